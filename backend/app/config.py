@@ -34,9 +34,30 @@ class Settings(BaseSettings):
     SMTP_USER: Optional[str] = None
     SMTP_PASS: Optional[str] = None
     SMTP_TLS: bool = True
+    SMTP_FROM: Optional[str] = None  # 发件人，默认使用SMTP_USER
+    SMTP_POOL_SIZE: int = 3  # 每个SMTP账号保持的最大连接数
+    SMTP_POOL_IDLE_SECONDS: int = 300  # 空闲连接超过该时间后重建
     
     # Default LLM
     DEFAULT_LLM_MODEL: str = "deepseek-chat"
+    LLM_BATCH_MAX_ITEMS: int = 10  # 打包分析时单次请求最多包含的新闻数
+    LLM_BATCH_MAX_INPUT_TOKENS: int = 3000  # 打包分析时单次请求中新闻内容的token预算
+    LLM_BATCH_ITEM_MAX_CHARS: int = 600  # 正文不超过该长度的新闻视为短讯，可打包分析
+    LLM_MAP_REDUCE_MIN_TOKENS: int = 6000  # 正文超过该token数时先分块摘要再分析，否则按句子挑选到预算内
+    LLM_MAP_REDUCE_MAX_CHUNKS: int = 8  # 分块摘要最多处理的块数
+    LLM_RESULT_CACHE_SIZE: int = 1000  # 按提示词版本+模型+内容缓存的LLM结果条数，0 表示关闭
+    LLM_RESULT_CACHE_TTL_SECONDS: int = 86400
+    LLM_PRICING_FILE: str = "../data/model_pricing.json"  # 模型价格（每1k token）和汇率，修改后自动重新加载
+    LLM_MODELS_CATALOG_FILE: str = "../data/models_list.json"  # V-API 模型目录，用于列出未配置价格的模型
+    
+    # LLM Router
+    LLM_ROUTER_MAX_ATTEMPTS: int = 3  # 单次请求最多尝试的端点数（含对冲）
+    LLM_ROUTER_EWMA_ALPHA: float = 0.2  # 延迟和错误率滑动平均的权重
+    LLM_CIRCUIT_FAILURES: int = 5  # 连续失败该次数后熔断端点
+    LLM_CIRCUIT_COOLDOWN_SECONDS: float = 30.0  # 熔断后经过该时间放行一次试探请求
+    LLM_HEDGE_ENABLED: bool = False  # 超过端点近期 p95 延迟未返回时向另一个可用端点发出对冲请求（需配置多个端点）
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 2.0
+    LLM_HEDGE_MAX_DELAY_SECONDS: float = 30.0
     
     # Crawler
     CRAWLER_INTERVAL: int = 300  # 5 minutes
@@ -45,11 +66,85 @@ class Settings(BaseSettings):
     # Cost Management
     ENABLE_COST_TRACKING: bool = True
     MONTHLY_BUDGET_USD: float = 100.0
+    COST_LEDGER_FLUSH_SIZE: int = 50  # 成本记录攒够该条数后批量写入
+    COST_LEDGER_FLUSH_SECONDS: float = 5.0  # 未攒够时最长缓冲时间
+    COST_LEDGER_REFRESH_SECONDS: float = 30.0  # 从 cost_rollups 重新加载汇总（合并其他进程写入）的间隔
+    COST_LEDGER_MEMORY_DAYS: int = 400  # 内存中保留的按日汇总天数
+    
+    # Cascade Pre-filter
+    CASCADE_ENABLED: bool = True  # LLM分析前先做本地预筛选
+    CASCADE_MIN_SCORE: float = 35.0  # 本地评分低于该值（对所有用户）的新闻跳过分析，打开时再分析
+    
+    # Analysis Queue
+    ANALYSIS_QUEUE_BATCH_SIZE: int = 20  # 单次处理最多领取的分析任务数
+    ANALYSIS_QUEUE_CONCURRENCY: int = 4  # 同时进行的LLM分析数
+    ANALYSIS_QUEUE_POLL_SECONDS: int = 30  # 定时处理分析队列的间隔（兜底）
+    ANALYSIS_QUEUE_MAX_ATTEMPTS: int = 3  # 单条新闻的最大分析次数
+    ANALYSIS_BUDGET_DOWNGRADE_PCT: float = 70.0  # 当月预算用到该比例后改用低价模型单次合并分析
+    ANALYSIS_BUDGET_TITLE_ONLY_PCT: float = 90.0  # 用到该比例后只分析标题，低优先级任务延后
+    ANALYSIS_BUDGET_MODEL: str = "deepseek-chat"  # 降级使用的低价模型
+    ANALYSIS_TITLE_ONLY_MIN_PRIORITY: float = 50.0  # 只分析标题阶段仍处理的最低优先级
+    
+    # Backfill (offline batch analysis)
+    BACKFILL_PROVIDER: str = "local"  # local: 本地分段执行；openai: 提交到 OpenAI 兼容的 Batch API
+    BACKFILL_API_BASE: Optional[str] = None  # Batch API 地址，默认使用 V-API
+    BACKFILL_API_KEY: Optional[str] = None
+    BACKFILL_MODEL: Optional[str] = None  # 回填使用的模型，默认 DEFAULT_LLM_MODEL
+    BACKFILL_DIR: str = "../data/backfill"  # JSONL 请求和输出文件目录
+    BACKFILL_CHUNK_SIZE: int = 500  # 单个批处理作业最多包含的请求数
+    BACKFILL_LOCAL_STEP: int = 50  # 本地批处理每次轮询执行的请求数
+    BACKFILL_LOCAL_CONCURRENCY: int = 2  # 本地批处理的并发数，避免占用实时分析的配额
+    BACKFILL_APPLY_BATCH: int = 100  # 写回结果时每提交一次记录一个断点
+    BACKFILL_POLL_SECONDS: int = 300  # 定时推进回填作业的间隔
     
     # Push
     ENABLE_FEISHU_PUSH: bool = False
     ENABLE_EMAIL_PUSH: bool = False
     SCORE_THRESHOLD: float = 60.0
+    PUSH_FEISHU_CONCURRENCY: int = 10  # 飞书Webhook并发上限
+    PUSH_EMAIL_CONCURRENCY: int = 5  # SMTP并发上限
+    PUSH_DIGEST_ENABLED: bool = False  # 汇总推送模式（多条新闻合并为一张卡片/一封邮件）
+    PUSH_DIGEST_WINDOW_SECONDS: int = 300  # 最早一条待推送新闻的最长等待时间
+    PUSH_DIGEST_MAX_ITEMS: int = 10  # 达到该条数立即推送，也是单条汇总的上限
+    PUSH_OUTBOX_MAX_ATTEMPTS: int = 6  # 发件箱单条记录的最大投递次数
+    PUSH_OUTBOX_BASE_BACKOFF_SECONDS: float = 10.0  # 首次重试的退避时间，之后逐次翻倍
+    PUSH_OUTBOX_MAX_BACKOFF_SECONDS: float = 900.0  # 退避时间上限
+    PUSH_OUTBOX_POLL_SECONDS: int = 15  # 定时投递发件箱的间隔（兜底重试）
+    
+    # Celery
+    CELERY_BACKEND: str = "memory"  # memory: 单进程开发模式；redis: 经 Redis 分发任务，worker 可按队列分别扩容
+    CELERY_BROKER_URL: Optional[str] = None  # 默认使用 REDIS_URL
+    CELERY_RESULT_BACKEND_URL: Optional[str] = None  # 默认使用 REDIS_URL
+    CELERY_RESULT_EXPIRES_SECONDS: int = 3600  # 任务结果保留时间
+    # 各队列 worker 的并发数和预取倍数（worker 用 -Q 只消费一个队列时生效）
+    CELERY_CRAWL_CONCURRENCY: int = 8  # 爬取以网络I/O为主
+    CELERY_CRAWL_PREFETCH: int = 4
+    CELERY_ANALYZE_CONCURRENCY: int = 2  # LLM分析受限于服务商配额和预算
+    CELERY_ANALYZE_PREFETCH: int = 1
+    CELERY_PUSH_CONCURRENCY: int = 4
+    CELERY_PUSH_PREFETCH: int = 4
+    CELERY_MAINTENANCE_CONCURRENCY: int = 1
+    CELERY_MAINTENANCE_PREFETCH: int = 1
+    
+    # Events
+    EVENT_BUS_BACKEND: str = "memory"  # memory: 仅进程内；redis: 通过 REDIS_URL 跨进程广播
+    EVENT_BUS_CHANNEL: str = "llmquant:events"
+    
+    # WebSocket
+    WS_SEND_QUEUE_SIZE: int = 100  # 每个连接的发送队列上限，写满视为慢连接并断开
+    WS_COALESCE_SECONDS: float = 1.0  # 合并该时间内的事件为一次推送
+    
+    # Server-Sent Events
+    SSE_BUFFER_SIZE: int = 1000  # 每个事件流保留的最近事件数（Last-Event-ID 续传范围）
+    SSE_QUEUE_SIZE: int = 500  # 每个订阅者的待发送事件上限
+    SSE_KEEPALIVE_SECONDS: float = 15.0  # 无事件时发送注释行，防止代理断开空闲连接
+    
+    # Monitoring
+    PROFILE_TASKS: Optional[str] = None  # 启动时开启性能分析的任务，逗号分隔
+    # memory: 指标和性能分析开关仅本进程；redis: worker 进程的指标经 REDIS_URL 汇总到 API 的 /metrics，
+    # 性能分析开关对所有 worker 生效。为空时与 CELERY_BACKEND 相同
+    MONITORING_BACKEND: Optional[str] = None
+    WORKER_METRICS_INTERVAL_SECONDS: float = 15.0  # worker 上报指标的间隔
     
     class Config:
         env_file = ".env"
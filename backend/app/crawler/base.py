@@ -4,6 +4,8 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 
+from app.monitoring import metrics
+
 class CrawlerType(str, Enum):
     RSS = "rss"
     WEB = "web"
@@ -65,16 +67,20 @@ class BaseNewsCrawler(ABC):
         执行完整爬取流程
         """
         try:
-            raw_items = await self.fetch()
+            with metrics.span("fetch", source=self.name):
+                raw_items = await self.fetch()
+            metrics.inc("crawled_items_total", len(raw_items), source=self.name)
             news_items = []
             now = datetime.utcnow()
             
             for raw_data in raw_items:
                 try:
-                    item = await self.parse(raw_data)
+                    with metrics.span("parse", source=self.name):
+                        item = await self.parse(raw_data)
                     if item and self._validate(item):
                         # 清洗数据
-                        cleaned_item = self._clean_data(item)
+                        with metrics.span("clean", source=self.name):
+                            cleaned_item = self._clean_data(item)
                         # 设置抓取时间
                         if not cleaned_item.crawled_at:
                             cleaned_item.crawled_at = now
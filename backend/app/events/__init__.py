@@ -0,0 +1,11 @@
+from .bus import Event, EventBus, event_bus
+from .topics import (
+    NEWS_SCORED, NEWS_PUSHED, ANALYSIS_PROGRESS,
+    news_event_payload, publish_news_scored, publish_analysis_progress,
+)
+
+__all__ = [
+    'Event', 'EventBus', 'event_bus',
+    'NEWS_SCORED', 'NEWS_PUSHED', 'ANALYSIS_PROGRESS',
+    'news_event_payload', 'publish_news_scored', 'publish_analysis_progress',
+]
@@ -0,0 +1,149 @@
+"""
+事件总线
+进程内同步分发；配置 Redis 后端时同时发布到 Redis 频道，由监听线程把其他进程
+（如 Celery worker）发布的事件分发给本进程的订阅者
+"""
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+# 本进程标识，用于区分本地事件与从 Redis 收到的其他进程事件
+PROCESS_ID = uuid.uuid4().hex
+
+
+@dataclass
+class Event:
+    """事件"""
+    type: str
+    payload: Dict[str, Any]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    origin: str = PROCESS_ID
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def is_local(self) -> bool:
+        return self.origin == PROCESS_ID
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_json(cls, data: str) -> "Event":
+        return cls(**json.loads(data))
+
+
+EventHandler = Callable[[Event], Any]
+
+
+class EventBus:
+    """
+    发布/订阅事件总线
+
+    订阅者在发布线程（或 Redis 监听线程）中同步调用，应尽快返回；
+    需要在事件循环中处理的订阅者自行通过 call_soon_threadsafe 转交
+    """
+
+    def __init__(self, backend: str = "memory", redis_url: Optional[str] = None, channel: str = "llmquant:events"):
+        self.backend = backend
+        self.redis_url = redis_url
+        self.channel = channel
+        self._handlers: Dict[str, List[Tuple[EventHandler, bool]]] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener: Optional[threading.Thread] = None
+        self._pubsub = None
+
+    def subscribe(self, event_type: str, handler: EventHandler, local_only: bool = False):
+        """
+        订阅事件，event_type 为 '*' 时接收所有事件
+
+        local_only=True 时只处理本进程发布的事件（如推送触发，避免多个进程重复处理）
+        """
+        with self._lock:
+            self._handlers.setdefault(event_type, []).append((handler, local_only))
+
+    def unsubscribe(self, event_type: str, handler: EventHandler):
+        with self._lock:
+            self._handlers[event_type] = [
+                entry for entry in self._handlers.get(event_type, []) if entry[0] is not handler
+            ]
+
+    def publish(self, event_type: str, payload: Dict[str, Any]) -> Event:
+        """发布事件：先分发给本进程订阅者，再转发到 Redis（失败只记录日志）"""
+        event = Event(type=event_type, payload=payload)
+        self._dispatch(event)
+
+        if self.backend == "redis":
+            try:
+                self._get_redis().publish(self.channel, event.to_json())
+            except Exception as e:
+                print(f"事件发布到Redis失败 [{event_type}]: {e}")
+
+        return event
+
+    def _dispatch(self, event: Event):
+        with self._lock:
+            handlers = self._handlers.get(event.type, []) + self._handlers.get('*', [])
+
+        for handler, local_only in handlers:
+            if local_only and not event.is_local:
+                continue
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"事件处理失败 [{event.type}] {getattr(handler, '__name__', handler)}: {e}")
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url)
+        return self._redis
+
+    def start_listener(self):
+        """启动 Redis 监听线程（仅 Redis 后端；重复调用无副作用）"""
+        if self.backend != "redis" or (self._listener and self._listener.is_alive()):
+            return
+
+        self._pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        self._listener = threading.Thread(target=self._listen, name="event-bus-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        pubsub = self._pubsub
+        while pubsub is self._pubsub:
+            try:
+                message = pubsub.get_message(timeout=1.0)
+                if not message:
+                    continue
+                event = Event.from_json(message['data'])
+                # 本进程发布的事件已在 publish 中分发过
+                if not event.is_local:
+                    self._dispatch(event)
+            except Exception as e:
+                print(f"事件监听出错: {e}")
+                time.sleep(1)
+
+    def stop_listener(self):
+        """停止 Redis 监听线程"""
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+        if self._listener:
+            self._listener.join(timeout=2)
+            self._listener = None
+
+# 全局事件总线
+event_bus = EventBus(
+    backend=settings.EVENT_BUS_BACKEND,
+    redis_url=settings.REDIS_URL,
+    channel=settings.EVENT_BUS_CHANNEL
+)
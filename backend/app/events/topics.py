@@ -0,0 +1,51 @@
+"""
+事件类型与负载
+"""
+from typing import Any, Dict, Iterable
+
+from .bus import event_bus
+
+# 新闻完成评分（新入库、分析完成或配置变更后重新评分）
+NEWS_SCORED = "news.scored"
+
+# 新闻推送完成（负载: ids）
+NEWS_PUSHED = "news.pushed"
+
+# 批量任务进度（负载: job, job_id, status, processed, total 及任务自定义字段）
+ANALYSIS_PROGRESS = "analysis.progress"
+
+# news.scored 负载中的新闻字段（不含正文，订阅者需要全文时按 id 查询）
+NEWS_EVENT_FIELDS = (
+    'id', 'title', 'summary', 'url', 'source', 'source_type', 'published_at', 'crawled_at',
+    'final_score', 'position_bias', 'position_magnitude', 'keywords', 'categories',
+    'sentiment', 'is_pushed', 'is_analyzed', 'analysis_type',
+)
+
+
+def news_event_payload(news) -> Dict[str, Any]:
+    """由 News 记录构建事件负载，feed_item 为信息流格式，实时订阅直接下发"""
+    from app.services.news_filter import NewsFilterService
+
+    data = news.to_dict()
+    return {
+        **{key: data.get(key) for key in NEWS_EVENT_FIELDS},
+        'feed_item': NewsFilterService.build_feed_item(news),
+    }
+
+
+def publish_news_scored(news_list: Iterable, reason: str = "ingest"):
+    """为已提交的新闻逐条发布 news.scored 事件"""
+    for news in news_list:
+        event_bus.publish(NEWS_SCORED, {**news_event_payload(news), 'reason': reason})
+
+
+def publish_analysis_progress(job: str, job_id: str, status: str, processed: int, total: int, **fields):
+    """发布批量任务进度，status 为 running/completed/failed"""
+    event_bus.publish(ANALYSIS_PROGRESS, {
+        'job': job,
+        'job_id': job_id,
+        'status': status,
+        'processed': processed,
+        'total': total,
+        **fields,
+    })
@@ -1,3 +1,9 @@
 from .engine import LLMEngine, llm_engine
+from .batch import get_batch_provider, LocalBatchProvider, OpenAIBatchProvider
+from .router import LLMRouter, Endpoint
+from .prompts import PromptTemplate, prompt_registry
 
-__all__ = ['LLMEngine', 'llm_engine']
+__all__ = [
+    'LLMEngine', 'llm_engine', 'get_batch_provider', 'LocalBatchProvider', 'OpenAIBatchProvider',
+    'LLMRouter', 'Endpoint', 'PromptTemplate', 'prompt_registry',
+]
@@ -0,0 +1,208 @@
+"""
+LLM 批处理接口
+回填和重新分析的请求先写成 JSONL（OpenAI Batch 格式，每行 custom_id + 请求体），
+再交给批处理提供方执行；输出同样是按 custom_id 对应的 JSONL。
+
+- openai: 上传到 OpenAI 兼容的 /v1/files 并创建 /v1/batches 作业，完成后下载输出文件
+- local: 本地替代实现，每次轮询按低并发执行一段请求并追加到输出文件，
+  已有输出的 custom_id 不会重复请求（进程中断后可继续）
+"""
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import aiohttp
+
+from app.config import settings
+from app.llm.engine import llm_engine
+
+# 批处理请求的目标接口
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+def build_request(custom_id: str, model: str, messages: List[Dict[str, str]], **params) -> Dict[str, Any]:
+    """单行批处理请求"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_URL,
+        "body": {"model": model, "messages": messages, **params},
+    }
+
+
+def write_jsonl(path: str, rows: List[Dict[str, Any]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取 JSONL（跳过空行和写入中断留下的残行）"""
+    if not path or not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def response_content(row: Dict[str, Any]) -> Optional[str]:
+    """输出行中的模型回复文本（请求失败时为 None）"""
+    response = row.get('response') or {}
+    if row.get('error') or response.get('status_code') != 200:
+        return None
+    choices = (response.get('body') or {}).get('choices') or []
+    if not choices:
+        return None
+    return (choices[0].get('message') or {}).get('content')
+
+
+def response_usage(row: Dict[str, Any]) -> Dict[str, int]:
+    usage = ((row.get('response') or {}).get('body') or {}).get('usage') or {}
+    details = usage.get('prompt_tokens_details') or {}
+    return {
+        'input_tokens': usage.get('prompt_tokens') or 0,
+        'output_tokens': usage.get('completion_tokens') or 0,
+        'cached_tokens': details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or 0,
+    }
+
+
+class LocalBatchProvider:
+    """本地批处理：不依赖服务端批处理接口，按 BACKFILL_LOCAL_STEP 分段执行"""
+
+    name = 'local'
+    # 本地执行没有批处理折扣
+    price_ratio = 1.0
+
+    def __init__(self, step: Optional[int] = None, concurrency: Optional[int] = None):
+        self.step = step or settings.BACKFILL_LOCAL_STEP
+        self.concurrency = concurrency or settings.BACKFILL_LOCAL_CONCURRENCY
+
+    async def submit(self, input_file: str) -> str:
+        return f"local-{os.path.splitext(os.path.basename(input_file))[0]}"
+
+    async def retrieve(self, batch_id: str, input_file: str, output_file: str) -> Dict[str, Any]:
+        requests = list(read_jsonl(input_file))
+        done: Set[str] = {row.get('custom_id') for row in read_jsonl(output_file)}
+        pending = [row for row in requests if row['custom_id'] not in done][:self.step]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(row: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    response = await llm_engine._completion("backfill", hedge=False, **row['body'])
+                    body = {
+                        'choices': [{'message': {'role': 'assistant', 'content': response.choices[0].message.content}}],
+                        'usage': {
+                            'prompt_tokens': getattr(response.usage, 'prompt_tokens', 0) or 0,
+                            'completion_tokens': getattr(response.usage, 'completion_tokens', 0) or 0,
+                            'prompt_tokens_details': {'cached_tokens': llm_engine.cached_prompt_tokens(response.usage)},
+                        },
+                    }
+                    return {'custom_id': row['custom_id'], 'response': {'status_code': 200, 'body': body}, 'error': None}
+                except Exception as e:
+                    return {'custom_id': row['custom_id'], 'response': None, 'error': {'message': str(e)}}
+
+        results = await asyncio.gather(*(run(row) for row in pending))
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        with open(output_file, 'a', encoding='utf-8') as f:
+            # 上次写入中断留下的残行没有换行符，先补上，避免新结果接在残行后面被一起丢弃
+            if f.tell() and not LocalBatchProvider._ends_with_newline(output_file):
+                f.write("\n")
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+        finished = len(done) + len(results)
+        return {
+            'status': 'completed' if finished >= len(requests) else 'in_progress',
+            'completed': finished,
+            'total': len(requests),
+        }
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+
+class OpenAIBatchProvider:
+    """OpenAI 兼容的 Batch API（24小时内完成，价格为实时接口的一半）"""
+
+    name = 'openai'
+    price_ratio = 0.5
+
+    def __init__(self, api_base: Optional[str] = None, api_key: Optional[str] = None):
+        self.api_base = (api_base or settings.BACKFILL_API_BASE or f"{settings.VAPI_BASE_URL}/v1").rstrip('/')
+        self.api_key = api_key or settings.BACKFILL_API_KEY or settings.OPENAI_API_KEY or settings.VAPI_API_KEY
+
+    @property
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    async def submit(self, input_file: str) -> str:
+        timeout = aiohttp.ClientTimeout(total=300)
+        async with aiohttp.ClientSession(headers=self._headers, timeout=timeout) as session:
+            form = aiohttp.FormData()
+            form.add_field('purpose', 'batch')
+            with open(input_file, 'rb') as f:
+                form.add_field('file', f, filename=os.path.basename(input_file), content_type='application/jsonl')
+                async with session.post(f"{self.api_base}/files", data=form) as response:
+                    response.raise_for_status()
+                    file_id = (await response.json())['id']
+
+            payload = {"input_file_id": file_id, "endpoint": CHAT_COMPLETIONS_URL, "completion_window": "24h"}
+            async with session.post(f"{self.api_base}/batches", json=payload) as response:
+                response.raise_for_status()
+                return (await response.json())['id']
+
+    async def retrieve(self, batch_id: str, input_file: str, output_file: str) -> Dict[str, Any]:
+        timeout = aiohttp.ClientTimeout(total=300)
+        async with aiohttp.ClientSession(headers=self._headers, timeout=timeout) as session:
+            async with session.get(f"{self.api_base}/batches/{batch_id}") as response:
+                response.raise_for_status()
+                batch = await response.json()
+
+            counts = batch.get('request_counts') or {}
+            status = batch.get('status')
+            result = {'completed': counts.get('completed', 0), 'total': counts.get('total', 0)}
+            if status in ('failed', 'cancelled'):
+                errors = (batch.get('errors') or {}).get('data') or []
+                return {**result, 'status': 'failed', 'error': errors[0].get('message') if errors else status}
+            # 过期的作业也会返回已完成部分的输出
+            if status not in ('completed', 'expired'):
+                return {**result, 'status': 'in_progress'}
+
+            lines = []
+            for key in ('output_file_id', 'error_file_id'):
+                if not batch.get(key):
+                    continue
+                async with session.get(f"{self.api_base}/files/{batch[key]}/content") as response:
+                    response.raise_for_status()
+                    lines.append((await response.text()).strip())
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(line for line in lines if line) + "\n")
+        return {**result, 'status': 'completed'}
+
+
+BATCH_PROVIDERS = {
+    'local': LocalBatchProvider,
+    'openai': OpenAIBatchProvider,
+}
+
+
+def get_batch_provider(name: Optional[str] = None):
+    name = name or settings.BACKFILL_PROVIDER
+    if name not in BATCH_PROVIDERS:
+        raise ValueError(f"不支持的批处理提供方: {name}")
+    return BATCH_PROVIDERS[name]()
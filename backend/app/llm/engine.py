@@ -1,6 +1,7 @@
 
 import litellm
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import asyncio
 import time
 import json
 from datetime import datetime
@@ -8,31 +9,40 @@ from datetime import datetime
 from app.config import settings
 from app.models import LLMCost
 from app.llm.vapi_service import vapi_service
+from app.llm.json_utils import IncrementalJSONParser, extract_json_object
+from app.llm import tokens
+from app.llm.prompts import ResultCache, prompt_registry
+from app.llm.pricing import model_pricing
+from app.llm.schemas import OUTPUT_SCHEMAS, ScoreOutput, parse_output
+from app.llm.router import LLMRouter
+from app.monitoring import metrics
 
 class LLMEngine:
     """LLM Engine for processing news"""
     
+    # token_budgets: 各任务的正文 token 预算，未配置的任务使用 tokens.DEFAULT_TOKEN_BUDGETS
+    # 价格见 pricing.model_pricing（LLM_PRICING_FILE）
+    # json_mode: 支持 response_format={"type": "json_object"}
     AVAILABLE_MODELS = {
-        'gpt-4o': {'provider': 'openai', 'model': 'gpt-4o', 'cost_per_1k_input': 0.005, 'cost_per_1k_output': 0.015},
-        'gpt-4o-mini': {'provider': 'openai', 'model': 'gpt-4o-mini', 'cost_per_1k_input': 0.00015, 'cost_per_1k_output': 0.0006},
-        'deepseek-chat': {'provider': 'deepseek', 'model': 'deepseek-chat', 'cost_per_1k_input': 0.00014, 'cost_per_1k_output': 0.00028},
+        'gpt-4o': {'provider': 'openai', 'model': 'gpt-4o', 'json_mode': True,
+                   'token_budgets': {'analysis': 1200, 'brief': 1000, 'tags': 1000, 'search': 120}},
+        'gpt-4o-mini': {'provider': 'openai', 'model': 'gpt-4o-mini', 'json_mode': True,
+                        'token_budgets': {'analysis': 2000, 'brief': 1500, 'tags': 1500, 'search': 150}},
+        'deepseek-chat': {'provider': 'deepseek', 'model': 'deepseek-chat', 'json_mode': True,
+                          'token_budgets': {'analysis': 2000, 'brief': 1500, 'tags': 1500, 'search': 150}},
     }
     
     def __init__(self):
         self.default_model = settings.DEFAULT_LLM_MODEL
-        self._setup_api_keys()
-        self._setup_vapi()
-    
-    def _setup_vapi(self):
-        if settings.VAPI_API_KEY:
-            litellm.api_base = f"{settings.VAPI_BASE_URL or 'https://api.vveai.com'}/v1"
-            litellm.api_key = settings.VAPI_API_KEY
-            print("V-API configured successfully")
-
-    def _setup_api_keys(self):
-        if settings.OPENAI_API_KEY:
-            litellm.api_key = settings.OPENAI_API_KEY
-            print("OpenAI API key configured")
+        # 凭证和 api_base 随每个请求传入，不修改 litellm 的全局配置
+        self.router = LLMRouter.from_settings({
+            config['model']: config['provider'] for config in self.AVAILABLE_MODELS.values()
+        })
+        self.result_cache = ResultCache(settings.LLM_RESULT_CACHE_SIZE, settings.LLM_RESULT_CACHE_TTL_SECONDS)
+    
+    def log_endpoints(self):
+        """启动时输出已配置的 LLM 端点（API 进程和 Celery worker 启动时调用）"""
+        print("LLM endpoints configured:", ", ".join(endpoint.name for endpoint in self.router.endpoints))
     
     def get_available_models(self):
         return [
@@ -40,8 +50,7 @@ class LLMEngine:
                 'id': model_id,
                 'name': config['model'],
                 'provider': config['provider'],
-                'cost_per_1k_input': config['cost_per_1k_input'],
-                'cost_per_1k_output': config['cost_per_1k_output'],
+                **model_pricing.per_1k_usd(config['model']),
             }
             for model_id, config in self.AVAILABLE_MODELS.items()
         ]
@@ -53,8 +62,7 @@ class LLMEngine:
                 'id': model.get('id'),
                 'name': model.get('id'),
                 'provider': model.get('owned_by', 'vapi'),
-                'cost_per_1k_input': 0.0,
-                'cost_per_1k_output': 0.0,
+                **model_pricing.per_1k_usd(model.get('id')),
             }
             for model in vapi_models
         ]
@@ -76,26 +84,31 @@ class LLMEngine:
         results = {
             'model_used': model,
             'tasks_completed': [],
+            'prompt_versions': {},
             'processing_time_ms': 0,
             'cost': None,
         }
         
         start_time = time.time()
-        total_cost = {'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0}
+        total_cost = {'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cost_usd': 0}
         
         try:
-            full_content = f"Title: {title}\n\nContent: {content[:3000]}"
+            content, prepare_usage = await self.prepare_content(content, model, 'analysis')
+            self._accumulate_cost(total_cost, prepare_usage)
+            full_content = f"Title: {title}\n\nContent: {content}"
             
             if 'summarize' in tasks:
                 summary_result = await self._summarize(full_content, model)
                 results['summary'] = summary_result['text']
                 results['tasks_completed'].append('summarize')
+                results['prompt_versions']['summarize'] = summary_result['prompt_version']
                 self._accumulate_cost(total_cost, summary_result)
             
             if 'classify' in tasks:
                 classify_result = await self._classify(full_content, model)
                 results['categories'] = classify_result['categories']
                 results['tasks_completed'].append('classify')
+                results['prompt_versions']['classify'] = classify_result['prompt_version']
                 self._accumulate_cost(total_cost, classify_result)
             
             if 'score' in tasks:
@@ -105,18 +118,21 @@ class LLMEngine:
                 results['position_magnitude'] = score_result.get('position_magnitude')
                 results['brief_impact'] = score_result.get('brief_impact')
                 results['tasks_completed'].append('score')
+                results['prompt_versions']['score'] = score_result['prompt_version']
                 self._accumulate_cost(total_cost, score_result)
             
             if 'keywords' in tasks:
                 keyword_result = await self._extract_keywords(full_content, model)
                 results['keywords'] = keyword_result['keywords']
                 results['tasks_completed'].append('keywords')
+                results['prompt_versions']['keywords'] = keyword_result['prompt_version']
                 self._accumulate_cost(total_cost, keyword_result)
             
             if 'sentiment' in tasks:
                 sentiment_result = await self._analyze_sentiment(full_content, model)
                 results['sentiment'] = sentiment_result['sentiment']
                 results['tasks_completed'].append('sentiment')
+                results['prompt_versions']['sentiment'] = sentiment_result['prompt_version']
                 self._accumulate_cost(total_cost, sentiment_result)
             
         except Exception as e:
@@ -129,298 +145,610 @@ class LLMEngine:
         
         return results
     
-    async def _summarize(self, content: str, model: str):
-        prompt = "Please generate a concise summary (under 100 words) for the following news:\n\n" + content + "\n\nPlease return only the summary."
-        
-        print("Using model: gpt-4o-mini")
-        print("API Base:", litellm.api_base)
-        
-        response = await litellm.acompletion(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=200,
+    async def _completion(self, task: str, hedge: Optional[bool] = None, **kwargs):
+        """经路由调用LLM（端点选择、故障切换、对冲），记录各任务/模型的延迟与token用量"""
+        model = kwargs.get('model', '')
+        with metrics.span("llm", task=task, model=model):
+            response = await self.router.completion(hedge=hedge, **kwargs)
+        
+        usage = getattr(response, 'usage', None)
+        if usage:
+            metrics.inc("llm_tokens_total", usage.prompt_tokens or 0, task=task, model=model, direction="input")
+            metrics.inc("llm_tokens_total", usage.completion_tokens or 0, task=task, model=model, direction="output")
+            cached = self.cached_prompt_tokens(usage)
+            if cached:
+                metrics.inc("llm_cached_tokens_total", cached, task=task, model=model)
+        return response
+    
+    def json_mode_params(self, model: str) -> Dict[str, Any]:
+        """支持 JSON 输出模式的模型所需的请求参数（提示词中需包含 JSON 字样）"""
+        config = self.AVAILABLE_MODELS.get(model) or next(
+            (config for config in self.AVAILABLE_MODELS.values() if config['model'] == model), {}
         )
+        return {'response_format': {'type': 'json_object'}} if config.get('json_mode') else {}
+    
+    @staticmethod
+    def cached_prompt_tokens(usage: Any) -> int:
+        """命中服务端前缀缓存的输入token数（OpenAI: prompt_tokens_details.cached_tokens，DeepSeek: prompt_cache_hit_tokens）"""
+        if usage is None:
+            return 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = details.get('cached_tokens') if isinstance(details, dict) else getattr(details, 'cached_tokens', None)
+        if not cached:
+            cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+        return int(cached or 0)
+    
+    async def _prompt_completion(
+        self,
+        task: str,
+        prompt: str,
+        variables: Dict[str, Any],
+        use_cache: bool = True,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        用注册的提示词模板调用LLM；相同模板版本、模型和变量的结果从结果缓存返回（不计token）
+        
+        模板在 OUTPUT_SCHEMAS 中有输出结构时，模型支持的话以 JSON 模式请求，输出经宽松解析和校验后
+        放在 parsed 中（失败为 None），只有校验通过的输出才进入结果缓存
+        
+        Returns:
+            {'text', 'parsed', 'input_tokens', 'output_tokens', 'cached_tokens', 'prompt_version', 'cache_hit'}
+        """
+        template = prompt_registry.get(prompt)
+        schema = OUTPUT_SCHEMAS.get(prompt)
+        model = kwargs['model']
+        key = template.cache_key(model, **variables) if use_cache else None
+        cached_text = self.result_cache.get(key) if key else None
+        if cached_text is not None:
+            metrics.inc("llm_result_cache_hits_total", task=task, model=model)
+            return {
+                'text': cached_text,
+                'parsed': schema.model_validate(extract_json_object(cached_text)) if schema else None,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'cached_tokens': 0,
+                'prompt_version': template.version,
+                'cache_hit': True,
+            }
         
+        if schema:
+            kwargs = {**self.json_mode_params(model), **kwargs}
+        response = await self._completion(task, messages=template.render(**variables), **kwargs)
+        text = (response.choices[0].message.content or '').strip()
+        parsed = parse_output(text, schema, task, model) if schema else None
+        if key and text and (parsed is not None or not schema):
+            self.result_cache.set(key, text)
+        usage = getattr(response, 'usage', None)
         return {
-            'text': response.choices[0].message.content.strip(),
-            'input_tokens': response.usage.prompt_tokens,
-            'output_tokens': response.usage.completion_tokens,
+            'text': text,
+            'parsed': parsed,
+            'input_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+            'output_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+            'cached_tokens': self.cached_prompt_tokens(usage),
+            'prompt_version': template.version,
+            'cache_hit': False,
         }
     
-    async def _classify(self, content: str, model: str):
-        prompt = """Please classify the following news (multiple choices allowed), return JSON format:
+    async def stream_completion(self, task: str, usage: Optional[Dict[str, int]] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        流式调用LLM，逐段产出文本增量
 
-""" + content + """
-
-Categories: ["Finance", "Technology", "AI", "Blockchain", "Policy", "Market", "Company", "International", "Society"]
-
-Return format: {"categories": ["Category1", "Category2"]}"""
+        记录首token延迟（llm_ttft_seconds）和整体耗时；token 用量取自流末尾的 usage，
+        服务端未返回时按文本估算，结果写入传入的 usage 字典（input_tokens / output_tokens）
+        """
+        model = kwargs.get('model', '')
+        start = time.perf_counter()
+        first_token = True
+        chunk_usage = None
+        output = []
+        
+        with metrics.span("llm", task=task, model=model):
+            async for chunk in self.router.stream(stream_options={"include_usage": True}, **kwargs):
+                if getattr(chunk, 'usage', None):
+                    chunk_usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = getattr(chunk.choices[0].delta, 'content', None)
+                if not delta:
+                    continue
+                if first_token:
+                    metrics.observe("llm_ttft_seconds", time.perf_counter() - start, task=task, model=model)
+                    first_token = False
+                output.append(delta)
+                yield delta
+        
+        cached_tokens = self.cached_prompt_tokens(chunk_usage)
+        if chunk_usage:
+            input_tokens = chunk_usage.prompt_tokens or 0
+            output_tokens = chunk_usage.completion_tokens or 0
+        else:
+            try:
+                input_tokens = litellm.token_counter(model=model, messages=kwargs.get('messages', []))
+                output_tokens = litellm.token_counter(model=model, text=''.join(output))
+            except Exception:
+                input_tokens = sum(len(m.get('content') or '') for m in kwargs.get('messages', [])) // 4
+                output_tokens = len(''.join(output)) // 4
+        
+        metrics.inc("llm_tokens_total", input_tokens, task=task, model=model, direction="input")
+        metrics.inc("llm_tokens_total", output_tokens, task=task, model=model, direction="output")
+        if cached_tokens:
+            metrics.inc("llm_cached_tokens_total", cached_tokens, task=task, model=model)
+        if usage is not None:
+            usage['input_tokens'] = usage.get('input_tokens', 0) + input_tokens
+            usage['output_tokens'] = usage.get('output_tokens', 0) + output_tokens
+            usage['cached_tokens'] = usage.get('cached_tokens', 0) + cached_tokens
+    
+    async def process_news_stream(
+        self,
+        title: str,
+        content: str,
+        tasks: List[str] = None,
+        model: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        流式处理新闻：摘要逐段产出 ('token', ...)，其余任务与摘要并发执行，
+        每个任务完成即产出 ('task', ...)，最后产出 ('done', 完整结果)，结构与 process_news 一致
+        """
+        if tasks is None:
+            tasks = ['summarize', 'classify', 'score', 'keywords', 'sentiment']
+        
+        model = model or self.default_model
+        if model not in self.AVAILABLE_MODELS:
+            model = self.default_model
         
-        print("Using model: gpt-4o-mini")
-        print("API Base:", litellm.api_base)
+        results = {
+            'model_used': model,
+            'tasks_completed': [],
+            'prompt_versions': {},
+            'processing_time_ms': 0,
+            'cost': None,
+        }
+        start_time = time.time()
+        total_cost = {'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cost_usd': 0}
+        content, prepare_usage = await self.prepare_content(content, model, 'analysis')
+        self._accumulate_cost(total_cost, prepare_usage)
+        full_content = f"Title: {title}\n\nContent: {content}"
+        
+        # 任务名 -> (调用, 结果中要返回的字段)
+        json_tasks = {
+            'classify': (self._classify, ['categories']),
+            'score': (self._score, ['scores', 'position_bias', 'position_magnitude', 'brief_impact']),
+            'keywords': (self._extract_keywords, ['keywords']),
+            'sentiment': (self._analyze_sentiment, ['sentiment']),
+        }
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def run_summary():
+            usage: Dict[str, int] = {}
+            parts = []
+            async for delta in self.stream_completion(
+                "summarize",
+                usage=usage,
+                model=self.model_name(model),
+                messages=prompt_registry.get('summarize').render(content=full_content),
+                temperature=0.3,
+                max_tokens=200,
+            ):
+                parts.append(delta)
+                await queue.put(('token', {'task': 'summarize', 'text': delta}))
+            return {'summary': ''.join(parts).strip()}, {**usage, 'prompt_version': prompt_registry.version('summarize')}
+        
+        async def run_json_task(func, fields):
+            result = await func(full_content, model)
+            return {field: result.get(field) for field in fields}, result
+        
+        async def run(name, coro):
+            try:
+                fields, usage = await coro
+                await queue.put(('task', {'task': name, 'result': fields, 'usage': usage}))
+            except Exception as e:
+                await queue.put(('error', {'task': name, 'error': str(e)}))
+        
+        workers = []
+        if 'summarize' in tasks:
+            workers.append(asyncio.create_task(run('summarize', run_summary())))
+        for name, (func, fields) in json_tasks.items():
+            if name in tasks:
+                workers.append(asyncio.create_task(run(name, run_json_task(func, fields))))
+        
+        try:
+            pending = len(workers)
+            while pending:
+                event_type, data = await queue.get()
+                if event_type == 'token':
+                    yield event_type, data
+                    continue
+                
+                pending -= 1
+                if event_type == 'error':
+                    results['error'] = data['error']
+                    results['status'] = 'error'
+                    yield event_type, data
+                    continue
+                
+                usage = data.pop('usage')
+                self._accumulate_cost(total_cost, usage)
+                results.update(data['result'])
+                results['tasks_completed'].append(data['task'])
+                results['prompt_versions'][data['task']] = usage.get('prompt_version')
+                yield event_type, data
+        finally:
+            # 客户端断开时取消未完成的调用
+            for worker in workers:
+                worker.cancel()
+        
+        results['processing_time_ms'] = int((time.time() - start_time) * 1000)
+        results['cost'] = total_cost
+        yield 'done', results
+    
+    def token_budget(self, model: Optional[str], task: str) -> int:
+        return tokens.token_budget(self.AVAILABLE_MODELS.get(model, {}), task)
+    
+    def model_name(self, model: Optional[str]) -> Optional[str]:
+        """实际请求（及分词、计价）使用的模型名（AVAILABLE_MODELS 中的 model 字段）"""
+        return self.AVAILABLE_MODELS.get(model, {}).get('model', model)
+    
+    def fit_content(self, content: str, model: Optional[str], task: str) -> str:
+        """正文超出任务预算时按句子信息量挑选（不调用LLM）"""
+        return tokens.select_sentences(content or '', self.token_budget(model, task), self.model_name(model))
+    
+    async def prepare_content(self, content: str, model: Optional[str], task: str) -> Tuple[str, Dict[str, int]]:
+        """
+        按任务预算准备正文：未超出预算原样返回；超出不多时挑选信息量高的句子；
+        超过 LLM_MAP_REDUCE_MIN_TOKENS 的长文先分块摘要再合并（map-reduce）
+        
+        Returns:
+            (正文, 分块摘要消耗的 token {'input_tokens', 'output_tokens', 'cached_tokens'})
+        """
+        usage = {'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0}
+        content = content or ''
+        budget = self.token_budget(model, task)
+        tokenizer_model = self.model_name(model)
+        length = tokens.count_tokens(content, tokenizer_model)
+        if length <= budget:
+            return content, usage
+        metrics.inc("llm_content_over_budget_total", task=task)
+        if length < settings.LLM_MAP_REDUCE_MIN_TOKENS:
+            return tokens.select_sentences(content, budget, tokenizer_model), usage
+        
+        metrics.inc("llm_map_reduce_total", task=task)
+        chunks = tokens.chunk_text(content, self.token_budget(model, 'chunk'), tokenizer_model)
+        chunks = chunks[:settings.LLM_MAP_REDUCE_MAX_CHUNKS]
+        # 每块摘要的长度按最终预算平均分配
+        per_chunk = max(60, budget // len(chunks))
+        
+        async def summarize_chunk(index: int, chunk: str) -> str:
+            try:
+                result = await self._prompt_completion(
+                    "chunk_summary",
+                    'chunk_summary',
+                    {'index': index + 1, 'total': len(chunks), 'max_tokens': per_chunk, 'chunk': chunk},
+                    model=model,
+                    temperature=0.2,
+                    max_tokens=per_chunk,
+                )
+                self._accumulate_cost(usage, result)
+                return result['text']
+            except Exception as e:
+                print(f"分块摘要失败: {e}")
+                return tokens.select_sentences(chunk, per_chunk, tokenizer_model)
+        
+        summaries = await asyncio.gather(*(summarize_chunk(index, chunk) for index, chunk in enumerate(chunks)))
+        merged = "\n".join(summary for summary in summaries if summary)
+        return tokens.select_sentences(merged, budget, tokenizer_model), usage
+    
+    async def _summarize(self, content: str, model: str):
+        result = await self._prompt_completion(
+            "summarize",
+            'summarize',
+            {'content': content},
+            model=self.model_name(model),
+            temperature=0.3,
+            max_tokens=200,
+        )
         
-        response = await litellm.acompletion(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        return result
+    
+    async def _classify(self, content: str, model: str):
+        result = await self._prompt_completion(
+            "classify",
+            'classify',
+            {'content': content},
+            model=self.model_name(model),
             temperature=0.3,
             max_tokens=100,
         )
         
-        try:
-            result = json.loads(response.choices[0].message.content)
-            categories = result.get('categories', [])
-        except:
-            categories = []
-        
-        return {
-            'categories': categories,
-            'input_tokens': response.usage.prompt_tokens,
-            'output_tokens': response.usage.completion_tokens,
-        }
+        parsed = result['parsed']
+        return {**result, 'categories': parsed.categories if parsed else []}
     
     async def _score(self, content: str, model: str):
-        prompt = """Please evaluate the following news across dimensions (0-100), return JSON format:
-
-""" + content + """
-
-Dimensions:
-1. market_impact: Potential impact on financial markets
-2. industry_relevance: Relevance to specific industries
-3. novelty_score: Innovativeness and uniqueness
-4. urgency: Need for immediate attention
-5. position_bias: From investment perspective, bullish/bearish/neutral
-6. position_magnitude: 0-100, strength of bias
-7. importance: Overall importance 0-100
-8. brief_impact: One sentence impact description
-
-Return format: {
-    "market_impact": 85,
-    "industry_relevance": 70,
-    "novelty_score": 60,
-    "urgency": 75,
-    "position_bias": "bullish",
-    "position_magnitude": 70,
-    "importance": 85,
-    "brief_impact": "Positive impact on tech sector"
-}"""
-        
-        print("Using model: gpt-4o-mini")
-        print("API Base:", litellm.api_base)
-        
-        response = await litellm.acompletion(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        result = await self._prompt_completion(
+            "score",
+            'score',
+            {'content': content},
+            model=self.model_name(model),
             temperature=0.3,
             max_tokens=250,
         )
         
-        try:
-            result = json.loads(response.choices[0].message.content)
-            scores = {
-                'market_impact': result.get('market_impact', 50),
-                'industry_relevance': result.get('industry_relevance', 50),
-                'novelty_score': result.get('novelty_score', 50),
-                'urgency': result.get('urgency', 50),
-            }
-            position_bias = result.get('position_bias', 'neutral')
-            position_magnitude = result.get('position_magnitude', 0)
-            brief_impact = result.get('brief_impact', '')
-        except:
-            scores = {
-                'market_impact': 50,
-                'industry_relevance': 50,
-                'novelty_score': 50,
-                'urgency': 50,
-            }
-            position_bias = 'neutral'
-            position_magnitude = 0
-            brief_impact = ''
-        
+        # 解析失败时各项取默认值
+        parsed = result['parsed'] or ScoreOutput(market_impact=50, industry_relevance=50, novelty_score=50, urgency=50)
         return {
-            'scores': scores,
-            'position_bias': position_bias,
-            'position_magnitude': position_magnitude,
-            'brief_impact': brief_impact,
-            'input_tokens': response.usage.prompt_tokens,
-            'output_tokens': response.usage.completion_tokens,
+            **result,
+            'scores': {
+                'market_impact': parsed.market_impact,
+                'industry_relevance': parsed.industry_relevance,
+                'novelty_score': parsed.novelty_score,
+                'urgency': parsed.urgency,
+            },
+            'position_bias': parsed.position_bias,
+            'position_magnitude': parsed.position_magnitude,
+            'brief_impact': parsed.brief_impact,
         }
     
     async def _extract_keywords(self, content: str, model: str):
-        prompt = """Please extract 5-10 keywords from the following news, return JSON format:
-
-""" + content + """
-
-Return format: {"keywords": ["keyword1", "keyword2", ...]}"""
-        
-        print("Using model: gpt-4o-mini")
-        print("API Base:", litellm.api_base)
-        
-        response = await litellm.acompletion(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        result = await self._prompt_completion(
+            "extract_keywords",
+            'keywords',
+            {'content': content},
+            model=self.model_name(model),
             temperature=0.3,
             max_tokens=100,
         )
         
-        try:
-            result = json.loads(response.choices[0].message.content)
-            keywords = result.get('keywords', [])[:10]
-        except:
-            keywords = []
-        
-        return {
-            'keywords': keywords,
-            'input_tokens': response.usage.prompt_tokens,
-            'output_tokens': response.usage.completion_tokens,
-        }
+        parsed = result['parsed']
+        return {**result, 'keywords': parsed.keywords if parsed else []}
     
     async def _analyze_sentiment(self, content: str, model: str):
-        prompt = """Please analyze sentiment of the following news, return JSON format:
-
-""" + content + """
-
-Return format: {"sentiment": "positive/negative/neutral"}"""
-        
-        print("Using model: gpt-4o-mini")
-        print("API Base:", litellm.api_base)
-        
-        response = await litellm.acompletion(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        result = await self._prompt_completion(
+            "sentiment",
+            'sentiment',
+            {'content': content},
+            model=self.model_name(model),
             temperature=0.3,
             max_tokens=50,
         )
         
-        try:
-            result = json.loads(response.choices[0].message.content)
-            sentiment = result.get('sentiment', 'neutral')
-        except:
-            sentiment = 'neutral'
-        
-        return {
-            'sentiment': sentiment,
-            'input_tokens': response.usage.prompt_tokens,
-            'output_tokens': response.usage.completion_tokens,
-        }
+        parsed = result['parsed']
+        return {**result, 'sentiment': parsed.sentiment if parsed else 'neutral'}
+    
+    @staticmethod
+    def brief_messages(title: str, content: str) -> List[Dict[str, str]]:
+        """单次合并分析的消息（实时简要分析和离线回填共用，content 应已按预算裁剪）"""
+        return prompt_registry.get('brief').render(title=title or '', content=content or '')
     
     async def brief_analyze_with_vapi(self, title: str, content: str, model: str = "gpt-4o-mini"):
-        prompt = """Please analyze the following finance/tech news deeply, return JSON format:
-
-Title: """ + title + """
-
-Content: """ + content[:2000] + """...
-
-Requirements:
-1. summary (under 100 words)
-2. keywords (3-7)
-3. sentiment (positive/negative/neutral)
-4. categories (1-2 from: Finance, Technology, AI, Blockchain, Policy, Market, Company, International)
-5. importance (0-100)
-6. position_bias (bullish/bearish/neutral)
-7. position_magnitude (0-100)
-8. market_impact (0-100)
-9. industry_relevance (0-100)
-10. novelty_score (0-100)
-11. urgency (0-100)
-
-Return format: {
-    "summary": "...",
-    "keywords": ["..."],
-    "sentiment": "...",
-    "categories": ["..."],
-    "importance": 85,
-    "position_bias": "...",
-    "position_magnitude": 70,
-    "market_impact": 80,
-    "industry_relevance": 75,
-    "novelty_score": 60,
-    "urgency": 65
-}"""
+        content, prepare_usage = await self.prepare_content(content, model, 'brief')
         
         try:
-            response = await litellm.acompletion(
+            result = await self._prompt_completion(
+                "brief_analysis",
+                'brief',
+                {'title': title or '', 'content': content},
                 model=model,
-                messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
                 max_tokens=400,
             )
             
-            result = json.loads(response.choices[0].message.content)
+            if result['parsed'] is None:
+                raise ValueError(f"无法解析分析结果: {result['text'][:200]}")
             
             return {
-                'summary': result.get('summary', ''),
-                'keywords': result.get('keywords', []),
-                'sentiment': result.get('sentiment', 'neutral'),
-                'categories': result.get('categories', []),
-                'importance': result.get('importance', 50),
-                'position_bias': result.get('position_bias', 'neutral'),
-                'position_magnitude': result.get('position_magnitude', 0),
-                'market_impact': result.get('market_impact', 50),
-                'industry_relevance': result.get('industry_relevance', 50),
-                'novelty_score': result.get('novelty_score', 50),
-                'urgency': result.get('urgency', 50),
-                'input_tokens': response.usage.prompt_tokens,
-                'output_tokens': response.usage.completion_tokens,
+                **self._brief_fields(result['parsed'].model_dump()),
+                'input_tokens': result['input_tokens'] + prepare_usage['input_tokens'],
+                'output_tokens': result['output_tokens'] + prepare_usage['output_tokens'],
+                'cached_tokens': result['cached_tokens'] + prepare_usage['cached_tokens'],
+                'prompt_versions': {'brief': result['prompt_version']},
                 'model_used': model,
             }
         except Exception as e:
             print("V-API analysis failed:", e)
             return {
-                'summary': '',
-                'keywords': [],
-                'sentiment': 'neutral',
-                'categories': [],
-                'importance': 50,
-                'position_bias': 'neutral',
-                'position_magnitude': 0,
-                'market_impact': 50,
-                'industry_relevance': 50,
-                'novelty_score': 50,
-                'urgency': 50,
-                'input_tokens': 0,
-                'output_tokens': 0,
+                **self._brief_fields({}),
+                'input_tokens': prepare_usage['input_tokens'],
+                'output_tokens': prepare_usage['output_tokens'],
+                'cached_tokens': prepare_usage['cached_tokens'],
                 'model_used': model,
                 'error': str(e),
             }
     
+    @staticmethod
+    def _brief_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+        """简要分析结果的各字段（缺失时取默认值）"""
+        return {
+            'summary': result.get('summary', ''),
+            'keywords': result.get('keywords', []),
+            'sentiment': result.get('sentiment', 'neutral'),
+            'categories': result.get('categories', []),
+            'importance': result.get('importance', 50),
+            'position_bias': result.get('position_bias', 'neutral'),
+            'position_magnitude': result.get('position_magnitude', 0),
+            'market_impact': result.get('market_impact', 50),
+            'industry_relevance': result.get('industry_relevance', 50),
+            'novelty_score': result.get('novelty_score', 50),
+            'urgency': result.get('urgency', 50),
+        }
+    
+    @staticmethod
+    def _packed_entry(item: Dict[str, Any]) -> str:
+        """打包请求中单条新闻的文本"""
+        return f"[id={item['id']}]\nTitle: {item.get('title') or ''}\nContent: {item.get('content') or ''}"
+    
+    def fit_packed_item(self, item: Dict[str, Any], model: Optional[str]) -> Dict[str, Any]:
+        """正文按 batch 任务预算挑选句子后的新闻，并记录其在打包请求中的 token 数（packed_tokens）"""
+        fitted = {**item, 'content': self.fit_content(item.get('content') or '', model, 'batch')}
+        fitted['packed_tokens'] = tokens.count_tokens(self._packed_entry(fitted), self.model_name(model))
+        return fitted
+    
+    def pack_batches(
+        self,
+        items: List[Dict[str, Any]],
+        max_items: Optional[int] = None,
+        max_input_tokens: Optional[int] = None,
+        model: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        按条数和token预算把新闻依次装入多个请求（单条超出预算时独占一个请求）
+        
+        返回的新闻已经过 fit_packed_item，token 数与实际发送的文本一致
+        """
+        max_items = max_items or settings.LLM_BATCH_MAX_ITEMS
+        max_input_tokens = max_input_tokens or settings.LLM_BATCH_MAX_INPUT_TOKENS
+        
+        batches, current, current_tokens = [], [], 0
+        for item in items:
+            item = self.fit_packed_item(item, model)
+            item_tokens = item['packed_tokens']
+            if current and (len(current) >= max_items or current_tokens + item_tokens > max_input_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += item_tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def _analyze_packed(self, batch: List[Dict[str, Any]], model: str):
+        """
+        单次请求分析一组新闻
+        
+        Returns:
+            (有效结果 {id: 结果}, 未通过校验的新闻分摊到的输入token {id: tokens})
+        """
+        news_list = "\n\n".join([self._packed_entry(item) for item in batch])
+        try:
+            response = await self._prompt_completion(
+                "batch_analysis",
+                'batch_analysis',
+                {'news_list': news_list},
+                model=model,
+                temperature=0.3,
+                max_tokens=200 * len(batch) + 100,
+            )
+        except Exception as e:
+            print("Batch analysis failed:", e)
+            return {}, {}
+        
+        entries = response['parsed'].results if response['parsed'] else []
+        
+        by_id = {str(item['id']): item for item in batch}
+        valid = {}
+        for entry in entries:
+            item = by_id.get(str(entry.id))
+            if item is None or item['id'] in valid:
+                continue
+            valid[item['id']] = entry.model_dump(exclude={'id'})
+        
+        # 输入token按各条新闻实际发送文本的token数分摊，输出token按各条结果的长度分摊
+        input_tokens = response['input_tokens']
+        output_tokens = response['output_tokens']
+        cached_tokens = response['cached_tokens']
+        input_weights = {item['id']: max(item['packed_tokens'], 1) for item in batch}
+        total_input_weight = sum(input_weights.values())
+        output_weights = {item_id: len(json.dumps(entry, ensure_ascii=False)) for item_id, entry in valid.items()}
+        total_output_weight = sum(output_weights.values()) or 1
+        
+        results = {
+            item_id: {
+                **self._brief_fields(entry),
+                'input_tokens': round(input_tokens * input_weights[item_id] / total_input_weight),
+                'output_tokens': round(output_tokens * output_weights[item_id] / total_output_weight),
+                'cached_tokens': round(cached_tokens * input_weights[item_id] / total_input_weight),
+                'prompt_versions': {'batch_analysis': response['prompt_version']},
+                'model_used': model,
+                'batch_size': len(batch),
+            }
+            for item_id, entry in valid.items()
+        }
+        wasted_input = {
+            item['id']: round(input_tokens * input_weights[item['id']] / total_input_weight)
+            for item in batch if item['id'] not in valid
+        }
+        return results, wasted_input
+    
+    async def analyze_batch(self, items: List[Dict[str, Any]], model: Optional[str] = None) -> Dict[Any, Dict[str, Any]]:
+        """
+        打包分析多条短新闻（items: [{'id', 'title', 'content'}]）
+        
+        按 LLM_BATCH_MAX_ITEMS / LLM_BATCH_MAX_INPUT_TOKENS 装入若干请求并发发出，
+        每条结果按 id 校验，缺失或无效的新闻单独重试；token 按条分摊，
+        失败条目在打包请求中分摊到的输入token计入其重试结果
+        
+        Returns:
+            {id: 与 brief_analyze_with_vapi 相同结构的结果}，单独重试仍失败的结果带 error
+        """
+        model = model or self.default_model
+        batches = self.pack_batches(items, model=model)
+        packed = [batch for batch in batches if len(batch) > 1]
+        # 单独分析时使用原始正文（由 prepare_content 按 brief 预算处理）
+        by_id = {item['id']: item for item in items}
+        singles = [by_id[batch[0]['id']] for batch in batches if len(batch) == 1]
+        
+        results: Dict[Any, Dict[str, Any]] = {}
+        wasted_input: Dict[Any, int] = {}
+        for batch_results, batch_wasted in await asyncio.gather(*(self._analyze_packed(batch, model) for batch in packed)):
+            results.update(batch_results)
+            wasted_input.update(batch_wasted)
+        
+        single_ids = {item['id'] for item in singles}
+        retry = [item for item in items if item['id'] not in results and item['id'] not in single_ids]
+        if retry:
+            metrics.inc("llm_batch_retries_total", len(retry), model=model)
+        individual = singles + retry
+        individual_results = await asyncio.gather(*(
+            self.brief_analyze_with_vapi(item.get('title') or '', item.get('content') or '', model)
+            for item in individual
+        ))
+        for item, result in zip(individual, individual_results):
+            result['input_tokens'] = (result.get('input_tokens') or 0) + wasted_input.get(item['id'], 0)
+            results[item['id']] = result
+        
+        return results
+    
     async def generate_tags(self, title: str, content: str, model: Optional[str] = None):
         model = model or self.default_model
         if model not in self.AVAILABLE_MODELS:
             model = self.default_model
         
-        full_content = f"Title: {title}\n\nContent: {content[:3000]}"
+        content, prepare_usage = await self.prepare_content(content, model, 'tags')
+        full_content = f"Title: {title}\n\nContent: {content}"
         
-        prompt = """Please generate relevant tags (5-15) for the following news, return JSON format with relevance scores:
-
-""" + full_content + """
-
-Tags should cover:
-1. Topic area (Technology, Finance, AI, etc.)
-2. Specific topics
-3. Sentiment
-4. Importance level
-
-Return format: {"tags": {"tag1": score, "tag2": score}}
-Score range: 0-100"""
-        
-        response = await litellm.acompletion(
+        result = await self._prompt_completion(
+            "generate_tags",
+            'tags',
+            {'content': full_content},
             model=self.AVAILABLE_MODELS[model]['model'],
-            messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
             max_tokens=300,
         )
         
-        try:
-            result = json.loads(response.choices[0].message.content)
-            tags = result.get('tags', {})
-        except:
-            tags = {}
-        
         return {
-            'tags': tags,
-            'input_tokens': response.usage.prompt_tokens,
-            'output_tokens': response.usage.completion_tokens,
+            'tags': result['parsed'].tags if result['parsed'] else {},
+            'input_tokens': result['input_tokens'] + prepare_usage['input_tokens'],
+            'output_tokens': result['output_tokens'] + prepare_usage['output_tokens'],
+            'cached_tokens': result['cached_tokens'] + prepare_usage['cached_tokens'],
+            'prompt_versions': {'tags': result['prompt_version']},
+        }
+    
+    def _search_variables(self, query: str, news_items: List[Dict[str, Any]], model: Optional[str] = None) -> Dict[str, str]:
+        news_list = "\n\n".join([
+            f"News {idx+1}:\nTitle: {item.get('title', '')}\nContent: {self.fit_content(item.get('content') or '', model, 'search')}"
+            for idx, item in enumerate(news_items[:20])
+        ])
+        return {'query': query, 'news_list': news_list}
+    
+    @staticmethod
+    def _ranked_item(item: Dict[str, Any], news_items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """把模型返回的一条排序结果映射回新闻"""
+        idx = item.get('index', 0) if isinstance(item, dict) else -1
+        if not isinstance(idx, int) or idx < 0 or idx >= len(news_items):
+            return None
+        return {
+            **news_items[idx],
+            'search_relevance': item.get('relevance', 0),
+            'search_reason': item.get('reason', ''),
         }
     
     async def search_news(self, query: str, news_items: List[Dict[str, Any]], model: Optional[str] = None):
@@ -428,67 +756,82 @@ Score range: 0-100"""
         if model not in self.AVAILABLE_MODELS:
             model = self.default_model
         
-        news_list = "\n\n".join([
-            f"News {idx+1}:\nTitle: {item.get('title', '')}\nContent: {item.get('content', '')[:500]}"
-            for idx, item in enumerate(news_items[:20])
-        ])
-        
-        prompt = """Please rank the news by relevance to the query, return JSON format:
-
-Query: """ + query + """
-
-News list:
-""" + news_list + """
-
-Return format: {"results": [{"index": news_index, "relevance": score, "reason": "..."}]}
-Score range: 0-100
-Sort by relevance descending"""
-        
-        response = await litellm.acompletion(
+        response = await self._prompt_completion(
+            "search",
+            'search',
+            self._search_variables(query, news_items, model),
             model=self.AVAILABLE_MODELS[model]['model'],
-            messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
             max_tokens=500,
         )
         
-        try:
-            result = json.loads(response.choices[0].message.content)
-            search_results = result.get('results', [])
-            
-            ranked_news = []
-            for item in search_results:
-                idx = item.get('index', 0)
-                if idx >= 0 and idx < len(news_items):
-                    ranked_news.append({
-                        **news_items[idx],
-                        'search_relevance': item.get('relevance', 0),
-                        'search_reason': item.get('reason', ''),
-                    })
-            
-            return ranked_news
-        except Exception as e:
-            print("Search failed:", e)
+        if response['parsed'] is None:
+            print("Search failed: 无法解析排序结果")
             return news_items
+        
+        ranked_news = []
+        for item in response['parsed'].results:
+            ranked = self._ranked_item(item.model_dump(), news_items)
+            if ranked is not None:
+                ranked_news.append(ranked)
+        
+        return ranked_news
+    
+    async def search_news_stream(
+        self,
+        query: str,
+        news_items: List[Dict[str, Any]],
+        model: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        流式搜索：模型每输出完一条排序结果就产出 ('item', 新闻)，
+        结束时产出 ('done', {'total', 'input_tokens', 'output_tokens', 'model_used'})
+        """
+        model = model or self.default_model
+        if model not in self.AVAILABLE_MODELS:
+            model = self.default_model
+        
+        parser = IncrementalJSONParser()
+        usage: Dict[str, int] = {}
+        total = 0
+        async for delta in self.stream_completion(
+            "search",
+            usage=usage,
+            model=self.AVAILABLE_MODELS[model]['model'],
+            messages=prompt_registry.get('search').render(**self._search_variables(query, news_items, model)),
+            temperature=0.3,
+            max_tokens=500,
+            **self.json_mode_params(model),
+        ):
+            for kind, key, value in parser.feed(delta):
+                if kind != 'item' or key != 'results':
+                    continue
+                ranked = self._ranked_item(value, news_items)
+                if ranked is not None:
+                    total += 1
+                    yield 'item', ranked
+        
+        yield 'done', {'total': total, 'model_used': model, **usage}
     
     def _accumulate_cost(self, total: Dict[str, Any], result: Dict[str, Any]):
         total['input_tokens'] += result.get('input_tokens', 0)
         total['output_tokens'] += result.get('output_tokens', 0)
+        total['cached_tokens'] = total.get('cached_tokens', 0) + (result.get('cached_tokens') or 0)
     
-    def calculate_cost(self, model: str, input_tokens: int, output_tokens: int):
-        if model not in self.AVAILABLE_MODELS:
-            model = self.default_model
-        
-        config = self.AVAILABLE_MODELS[model]
-        input_cost = (input_tokens / 1000) * config['cost_per_1k_input']
-        output_cost = (output_tokens / 1000) * config['cost_per_1k_output']
-        total_usd = input_cost + output_cost
-        total_cny = total_usd * 7.2
-        
-        return {
-            'cost_usd': round(total_usd, 6),
-            'cost_cny': round(total_cny, 6),
-            'input_tokens': input_tokens,
-            'output_tokens': output_tokens,
-        }
+    def calculate_cost(self, model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0):
+        """
+        按价格表计算成本，cached_tokens（包含在 input_tokens 中）按缓存命中价格计；
+        不在 AVAILABLE_MODELS 中的模型（如 V-API 模型）按其自身价格计，未配置价格时 priced 为 False
+        """
+        return model_pricing.cost(self.model_name(model), input_tokens, output_tokens, cached_tokens)
+    
+    def provider_of(self, model: str) -> str:
+        """成本记录的服务商：有直连端点的模型记为其服务商，其余（V-API 模型等）记为支持该模型的首个端点"""
+        config = self.AVAILABLE_MODELS.get(model) or {}
+        name = config.get('model', model)
+        supported = [endpoint.name for endpoint in self.router.endpoints if endpoint.supports(name)]
+        if config.get('provider') in supported:
+            return config['provider']
+        return supported[0] if supported else config.get('provider', 'vapi')
 
 llm_engine = LLMEngine()
@@ -0,0 +1,247 @@
+"""
+LLM 输出的 JSON 解析工具
+IncrementalJSONParser 在流式输出过程中逐段喂入文本，顶层字段（以及顶层数组字段中的元素）
+一旦完整就立即产出，无需等待整个响应结束；
+extract_json_object 容忍代码块标记、前后说明文字、尾随逗号和被截断的输出
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE = ' \t\r\n'
+
+
+class IncrementalJSONParser:
+    """
+    增量解析顶层 JSON 对象
+
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for kind, key, value in parser.feed(chunk):
+                ...  # kind: 'field'（顶层字段完成）或 'item'（顶层数组字段中的一个元素完成）
+
+    对象开始前的任意文本（如 ```json 代码块标记）会被跳过
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._containers: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        # 顶层对象的解析状态: key -> colon -> value -> (',' 后回到 key)
+        self._state = 'key'
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self.fields = {}
+
+    @property
+    def done(self) -> bool:
+        """顶层对象已闭合"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        self.buffer += chunk
+        events: List[Tuple[str, str, Any]] = []
+        buffer = self.buffer
+
+        while self._pos < len(buffer) and not self._done:
+            i = self._pos
+            char = buffer[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == 'key' and self._key_start is not None:
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+                        self._key_start = None
+                        self._state = 'colon'
+                continue
+
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._containers.append('{')
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._state == 'key':
+                        self._key_start = i
+                    elif self._state == 'value' and self._value_start is None:
+                        self._value_start = i
+                else:
+                    self._mark_item_start(i)
+                continue
+
+            if char in '{[':
+                if self._depth == 1 and self._state == 'value' and self._value_start is None:
+                    self._value_start = i
+                else:
+                    self._mark_item_start(i)
+                self._depth += 1
+                self._containers.append(char)
+                continue
+
+            if char in '}]':
+                if self._depth == 2 and self._item_start is not None:
+                    # 顶层数组中的标量元素以 ']' 结束
+                    events.extend(self._emit_item(i))
+                if self._depth == 1:
+                    # 顶层对象闭合，最后一个字段为标量
+                    events.extend(self._emit_field(i))
+                    self._depth = 0
+                    self._done = True
+                    continue
+                self._depth -= 1
+                self._containers.pop()
+                if self._depth == 2 and self._item_start is not None:
+                    # 顶层数组中的对象/数组元素闭合
+                    events.extend(self._emit_item(i + 1))
+                elif self._depth == 1:
+                    events.extend(self._emit_field(i + 1))
+                continue
+
+            if char == ':' and self._depth == 1 and self._state == 'colon':
+                self._state = 'value'
+                self._value_start = None
+                continue
+
+            if char == ',':
+                if self._depth == 1:
+                    events.extend(self._emit_field(i))
+                    self._state = 'key'
+                elif self._depth == 2 and self._item_start is not None:
+                    events.extend(self._emit_item(i))
+                continue
+
+            if char in _WHITESPACE:
+                continue
+
+            # 数字、true/false/null 等标量的起始
+            if self._depth == 1 and self._state == 'value' and self._value_start is None:
+                self._value_start = i
+            else:
+                self._mark_item_start(i)
+
+        return events
+
+    def _in_top_array(self) -> bool:
+        return self._depth == 2 and self._containers[-1] == '['
+
+    def _mark_item_start(self, i: int):
+        if self._in_top_array() and self._item_start is None:
+            self._item_start = i
+
+    def _emit_item(self, end: int) -> List[Tuple[str, str, Any]]:
+        text = self.buffer[self._item_start:end].strip()
+        self._item_start = None
+        try:
+            return [('item', self._key, json.loads(text))]
+        except ValueError:
+            return []
+
+    def _emit_field(self, end: int) -> List[Tuple[str, str, Any]]:
+        if self._value_start is None or self._key is None:
+            return []
+        text = self.buffer[self._value_start:end].strip()
+        key = self._key
+        self._value_start = None
+        self._key = None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return []
+        self.fields[key] = value
+        return [('field', key, value)]
+
+
+_CODE_FENCE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.S)
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+def _loads_object(text: str) -> Optional[dict]:
+    try:
+        result = json.loads(text)
+    except ValueError:
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def _balanced_objects(text: str) -> List[str]:
+    """按括号配对（忽略字符串中的括号）找出文本中各个完整的顶层 {...} 片段"""
+    objects = []
+    depth = 0
+    start = None
+    in_string = escape = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = depth > 0
+        elif char == '{':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                objects.append(text[start:i + 1])
+    return objects
+
+
+def parse_partial_object(text: str) -> Dict[str, Any]:
+    """
+    解析被截断的 JSON 对象（如达到 max_tokens）：返回已完整的顶层字段，
+    未闭合的顶层数组字段保留其中已完整的元素
+    """
+    parser = IncrementalJSONParser()
+    items: Dict[str, List[Any]] = {}
+    for kind, key, value in parser.feed(text):
+        if kind == 'item':
+            items.setdefault(key, []).append(value)
+    fields = dict(parser.fields)
+    for key, values in items.items():
+        fields.setdefault(key, values)
+    return fields
+
+
+def extract_json_object(text: str, allow_partial: bool = True) -> Optional[dict]:
+    """
+    从完整响应中提取 JSON 对象
+
+    依次尝试：整体解析、```json 代码块内容、文本中第一个括号配对完整的对象（忽略前后说明文字）、
+    去掉尾随逗号后重试；都失败且 allow_partial 时按截断输出取出已完整的字段
+    """
+    if not text:
+        return None
+    result = _loads_object(text)
+    if result is not None:
+        return result
+
+    candidates = [match.group(1) for match in _CODE_FENCE.finditer(text)] + [text]
+    for candidate in candidates:
+        for fragment in _balanced_objects(candidate):
+            for attempt in (fragment, _TRAILING_COMMA.sub(r'\1', fragment)):
+                result = _loads_object(attempt)
+                if result is not None:
+                    return result
+
+    if allow_partial:
+        return parse_partial_object(text) or None
+    return None
@@ -0,0 +1,218 @@
+"""
+模型价格表
+各模型的输入、输出和缓存命中输入价格（每1k token）以及汇率都是数据，从 LLM_PRICING_FILE 加载，
+文件修改后自动重新加载；文件缺失时使用内置的几个默认模型价格。
+
+模型名先精确匹配（不区分大小写），再按通配符（fnmatch，如 gpt-4o-2024-*）匹配，越长的模式越优先；
+都不匹配时使用 default 价格并计数 llm_unpriced_calls_total，不再静默按默认模型计价。
+V-API 模型目录（LLM_MODELS_CATALOG_FILE，/v1/models 的返回）用于列出尚未配置价格的模型
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.llm.vapi_service import is_chat_model
+from app.monitoring import metrics
+
+# 检查价格文件是否被修改的最短间隔
+RELOAD_CHECK_SECONDS = 30
+
+# 价格文件缺失时的内置价格（美元/1k token）
+BUILTIN_PRICING = {
+    'exchange_rates': {'USD': 1.0, 'CNY': 7.2},
+    'models': {
+        'gpt-4o': {'input': 0.0025, 'output': 0.01, 'cached_input': 0.00125},
+        'gpt-4o-mini': {'input': 0.00015, 'output': 0.0006, 'cached_input': 0.000075},
+        'deepseek-chat': {'input': 0.00028, 'output': 0.00042, 'cached_input': 0.000028},
+    },
+}
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """每1k token的价格，currency 为计价货币"""
+    input: float
+    output: float
+    cached_input: Optional[float] = None  # 未配置时按 input 计价
+    currency: str = 'USD'
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ModelPrice':
+        return cls(
+            input=float(data.get('input', 0)),
+            output=float(data.get('output', 0)),
+            cached_input=float(data['cached_input']) if data.get('cached_input') is not None else None,
+            currency=str(data.get('currency', 'USD')).upper(),
+        )
+
+
+class PricingTable:
+    """按模型名查价格并计算成本"""
+
+    def __init__(self, path: Optional[str] = None, catalog_path: Optional[str] = None):
+        self.path = path if path is not None else settings.LLM_PRICING_FILE
+        self.catalog_path = catalog_path if catalog_path is not None else settings.LLM_MODELS_CATALOG_FILE
+        self._lock = threading.Lock()
+        self._exact: Dict[str, Tuple[str, ModelPrice]] = {}
+        self._patterns: List[Tuple[str, ModelPrice]] = []
+        self._default: Optional[ModelPrice] = None
+        self.exchange_rates: Dict[str, float] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._warned: Set[str] = set()
+        self.reload()
+
+    def reload(self):
+        """重新加载价格文件（不存在或格式错误时使用内置价格）"""
+        data = BUILTIN_PRICING
+        mtime = None
+        if self.path and os.path.exists(self.path):
+            try:
+                mtime = os.path.getmtime(self.path)
+                with open(self.path, encoding='utf-8-sig') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"加载模型价格失败 ({self.path}): {e}，使用内置价格")
+                data = BUILTIN_PRICING
+
+        exact, patterns = {}, []
+        for name, entry in (data.get('models') or {}).items():
+            price = ModelPrice.from_dict(entry)
+            if any(char in name for char in '*?['):
+                patterns.append((name.lower(), price))
+            else:
+                exact[name.lower()] = (name, price)
+        # 越具体（越长）的模式越优先
+        patterns.sort(key=lambda item: len(item[0]), reverse=True)
+        rates = {'USD': 1.0, **{k.upper(): float(v) for k, v in (data.get('exchange_rates') or {}).items()}}
+
+        with self._lock:
+            self._exact = exact
+            self._patterns = patterns
+            self._default = ModelPrice.from_dict(data['default']) if data.get('default') else None
+            self.exchange_rates = rates
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+
+    def _maybe_reload(self):
+        if not self.path or time.monotonic() - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+        else:
+            self._checked_at = time.monotonic()
+
+    def lookup(self, model: str) -> Optional[ModelPrice]:
+        """模型的价格，未配置时返回 None"""
+        self._maybe_reload()
+        name = (model or '').lower()
+        with self._lock:
+            if name in self._exact:
+                return self._exact[name][1]
+            for pattern, price in self._patterns:
+                if fnmatchcase(name, pattern):
+                    return price
+        return None
+
+    def price(self, model: str) -> Tuple[Optional[ModelPrice], bool]:
+        """(价格, 是否为该模型配置的价格)；未配置时取 default 价格，再没有则取默认模型价格"""
+        price = self.lookup(model)
+        if price is not None:
+            return price, True
+        return self._default or self.lookup(settings.DEFAULT_LLM_MODEL), False
+
+    def to_usd(self, amount: float, currency: str) -> float:
+        rate = self.exchange_rates.get(currency.upper())
+        if not rate:
+            raise ValueError(f"缺少汇率: {currency}")
+        return amount / rate
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Dict[str, Any]:
+        """
+        计算一次调用的成本，cached_tokens（包含在 input_tokens 中）按缓存命中价格计
+
+        Returns:
+            {'cost_usd', 'cost_cny', 'input_tokens', 'output_tokens', 'cached_tokens', 'priced'}
+        """
+        price, priced = self.price(model)
+        if not priced:
+            metrics.inc("llm_unpriced_calls_total", model=model or 'unknown')
+            if model not in self._warned:
+                self._warned.add(model)
+                print(f"模型未配置价格: {model}，按默认价格估算（在 {self.path} 中补充）")
+
+        input_tokens = input_tokens or 0
+        output_tokens = output_tokens or 0
+        cached_tokens = min(cached_tokens or 0, input_tokens)
+        total = 0.0
+        if price is not None:
+            cached_price = price.input if price.cached_input is None else price.cached_input
+            total = ((input_tokens - cached_tokens) / 1000) * price.input \
+                + (cached_tokens / 1000) * cached_price \
+                + (output_tokens / 1000) * price.output
+            total = self.to_usd(total, price.currency)
+        return {
+            'cost_usd': round(total, 6),
+            'cost_cny': round(total * self.exchange_rates.get('CNY', 0.0), 6),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens,
+            'priced': priced,
+        }
+
+    def per_1k_usd(self, model: str) -> Dict[str, Any]:
+        """模型列表展示用的美元单价"""
+        price, priced = self.price(model)
+        if price is None:
+            return {'cost_per_1k_input': 0.0, 'cost_per_1k_output': 0.0, 'cost_per_1k_cached_input': 0.0, 'priced': False}
+        cached = price.input if price.cached_input is None else price.cached_input
+        return {
+            'cost_per_1k_input': round(self.to_usd(price.input, price.currency), 8),
+            'cost_per_1k_output': round(self.to_usd(price.output, price.currency), 8),
+            'cost_per_1k_cached_input': round(self.to_usd(cached, price.currency), 8),
+            'priced': priced,
+        }
+
+    def catalog(self) -> List[str]:
+        """V-API 模型目录中的聊天模型名"""
+        if not self.catalog_path or not os.path.exists(self.catalog_path):
+            return []
+        try:
+            with open(self.catalog_path, encoding='utf-8-sig') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载模型目录失败 ({self.catalog_path}): {e}")
+            return []
+        entries = data.get('data', []) if isinstance(data, dict) else data
+        return [
+            entry['id'] for entry in entries
+            if isinstance(entry, dict) and entry.get('id') and is_chat_model(entry['id'])
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """价格表、汇率和目录中未配置价格的模型"""
+        with self._lock:
+            models = {name: asdict(price) for name, price in self._exact.values()}
+            patterns = {pattern: asdict(price) for pattern, price in self._patterns}
+            default = asdict(self._default) if self._default else None
+            rates = dict(self.exchange_rates)
+        return {
+            'source': self.path if self._mtime is not None else 'builtin',
+            'exchange_rates': rates,
+            'models': models,
+            'patterns': patterns,
+            'default': default,
+            'unpriced_models': [model for model in self.catalog() if self.lookup(model) is None],
+        }
+
+
+model_pricing = PricingTable()
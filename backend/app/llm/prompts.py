@@ -0,0 +1,265 @@
+"""
+提示词模板注册表
+每个模板带版本号，固定的说明和输出格式放在 system 消息中、位于请求最前面，
+新闻内容等变量放在其后的 user 消息中，使服务端的前缀缓存可以命中；
+变量部分在注册时编译一次（string.Template，JSON 示例中的花括号无需转义）。
+模板版本写入 News.prompt_versions，模板修改后可按版本选出需要重新分析的新闻
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PromptTemplate:
+    """一个版本的提示词模板"""
+
+    def __init__(self, name: str, version: str, system: str, user: str):
+        self.name = name
+        self.version = version
+        self.system = system.strip()
+        self.user = user.strip()
+        self._user_template = Template(self.user)
+
+    def render(self, **variables) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self._user_template.substitute(**variables)},
+        ]
+
+    @property
+    def fingerprint(self) -> str:
+        """模板内容摘要，用于发现同一版本号下内容被改动"""
+        return hashlib.sha256(f"{self.system}\0{self.user}".encode('utf-8')).hexdigest()[:12]
+
+    def cache_key(self, model: str, **variables) -> str:
+        """结果缓存键：模板版本 + 模型 + 变量"""
+        payload = json.dumps(variables, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+        return f"{self.name}:{self.version}:{model}:{digest}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'version': self.version, 'fingerprint': self.fingerprint}
+
+
+class PromptRegistry:
+    """按名称和版本管理模板，每个名称有一个当前版本"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._active: Dict[str, str] = {}
+
+    def register(self, template: PromptTemplate, active: bool = True) -> PromptTemplate:
+        self._templates.setdefault(template.name, {})[template.version] = template
+        if active or template.name not in self._active:
+            self._active[template.name] = template.version
+        return template
+
+    def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
+        versions = self._templates.get(name)
+        if not versions:
+            raise KeyError(f"未注册的提示词模板: {name}")
+        return versions[version or self._active[name]]
+
+    def version(self, name: str) -> str:
+        return self._active[name]
+
+    def versions(self) -> Dict[str, str]:
+        """各模板的当前版本"""
+        return dict(self._active)
+
+    def is_stale(self, used: Optional[Dict[str, str]]) -> bool:
+        """分析结果使用的模板版本（News.prompt_versions）是否已不是当前版本；未记录版本视为过期"""
+        if not used:
+            return True
+        return any(self._active.get(name) != version for name, version in used.items())
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {**template.to_dict(), 'active': self._active[name] == version}
+            for name, versions in sorted(self._templates.items())
+            for version, template in sorted(versions.items())
+        ]
+
+
+class ResultCache:
+    """按提示词缓存键保存模型输出（进程内 LRU，带过期时间），相同内容的重复分析不再调用LLM"""
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 86400):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+prompt_registry = PromptRegistry()
+
+prompt_registry.register(PromptTemplate('summarize', 'v1', system="""
+Please generate a concise summary (under 100 words) for the news provided by the user.
+Please return only the summary.
+""", user="""
+$content
+"""))
+
+prompt_registry.register(PromptTemplate('classify', 'v1', system="""
+Please classify the news provided by the user (multiple choices allowed), return JSON format.
+
+Categories: ["Finance", "Technology", "AI", "Blockchain", "Policy", "Market", "Company", "International", "Society"]
+
+Return format: {"categories": ["Category1", "Category2"]}
+""", user="""
+$content
+"""))
+
+prompt_registry.register(PromptTemplate('score', 'v1', system="""
+Please evaluate the news provided by the user across dimensions (0-100), return JSON format.
+
+Dimensions:
+1. market_impact: Potential impact on financial markets
+2. industry_relevance: Relevance to specific industries
+3. novelty_score: Innovativeness and uniqueness
+4. urgency: Need for immediate attention
+5. position_bias: From investment perspective, bullish/bearish/neutral
+6. position_magnitude: 0-100, strength of bias
+7. importance: Overall importance 0-100
+8. brief_impact: One sentence impact description
+
+Return format: {
+    "market_impact": 85,
+    "industry_relevance": 70,
+    "novelty_score": 60,
+    "urgency": 75,
+    "position_bias": "bullish",
+    "position_magnitude": 70,
+    "importance": 85,
+    "brief_impact": "Positive impact on tech sector"
+}
+""", user="""
+$content
+"""))
+
+prompt_registry.register(PromptTemplate('keywords', 'v1', system="""
+Please extract 5-10 keywords from the news provided by the user, return JSON format.
+
+Return format: {"keywords": ["keyword1", "keyword2", ...]}
+""", user="""
+$content
+"""))
+
+prompt_registry.register(PromptTemplate('sentiment', 'v1', system="""
+Please analyze sentiment of the news provided by the user, return JSON format.
+
+Return format: {"sentiment": "positive/negative/neutral"}
+""", user="""
+$content
+"""))
+
+prompt_registry.register(PromptTemplate('brief', 'v1', system="""
+Please analyze the finance/tech news provided by the user deeply, return JSON format.
+
+Requirements:
+1. summary (under 100 words)
+2. keywords (3-7)
+3. sentiment (positive/negative/neutral)
+4. categories (1-2 from: Finance, Technology, AI, Blockchain, Policy, Market, Company, International)
+5. importance (0-100)
+6. position_bias (bullish/bearish/neutral)
+7. position_magnitude (0-100)
+8. market_impact (0-100)
+9. industry_relevance (0-100)
+10. novelty_score (0-100)
+11. urgency (0-100)
+
+Return format: {
+    "summary": "...",
+    "keywords": ["..."],
+    "sentiment": "...",
+    "categories": ["..."],
+    "importance": 85,
+    "position_bias": "...",
+    "position_magnitude": 70,
+    "market_impact": 80,
+    "industry_relevance": 75,
+    "novelty_score": 60,
+    "urgency": 65
+}
+""", user="""
+Title: $title
+
+Content: $content
+"""))
+
+prompt_registry.register(PromptTemplate('batch_analysis', 'v1', system="""
+Please analyze each of the finance/tech news items provided by the user, return JSON format.
+
+For each item provide: id (copy from [id=...]), summary (under 60 words), keywords (3-7), sentiment (positive/negative/neutral),
+categories (1-2 from: Finance, Technology, AI, Blockchain, Policy, Market, Company, International), importance (0-100),
+position_bias (bullish/bearish/neutral), position_magnitude (0-100), market_impact (0-100), industry_relevance (0-100),
+novelty_score (0-100), urgency (0-100)
+
+Return format: {"results": [{"id": 1, "summary": "...", "keywords": ["..."], "sentiment": "...", "categories": ["..."], "importance": 85, "position_bias": "...", "position_magnitude": 70, "market_impact": 80, "industry_relevance": 75, "novelty_score": 60, "urgency": 65}]}
+""", user="""
+$news_list
+"""))
+
+prompt_registry.register(PromptTemplate('tags', 'v1', system="""
+Please generate relevant tags (5-15) for the news provided by the user, return JSON format with relevance scores.
+
+Tags should cover:
+1. Topic area (Technology, Finance, AI, etc.)
+2. Specific topics
+3. Sentiment
+4. Importance level
+
+Return format: {"tags": {"tag1": score, "tag2": score}}
+Score range: 0-100
+""", user="""
+$content
+"""))
+
+prompt_registry.register(PromptTemplate('search', 'v1', system="""
+Please rank the news by relevance to the user's query, return JSON format.
+
+Return format: {"results": [{"index": news_index, "relevance": score, "reason": "..."}]}
+Score range: 0-100
+Sort by relevance descending
+""", user="""
+Query: $query
+
+News list:
+$news_list
+"""))
+
+prompt_registry.register(PromptTemplate('chunk_summary', 'v1', system="""
+You will receive one part of a news article. Extract its key facts (numbers, companies, people, events),
+keep the original language, and stay within the requested length.
+""", user="""
+Part $index of $total, answer in at most $max_tokens tokens:
+
+$chunk
+"""))
@@ -0,0 +1,287 @@
+"""
+多端点 LLM 路由
+每个请求带上所选端点的 api_base / api_key（不再修改 litellm 全局配置），
+按端点+模型维护延迟和错误率的指数滑动平均，选择当前最优的端点；
+开启对冲（LLM_HEDGE_ENABLED）且有另一个可用端点时，超过该端点近期 p95 延迟仍未返回即向次优端点发出对冲请求，取先返回的结果；
+连续失败的端点由熔断器隔离，冷却后放行一次试探请求
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+import litellm
+
+from app.config import settings
+from app.monitoring import metrics
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEEPSEEK_API_BASE = "https://api.deepseek.com/v1"
+
+# 计算 p95 的最近样本数，以及开始对冲所需的最少样本数
+LATENCY_WINDOW = 100
+MIN_HEDGE_SAMPLES = 10
+
+
+@dataclass
+class Endpoint:
+    """一个 LLM 接入点（服务商或代理）"""
+    name: str
+    api_base: Optional[str] = None
+    api_key: Optional[str] = None
+    models: Optional[Set[str]] = None  # 支持的模型，None 表示不限（如 V-API 这类聚合代理）
+    model_prefix: str = ''  # 传给 litellm 的模型名前缀（如 openai/，指定按 OpenAI 兼容接口调用）
+
+    def supports(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def request_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """带上本端点凭证的请求参数"""
+        request = dict(kwargs)
+        request['model'] = f"{self.model_prefix}{kwargs['model']}"
+        if self.api_base:
+            request['api_base'] = self.api_base
+        if self.api_key:
+            request['api_key'] = self.api_key
+        return request
+
+
+@dataclass
+class EndpointStats:
+    """单个端点+模型的延迟、错误率和熔断状态"""
+    ewma_latency: Optional[float] = None
+    ewma_error: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    consecutive_failures: int = 0
+    state: str = CLOSED
+    opened_at: float = 0.0
+    probe_at: float = 0.0  # 半开状态下最近一次放行试探请求的时间
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def score(self) -> float:
+        """越小越好；没有样本的端点优先试用"""
+        if self.ewma_latency is None:
+            return 0.0
+        return self.ewma_latency * (1 + 4 * self.ewma_error)
+
+
+class LLMRouter:
+    """按端点健康度路由 LLM 请求"""
+
+    def __init__(self, endpoints: List[Endpoint]):
+        self.endpoints = endpoints
+        self._stats: Dict[Tuple[str, str], EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, model_providers: Optional[Dict[str, str]] = None) -> 'LLMRouter':
+        """
+        由配置构建端点：V-API（聚合代理，支持全部模型）、OpenAI、DeepSeek 直连
+
+        Args:
+            model_providers: 模型名 -> 服务商（AVAILABLE_MODELS），决定直连端点支持哪些模型
+        """
+        model_providers = model_providers or {}
+
+        def models_of(provider: str) -> Set[str]:
+            return {model for model, owner in model_providers.items() if owner == provider}
+
+        # 三个端点都是 OpenAI 兼容接口；litellm 只能从模型名推断它已知的模型的服务商，
+        # gpt-4o、deepseek-chat 等较新的模型名需带 openai/ 前缀，否则报 "LLM Provider NOT provided"
+        endpoints = []
+        if settings.VAPI_API_KEY:
+            endpoints.append(Endpoint('vapi', f"{settings.VAPI_BASE_URL or 'https://api.vveai.com'}/v1", settings.VAPI_API_KEY,
+                                      model_prefix='openai/'))
+        if settings.OPENAI_API_KEY:
+            endpoints.append(Endpoint('openai', None, settings.OPENAI_API_KEY, models_of('openai'), 'openai/'))
+        if settings.DEEPSEEK_API_KEY:
+            endpoints.append(Endpoint('deepseek', DEEPSEEK_API_BASE, settings.DEEPSEEK_API_KEY, models_of('deepseek'), 'openai/'))
+        if not endpoints:
+            # 未配置任何凭证时按 litellm 默认（读取环境变量）调用
+            endpoints.append(Endpoint('default'))
+        return cls(endpoints)
+
+    def _get_stats(self, endpoint: Endpoint, model: str) -> EndpointStats:
+        key = (endpoint.name, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = EndpointStats()
+        return stats
+
+    def _available(self, stats: EndpointStats, now: float) -> bool:
+        """熔断器是否放行（打开状态冷却结束后转为半开，只放行一个试探请求）"""
+        if stats.state == CLOSED:
+            return True
+        cooldown = settings.LLM_CIRCUIT_COOLDOWN_SECONDS
+        if stats.state == OPEN and now - stats.opened_at >= cooldown:
+            stats.state = HALF_OPEN
+            stats.probe_at = 0.0
+        # 放行的试探请求未被实际使用时，冷却一轮后再次放行
+        if stats.state == HALF_OPEN and now - stats.probe_at >= cooldown:
+            stats.probe_at = now
+            return True
+        return False
+
+    def candidates(self, model: str) -> List[Endpoint]:
+        """按健康度排序的可用端点；全部熔断时返回熔断最早的端点，避免完全不可用"""
+        now = time.monotonic()
+        with self._lock:
+            supported = [endpoint for endpoint in self.endpoints if endpoint.supports(model)] or list(self.endpoints)
+            available = [
+                endpoint for endpoint in supported
+                if self._available(self._get_stats(endpoint, model), now)
+            ]
+            if not available:
+                return sorted(supported, key=lambda endpoint: self._get_stats(endpoint, model).opened_at)[:1]
+            return sorted(available, key=lambda endpoint: self._get_stats(endpoint, model).score())
+
+    def record(self, endpoint: Endpoint, model: str, latency: Optional[float], error: bool):
+        """记录一次请求结果，更新滑动平均和熔断器"""
+        alpha = settings.LLM_ROUTER_EWMA_ALPHA
+        with self._lock:
+            stats = self._get_stats(endpoint, model)
+            stats.ewma_error = alpha * (1.0 if error else 0.0) + (1 - alpha) * stats.ewma_error
+            if error:
+                stats.consecutive_failures += 1
+                if stats.state == HALF_OPEN or stats.consecutive_failures >= settings.LLM_CIRCUIT_FAILURES:
+                    if stats.state != OPEN:
+                        metrics.inc("llm_circuit_open_total", endpoint=endpoint.name, model=model)
+                    stats.state = OPEN
+                    stats.opened_at = time.monotonic()
+            else:
+                stats.latencies.append(latency)
+                stats.ewma_latency = latency if stats.ewma_latency is None else alpha * latency + (1 - alpha) * stats.ewma_latency
+                stats.consecutive_failures = 0
+                stats.state = CLOSED
+            stats.probe_at = 0.0
+        metrics.inc("llm_router_requests_total", endpoint=endpoint.name, model=model, outcome='error' if error else 'success')
+
+    def hedge_delay(self, endpoint: Endpoint, model: str) -> Optional[float]:
+        """对冲请求的等待时间：该端点近期 p95 延迟（样本不足时不对冲）"""
+        p95 = self._get_stats(endpoint, model).p95()
+        if p95 is None:
+            return None
+        return min(max(p95, settings.LLM_HEDGE_MIN_DELAY_SECONDS), settings.LLM_HEDGE_MAX_DELAY_SECONDS)
+
+    async def _attempt(self, endpoint: Endpoint, kwargs: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            response = await litellm.acompletion(**endpoint.request_kwargs(kwargs))
+        except asyncio.CancelledError:
+            # 被对冲请求取代，不计入统计
+            raise
+        except Exception:
+            self.record(endpoint, kwargs['model'], None, error=True)
+            raise
+        self.record(endpoint, kwargs['model'], time.perf_counter() - start, error=False)
+        return response
+
+    async def _hedged(self, primary: Endpoint, backup: Endpoint, kwargs: Dict[str, Any], delay: float):
+        """先发主请求，超过 delay 未返回时再向备用端点发出请求，取先成功的结果"""
+        first = asyncio.ensure_future(self._attempt(primary, kwargs))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done and first.exception() is None:
+            return first.result()
+        if not done:
+            metrics.inc("llm_hedged_total", endpoint=backup.name, model=kwargs['model'])
+        # 主请求超时未返回时与备用请求竞争；主请求已失败时直接改用备用端点
+        tasks = {asyncio.ensure_future(self._attempt(backup, kwargs))}
+        if not done:
+            tasks.add(first)
+
+        error: Optional[BaseException] = first.exception() if done else None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def completion(self, hedge: Optional[bool] = None, **kwargs):
+        """
+        路由一次非流式请求：按健康度依次尝试端点（最多 LLM_ROUTER_MAX_ATTEMPTS 个），
+        开启对冲时首个端点超过其 p95 延迟未返回即同时请求下一个端点；没有其他可用端点时不对冲
+        （向同一个已经变慢的端点重复请求只会加重其负载并重复计费）
+        """
+        model = kwargs['model']
+        hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        candidates = self.candidates(model)[:settings.LLM_ROUTER_MAX_ATTEMPTS]
+
+        error: Optional[BaseException] = None
+        index = 0
+        while index < len(candidates):
+            endpoint = candidates[index]
+            backup = candidates[index + 1] if index + 1 < len(candidates) else None
+            delay = self.hedge_delay(endpoint, model) if hedge and backup is not None else None
+            try:
+                if delay is not None:
+                    index += 2
+                    return await self._hedged(endpoint, backup, kwargs, delay)
+                index += 1
+                return await self._attempt(endpoint, kwargs)
+            except Exception as e:
+                error = e
+                print(f"LLM请求失败 ({endpoint.name}/{model}): {e}")
+        raise error
+
+    async def stream(self, **kwargs) -> AsyncIterator[Any]:
+        """
+        路由一次流式请求：收到首个数据块前失败可切换到下一个端点，之后的错误直接抛出；
+        首块延迟计入端点延迟统计
+        """
+        model = kwargs['model']
+        candidates = self.candidates(model)[:settings.LLM_ROUTER_MAX_ATTEMPTS]
+
+        error: Optional[BaseException] = None
+        for endpoint in candidates:
+            start = time.perf_counter()
+            started = False
+            try:
+                response = await litellm.acompletion(stream=True, **endpoint.request_kwargs(kwargs))
+                async for chunk in response:
+                    if not started:
+                        started = True
+                        self.record(endpoint, model, time.perf_counter() - start, error=False)
+                    yield chunk
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if started:
+                    raise
+                self.record(endpoint, model, None, error=True)
+                error = e
+                print(f"LLM流式请求失败 ({endpoint.name}/{model}): {e}")
+        raise error
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各端点+模型的健康状态（监控接口）"""
+        with self._lock:
+            return [
+                {
+                    'endpoint': name,
+                    'model': model,
+                    'state': stats.state,
+                    'ewma_latency_seconds': round(stats.ewma_latency, 3) if stats.ewma_latency is not None else None,
+                    'ewma_error_rate': round(stats.ewma_error, 3),
+                    'p95_seconds': round(stats.p95(), 3) if stats.p95() is not None else None,
+                    'consecutive_failures': stats.consecutive_failures,
+                }
+                for (name, model), stats in sorted(self._stats.items())
+            ]
@@ -0,0 +1,263 @@
+"""
+LLM 各任务输出的结构校验
+模型返回的字段类型经常不规范（分数为字符串、情感大小写不一致、列表给成逗号分隔的字符串），
+这里按任务定义宽松的 Pydantic 模型：能纠正的就地纠正，次要字段缺失时取默认值；
+关键字段（各项分数、摘要、分类、关键词、情感等）必须给出且可用，否则算解析失败，
+这样字段名错误或被截断的输出不会被当作成功结果（也不会进入结果缓存）；
+成功/修复/失败按任务和模型计数（llm_parse_total）
+"""
+import json
+from typing import Any, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from app.llm.json_utils import extract_json_object
+from app.monitoring import metrics
+
+SENTIMENTS = ('positive', 'negative', 'neutral')
+POSITION_BIASES = ('bullish', 'bearish', 'neutral')
+
+
+def _score(value: Any, default: Optional[float]) -> float:
+    """0-100 的分数（字符串数字、百分号、越界值都做纠正）；无法转换时取 default，default 为 None 时校验失败"""
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        if default is None:
+            raise ValueError(f'无效的分数: {value!r}')
+        return default
+    return min(max(value, 0.0), 100.0)
+
+
+def _string_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.replace('，', ',').split(',')
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [str(item).strip() for item in value if item is not None and str(item).strip()]
+
+
+def _required_list(value: Any, name: str) -> List[str]:
+    items = _string_list(value)
+    if not items:
+        raise ValueError(f'{name} 为空')
+    return items
+
+
+def _choice(value: Any, choices, default: Optional[str]) -> str:
+    """取值不在 choices 中时取 default，default 为 None 时校验失败"""
+    value = str(value or '').strip().lower()
+    if value in choices:
+        return value
+    if default is None:
+        raise ValueError(f'无效的取值: {value!r}')
+    return default
+
+
+class ClassifyOutput(BaseModel):
+    categories: List[str]
+
+    @field_validator('categories', mode='before')
+    @classmethod
+    def _categories(cls, value):
+        return _required_list(value, 'categories')
+
+
+class KeywordsOutput(BaseModel):
+    keywords: List[str]
+
+    @field_validator('keywords', mode='before')
+    @classmethod
+    def _keywords(cls, value):
+        return _required_list(value, 'keywords')[:10]
+
+
+class SentimentOutput(BaseModel):
+    sentiment: str
+
+    @field_validator('sentiment', mode='before')
+    @classmethod
+    def _sentiment(cls, value):
+        return _choice(value, SENTIMENTS, None)
+
+
+class ScoreOutput(BaseModel):
+    market_impact: float
+    industry_relevance: float
+    novelty_score: float
+    urgency: float
+    importance: float = 50
+    position_bias: str = 'neutral'
+    position_magnitude: float = 0
+    brief_impact: str = ''
+
+    @field_validator('market_impact', 'industry_relevance', 'novelty_score', 'urgency', mode='before')
+    @classmethod
+    def _scores(cls, value):
+        return _score(value, None)
+
+    @field_validator('importance', mode='before')
+    @classmethod
+    def _importance(cls, value):
+        return _score(value, 50)
+
+    @field_validator('position_magnitude', mode='before')
+    @classmethod
+    def _magnitude(cls, value):
+        return _score(value, 0)
+
+    @field_validator('position_bias', mode='before')
+    @classmethod
+    def _bias(cls, value):
+        return _choice(value, POSITION_BIASES, 'neutral')
+
+    @field_validator('brief_impact', mode='before')
+    @classmethod
+    def _impact(cls, value):
+        return str(value or '')
+
+
+class BriefOutput(ScoreOutput):
+    """单次合并分析（brief 模板、离线回填）"""
+    summary: str
+    keywords: List[str] = []
+    sentiment: str = 'neutral'
+    categories: List[str]
+
+    @field_validator('keywords', mode='before')
+    @classmethod
+    def _keywords(cls, value):
+        return _string_list(value)
+
+    @field_validator('categories', mode='before')
+    @classmethod
+    def _categories(cls, value):
+        return _required_list(value, 'categories')
+
+    @field_validator('sentiment', mode='before')
+    @classmethod
+    def _sentiment(cls, value):
+        return _choice(value, SENTIMENTS, 'neutral')
+
+    @field_validator('summary', mode='before')
+    @classmethod
+    def _summary(cls, value):
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError('summary 为空')
+        return value.strip()
+
+
+class BatchItemOutput(BriefOutput):
+    id: Any
+
+
+class BatchOutput(BaseModel):
+    """打包分析：逐条校验，无效条目丢弃（由调用方单独重试）"""
+    results: List[BatchItemOutput]
+
+    @field_validator('results', mode='before')
+    @classmethod
+    def _results(cls, value):
+        if not isinstance(value, list):
+            raise ValueError('results 不是列表')
+        valid = []
+        for entry in value:
+            try:
+                valid.append(BatchItemOutput.model_validate(entry))
+            except ValidationError:
+                continue
+        if value and not valid:
+            raise ValueError('results 中没有有效条目')
+        return valid
+
+
+class TagsOutput(BaseModel):
+    tags: Dict[str, float]
+
+    @field_validator('tags', mode='before')
+    @classmethod
+    def _tags(cls, value):
+        if isinstance(value, list):
+            # 只给了标签列表时按同等相关度
+            return {str(tag): 50.0 for tag in value if tag}
+        if not isinstance(value, dict):
+            raise ValueError('tags 不是对象')
+        return {str(tag): _score(score, 50) for tag, score in value.items() if tag}
+
+
+class SearchItemOutput(BaseModel):
+    index: int
+    relevance: float = 0
+    reason: str = ''
+
+    @field_validator('relevance', mode='before')
+    @classmethod
+    def _relevance(cls, value):
+        return _score(value, 0)
+
+    @field_validator('reason', mode='before')
+    @classmethod
+    def _reason(cls, value):
+        return str(value or '')
+
+
+class SearchOutput(BaseModel):
+    results: List[SearchItemOutput]
+
+    @field_validator('results', mode='before')
+    @classmethod
+    def _results(cls, value):
+        if not isinstance(value, list):
+            raise ValueError('results 不是列表')
+        valid = []
+        for entry in value:
+            try:
+                valid.append(SearchItemOutput.model_validate(entry))
+            except ValidationError:
+                continue
+        if value and not valid:
+            raise ValueError('results 中没有有效条目')
+        return valid
+
+
+# 模板名 -> 输出结构
+OUTPUT_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    'classify': ClassifyOutput,
+    'score': ScoreOutput,
+    'keywords': KeywordsOutput,
+    'sentiment': SentimentOutput,
+    'brief': BriefOutput,
+    'batch_analysis': BatchOutput,
+    'tags': TagsOutput,
+    'search': SearchOutput,
+}
+
+T = TypeVar('T', bound=BaseModel)
+
+
+def parse_output(text: str, schema: Type[T], task: str, model: str) -> Optional[T]:
+    """
+    宽松解析并校验模型输出，记录 llm_parse_total（outcome: ok / repaired / failed）
+
+    repaired 表示输出不是纯 JSON（代码块、说明文字、截断等）但已提取成功
+    """
+    data = extract_json_object(text or '')
+    if data is None:
+        metrics.inc("llm_parse_total", task=task, model=model, outcome='failed')
+        return None
+    try:
+        parsed = schema.model_validate(data)
+    except ValidationError:
+        metrics.inc("llm_parse_total", task=task, model=model, outcome='failed')
+        return None
+    try:
+        json.loads(text)
+        outcome = 'ok'
+    except ValueError:
+        outcome = 'repaired'
+    metrics.inc("llm_parse_total", task=task, model=model, outcome=outcome)
+    return parsed
@@ -0,0 +1,137 @@
+"""
+token 预算
+按模型的分词器计算 token 数（编码器按模型缓存），超出任务预算的正文按句子信息量挑选：
+导语、含数字、实体密集的句子优先，按原文顺序拼回；更长的文章由引擎做分块摘要（map-reduce）
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # 可选依赖，缺失时按字符估算
+    tiktoken = None
+
+# 各任务默认的正文 token 预算，模型可在 AVAILABLE_MODELS 的 token_budgets 中覆盖
+DEFAULT_TOKEN_BUDGETS = {
+    'analysis': 1500,  # process_news 各任务
+    'brief': 1000,  # 单次合并分析
+    'batch': 600,  # 打包分析中每条新闻
+    'tags': 1500,
+    'search': 150,  # 搜索排序中每条候选新闻
+    'chunk': 1500,  # 分块摘要中每块的大小
+}
+
+# 没有对应分词器的模型（deepseek 等）按 cl100k 近似
+FALLBACK_ENCODING = 'cl100k_base'
+
+# 句子切分：中英文句末标点和换行
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])|(?<=\.)\s+|\n+')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*\s*(?:%|％|亿|万|千|百|bp|[kKmMbB]\b)?')
+_ENTITY = re.compile(r'\b[A-Z][A-Za-z0-9&.-]*|[《「“"][^》」”"]{1,30}[》」”"]')
+
+
+@lru_cache(maxsize=16)
+def get_encoder(model: Optional[str] = None):
+    """模型对应的 tiktoken 编码器（缓存），不可用时（未安装、词表无法下载）返回 None"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(FALLBACK_ENCODING)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符按1个，其余按4个字符1个"""
+    cjk = sum(1 for char in text if '\u4e00' <= char <= '\u9fff' or '\u3040' <= char <= '\u30ff' or '\uac00' <= char <= '\ud7af')
+    return max(1, cjk + (len(text) - cjk) // 4)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoder = get_encoder(model)
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, budget: int, model: Optional[str] = None) -> str:
+    """按 token 数截断（单句超出预算时使用）"""
+    encoder = get_encoder(model)
+    if encoder is None:
+        # 估算模式下按比例截断字符
+        tokens = estimate_tokens(text)
+        return text if tokens <= budget else text[:max(1, len(text) * budget // tokens)]
+    ids = encoder.encode(text, disallowed_special=())
+    return text if len(ids) <= budget else encoder.decode(ids[:budget])
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text or '') if sentence and sentence.strip()]
+
+
+def sentence_score(sentence: str, index: int) -> float:
+    """句子信息量：导语加分，数字和实体（英文专名、书名号/引号内名称）按密度加分"""
+    length = max(len(sentence), 1)
+    lead = 3.0 if index == 0 else 1.5 if index < 3 else 0.0
+    numbers = len(_NUMBER.findall(sentence))
+    entities = len(_ENTITY.findall(sentence))
+    density = (numbers * 2 + entities) * 50 / length
+    return lead + min(density, 4.0) + min(numbers, 3) * 0.5
+
+
+def select_sentences(text: str, budget: int, model: Optional[str] = None) -> str:
+    """正文超出预算时挑选信息量最高的句子，按原文顺序拼接"""
+    if count_tokens(text, model) <= budget:
+        return text
+
+    sentences = split_sentences(text)
+    ranked = sorted(
+        ((sentence_score(sentence, index), index, sentence) for index, sentence in enumerate(sentences)),
+        key=lambda entry: (-entry[0], entry[1])
+    )
+    chosen: List[Tuple[int, str]] = []
+    used = 0
+    for _, index, sentence in ranked:
+        tokens = count_tokens(sentence, model)
+        if used + tokens > budget:
+            if not chosen:
+                # 首句就超出预算时截断后使用
+                chosen.append((index, truncate_tokens(sentence, budget, model)))
+                break
+            continue
+        chosen.append((index, sentence))
+        used += tokens
+
+    joiner = '' if re.search(r'[\u4e00-\u9fff]', text) else ' '
+    return joiner.join(sentence for _, sentence in sorted(chosen))
+
+
+def chunk_text(text: str, chunk_tokens: int, model: Optional[str] = None) -> List[str]:
+    """按句子边界切块，每块不超过 chunk_tokens"""
+    chunks, current, used = [], [], 0
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence, model)
+        if tokens > chunk_tokens:
+            sentence, tokens = truncate_tokens(sentence, chunk_tokens, model), chunk_tokens
+        if current and used + tokens > chunk_tokens:
+            chunks.append('\n'.join(current))
+            current, used = [], 0
+        current.append(sentence)
+        used += tokens
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def token_budget(model_config: Dict[str, Any], task: str) -> int:
+    """模型配置（AVAILABLE_MODELS 中的一项）下某任务的正文 token 预算"""
+    return (model_config.get('token_budgets') or {}).get(task, DEFAULT_TOKEN_BUDGETS.get(task, DEFAULT_TOKEN_BUDGETS['analysis']))
@@ -3,6 +3,14 @@ import json
 from typing import List, Dict, Any
 from app.config import settings
 
+# 明显不是聊天模型的类型
+NON_CHAT_KEYWORDS = ["embedding", "whisper", "tts", "dall-e", "image", "vision", "text-", "code-", "music", "video"]
+
+
+def is_chat_model(model_id: str) -> bool:
+    return not any(exclude in model_id.lower() for exclude in NON_CHAT_KEYWORDS)
+
+
 class VAPIService:
     """V-API服务类 - 用于获取模型列表和管理V-API配置"""
     
@@ -63,7 +71,7 @@ class VAPIService:
         for model in all_models:
             model_id = model.get("id", "")
             # 排除明显不是聊天模型的类型
-            if any(exclude in model_id.lower() for exclude in ["embedding", "whisper", "tts", "dall-e", "image", "vision", "text-", "code-", "music", "video"]):
+            if not is_chat_model(model_id):
                 continue
             chat_models.append(model)
         return chat_models
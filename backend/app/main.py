@@ -1,116 +1,42 @@
-from fastapi import FastAPI, WebSocket, Depends
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
-import asyncio
-from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.database import engine, Base, get_db
+from app.database import engine, Base
 from app.routers import api_router
-from app.services.news_service import NewsService, CostService
-from app.models import News
+from app.llm import llm_engine
+from app.monitoring import metrics_aggregator
+from app.events import event_bus
+from app.realtime import ws_hub, stream_broker
+from app.services.cost_ledger import cost_ledger
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
 
-# WebSocket连接管理器
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                self.disconnect(connection)
-
-manager = ConnectionManager()
-
-# 定时任务，定期推送数据
-async def periodic_push():
-    while True:
-        try:
-            # 获取数据库会话
-            from app.database import SessionLocal
-            db = SessionLocal()
-            
-            try:
-                # 获取仪表盘统计数据
-                from sqlalchemy import func
-                from datetime import datetime, timedelta
-                
-                # 今日统计
-                today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-                today_news = db.query(func.count(News.id)).filter(News.crawled_at >= today).scalar() or 0
-                today_pushed = db.query(func.count(News.id)).filter(
-                    News.is_pushed == True,
-                    News.last_push_at >= today
-                ).scalar() or 0
-                
-                # 最近新闻（使用原生SQL查询，只查询存在的字段）
-                from sqlalchemy import text
-                recent_news_result = db.execute(text("""
-                    SELECT id, title, source, final_score, crawled_at 
-                    FROM news 
-                    ORDER BY crawled_at DESC 
-                    LIMIT 5
-                """)).fetchall()
-                
-                recent_news_list = []
-                for news in recent_news_result:
-                    news_dict = {
-                        "id": news.id,
-                        "title": news.title,
-                        "source": news.source,
-                        "final_score": news.final_score,
-                        "crawled_at": news.crawled_at
-                    }
-                    recent_news_list.append(news_dict)
-                
-                # 构建消息
-                message = {
-                    "type": "dashboard_update",
-                    "data": {
-                        "today_news": today_news,
-                        "today_pushed": today_pushed,
-                        "recent_news": recent_news_list
-                    }
-                }
-                
-                # 广播消息
-                await manager.broadcast(message)
-                
-            finally:
-                # 关闭数据库会话
-                db.close()
-            
-        except Exception as e:
-            print(f"Error in periodic push: {e}")
-        
-        # 每30秒推送一次
-        await asyncio.sleep(30)
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
     print(f"Starting {settings.APP_NAME}...")
+    llm_engine.log_endpoints()
     
-    # 启动定时推送任务
-    task = asyncio.create_task(periodic_push())
+    # 接收其他进程（Celery worker）发布的事件
+    event_bus.start_listener()
+    
+    # 启动WebSocket广播与SSE事件流（由新闻入库/推送/进度事件驱动）
+    ws_hub.start()
+    stream_broker.start()
     
     yield
     
     # 关闭时执行
-    task.cancel()
+    stream_broker.stop()
+    ws_hub.stop()
+    event_bus.stop_listener()
+    # 写完缓冲中的成本记录
+    cost_ledger.stop()
     print(f"Shutting down {settings.APP_NAME}...")
 
 app = FastAPI(
@@ -135,16 +61,16 @@ app.include_router(api_router, prefix="/api/v1")
 # WebSocket端点
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    connection = await ws_hub.connect(websocket)
     try:
         while True:
-            # 接收消息
+            # 接收消息（心跳与信息流订阅）
             data = await websocket.receive_text()
-            # 处理心跳包
-            if data == "ping":
-                await websocket.send_text("pong")
+            ws_hub.handle_message(connection, data)
     except:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        ws_hub.disconnect(connection)
 
 @app.get("/")
 async def root():
@@ -158,6 +84,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus 指标导出（MONITORING_BACKEND=redis 时包含各 Celery worker 进程的指标，带 process 标签）"""
+    return PlainTextResponse(metrics_aggregator.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
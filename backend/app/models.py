@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, Text, ForeignKey, Index, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -32,6 +32,7 @@ class News(Base):
     # 量化评分
     rule_score = Column(Float, default=0.0)  # 规则评分
     final_score = Column(Float, default=0.0)  # 最终综合评分
+    decay_rank_key = Column(Float, index=True)  # 时间衰减排序键 log(final_score) + t/τ，随final_score/crawled_at自动维护
     
     # 多空影响分析
     position_bias = Column(String(20))  # bullish/bearish/neutral
@@ -93,6 +94,7 @@ class News(Base):
     is_analyzed = Column(Boolean, default=False)  # 是否已分析
     analyzed_at = Column(DateTime)  # 分析时间
     analysis_type = Column(String(50))  # 分析类型: 'full', 'brief', 'vapi'
+    prompt_versions = Column(JSON)  # 分析使用的提示词模板版本 {'brief': 'v1'}
     
     def to_dict(self):
         return {
@@ -129,12 +131,22 @@ class News(Base):
             'is_analyzed': self.is_analyzed,
             'analyzed_at': self.analyzed_at.isoformat() if self.analyzed_at else None,
             'analysis_type': self.analysis_type,
+            'prompt_versions': self.prompt_versions,
             # 新增字段
             'causal_chain': self.causal_chain,
             'position_analysis': self.position_analysis,
             'related_news_ids': self.related_news_ids,
         }
 
+@event.listens_for(News, 'before_insert')
+@event.listens_for(News, 'before_update')
+def _update_decay_rank_key(mapper, connection, target):
+    """写入前同步时间衰减排序键"""
+    from app.scoring.engine import calculate_decay_rank_key
+    if target.crawled_at is None:
+        target.crawled_at = datetime.utcnow()
+    target.decay_rank_key = calculate_decay_rank_key(target.final_score, target.crawled_at)
+
 class UserConfig(Base):
     __tablename__ = "user_configs"
     
@@ -305,13 +317,15 @@ class LLMCost(Base):
     prompt_tokens = Column(Integer, default=0)
     completion_tokens = Column(Integer, default=0)
     total_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)  # 命中服务端前缀缓存的输入token（包含在 prompt_tokens 中）
     
     # 成本计算
     cost_usd = Column(Float, default=0.0)
     cost_cny = Column(Float, default=0.0)  # 人民币
     
     # 请求元数据
-    request_type = Column(String(50))  # summary, classify, score, etc.
+    request_type = Column(String(50))  # 调用环节：news_analysis, brief_analysis, backfill, manual_process 等
+    source = Column(String(100), index=True)  # 新闻来源名称（成本归属），与新闻无关的调用为空
     news_id = Column(Integer, ForeignKey('news.id'), nullable=True)
     duration_ms = Column(Integer)
     status = Column(String(20), default="success")  # success, error
@@ -329,14 +343,110 @@ class LLMCost(Base):
             'prompt_tokens': self.prompt_tokens,
             'completion_tokens': self.completion_tokens,
             'total_tokens': self.total_tokens,
+            'cached_tokens': self.cached_tokens,
             'cost_usd': self.cost_usd,
             'cost_cny': self.cost_cny,
             'request_type': self.request_type,
+            'source': self.source,
             'news_id': self.news_id,
             'duration_ms': self.duration_ms,
             'status': self.status,
         }
 
+class CostRollup(Base):
+    """LLM成本汇总（按日/按月、按模型、调用环节和来源），由成本账本批量写入时累加，预算检查和成本统计直接读取"""
+    __tablename__ = "cost_rollups"
+    __table_args__ = (
+        UniqueConstraint('period', 'period_key', 'model', 'request_type', 'source', name='uq_cost_rollup_key'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    period = Column(String(10), nullable=False)  # day, month
+    period_key = Column(String(10), nullable=False)  # 2024-05-01, 2024-05
+    model = Column(String(100), nullable=False)
+    request_type = Column(String(50), nullable=False, default='')
+    source = Column(String(100), nullable=False, default='')
+    requests = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+    cost_cny = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'period_key': self.period_key,
+            'model': self.model,
+            'request_type': self.request_type,
+            'source': self.source,
+            'requests': self.requests,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
+            'total_tokens': self.total_tokens,
+            'cost_usd': self.cost_usd,
+            'cost_cny': self.cost_cny,
+        }
+
+class NewsUserRelevance(Base):
+    """新闻与用户的关联度（入库/分析时预计算，信息流直接在SQL中筛选排序）"""
+    __tablename__ = "news_user_relevance"
+    __table_args__ = (
+        UniqueConstraint('news_id', 'user_id', name='uq_news_user_relevance'),
+        Index('ix_news_user_relevance_user_relevance', 'user_id', 'relevance'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    news_id = Column(Integer, ForeignKey('news.id'), nullable=False, index=True)
+    user_id = Column(String(100), nullable=False, default="default")
+    relevance = Column(Float, default=0.0)  # 0-100
+    computed_at = Column(DateTime, default=datetime.utcnow)  # 与UserConfig.updated_at比较判断是否过期
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'news_id': self.news_id,
+            'user_id': self.user_id,
+            'relevance': self.relevance,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None,
+        }
+
+class PushOutbox(Base):
+    """推送发件箱（与评分结果同一事务写入，由后台任务投递、失败退避重试）"""
+    __tablename__ = "push_outbox"
+    __table_args__ = (
+        UniqueConstraint('news_id', 'channel', name='uq_push_outbox_news_channel'),
+        Index('ix_push_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    news_id = Column(Integer, ForeignKey('news.id'), nullable=False, index=True)
+    channel = Column(String(50), nullable=False)  # feishu, email
+    status = Column(String(20), default='pending')  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)  # sending 状态下为租约到期时间
+    idempotency_key = Column(String(64), unique=True, nullable=False)  # 下游去重键，重试时保持不变
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'news_id': self.news_id,
+            'channel': self.channel,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'idempotency_key': self.idempotency_key,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+        }
+
 class PushLog(Base):
     __tablename__ = "push_logs"
     
@@ -383,3 +493,86 @@ class SystemLog(Base):
             'message': self.message,
             'details': self.details,
         }
+
+class AnalysisJob(Base):
+    """LLM分析队列（按优先级领取；预算消耗后降级模型、只分析标题或延后）"""
+    __tablename__ = "analysis_queue"
+    __table_args__ = (
+        Index('ix_analysis_queue_status_priority', 'status', 'priority'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    news_id = Column(Integer, ForeignKey('news.id'), nullable=False, unique=True)
+    priority = Column(Float, default=0.0)  # 来源优先级、规则预评分、时效性和同类报道数的加权
+    cluster_size = Column(Integer, default=1)  # 近24小时内标题相似的报道数（含自身）
+    status = Column(String(20), default='queued')  # queued, running, done, deferred, failed
+    tier = Column(String(20))  # full, budget, title_only（实际执行的分析档位）
+    model = Column(String(100))
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    enqueued_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    lease_until = Column(DateTime)  # running 状态的租约到期时间，worker 崩溃后可被重新领取
+    finished_at = Column(DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'news_id': self.news_id,
+            'priority': self.priority,
+            'cluster_size': self.cluster_size,
+            'status': self.status,
+            'tier': self.tier,
+            'model': self.model,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'enqueued_at': self.enqueued_at.isoformat() if self.enqueued_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class LLMBatchJob(Base):
+    """离线批处理分析作业（回填、重新分析），按状态推进，断点续跑"""
+    __tablename__ = "llm_batch_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))  # reanalyze, unanalyzed
+    provider = Column(String(20))  # local, openai
+    model = Column(String(100))
+    prompt_version = Column(String(20))  # 请求文件使用的 brief 模板版本
+    status = Column(String(20), default='pending', index=True)  # pending, submitted, completed, applied, failed, cancelled
+    provider_batch_id = Column(String(200))
+    input_file = Column(String(500))
+    output_file = Column(String(500))
+    news_ids = Column(JSON)  # 作业包含的新闻ID，避免重复提交
+    request_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)  # 提供方已完成的请求数
+    applied_count = Column(Integer, default=0)  # 已写回的输出行数（断点）
+    succeeded_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    submitted_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    applied_at = Column(DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'provider': self.provider,
+            'model': self.model,
+            'prompt_version': self.prompt_version,
+            'status': self.status,
+            'provider_batch_id': self.provider_batch_id,
+            'request_count': self.request_count,
+            'completed_count': self.completed_count,
+            'applied_count': self.applied_count,
+            'succeeded_count': self.succeeded_count,
+            'failed_count': self.failed_count,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'applied_at': self.applied_at.isoformat() if self.applied_at else None,
+        }
@@ -0,0 +1,9 @@
+from .metrics import MetricsRegistry, LatencyHistogram, metrics
+from .aggregation import MetricsAggregator, metrics_aggregator
+from .profiler import TaskProfiler, task_profiler
+
+__all__ = [
+    'MetricsRegistry', 'LatencyHistogram', 'metrics',
+    'MetricsAggregator', 'metrics_aggregator',
+    'TaskProfiler', 'task_profiler',
+]
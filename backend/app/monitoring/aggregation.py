@@ -0,0 +1,133 @@
+"""
+跨进程指标汇总
+指标注册表是进程内的，Celery worker（prefork 子进程）中记录的抓取、LLM等指标在 API 进程的 /metrics 中看不到。
+backend=redis 时每个 worker 子进程定期把 metrics.dump() 写入 Redis（带过期时间，进程退出后自动消失），
+API 进程导出时合并本进程和各 worker 的指标，worker 的序列带 process 标签（主机名-进程号）；
+backend=memory 时只导出本进程的指标
+"""
+import json
+import os
+import socket
+import threading
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.monitoring.metrics import MetricsRegistry, metrics
+
+
+def process_name() -> str:
+    """当前进程在汇总指标中的标识"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class MetricsAggregator:
+    """worker 进程定期上报指标，API 进程合并导出"""
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        backend: str = "memory",
+        redis_url: Optional[str] = None,
+        prefix: str = "llmquant:metrics",
+        interval: float = 15.0,
+    ):
+        self.registry = registry
+        self.backend = backend
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.interval = interval
+        self._redis = None
+        self._stop = threading.Event()
+        self._publisher: Optional[threading.Thread] = None
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url)
+        return self._redis
+
+    def publish(self):
+        """上报本进程的指标，过期时间为上报间隔的3倍"""
+        if self.backend != "redis":
+            return
+        try:
+            self._get_redis().set(
+                f"{self.prefix}:{process_name()}",
+                json.dumps(self.registry.dump()),
+                ex=max(int(self.interval * 3), 1),
+            )
+        except Exception as e:
+            print(f"上报worker指标失败: {e}")
+
+    def start_publisher(self):
+        """启动定期上报线程（仅 Redis 后端；在 worker 子进程中调用，重复调用无副作用）"""
+        if self.backend != "redis" or (self._publisher and self._publisher.is_alive()):
+            return
+        self._stop.clear()
+        self._publisher = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+        self._publisher.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+    def stop_publisher(self):
+        """停止上报线程，退出前再上报一次"""
+        self._stop.set()
+        if self._publisher:
+            self._publisher.join(timeout=2)
+            self._publisher = None
+        self.publish()
+
+    def worker_dumps(self) -> Dict[str, Dict[str, Any]]:
+        """各 worker 进程最近上报的原始指标: process -> dump"""
+        if self.backend != "redis":
+            return {}
+        client = self._get_redis()
+        keys = sorted(client.scan_iter(match=f"{self.prefix}:*"))
+        if not keys:
+            return {}
+        dumps = {}
+        for key, value in zip(keys, client.mget(keys)):
+            if value is None:
+                continue
+            name = key.decode() if isinstance(key, bytes) else key
+            dumps[name[len(self.prefix) + 1:]] = json.loads(value)
+        return dumps
+
+    def collect(self) -> MetricsRegistry:
+        """本进程与各 worker 指标合并后的注册表（worker 的序列带 process 标签）"""
+        combined = MetricsRegistry()
+        combined.load(self.registry.dump())
+        try:
+            dumps = self.worker_dumps()
+        except Exception as e:
+            print(f"读取worker指标失败: {e}")
+            dumps = {}
+        for process, data in dumps.items():
+            combined.load(data, process=process)
+        return combined
+
+    def render_prometheus(self) -> str:
+        """导出 Prometheus 文本格式（Redis 后端时包含各 worker 的指标）"""
+        if self.backend != "redis":
+            return self.registry.render_prometheus()
+        return self.collect().render_prometheus()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各 worker 进程的指标摘要（含分位数）"""
+        workers = {}
+        for process, data in self.worker_dumps().items():
+            registry = MetricsRegistry()
+            registry.load(data)
+            workers[process] = registry.snapshot()
+        return {'backend': self.backend, 'workers': workers}
+
+
+# 全局指标汇总实例
+metrics_aggregator = MetricsAggregator(
+    metrics,
+    backend=settings.MONITORING_BACKEND or settings.CELERY_BACKEND,
+    redis_url=settings.REDIS_URL,
+    interval=settings.WORKER_METRICS_INTERVAL_SECONDS,
+)
@@ -0,0 +1,259 @@
+"""
+流水线指标采集
+记录各阶段（抓取、解析、清洗、去重、LLM、评分、入库、推送）的延迟直方图与计数器，
+并以 Prometheus 文本格式导出
+"""
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 前缀，避免与其他服务的指标重名
+METRIC_PREFIX = "llmquant"
+
+# 对数线性分桶（秒）：每个数量级 10 个桶，覆盖 0.1ms ~ 750s，相对误差约 25%
+_BUCKET_MANTISSAS = (1.0, 1.25, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, 7.5)
+DEFAULT_BUCKETS: List[float] = [
+    round(m * 10 ** e, 6) for e in range(-4, 3) for m in _BUCKET_MANTISSAS
+]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
+
+
+class LatencyHistogram:
+    """对数线性分桶的延迟直方图（HDR风格，固定内存）"""
+    
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets = buckets or DEFAULT_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+    
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def percentile(self, q: float) -> float:
+        """估算分位数（返回所在桶的上界，不超过观测到的最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count:
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(upper, self.max)
+        return self.max
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """指标注册表（进程内，线程安全）"""
+    
+    STAGE_HISTOGRAM = "stage_duration_seconds"
+    STAGE_ERRORS = "stage_errors_total"
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, LatencyHistogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {
+            self.STAGE_HISTOGRAM: "Pipeline stage latency in seconds",
+            self.STAGE_ERRORS: "Pipeline stage failures",
+        }
+    
+    def describe(self, name: str, help_text: str):
+        """为指标添加说明"""
+        self._help[name] = help_text
+    
+    def observe(self, name: str, value: float, **labels):
+        """记录一次直方图观测值"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = LatencyHistogram()
+            histogram.observe(value)
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器累加"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+    
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """
+        计时一个流水线阶段，同步与异步代码中均可使用:
+        
+            with metrics.span("fetch", source=self.name):
+                raw_items = await self.fetch()
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(self.STAGE_ERRORS, stage=stage, **labels)
+            raise
+        finally:
+            self.observe(self.STAGE_HISTOGRAM, time.perf_counter() - start, stage=stage, **labels)
+    
+    def timed(self, stage: str, **labels):
+        """计时装饰器，支持同步和异步函数"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(stage, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """以字典形式返回当前指标（含分位数）"""
+        with self._lock:
+            return {
+                'histograms': {
+                    name: [
+                        {'labels': dict(key), **histogram.summary()}
+                        for key, histogram in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+            }
+    
+    def render_prometheus(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = f"{METRIC_PREFIX}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in series.items():
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+            
+            for name, series in sorted(self._histograms.items()):
+                full_name = f"{METRIC_PREFIX}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+        
+        return "\n".join(lines) + "\n"
+    
+    def dump(self) -> Dict[str, Any]:
+        """导出原始指标（可 JSON 序列化），供跨进程汇总（见 aggregation.MetricsAggregator）"""
+        with self._lock:
+            return {
+                'help': dict(self._help),
+                'counters': [
+                    {'name': name, 'labels': dict(key), 'value': value}
+                    for name, series in self._counters.items()
+                    for key, value in series.items()
+                ],
+                'histograms': [
+                    {
+                        'name': name,
+                        'labels': dict(key),
+                        'buckets': histogram.buckets,
+                        'counts': histogram.counts,
+                        'sum': histogram.sum,
+                        'min': histogram.min,
+                        'max': histogram.max,
+                    }
+                    for name, series in self._histograms.items()
+                    for key, histogram in series.items()
+                ],
+            }
+    
+    def load(self, data: Dict[str, Any], **labels):
+        """合并 dump() 导出的指标，labels 附加到每个序列上（如 process=...），相同序列累加"""
+        with self._lock:
+            for name, help_text in (data.get('help') or {}).items():
+                self._help.setdefault(name, help_text)
+            
+            for entry in data.get('counters', []):
+                key = _label_key({**entry['labels'], **labels})
+                series = self._counters.setdefault(entry['name'], {})
+                series[key] = series.get(key, 0) + entry['value']
+            
+            for entry in data.get('histograms', []):
+                key = _label_key({**entry['labels'], **labels})
+                series = self._histograms.setdefault(entry['name'], {})
+                histogram = series.get(key)
+                if histogram is None:
+                    histogram = series[key] = LatencyHistogram(list(entry['buckets']))
+                if histogram.buckets != list(entry['buckets']):
+                    continue
+                histogram.counts = [a + b for a, b in zip(histogram.counts, entry['counts'])]
+                histogram.count = sum(histogram.counts)
+                histogram.sum += entry['sum']
+                for value in (entry['min'], entry['max']):
+                    if value is not None:
+                        histogram.min = value if histogram.min is None else min(histogram.min, value)
+                        histogram.max = value if histogram.max is None else max(histogram.max, value)
+    
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+# 全局指标注册表实例
+metrics = MetricsRegistry()
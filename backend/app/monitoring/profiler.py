@@ -0,0 +1,205 @@
+"""
+按任务开关的采样分析器
+默认关闭；对指定任务开启后，下一次（或接下来N次）执行会用 cProfile 记录，
+安装了 pyinstrument 时优先使用其采样模式
+
+backend=memory 时开关和结果只在本进程内；backend=redis 时开关（及剩余次数）和结果保存在 Redis 中，
+API 进程开启后由执行任务的 Celery worker 进程领取，结果也从 Redis 读取
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.monitoring.aggregation import process_name
+
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:  # 可选依赖
+    _PyinstrumentProfiler = None
+
+
+class TaskProfiler:
+    """任务级性能分析开关"""
+    
+    def __init__(
+        self,
+        max_results: int = 5,
+        top_n: int = 30,
+        backend: str = "memory",
+        redis_url: Optional[str] = None,
+        prefix: str = "llmquant:profiling",
+    ):
+        self.max_results = max_results
+        self.top_n = top_n
+        self.backend = backend
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._redis = None
+        self._lock = threading.Lock()
+        # task -> 剩余分析次数（None 表示一直开启）
+        self._enabled: Dict[str, Optional[int]] = {}
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+        
+        # 允许通过环境变量在 worker 启动时开启（仅本进程），如 PROFILE_TASKS=crawl_single_source
+        for task in (settings.PROFILE_TASKS or "").split(","):
+            if task.strip():
+                self._enabled[task.strip()] = None
+    
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url)
+        return self._redis
+    
+    @property
+    def _enabled_key(self) -> str:
+        return f"{self.prefix}:enabled"
+    
+    def _results_key(self, task: str) -> str:
+        return f"{self.prefix}:results:{task}"
+    
+    def enable(self, task: str, runs: Optional[int] = 1):
+        """开启指定任务的分析，runs=None 表示一直开启"""
+        if self.backend == "redis":
+            # 空字符串表示一直开启
+            self._get_redis().hset(self._enabled_key, task, '' if runs is None else runs)
+            return
+        with self._lock:
+            self._enabled[task] = runs
+    
+    def disable(self, task: str):
+        """关闭指定任务的分析"""
+        if self.backend == "redis":
+            self._get_redis().hdel(self._enabled_key, task)
+        with self._lock:
+            self._enabled.pop(task, None)
+    
+    def status(self) -> Dict[str, Any]:
+        """当前开启的任务及剩余次数"""
+        with self._lock:
+            enabled = dict(self._enabled)
+        if self.backend == "redis":
+            for task, value in self._get_redis().hgetall(self._enabled_key).items():
+                task = task.decode() if isinstance(task, bytes) else task
+                value = value.decode() if isinstance(value, bytes) else value
+                enabled[task] = int(value) if value else None
+        return {
+            'enabled': enabled,
+            'engine': 'pyinstrument' if _PyinstrumentProfiler else 'cprofile',
+            'backend': self.backend,
+        }
+    
+    def get_results(self, task: str) -> List[Dict[str, Any]]:
+        """获取任务最近的分析结果"""
+        if self.backend == "redis":
+            entries = self._get_redis().lrange(self._results_key(task), 0, self.max_results - 1)
+            return [json.loads(entry) for entry in reversed(entries)]
+        with self._lock:
+            return list(self._results.get(task, []))
+    
+    def _claim(self, task: str) -> bool:
+        with self._lock:
+            if task in self._enabled:
+                remaining = self._enabled[task]
+                if remaining is not None:
+                    if remaining <= 1:
+                        self._enabled.pop(task)
+                    else:
+                        self._enabled[task] = remaining - 1
+                return True
+        if self.backend == "redis":
+            try:
+                return self._claim_shared(task)
+            except Exception as e:
+                print(f"读取性能分析开关失败 [{task}]: {e}")
+        return False
+    
+    def _claim_shared(self, task: str) -> bool:
+        """从 Redis 领取一次分析（多个 worker 进程并发领取时按剩余次数原子扣减）"""
+        client = self._get_redis()
+        value = client.hget(self._enabled_key, task)
+        if value is None:
+            return False
+        if value in (b'', ''):
+            return True
+        remaining = client.hincrby(self._enabled_key, task, -1)
+        if remaining <= 0:
+            client.hdel(self._enabled_key, task)
+        return remaining >= 0
+    
+    def _save_result(self, task: str, result: Dict[str, Any]):
+        if self.backend == "redis":
+            try:
+                key = self._results_key(task)
+                pipe = self._get_redis().pipeline()
+                pipe.lpush(key, json.dumps(result, ensure_ascii=False))
+                pipe.ltrim(key, 0, self.max_results - 1)
+                pipe.execute()
+                return
+            except Exception as e:
+                print(f"保存性能分析结果到Redis失败 [{task}]: {e}")
+        with self._lock:
+            results = self._results.setdefault(task, [])
+            results.append(result)
+            del results[:-self.max_results]
+    
+    @contextmanager
+    def profile(self, task: str):
+        """未开启时无额外开销；开启时记录本次执行的热点函数"""
+        if not self._claim(task):
+            yield
+            return
+        
+        start = time.perf_counter()
+        if _PyinstrumentProfiler:
+            profiler = _PyinstrumentProfiler(async_mode="disabled")
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        
+        try:
+            yield
+        finally:
+            if _PyinstrumentProfiler:
+                profiler.stop()
+                report = profiler.output_text(unicode=True, color=False)
+            else:
+                profiler.disable()
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.top_n)
+                report = stream.getvalue()
+            
+            result = {
+                'task': task,
+                'process': process_name(),
+                'started_at': datetime.utcnow().isoformat(),
+                'duration_ms': int((time.perf_counter() - start) * 1000),
+                'report': report,
+            }
+            self._save_result(task, result)
+            print(f"性能分析完成 [{task}]: {result['duration_ms']}ms")
+    
+    def profiled(self, task: str):
+        """装饰器形式，用于 Celery 任务函数"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.profile(task):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+# 全局分析器实例
+task_profiler = TaskProfiler(
+    backend=settings.MONITORING_BACKEND or settings.CELERY_BACKEND,
+    redis_url=settings.REDIS_URL,
+)
@@ -2,6 +2,8 @@ from .base import BasePusher, PushResult
 from .feishu import FeishuPusher
 from .email import EmailPusher
 from .manager import PushManager, push_manager
+from .smtp_pool import SMTPConnectionPool, smtp_pools
+from .dispatcher import PushDispatcher, PushJob, DigestJob, push_dispatcher
 
 __all__ = [
     'BasePusher',
@@ -10,4 +12,10 @@ __all__ = [
     'EmailPusher',
     'PushManager',
     'push_manager',
+    'PushDispatcher',
+    'PushJob',
+    'DigestJob',
+    'push_dispatcher',
+    'SMTPConnectionPool',
+    'smtp_pools',
 ]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 
 @dataclass
@@ -23,11 +23,34 @@ class BasePusher(ABC):
         """推送单条新闻"""
         pass
     
+    async def push_digest(self, news_items: List[Dict[str, Any]]) -> PushResult:
+        """
+        推送多条新闻的汇总消息
+        默认逐条推送，全部成功才算成功；支持合并消息的渠道应重写此方法
+        """
+        failures = []
+        channel = ''
+        for news_item in news_items:
+            result = await self.push(news_item)
+            channel = result.channel
+            if not result.success:
+                failures.append(result.error_message or '')
+        
+        return PushResult(
+            success=not failures,
+            channel=channel,
+            error_message='; '.join(failures) if failures else None
+        )
+    
     @abstractmethod
     async def test_connection(self) -> bool:
         """测试连接"""
         pass
     
+    async def close(self):
+        """释放推送器持有的连接（默认无操作）"""
+        pass
+    
     def format_message(self, news_item: Dict[str, Any]) -> str:
         """格式化消息内容"""
         score = news_item.get('final_score', 0)
@@ -0,0 +1,73 @@
+"""
+推送分发器
+把一批 (新闻, 渠道) 推送任务并发发出，每个渠道单独限制并发数，
+避免触发飞书 Webhook 频率限制或 SMTP 服务器限流
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from .base import PushResult
+from .manager import PushManager, push_manager
+from app.config import settings
+
+
+@dataclass
+class PushJob:
+    """单个推送任务"""
+    news_item: Dict[str, Any]
+    channel: str
+    config: Dict[str, Any]
+
+
+@dataclass
+class DigestJob:
+    """汇总推送任务（多条新闻合并为一条消息）"""
+    news_items: List[Dict[str, Any]]
+    channel: str
+    config: Dict[str, Any]
+
+
+class PushDispatcher:
+    """按渠道限流的并发推送分发器"""
+    
+    def __init__(
+        self,
+        manager: PushManager,
+        concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = 4
+    ):
+        self.manager = manager
+        self.concurrency = concurrency or {}
+        self.default_concurrency = default_concurrency
+        # 信号量绑定事件循环，按 (循环, 渠道) 分别创建
+        self._semaphores: Dict[tuple, asyncio.Semaphore] = {}
+    
+    def _semaphore(self, channel: str) -> asyncio.Semaphore:
+        key = (id(asyncio.get_running_loop()), channel)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            limit = self.concurrency.get(channel, self.default_concurrency)
+            semaphore = self._semaphores[key] = asyncio.Semaphore(limit)
+        return semaphore
+    
+    async def _send(self, job: Union[PushJob, DigestJob]) -> PushResult:
+        async with self._semaphore(job.channel):
+            if isinstance(job, DigestJob):
+                return await self.manager.push_digest(job.channel, job.news_items, job.config)
+            return await self.manager.push_to_channel(job.channel, job.news_item, job.config)
+    
+    async def dispatch(self, jobs: List[Union[PushJob, DigestJob]]) -> List[PushResult]:
+        """并发执行所有推送任务，结果顺序与 jobs 一致"""
+        if not jobs:
+            return []
+        return list(await asyncio.gather(*[self._send(job) for job in jobs]))
+
+# 全局推送分发器实例
+push_dispatcher = PushDispatcher(
+    push_manager,
+    concurrency={
+        'feishu': settings.PUSH_FEISHU_CONCURRENCY,
+        'email': settings.PUSH_EMAIL_CONCURRENCY,
+    }
+)
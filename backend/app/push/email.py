@@ -1,10 +1,11 @@
-import aiosmtplib
+import html
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from typing import Dict, Any, List
 
 from .base import BasePusher, PushResult
+from .smtp_pool import SMTPConnectionPool, smtp_pools
 from app.config import settings
 
 class EmailPusher(BasePusher):
@@ -16,11 +17,30 @@ class EmailPusher(BasePusher):
         self.smtp_port = config.get('smtp_port') or settings.SMTP_PORT
         self.smtp_user = config.get('smtp_user') or settings.SMTP_USER
         self.smtp_pass = config.get('smtp_pass') or settings.SMTP_PASS
-        self.use_tls = config.get('use_tls', True)
+        self.use_tls = config.get('use_tls', settings.SMTP_TLS)
         self.recipients = config.get('recipients', [])
+        self.sender = config.get('sender') or settings.SMTP_FROM or self.smtp_user or 'llmquant-news@localhost'
+    
+    def _get_pool(self) -> SMTPConnectionPool:
+        """当前事件循环下该SMTP账号的连接池"""
+        return smtp_pools.get(
+            self.smtp_host,
+            self.smtp_port,
+            self.smtp_user,
+            self.smtp_pass,
+            self.use_tls
+        )
     
     async def push(self, news_item: Dict[str, Any]) -> PushResult:
         """推送新闻邮件"""
+        return await self._send(lambda: self._build_email(news_item))
+    
+    async def push_digest(self, news_items: List[Dict[str, Any]]) -> PushResult:
+        """多条新闻合并为一封邮件推送"""
+        return await self._send(lambda: self._build_digest_email(news_items))
+    
+    async def _send(self, build_message) -> PushResult:
+        """构建并发送邮件"""
         try:
             if not self.recipients:
                 return PushResult(
@@ -30,17 +50,10 @@ class EmailPusher(BasePusher):
                 )
             
             # 构建邮件
-            msg = self._build_email(news_item)
+            msg = build_message()
             
-            # 发送邮件
-            await aiosmtplib.send(
-                msg,
-                hostname=self.smtp_host,
-                port=self.smtp_port,
-                username=self.smtp_user,
-                password=self.smtp_pass,
-                start_tls=self.use_tls
-            )
+            # 发送邮件（复用连接池中已认证的连接，所有收件人在同一会话中发送）
+            await self._get_pool().send_message(msg, recipients=self.recipients)
             
             return PushResult(
                 success=True,
@@ -125,7 +138,7 @@ class EmailPusher(BasePusher):
         # 创建邮件
         msg = MIMEMultipart('alternative')
         msg['Subject'] = f"[{priority_label}] {title[:60]}"
-        msg['From'] = self.smtp_user
+        msg['From'] = self.sender
         msg['To'] = ', '.join(self.recipients)
         
         # 添加HTML内容
@@ -134,16 +147,56 @@ class EmailPusher(BasePusher):
         
         return msg
     
+    def _build_digest_email(self, news_items: List[Dict[str, Any]]) -> MIMEMultipart:
+        """构建多条新闻的汇总邮件"""
+        rows = []
+        for index, news_item in enumerate(news_items):
+            score = news_item.get('final_score', 0)
+            title = html.escape(news_item.get('title', '无标题'))
+            summary = html.escape((news_item.get('summary') or '')[:300])
+            source = html.escape(news_item.get('source', '未知来源'))
+            url = html.escape(news_item.get('url', ''), quote=True)
+            rows.append(f"""
+            <div class="item">
+                <div class="title"><span class="score">{score}%</span> {index + 1}. <a href="{url}">{title}</a></div>
+                <div class="meta">📎 {source}</div>
+                <p>{summary}</p>
+            </div>""")
+        
+        html_content = f"""
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }}
+                .item {{ border-bottom: 1px solid #e0e0e0; padding: 12px 0; }}
+                .title {{ font-size: 16px; font-weight: bold; }}
+                .title a {{ color: #333; text-decoration: none; }}
+                .score {{ display: inline-block; background: #667eea; color: white; padding: 2px 8px; border-radius: 10px; font-size: 12px; }}
+                .meta {{ color: #666; font-size: 12px; }}
+            </style>
+        </head>
+        <body>
+            <div class="header">
+                <div class="title">📰 {len(news_items)} 条重要新闻汇总</div>
+            </div>
+            {''.join(rows)}
+            <p style="color: #999; font-size: 12px; margin-top: 40px;">
+                此邮件由 LLMQuant News 自动发送<br>
+                发送时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+            </p>
+        </body>
+        </html>
+        """
+        
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = f"[LLMQuant] {len(news_items)} 条重要新闻汇总 {datetime.now().strftime('%m-%d %H:%M')}"
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(self.recipients)
+        msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+        
+        return msg
+    
     async def test_connection(self) -> bool:
         """测试SMTP连接"""
-        try:
-            await aiosmtplib.connect(
-                hostname=self.smtp_host,
-                port=self.smtp_port,
-                username=self.smtp_user,
-                password=self.smtp_pass,
-                start_tls=self.use_tls
-            )
-            return True
-        except:
-            return False
+        return await self._get_pool().health_check()
@@ -1,6 +1,7 @@
+import asyncio
 import aiohttp
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from .base import BasePusher, PushResult
 from app.config import settings
@@ -14,6 +15,22 @@ class FeishuPusher(BasePusher):
         self.app_secret = config.get('app_secret') or settings.FEISHU_APP_SECRET
         self.webhook = config.get('webhook')
         self.chat_id = config.get('chat_id')
+        self.timeout = config.get('timeout', 10)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """复用HTTP会话（保持长连接），事件循环变化时重建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._session_loop = loop
+        return self._session
+    
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def push(self, news_item: Dict[str, Any]) -> PushResult:
         """推送新闻到飞书"""
@@ -21,6 +38,9 @@ class FeishuPusher(BasePusher):
             if self.webhook:
                 # 使用Webhook方式
                 return await self._push_by_webhook(news_item)
+            elif self.chat_id:
+                # 使用API方式
+                return await self._push_by_api(news_item)
             else:
                 return PushResult(
                     success=False,
@@ -34,23 +54,13 @@ class FeishuPusher(BasePusher):
                 error_message=str(e),
                 timestamp=datetime.now().isoformat()
             )
-        return self._client
     
-    async def push(self, news_item: Dict[str, Any]) -> PushResult:
-        """推送新闻到飞书"""
+    async def push_digest(self, news_items: List[Dict[str, Any]]) -> PushResult:
+        """多条新闻合并为一张卡片推送"""
+        if not self.webhook:
+            return await super().push_digest(news_items)
         try:
-            if self.webhook:
-                # 使用Webhook方式
-                return await self._push_by_webhook(news_item)
-            elif self._get_client() and self.chat_id:
-                # 使用API方式
-                return await self._push_by_api(news_item)
-            else:
-                return PushResult(
-                    success=False,
-                    channel='feishu',
-                    error_message='未配置飞书推送参数'
-                )
+            return await self._send_card(self._build_digest_card(news_items))
         except Exception as e:
             return PushResult(
                 success=False,
@@ -61,39 +71,41 @@ class FeishuPusher(BasePusher):
     
     async def _push_by_webhook(self, news_item: Dict[str, Any]) -> PushResult:
         """通过Webhook推送"""
-        import aiohttp
-        import json
-        
-        score = news_item.get('final_score', 0)
-        card = self._build_card(news_item)
+        return await self._send_card(self._build_card(news_item), news_item.get('idempotency_key'))
+    
+    async def _send_card(self, card: Dict[str, Any], idempotency_key: Optional[str] = None) -> PushResult:
+        """通过Webhook发送消息卡片（带幂等键时飞书按 uuid 去重，重试不会重复发送）"""
+        session = await self._get_session()
+        payload = {"msg_type": "interactive", "card": card}
+        if idempotency_key:
+            payload["uuid"] = idempotency_key
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.webhook,
-                json={"msg_type": "interactive", "card": card},
-                headers={'Content-Type': 'application/json'}
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    if result.get('code') == 0:
-                        return PushResult(
-                            success=True,
-                            channel='feishu',
-                            message_id=result.get('data', {}).get('message_id'),
-                            timestamp=datetime.now().isoformat()
-                        )
-                    else:
-                        return PushResult(
-                            success=False,
-                            channel='feishu',
-                            error_message=result.get('msg', 'Unknown error')
-                        )
+        async with session.post(
+            self.webhook,
+            json=payload,
+            headers={'Content-Type': 'application/json'}
+        ) as response:
+            if response.status == 200:
+                result = await response.json()
+                if result.get('code') == 0:
+                    return PushResult(
+                        success=True,
+                        channel='feishu',
+                        message_id=(result.get('data') or {}).get('message_id'),
+                        timestamp=datetime.now().isoformat()
+                    )
                 else:
                     return PushResult(
                         success=False,
                         channel='feishu',
-                        error_message=f'HTTP {response.status}'
+                        error_message=result.get('msg', 'Unknown error')
                     )
+            else:
+                return PushResult(
+                    success=False,
+                    channel='feishu',
+                    error_message=f'HTTP {response.status}'
+                )
     
     async def _push_by_api(self, news_item: Dict[str, Any]) -> PushResult:
         """通过API推送（需要更完整的飞书SDK实现）"""
@@ -108,7 +120,7 @@ class FeishuPusher(BasePusher):
         """构建飞书消息卡片"""
         score = news_item.get('final_score', 0)
         title = news_item.get('title', '无标题')
-        summary = news_item.get('summary', '')[:300]
+        summary = (news_item.get('summary') or '')[:300]
         source = news_item.get('source', '未知来源')
         url = news_item.get('url', '')
         
@@ -144,7 +156,7 @@ class FeishuPusher(BasePusher):
                     "tag": "div",
                     "fields": [
                         {"is_short": True, "text": {"tag": "lark_md", "content": f"**📎 来源:** {source}"}},
-                        {"is_short": True, "text": {"tag": "lark_md", "content": f"**🏷️ 分类:** {', '.join(news_item.get('categories', [])[:3])}"}}
+                        {"is_short": True, "text": {"tag": "lark_md", "content": f"**🏷️ 分类:** {', '.join((news_item.get('categories') or [])[:3])}"}}
                     ]
                 },
                 {"tag": "hr"},
@@ -162,17 +174,54 @@ class FeishuPusher(BasePusher):
             ]
         }
     
+    def _build_digest_card(self, news_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """构建多条新闻的汇总卡片（每条新闻一个分区）"""
+        top_score = max((item.get('final_score') or 0 for item in news_items), default=0)
+        
+        elements = []
+        for index, news_item in enumerate(news_items):
+            if index:
+                elements.append({"tag": "hr"})
+            score = news_item.get('final_score', 0)
+            title = news_item.get('title', '无标题')
+            summary = (news_item.get('summary') or '')[:120]
+            source = news_item.get('source', '未知来源')
+            url = news_item.get('url', '')
+            elements.append({
+                "tag": "div",
+                "text": {
+                    "tag": "lark_md",
+                    "content": f"**{index + 1}. [{title}]({url})**\n📊 {score}% | 📎 {source}\n{summary}"
+                }
+            })
+        
+        elements.append({
+            "tag": "note",
+            "elements": [{"tag": "plain_text", "content": f"LLMQuant News · {datetime.now().strftime('%Y-%m-%d %H:%M')}"}]
+        })
+        
+        return {
+            "config": {"wide_screen_mode": True},
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": f"📰 {len(news_items)} 条重要新闻汇总 | 最高 {top_score}%"
+                },
+                "template": self.get_priority_color(top_score)
+            },
+            "elements": elements
+        }
+    
     async def test_connection(self) -> bool:
         """测试连接"""
         try:
             if self.webhook:
-                import aiohttp
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        self.webhook,
-                        json={"msg_type": "text", "content": {"text": "测试消息"}}
-                    ) as response:
-                        return response.status == 200
+                session = await self._get_session()
+                async with session.post(
+                    self.webhook,
+                    json={"msg_type": "text", "content": {"text": "测试消息"}}
+                ) as response:
+                    return response.status == 200
             return False
         except:
             return False
@@ -1,7 +1,13 @@
-from typing import Dict, Any, List, Type
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Type, Tuple
 from .base import BasePusher, PushResult
 from .feishu import FeishuPusher
 from .email import EmailPusher
+from .smtp_pool import smtp_pools
+from app.monitoring import metrics
+from app.config import settings
 
 class PushManager:
     """推送管理器"""
@@ -12,45 +18,101 @@ class PushManager:
     }
     
     def __init__(self):
-        self._pusher_instances: Dict[str, BasePusher] = {}
+        # (渠道, 配置) -> 推送器实例，相同配置复用同一实例及其连接
+        self._pusher_instances: Dict[Tuple[str, str], BasePusher] = {}
+        
+        # 汇总模式：待推送新闻累计到一定数量，或最早一条等待超过窗口时合并推送
+        self.digest_enabled = settings.PUSH_DIGEST_ENABLED
+        self.digest_window = timedelta(seconds=settings.PUSH_DIGEST_WINDOW_SECONDS)
+        self.digest_max_items = settings.PUSH_DIGEST_MAX_ITEMS
     
     def register_pusher(self, name: str, pusher_class: Type[BasePusher]):
         """注册新的推送方式"""
         self.PUSHERS[name] = pusher_class
     
     def create_pusher(self, channel: str, config: Dict[str, Any]) -> BasePusher:
-        """创建推送器实例"""
+        """获取推送器实例（按渠道和配置缓存）"""
         if channel not in self.PUSHERS:
             raise ValueError(f"未知的推送渠道: {channel}")
         
-        pusher_class = self.PUSHERS[channel]
-        pusher = pusher_class(config)
-        self._pusher_instances[channel] = pusher
+        key = (channel, json.dumps(config, sort_keys=True, default=str))
+        pusher = self._pusher_instances.get(key)
+        if pusher is None:
+            pusher = self.PUSHERS[channel](config)
+            self._pusher_instances[key] = pusher
         return pusher
     
+    async def push_to_channel(
+        self,
+        channel: str,
+        news_item: Dict[str, Any],
+        config: Dict[str, Any]
+    ) -> PushResult:
+        """向单个渠道推送，异常转为失败结果"""
+        try:
+            pusher = self.create_pusher(channel, config)
+            with metrics.span("push", channel=channel):
+                result = await pusher.push(news_item)
+        except Exception as e:
+            result = PushResult(
+                success=False,
+                channel=channel,
+                error_message=str(e)
+            )
+        
+        status = "success" if result.success else "failed"
+        metrics.inc("push_total", channel=channel, status=status)
+        return result
+    
     async def push(
         self, 
         news_item: Dict[str, Any], 
         channels: List[str],
         configs: Dict[str, Dict[str, Any]]
     ) -> Dict[str, PushResult]:
-        """向多个渠道推送"""
-        results = {}
-        
-        for channel in channels:
-            try:
-                config = configs.get(channel, {})
-                pusher = self.create_pusher(channel, config)
-                result = await pusher.push(news_item)
-                results[channel] = result
-            except Exception as e:
-                results[channel] = PushResult(
-                    success=False,
-                    channel=channel,
-                    error_message=str(e)
-                )
+        """向多个渠道并发推送"""
+        results = await asyncio.gather(*[
+            self.push_to_channel(channel, news_item, configs.get(channel, {}))
+            for channel in channels
+        ])
+        return dict(zip(channels, results))
+    
+    async def push_digest(
+        self,
+        channel: str,
+        news_items: List[Dict[str, Any]],
+        config: Dict[str, Any]
+    ) -> PushResult:
+        """向单个渠道推送多条新闻的汇总消息"""
+        try:
+            pusher = self.create_pusher(channel, config)
+            with metrics.span("push_digest", channel=channel):
+                result = await pusher.push_digest(news_items)
+        except Exception as e:
+            result = PushResult(
+                success=False,
+                channel=channel,
+                error_message=str(e)
+            )
         
-        return results
+        status = "success" if result.success else "failed"
+        metrics.inc("push_digest_total", channel=channel, status=status)
+        metrics.inc("push_digest_items_total", len(news_items), channel=channel, status=status)
+        return result
+    
+    def digest_ready(self, pending_count: int, oldest_pending_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
+        """待推送新闻是否达到汇总条件（数量或等待时间）"""
+        if pending_count <= 0:
+            return False
+        if pending_count >= self.digest_max_items:
+            return True
+        now = now or datetime.utcnow()
+        return oldest_pending_at is None or now - oldest_pending_at >= self.digest_window
+    
+    def split_digest(self, news_items: List[Any]) -> List[List[Any]]:
+        """按单条汇总的最大条数分组"""
+        size = max(1, self.digest_max_items)
+        return [news_items[i:i + size] for i in range(0, len(news_items), size)]
     
     async def test_channel(self, channel: str, config: Dict[str, Any]) -> bool:
         """测试指定渠道"""
@@ -63,6 +125,13 @@ class PushManager:
     def get_available_channels(self) -> List[str]:
         """获取所有可用渠道"""
         return list(self.PUSHERS.keys())
+    
+    async def close(self):
+        """关闭所有缓存的推送器连接"""
+        for pusher in self._pusher_instances.values():
+            await pusher.close()
+        self._pusher_instances.clear()
+        await smtp_pools.close()
 
 # 全局推送管理器实例
 push_manager = PushManager()
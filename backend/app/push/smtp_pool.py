@@ -0,0 +1,167 @@
+"""
+SMTP 连接池
+保持已完成 STARTTLS 和登录的连接，推送邮件时直接复用，避免每封邮件重复握手
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aiosmtplib
+from email.message import Message
+
+from app.config import settings
+
+# 连接失效时可透明重连的异常
+_RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+
+class SMTPConnectionPool:
+    """单个 SMTP 服务器（同一账号）的连接池，绑定创建它的事件循环"""
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: Optional[bool] = None,
+        max_size: int = 3,
+        idle_timeout: float = 300,
+        timeout: float = 30
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._semaphore = asyncio.Semaphore(max_size)
+        self.connects = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """建立新连接（含 STARTTLS 与登录）"""
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        self.connects += 1
+        return smtp
+
+    @staticmethod
+    async def _discard(smtp: aiosmtplib.SMTP):
+        """关闭连接，忽略错误"""
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _take_idle(self) -> Optional[aiosmtplib.SMTP]:
+        """取出一个可用的空闲连接，丢弃已断开或空闲过久的连接"""
+        now = time.monotonic()
+        while self._idle:
+            smtp, released_at = self._idle.pop()
+            if smtp.is_connected and now - released_at < self.idle_timeout:
+                return smtp
+            await self._discard(smtp)
+        return None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """借用一个连接，正常归还后放回池中，出错则关闭"""
+        async with self._semaphore:
+            smtp = await self._take_idle() or await self._connect()
+            try:
+                yield smtp
+            except BaseException:
+                await self._discard(smtp)
+                raise
+            self._idle.append((smtp, time.monotonic()))
+
+    async def send_message(self, message: Message, recipients: Optional[Sequence[str]] = None):
+        """
+        发送邮件；复用的连接已被服务器断开时，换新连接重试一次
+
+        多个收件人在同一会话中发送（一次 MAIL FROM，多个 RCPT TO）
+        """
+        for attempt in range(2):
+            try:
+                async with self.acquire() as smtp:
+                    return await smtp.send_message(message, recipients=recipients)
+            except _RECONNECT_ERRORS:
+                if attempt:
+                    raise
+
+    async def health_check(self) -> bool:
+        """借用连接并发送 NOOP，验证服务器可达且认证有效"""
+        try:
+            async with self.acquire() as smtp:
+                await smtp.noop()
+            return True
+        except Exception as e:
+            print(f"SMTP健康检查失败 [{self.hostname}:{self.port}]: {e}")
+            return False
+
+    async def close(self):
+        """关闭所有空闲连接"""
+        while self._idle:
+            smtp, _ = self._idle.pop()
+            await self._discard(smtp)
+
+
+class SMTPPoolRegistry:
+    """按 (事件循环, 服务器, 账号) 管理连接池"""
+
+    def __init__(self):
+        self._pools: Dict[tuple, Tuple[asyncio.AbstractEventLoop, SMTPConnectionPool]] = {}
+
+    def get(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: Optional[bool] = None
+    ) -> SMTPConnectionPool:
+        """获取当前事件循环下对应服务器的连接池"""
+        loop = asyncio.get_running_loop()
+
+        # 清理已关闭事件循环遗留的连接池
+        for key in [key for key, (pool_loop, _) in self._pools.items() if pool_loop.is_closed()]:
+            del self._pools[key]
+
+        key = (id(loop), hostname, port, username, start_tls)
+        entry = self._pools.get(key)
+        if entry is None:
+            pool = SMTPConnectionPool(
+                hostname, port, username, password, start_tls,
+                max_size=settings.SMTP_POOL_SIZE,
+                idle_timeout=settings.SMTP_POOL_IDLE_SECONDS
+            )
+            entry = self._pools[key] = (loop, pool)
+        return entry[1]
+
+    async def close(self):
+        """关闭当前事件循环下的所有连接池"""
+        loop = asyncio.get_running_loop()
+        for key, (pool_loop, pool) in list(self._pools.items()):
+            if pool_loop is loop:
+                await pool.close()
+                del self._pools[key]
+
+# 全局连接池注册表
+smtp_pools = SMTPPoolRegistry()
@@ -0,0 +1,9 @@
+from .hub import BroadcastHub, ClientConnection, ws_hub
+from .subscriptions import FeedFilter, Subscription, SubscriptionIndex
+from .stream import SSE_HEADERS, EventStream, StreamBroker, format_sse, relay_events, stream_broker
+
+__all__ = [
+    'BroadcastHub', 'ClientConnection', 'ws_hub',
+    'FeedFilter', 'Subscription', 'SubscriptionIndex',
+    'SSE_HEADERS', 'EventStream', 'StreamBroker', 'format_sse', 'relay_events', 'stream_broker',
+]
@@ -0,0 +1,273 @@
+"""
+WebSocket 广播中心
+每条消息只序列化一次；每个连接有独立的有界发送队列和发送协程，慢连接队列写满即断开，
+不会拖慢其他连接。推送内容由新闻入库/推送事件驱动，只发送增量，无连接时不查询数据库
+
+客户端消息:
+    ping                                                       -> pong
+    {"action": "subscribe", "id": "feed", "filters": {...}}    -> subscribed，之后收到 feed_items
+    {"action": "unsubscribe", "id": "feed"}                    -> unsubscribed
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.config import settings
+from app.events import Event, event_bus, NEWS_SCORED, NEWS_PUSHED
+from app.monitoring import metrics
+from .subscriptions import FeedFilter, Subscription, SubscriptionIndex
+
+# 断开慢连接时使用的关闭码（1013: Try Again Later，客户端会自动重连）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# 会推送给信息流订阅的评分事件来源（配置变更后的重新评分不重复推送）
+FEED_EVENT_REASONS = ('ingest', 'analysis')
+
+# 仪表盘增量中携带的新闻字段
+DELTA_NEWS_FIELDS = ('id', 'title', 'source', 'final_score', 'crawled_at')
+
+
+class ClientConnection:
+    """单个 WebSocket 连接及其发送队列"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.sender: Optional[asyncio.Task] = None
+
+    def offer(self, text: str) -> bool:
+        """放入发送队列，队列已满返回 False"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send_loop(self):
+        while True:
+            text = await self.queue.get()
+            await self.websocket.send_text(text)
+
+
+class BroadcastHub:
+    """WebSocket 广播中心"""
+
+    def __init__(self, max_queue: int = 100, coalesce_seconds: float = 1.0):
+        self.max_queue = max_queue
+        self.coalesce_seconds = coalesce_seconds
+        self.connections: Set[ClientConnection] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.subscriptions = SubscriptionIndex()
+        self._new_news: Dict[int, Dict[str, Any]] = {}
+        self._feed_news: Dict[int, Dict[str, Any]] = {}
+        self._counters_dirty = False
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self.connections)
+
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
+        await websocket.accept()
+        connection = ClientConnection(websocket, self.max_queue)
+        connection.sender = asyncio.create_task(self._run_sender(connection))
+        self.connections.add(connection)
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        self.connections.discard(connection)
+        self.subscriptions.remove_connection(connection)
+        if connection.sender and not connection.sender.done():
+            connection.sender.cancel()
+
+    async def _run_sender(self, connection: ClientConnection):
+        try:
+            await connection.send_loop()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # 发送失败说明连接已断开
+            self.disconnect(connection)
+
+    def _drop_slow(self, connection: ClientConnection):
+        """断开发送队列已满的连接"""
+        print("WebSocket客户端消费过慢，断开连接")
+        metrics.inc("ws_slow_consumer_drops_total")
+        self.disconnect(connection)
+        asyncio.ensure_future(self._close(connection.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def send(self, connection: ClientConnection, text: str):
+        """向单个连接发送已序列化的消息"""
+        if not connection.offer(text):
+            self._drop_slow(connection)
+
+    def broadcast(self, message: Dict[str, Any], connections: Optional[List[ClientConnection]] = None):
+        """序列化一次后放入各连接的发送队列（默认所有连接）"""
+        targets = list(self.connections) if connections is None else connections
+        if not targets:
+            return
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        for connection in targets:
+            self.send(connection, text)
+        metrics.inc("ws_messages_total", len(targets), type=message.get('type', 'unknown'))
+
+    def handle_message(self, connection: ClientConnection, data: str):
+        """处理客户端消息：心跳与订阅管理"""
+        if data == "ping":
+            # 经发送队列回复，避免与广播并发写入
+            self.send(connection, "pong")
+            return
+
+        try:
+            message = json.loads(data)
+            action = message.get('action')
+            subscription_id = str(message.get('id') or 'default')
+            if action == 'subscribe':
+                feed_filter = FeedFilter.from_dict(message.get('filters'))
+                self.subscriptions.add(Subscription(connection, subscription_id, feed_filter))
+                reply = {"type": "subscribed", "id": subscription_id}
+            elif action == 'unsubscribe':
+                self.subscriptions.remove(connection, subscription_id)
+                reply = {"type": "unsubscribed", "id": subscription_id}
+            else:
+                reply = {"type": "error", "message": f"未知操作: {action}"}
+        except (ValueError, TypeError, AttributeError) as e:
+            reply = {"type": "error", "message": str(e)}
+
+        self.send(connection, json.dumps(reply, ensure_ascii=False))
+
+    def _publish_feed(self, news_list: List[Dict[str, Any]]):
+        """把新文章按订阅匹配结果下发，每条文章只序列化一次"""
+        matched: Dict[tuple, List[str]] = {}
+        subscriptions: Dict[tuple, Subscription] = {}
+        for news in news_list:
+            matches = self.subscriptions.match(news)
+            if not matches:
+                continue
+            item = json.dumps(news.get('feed_item') or news, ensure_ascii=False, default=str)
+            for subscription in matches:
+                matched.setdefault(subscription.key, []).append(item)
+                subscriptions[subscription.key] = subscription
+
+        for key, items in matched.items():
+            subscription = subscriptions[key]
+            if subscription.connection not in self.connections:
+                continue
+            text = '{"type": "feed_items", "subscription": %s, "items": [%s]}' % (
+                json.dumps(subscription.subscription_id, ensure_ascii=False), ', '.join(items)
+            )
+            self.send(subscription.connection, text)
+        metrics.inc("ws_feed_messages_total", len(matched))
+
+    # ---- 事件驱动的仪表盘增量 ----
+
+    def _on_event(self, event: Event):
+        """事件总线回调（可能在 Redis 监听线程中调用），转交到事件循环处理"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._collect, event)
+
+    def _collect(self, event: Event):
+        # 无连接时直接丢弃，不累积也不触发查询
+        if not self.connections:
+            return
+        if event.type == NEWS_SCORED:
+            news = event.payload
+            reason = news.get('reason', 'ingest')
+            if reason == 'ingest':
+                self._new_news[news['id']] = {key: news.get(key) for key in DELTA_NEWS_FIELDS}
+            if reason in FEED_EVENT_REASONS and len(self.subscriptions):
+                self._feed_news[news['id']] = news
+        self._counters_dirty = True
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # 合并短时间内的多个事件为一次推送
+            await asyncio.sleep(self.coalesce_seconds)
+            self._wakeup.clear()
+
+            new_news = list(self._new_news.values())
+            self._new_news.clear()
+            feed_news = list(self._feed_news.values())
+            self._feed_news.clear()
+            counters_dirty, self._counters_dirty = self._counters_dirty, False
+            if not self.connections:
+                continue
+
+            if feed_news:
+                self._publish_feed(feed_news)
+            if not (new_news or counters_dirty):
+                continue
+
+            try:
+                counters = await asyncio.get_running_loop().run_in_executor(None, self._load_counters)
+            except Exception as e:
+                print(f"Error loading dashboard counters: {e}")
+                continue
+
+            new_news.sort(key=lambda news: news.get('crawled_at') or '', reverse=True)
+            self.broadcast({
+                "type": "dashboard_update",
+                "data": {
+                    **counters,
+                    "new_news_ids": [news['id'] for news in new_news],
+                    "new_news": new_news,
+                }
+            })
+
+    @staticmethod
+    def _load_counters() -> Dict[str, int]:
+        """今日新闻数与今日推送数"""
+        from sqlalchemy import func
+        from app.database import SessionLocal
+        from app.models import News
+
+        db = SessionLocal()
+        try:
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            today_news = db.query(func.count(News.id)).filter(News.crawled_at >= today).scalar() or 0
+            today_pushed = db.query(func.count(News.id)).filter(
+                News.is_pushed == True,
+                News.last_push_at >= today
+            ).scalar() or 0
+            return {"today_news": today_news, "today_pushed": today_pushed}
+        finally:
+            db.close()
+
+    def start(self):
+        """在应用事件循环中启动，订阅入库和推送事件"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        event_bus.subscribe(NEWS_SCORED, self._on_event)
+        event_bus.subscribe(NEWS_PUSHED, self._on_event)
+
+    def stop(self):
+        event_bus.unsubscribe(NEWS_SCORED, self._on_event)
+        event_bus.unsubscribe(NEWS_PUSHED, self._on_event)
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for connection in list(self.connections):
+            self.disconnect(connection)
+        self._loop = None
+
+# 全局广播中心
+ws_hub = BroadcastHub(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    coalesce_seconds=settings.WS_COALESCE_SECONDS
+)
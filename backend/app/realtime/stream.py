@@ -0,0 +1,181 @@
+"""
+Server-Sent Events 事件流
+每个事件流保存最近 N 条事件的环形缓冲区，客户端断线重连时按 Last-Event-ID 补发；
+订阅者各自有有界队列，消费过慢的连接被断开，由客户端按 Last-Event-ID 续传。
+事件ID为 "<纪元>-<序号>"，纪元在进程启动时生成：重启后或连到另一个 worker 进程时，
+旧的 Last-Event-ID 纪元不匹配，返回 reset 事件让客户端重新拉取，而不是按旧序号跳过新事件
+"""
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.events import Event, event_bus, NEWS_SCORED, ANALYSIS_PROGRESS
+from app.monitoring import metrics
+
+# 推送到新闻流的评分事件来源（配置变更后的重新评分不推送）
+NEWS_STREAM_REASONS = ('ingest', 'analysis')
+
+# 断开订阅者时放入队列的标记
+_CLOSED = None
+
+# SSE 响应头：禁用缓存和代理缓冲
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event_id: Optional[str], event_type: str, data: str) -> str:
+    """格式化为 SSE 消息（data 为已序列化的 JSON，不含换行）"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def relay_events(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    """把 (事件类型, 数据) 异步迭代器转为 SSE 消息，中途出错以 error 事件结束"""
+    try:
+        async for event_type, data in events:
+            yield format_sse(None, event_type, json.dumps(data, ensure_ascii=False, default=str))
+    except Exception as e:
+        print(f"流式响应失败: {e}")
+        yield format_sse(None, "error", json.dumps({"error": str(e)}, ensure_ascii=False))
+
+
+class EventStream:
+    """单个事件流：环形缓冲区 + 订阅者队列，只在事件循环线程中调用"""
+
+    def __init__(self, name: str, buffer_size: int = 1000, queue_size: int = 500):
+        self.name = name
+        self.queue_size = queue_size
+        # 事件ID的纪元，区分进程重启前后和不同 worker 进程
+        self.epoch = uuid.uuid4().hex[:12]
+        # (序号, 事件类型, 数据, 序列化后的数据)
+        self._buffer: Deque[Tuple[int, str, Dict[str, Any], str]] = deque(maxlen=buffer_size)
+        self._next_id = 1
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def event_id(self, seq: int) -> str:
+        """序号对应的 SSE 事件ID"""
+        return f"{self.epoch}-{seq}"
+
+    def append(self, event_type: str, data: Dict[str, Any]) -> int:
+        """写入一条事件并分发给订阅者，返回序号"""
+        event_id = self._next_id
+        self._next_id += 1
+        message = (event_id, event_type, data, json.dumps(data, ensure_ascii=False, default=str))
+        self._buffer.append(message)
+
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(queue)
+        return event_id
+
+    def _drop(self, queue: asyncio.Queue):
+        """断开消费过慢的订阅者"""
+        metrics.inc("sse_slow_consumer_drops_total", stream=self.name)
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_CLOSED)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def since(self, last_seq: Optional[int]) -> List[Tuple[int, str, Dict[str, Any], str]]:
+        """缓冲区中序号大于 last_seq 的事件（超出缓冲区范围的部分已丢失）"""
+        if last_seq is None:
+            return []
+        return [entry for entry in self._buffer if entry[0] > last_seq]
+
+    def is_gap(self, last_seq: Optional[int]) -> bool:
+        """续传起点早于缓冲区起点（有事件已被覆盖）"""
+        if last_seq is None or not self._buffer:
+            return False
+        return last_seq < self._buffer[0][0] - 1
+
+    def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        """本进程本次启动分配的事件ID对应的序号，其他纪元、格式不对或超出已分配范围时返回 None"""
+        if not event_id:
+            return None
+        epoch, _, seq = event_id.rpartition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.last_id:
+            return None
+        return int(seq)
+
+    def resume(self, last_event_id: Optional[str]) -> Tuple[Optional[str], int, List[Tuple[int, str, Dict[str, Any], str]]]:
+        """按 Last-Event-ID 续传：返回 (重置原因, 已发送到的序号, 需补发的事件)
+        重置原因不为 None 时客户端有事件丢失，需要重新拉取：
+        stream_restarted 表示 ID 来自重启前或其他 worker 进程（此时不补发，只转发之后的实时事件），
+        buffer_overflow 表示缓冲区已覆盖部分事件（补发缓冲区中剩余的事件）"""
+        if not last_event_id:
+            return None, 0, []
+        last_seq = self.parse_event_id(last_event_id)
+        if last_seq is None:
+            return "stream_restarted", 0, []
+        reason = "buffer_overflow" if self.is_gap(last_seq) else None
+        return reason, last_seq, self.since(last_seq)
+
+
+class StreamBroker:
+    """把事件总线上的事件写入对应的 SSE 事件流"""
+
+    def __init__(self, buffer_size: int = 1000, queue_size: int = 500):
+        self.streams: Dict[str, EventStream] = {
+            'news': EventStream('news', buffer_size, queue_size),
+            'analysis': EventStream('analysis', buffer_size, queue_size),
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self, name: str) -> EventStream:
+        return self.streams[name]
+
+    def _on_event(self, event: Event):
+        """事件总线回调（可能在 Redis 监听线程中调用），转交到事件循环处理"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._append, event)
+
+    def _append(self, event: Event):
+        if event.type == NEWS_SCORED:
+            news = event.payload
+            if news.get('reason', 'ingest') in NEWS_STREAM_REASONS:
+                self.streams['news'].append('news', news.get('feed_item') or news)
+        elif event.type == ANALYSIS_PROGRESS:
+            self.streams['analysis'].append('progress', event.payload)
+
+    def start(self):
+        """在应用事件循环中启动"""
+        self._loop = asyncio.get_running_loop()
+        event_bus.subscribe(NEWS_SCORED, self._on_event)
+        event_bus.subscribe(ANALYSIS_PROGRESS, self._on_event)
+
+    def stop(self):
+        event_bus.unsubscribe(NEWS_SCORED, self._on_event)
+        event_bus.unsubscribe(ANALYSIS_PROGRESS, self._on_event)
+        self._loop = None
+
+# 全局 SSE 事件流
+stream_broker = StreamBroker(
+    buffer_size=settings.SSE_BUFFER_SIZE,
+    queue_size=settings.SSE_QUEUE_SIZE
+)
@@ -0,0 +1,224 @@
+"""
+WebSocket 信息流订阅索引
+按来源、多空方向、分类、关键词和最低评分分别建立倒排索引，新文章到达时
+从候选最少的维度出发，逐个候选检查其余条件：匹配成本与该维度的候选数成正比
+（不限该维度的订阅也是候选），而不是与订阅总数成正比；关键词维度另需遍历索引中的不同词项
+"""
+import bisect
+from dataclasses import dataclass, field
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 每个连接最多保持的订阅数
+MAX_SUBSCRIPTIONS_PER_CONNECTION = 10
+
+POSITION_BIASES = {'bullish', 'bearish', 'neutral'}
+
+
+def _as_set(values: Optional[Iterable[Any]], lower: bool = False) -> Set[str]:
+    if not values:
+        return set()
+    if isinstance(values, str):
+        values = [values]
+    return {str(value).strip().lower() if lower else str(value).strip() for value in values if str(value).strip()}
+
+
+@dataclass
+class FeedFilter:
+    """订阅条件，空集合表示该维度不限"""
+    min_score: float = 0.0
+    max_score: float = 100.0
+    position_bias: Set[str] = field(default_factory=set)
+    sources: Set[str] = field(default_factory=set)
+    categories: Set[str] = field(default_factory=set)
+    keywords: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "FeedFilter":
+        data = data or {}
+        position_bias = _as_set(data.get('position_bias'), lower=True)
+        invalid = position_bias - POSITION_BIASES
+        if invalid:
+            raise ValueError(f"无效的多空方向: {', '.join(sorted(invalid))}")
+        return cls(
+            min_score=float(data.get('min_score') or 0),
+            max_score=float(data.get('max_score') if data.get('max_score') is not None else 100),
+            position_bias=position_bias,
+            sources=_as_set(data.get('sources')),
+            categories=_as_set(data.get('categories')),
+            keywords=_as_set(data.get('keywords'), lower=True),
+        )
+
+    def matches(self, news: Dict[str, Any]) -> bool:
+        """逐条件判断（索引匹配结果与此一致）"""
+        score = news.get('final_score') or 0
+        if not self.min_score <= score <= self.max_score:
+            return False
+        if self.position_bias and (news.get('position_bias') or 'neutral') not in self.position_bias:
+            return False
+        if self.sources and news.get('source') not in self.sources:
+            return False
+        if self.categories and not self.categories & set(news.get('categories') or []):
+            return False
+        if self.keywords:
+            text = SubscriptionIndex.searchable_text(news)
+            if not any(keyword in text for keyword in self.keywords):
+                return False
+        return True
+
+
+@dataclass
+class Subscription:
+    """单个连接上的一个订阅"""
+    connection: Any
+    subscription_id: str
+    filter: FeedFilter
+
+    @property
+    def key(self) -> Tuple[int, str]:
+        return (id(self.connection), self.subscription_id)
+
+
+class _TermIndex:
+    """单个维度的倒排索引：词项 -> 订阅键，另记录该维度不限的订阅"""
+
+    def __init__(self):
+        self.by_term: Dict[str, Set[tuple]] = {}
+        self.unrestricted: Set[tuple] = set()
+
+    def add(self, key: tuple, terms: Set[str]):
+        if not terms:
+            self.unrestricted.add(key)
+        for term in terms:
+            self.by_term.setdefault(term, set()).add(key)
+
+    def remove(self, key: tuple, terms: Set[str]):
+        self.unrestricted.discard(key)
+        for term in terms:
+            keys = self.by_term.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_term[term]
+
+    def candidate_count(self, terms: Iterable[str]) -> int:
+        """候选数上界（同一订阅命中多个词项时重复计数）"""
+        return len(self.unrestricted) + sum(len(self.by_term.get(term, ())) for term in terms)
+
+    def candidates(self, terms: Iterable[str]) -> Iterator[tuple]:
+        """候选订阅键（可能重复），不复制集合"""
+        return chain(self.unrestricted, *(self.by_term.get(term, ()) for term in terms))
+
+
+class SubscriptionIndex:
+    """信息流订阅索引"""
+
+    def __init__(self):
+        self._subscriptions: Dict[tuple, Subscription] = {}
+        self._sources = _TermIndex()
+        self._biases = _TermIndex()
+        self._categories = _TermIndex()
+        self._keywords = _TermIndex()
+        # 按最低评分排序，bisect 取出 min_score <= 新闻评分的订阅
+        self._min_scores: List[Tuple[float, tuple]] = []
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    @staticmethod
+    def searchable_text(news: Dict[str, Any]) -> str:
+        """关键词匹配的文本：标题、摘要和提取的关键词"""
+        return ' '.join([
+            news.get('title') or '',
+            news.get('summary') or '',
+            ' '.join(news.get('keywords') or []),
+        ]).lower()
+
+    def add(self, subscription: Subscription):
+        """新增订阅，同一连接同一 ID 的订阅会被替换"""
+        key = subscription.key
+        if key in self._subscriptions:
+            self.remove(subscription.connection, subscription.subscription_id)
+        elif self.count_for(subscription.connection) >= MAX_SUBSCRIPTIONS_PER_CONNECTION:
+            raise ValueError(f"每个连接最多 {MAX_SUBSCRIPTIONS_PER_CONNECTION} 个订阅")
+
+        feed_filter = subscription.filter
+        self._subscriptions[key] = subscription
+        self._sources.add(key, feed_filter.sources)
+        self._biases.add(key, feed_filter.position_bias)
+        self._categories.add(key, feed_filter.categories)
+        self._keywords.add(key, feed_filter.keywords)
+        bisect.insort(self._min_scores, (feed_filter.min_score, key))
+
+    def remove(self, connection: Any, subscription_id: str) -> bool:
+        key = (id(connection), subscription_id)
+        subscription = self._subscriptions.pop(key, None)
+        if subscription is None:
+            return False
+
+        feed_filter = subscription.filter
+        self._sources.remove(key, feed_filter.sources)
+        self._biases.remove(key, feed_filter.position_bias)
+        self._categories.remove(key, feed_filter.categories)
+        self._keywords.remove(key, feed_filter.keywords)
+        self._min_scores.remove((feed_filter.min_score, key))
+        return True
+
+    def remove_connection(self, connection: Any):
+        """移除连接的全部订阅"""
+        for key in [key for key in self._subscriptions if key[0] == id(connection)]:
+            self.remove(connection, key[1])
+
+    def count_for(self, connection: Any) -> int:
+        return sum(1 for key in self._subscriptions if key[0] == id(connection))
+
+    def match(self, news: Dict[str, Any]) -> List[Subscription]:
+        """返回匹配该新闻的订阅（结果与逐个调用 FeedFilter.matches 一致）"""
+        if not self._subscriptions:
+            return []
+
+        score = news.get('final_score') or 0
+        # min_score <= 新闻评分的订阅是 _min_scores 的前缀，只取长度
+        score_end = bisect.bisect_right(self._min_scores, (score, (float('inf'),)))
+        if not score_end:
+            return []
+
+        source = news.get('source') or ''
+        bias = news.get('position_bias') or 'neutral'
+        categories = set(news.get('categories') or [])
+        # 关键词维度：只遍历索引中的不同词项，与订阅数无关
+        text = self.searchable_text(news)
+        matched_keywords = {keyword for keyword in self._keywords.by_term if keyword in text}
+
+        # 从候选最少的维度出发
+        drivers = [
+            (score_end, lambda: (key for _, key in islice(self._min_scores, score_end))),
+            (self._sources.candidate_count([source]), lambda: self._sources.candidates([source])),
+            (self._biases.candidate_count([bias]), lambda: self._biases.candidates([bias])),
+            (self._categories.candidate_count(categories), lambda: self._categories.candidates(categories)),
+            (self._keywords.candidate_count(matched_keywords), lambda: self._keywords.candidates(matched_keywords)),
+        ]
+        count, candidates = min(drivers, key=lambda driver: driver[0])
+        if not count:
+            return []
+
+        matched = []
+        seen = set()
+        for key in candidates():
+            if key in seen:
+                continue
+            seen.add(key)
+            subscription = self._subscriptions[key]
+            feed_filter = subscription.filter
+            if not feed_filter.min_score <= score <= feed_filter.max_score:
+                continue
+            if feed_filter.position_bias and bias not in feed_filter.position_bias:
+                continue
+            if feed_filter.sources and source not in feed_filter.sources:
+                continue
+            if feed_filter.categories and feed_filter.categories.isdisjoint(categories):
+                continue
+            if feed_filter.keywords and feed_filter.keywords.isdisjoint(matched_keywords):
+                continue
+            matched.append(subscription)
+        return matched
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.routers import news, config, costs, push, dashboard, ai
+from app.routers import news, config, costs, push, dashboard, ai, monitoring, stream
 
 api_router = APIRouter()
 
@@ -10,3 +10,5 @@ api_router.include_router(costs.router)
 api_router.include_router(push.router)
 api_router.include_router(dashboard.router)
 api_router.include_router(ai.router)
+api_router.include_router(monitoring.router)
+api_router.include_router(stream.router)
@@ -1,10 +1,16 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.schemas import AITaskRequest, AITaskResponse
 from app.llm import llm_engine
+from app.llm.batch import BATCH_PROVIDERS
 from app.services.news_service import CostService, NewsService
+from app.services.backfill import BackfillService
+from app.realtime import SSE_HEADERS, relay_events
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -25,25 +31,7 @@ async def process_with_ai(
     )
     
     # 记录成本
-    if result.get('cost'):
-        cost = result['cost']
-        cost_info = llm_engine.calculate_cost(
-            model,
-            cost.get('input_tokens', 0),
-            cost.get('output_tokens', 0)
-        )
-        
-        CostService.record_cost(
-            db=db,
-            model=model,
-            provider="openai",  # 简化处理
-            prompt_tokens=cost_info['input_tokens'],
-            completion_tokens=cost_info['output_tokens'],
-            cost_usd=cost_info['cost_usd'],
-            cost_cny=cost_info['cost_cny'],
-            request_type='manual_process',
-            duration_ms=result.get('processing_time_ms')
-        )
+    _record_process_cost(db, model, result)
     
     return {
         "summary": result.get('summary'),
@@ -55,6 +43,59 @@ async def process_with_ai(
         "processing_time_ms": result.get('processing_time_ms', 0)
     }
 
+@router.post("/process/stream")
+async def process_with_ai_stream(request: AITaskRequest):
+    """
+    流式AI处理（SSE）
+    
+    事件: token（摘要文本增量）、task（单个任务完成）、error（单个任务失败）、done（完整结果）
+    """
+    model = request.model or "gpt-4o"
+    tasks = [t.value for t in request.tasks] if request.tasks else ['summarize']
+    
+    async def events():
+        async for event_type, data in llm_engine.process_news_stream(
+            title="",
+            content=request.content,
+            tasks=tasks,
+            model=model
+        ):
+            if event_type == 'done':
+                # 流结束后记录成本（响应期间请求级会话可能已关闭，单独开会话）
+                db = SessionLocal()
+                try:
+                    _record_process_cost(db, model, data)
+                finally:
+                    db.close()
+            yield event_type, data
+    
+    return StreamingResponse(relay_events(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def _record_process_cost(db: Session, model: str, result: dict):
+    """记录手动AI处理的成本"""
+    if not result.get('cost'):
+        return
+    cost = result['cost']
+    cost_info = llm_engine.calculate_cost(
+        model,
+        cost.get('input_tokens', 0),
+        cost.get('output_tokens', 0),
+        cost.get('cached_tokens', 0)
+    )
+    
+    CostService.record_cost(
+        db=db,
+        model=model,
+        provider=llm_engine.provider_of(model),
+        prompt_tokens=cost_info['input_tokens'],
+        completion_tokens=cost_info['output_tokens'],
+        cached_tokens=cost_info['cached_tokens'],
+        cost_usd=cost_info['cost_usd'],
+        cost_cny=cost_info['cost_cny'],
+        request_type='manual_process',
+        duration_ms=result.get('processing_time_ms')
+    )
+
 @router.get("/models")
 async def get_available_models():
     """获取可用的AI模型列表"""
@@ -73,10 +114,56 @@ async def get_vapi_models(refresh: bool = False):
 
 
 @router.post("/analyze-unanalyzed")
-async def analyze_unanalyzed_news(limit: int = 10, db: Session = Depends(get_db)):
-    """分析未分析的新闻，使用V-API进行简要分析"""
+async def analyze_unanalyzed_news(limit: int = 10, offline: bool = False, db: Session = Depends(get_db)):
+    """
+    分析未分析的新闻，使用V-API进行简要分析
+    
+    offline=true 时不逐条同步调用，而是登记为离线批处理回填作业，由后台任务执行和写回
+    """
     try:
+        if offline:
+            return BackfillService.start(db, 'unanalyzed', only_missing=True, days=None, limit=limit)
         result = await NewsService.analyze_unanalyzed_news(db, limit)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/backfill")
+async def create_backfill(
+    days: int = 30,
+    only_missing: bool = True,
+    limit: Optional[int] = None,
+    model: Optional[str] = None,
+    provider: Optional[str] = None,
+    stale_prompts: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    登记离线回填作业
+    
+    only_missing=false 时重新分析最近 days 天的全部新闻；stale_prompts=true 时再加上
+    提示词模板已更新的新闻；已在未结束作业或实时分析队列中的新闻不会重复提交
+    """
+    if provider and provider not in BATCH_PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"不支持的批处理提供方: {provider}")
+    name = 'stale_prompts' if stale_prompts else 'unanalyzed' if only_missing else 'reanalyze'
+    return BackfillService.start(
+        db, name, only_missing=only_missing, days=days, limit=limit, model=model, provider=provider,
+        stale_prompts=stale_prompts
+    )
+
+
+@router.get("/backfill")
+async def get_backfill_jobs(limit: int = 20, db: Session = Depends(get_db)):
+    """回填作业状态和进度"""
+    return BackfillService.get_stats(db, limit)
+
+
+@router.post("/backfill/{job_id}/cancel")
+async def cancel_backfill_job(job_id: int, db: Session = Depends(get_db)):
+    """取消未结束的回填作业"""
+    job = BackfillService.cancel(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="回填作业不存在")
+    return job.to_dict()
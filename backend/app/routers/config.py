@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict
 from datetime import datetime
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.schemas import (
     UserConfigResponse, UserConfigUpdate,
     CrawlerConfigResponse, CrawlerConfigCreate, CrawlerConfigUpdate
 )
 from app.services.news_service import ConfigService, CrawlerService
 from app.services.config_analysis import config_analysis_service
+from app.services.rescoring import RescoringService
 from app.crawler import crawler_manager
 from app.models import UserConfig
+from app.realtime import SSE_HEADERS, relay_events
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -51,7 +54,7 @@ async def update_user_config(
 ):
     """更新用户配置"""
     config = ConfigService.update_user_config(db, "default", config_data.model_dump())
-    return config.to_dict()
+    return {**config.to_dict(), "rescore_task_id": config.rescore_task_id}
 
 # ========== AI配置分析 ==========
 
@@ -81,13 +84,7 @@ async def analyze_description(
         
         if not request.preview_only:
             # 保存到待确认配置
-            if not existing_config:
-                existing_config = ConfigService.get_or_create_user_config(db, "default")
-            
-            existing_config.user_description = request.description
-            existing_config.pending_ai_config = ai_config
-            existing_config.analysis_mode = "description"
-            db.commit()
+            _save_pending_ai_config(db, request.description, ai_config)
         
         return {
             "success": True,
@@ -99,6 +96,44 @@ async def analyze_description(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
 
+@router.post("/analyze-description/stream")
+async def analyze_description_stream(
+    request: AnalyzeDescriptionRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    流式分析用户描述（SSE）
+    
+    每个配置字段生成完毕即推送 field 事件，最后推送 done 事件（含完整配置和是否已保存）
+    """
+    existing_config = ConfigService.get_user_config(db)
+    existing = existing_config.to_dict() if existing_config else None
+    
+    async def events():
+        async for event_type, data in config_analysis_service.analyze_description_stream(request.description, existing):
+            if event_type == 'done':
+                ai_config = data['config']
+                ai_config["description"] = request.description
+                if not request.preview_only:
+                    # 响应期间请求级会话可能已关闭，单独开会话保存
+                    session = SessionLocal()
+                    try:
+                        _save_pending_ai_config(session, request.description, ai_config)
+                    finally:
+                        session.close()
+                data = {**data, "saved": not request.preview_only}
+            yield event_type, data
+    
+    return StreamingResponse(relay_events(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def _save_pending_ai_config(db: Session, description: str, ai_config: Dict):
+    """保存到待确认配置，等待用户确认后应用"""
+    config = ConfigService.get_or_create_user_config(db, "default")
+    config.user_description = description
+    config.pending_ai_config = ai_config
+    config.analysis_mode = "description"
+    db.commit()
+
 @router.get("/pending-ai-config")
 async def get_pending_ai_config(db: Session = Depends(get_db)):
     """获取待确认的AI配置"""
@@ -130,6 +165,7 @@ async def apply_ai_config(
             raise HTTPException(status_code=400, detail="没有待应用的AI配置")
         
         # 应用配置
+        old_snapshot = RescoringService.snapshot_config(config)
         config = config_analysis_service.apply_ai_config(
             config, 
             config.pending_ai_config, 
@@ -137,10 +173,14 @@ async def apply_ai_config(
         )
         db.commit()
         
+        # 关键词/多空映射变化后重新评分受影响的新闻
+        rescore_task_id = RescoringService.schedule_if_needed(old_snapshot, config)
+        
         return {
             "success": True,
             "message": "AI配置已应用" if request.confirmed else "配置已更新",
-            "config": config.to_dict()
+            "config": config.to_dict(),
+            "rescore_task_id": rescore_task_id
         }
         
     except HTTPException:
@@ -191,6 +231,25 @@ async def reset_to_default(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"重置失败: {str(e)}")
 
+@router.get("/rescore/{task_id}")
+async def get_rescore_progress(task_id: str):
+    """查询重新评分任务进度"""
+    from app.services.tasks import rescore_news_for_config
+    result = rescore_news_for_config.AsyncResult(task_id)
+    
+    if result.state == "PROGRESS":
+        progress = result.info or {}
+    elif result.successful():
+        progress = result.result or {}
+    else:
+        progress = {}
+    
+    return {
+        "task_id": task_id,
+        "state": result.state,
+        "progress": progress
+    }
+
 # ========== 信息源偏好管理 ==========
 
 @router.get("/preferred-sources")
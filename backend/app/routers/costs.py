@@ -30,3 +30,11 @@ async def get_available_models():
     from app.llm import llm_engine
     models = llm_engine.get_available_models()
     return {"models": models}
+
+@router.get("/pricing")
+async def get_pricing(refresh: bool = False):
+    """模型价格表、汇率，以及 V-API 模型目录中尚未配置价格的模型"""
+    from app.llm.pricing import model_pricing
+    if refresh:
+        model_pricing.reload()
+    return model_pricing.snapshot()
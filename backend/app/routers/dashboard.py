@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 
 from app.database import get_db
 from app.services.news_service import NewsService, CostService
+from app.services.analysis_queue import AnalysisQueueService
 from app.models import News
 from app.schemas import DashboardStats
 
@@ -79,7 +80,22 @@ async def get_dashboard_stats(
         "total_requests": total_requests,
         "total_tokens": total_tokens,
         "active_crawlers": active_crawlers,
-        "recent_news": [news.to_dict() for news in date_news_list]
+        "recent_news": [news.to_dict() for news in date_news_list],
+        "analysis_queue": AnalysisQueueService.get_stats(db)
+    }
+
+@router.get("/analysis-queue")
+async def get_analysis_queue(limit: int = 20, db: Session = Depends(get_db)):
+    """分析队列状态：深度、等待时间、预算档位和排在最前的任务"""
+    from app.models import AnalysisJob
+    
+    top_jobs = db.query(AnalysisJob).filter(
+        AnalysisJob.status.in_(['queued', 'running', 'deferred'])
+    ).order_by(AnalysisJob.priority.desc(), AnalysisJob.enqueued_at).limit(limit).all()
+    
+    return {
+        **AnalysisQueueService.get_stats(db),
+        "jobs": [job.to_dict() for job in top_jobs]
     }
 
 @router.get("/trends")
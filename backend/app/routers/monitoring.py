@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from app.monitoring import metrics, metrics_aggregator, task_profiler
+
+router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+
+@router.get("/stats")
+async def get_stage_stats():
+    """获取各阶段延迟分位数与计数器"""
+    return metrics.snapshot()
+
+@router.get("/workers")
+async def get_worker_stats():
+    """各 Celery worker 进程最近上报的指标（需 MONITORING_BACKEND=redis）"""
+    return metrics_aggregator.snapshot()
+
+@router.get("/llm-router")
+async def get_llm_router_status():
+    """各LLM端点的延迟、错误率和熔断状态"""
+    from app.llm import llm_engine
+    return {
+        "endpoints": [endpoint.name for endpoint in llm_engine.router.endpoints],
+        "stats": llm_engine.router.snapshot(),
+    }
+
+@router.get("/prompts")
+async def get_prompt_templates():
+    """已注册的提示词模板及当前版本"""
+    from app.llm.prompts import prompt_registry
+    return {"templates": prompt_registry.list()}
+
+@router.get("/profiling")
+async def get_profiling_status():
+    """获取性能分析开关状态（MONITORING_BACKEND=redis 时开关对所有 worker 进程生效）"""
+    return task_profiler.status()
+
+@router.post("/profiling/{task}")
+async def enable_profiling(task: str, runs: Optional[int] = 1):
+    """开启指定任务的性能分析，runs 为空表示一直开启"""
+    if runs is not None and runs < 1:
+        raise HTTPException(status_code=400, detail="runs 必须大于0")
+    task_profiler.enable(task, runs)
+    return task_profiler.status()
+
+@router.delete("/profiling/{task}")
+async def disable_profiling(task: str):
+    """关闭指定任务的性能分析"""
+    task_profiler.disable(task)
+    return task_profiler.status()
+
+@router.get("/profiling/{task}/results")
+async def get_profiling_results(task: str):
+    """获取任务最近的性能分析报告"""
+    return {"task": task, "results": task_profiler.get_results(task)}
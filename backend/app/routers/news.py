@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -11,6 +12,8 @@ from app.schemas import (
 )
 from app.services.news_service import NewsService
 from app.services.news_filter import news_filter_service
+from app.services.analysis_queue import AnalysisQueueService
+from app.realtime import SSE_HEADERS, relay_events
 from app.scoring.engine import (
     calculate_decayed_score, calculate_position_bias, 
     generate_impact_analysis, get_time_ago, generate_brief_impact
@@ -188,6 +191,20 @@ async def search_news(
         "page_size": limit
     }
 
+@router.get("/search/stream")
+async def search_news_stream(
+    query: str = Query(..., description="搜索查询"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """流式搜索新闻（SSE）：每排出一条结果即推送 item 事件，最后推送 done 事件"""
+    return StreamingResponse(
+        relay_events(NewsService.search_news_stream(db, query, skip, limit)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.post("/{news_id}/regenerate-tags")
 async def regenerate_tags(
     news_id: int,
@@ -205,6 +222,10 @@ async def get_news(news_id: int, db: Session = Depends(get_db)):
     news = NewsService.get_news_by_id(db, news_id)
     if not news:
         raise HTTPException(status_code=404, detail="News not found")
+    
+    # 预筛选跳过的新闻在首次打开时按需分析
+    if news.analysis_type == 'skipped':
+        AnalysisQueueService.request_analysis(db, news)
     return news.to_dict()
 
 @router.post("", response_model=NewsResponse)
@@ -244,6 +265,10 @@ async def get_news_detail(
     if not news:
         raise HTTPException(status_code=404, detail="News not found")
     
+    # 预筛选跳过的新闻在首次打开时按需分析
+    if news.analysis_type == 'skipped':
+        AnalysisQueueService.request_analysis(db, news)
+    
     # 获取用户配置
     user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
     if not user_config:
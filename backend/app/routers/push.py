@@ -62,3 +62,9 @@ async def get_available_channels():
     from app.push import push_manager
     channels = push_manager.get_available_channels()
     return {"channels": channels}
+
+@router.get("/outbox/stats")
+async def get_outbox_stats(db: Session = Depends(get_db)):
+    """获取推送发件箱各状态的记录数"""
+    from app.services.push_outbox import PushOutboxService
+    return PushOutboxService.get_stats(db)
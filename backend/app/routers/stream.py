@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import asyncio
+import json
+
+from app.config import settings
+from app.realtime import SSE_HEADERS, FeedFilter, EventStream, format_sse, stream_broker
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+def _parse_last_event_id(header_value: Optional[str], query_value: Optional[str]) -> Optional[str]:
+    """Last-Event-ID 请求头优先，其次是 last_event_id 查询参数（便于脚本使用）"""
+    return (header_value or query_value or "").strip() or None
+
+async def _event_source(
+    request: Request,
+    stream: EventStream,
+    last_event_id: Optional[str],
+    feed_filter: Optional[FeedFilter] = None
+):
+    """SSE 生成器：先补发缓冲区中的事件，再实时转发"""
+    queue = stream.subscribe()
+    # 订阅后立即确定续传起点：之后到达的事件都在队列中
+    reason, sent_id, backlog = stream.resume(last_event_id)
+    try:
+        # 建议客户端的重连间隔
+        yield "retry: 3000\n\n"
+        
+        if reason:
+            yield format_sse(None, "reset", json.dumps({"reason": reason, "last_id": stream.event_id(stream.last_id)}))
+        
+        for event_id, event_type, data, text in backlog:
+            if feed_filter is None or feed_filter.matches(data):
+                yield format_sse(stream.event_id(event_id), event_type, text)
+            sent_id = event_id
+        
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=settings.SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            
+            # 消费过慢被断开，客户端按 Last-Event-ID 续传
+            if message is None:
+                break
+            
+            event_id, event_type, data, text = message
+            # 订阅与补发之间到达的事件可能已在补发中发送过
+            if event_id <= sent_id:
+                continue
+            if feed_filter is None or feed_filter.matches(data):
+                yield format_sse(stream.event_id(event_id), event_type, text)
+    finally:
+        stream.unsubscribe(queue)
+
+@router.get("/news")
+async def stream_news(
+    request: Request,
+    min_score: float = Query(0, ge=0, le=100, description="最低评分"),
+    position_bias: Optional[List[str]] = Query(None, description="多空方向: bullish/bearish/neutral"),
+    sources: Optional[List[str]] = Query(None, description="来源"),
+    keywords: Optional[List[str]] = Query(None, description="关键词"),
+    last_event_id: Optional[str] = Query(None, description="断线续传的起点（同 Last-Event-ID 请求头）"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """新闻实时流：新闻评分完成后立即推送（event: news，数据为信息流格式）"""
+    feed_filter = FeedFilter.from_dict({
+        "min_score": min_score,
+        "position_bias": position_bias,
+        "sources": sources,
+        "keywords": keywords,
+    })
+    return StreamingResponse(
+        _event_source(
+            request,
+            stream_broker.get("news"),
+            _parse_last_event_id(last_event_id_header, last_event_id),
+            feed_filter
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.get("/analysis")
+async def stream_analysis(
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="断线续传的起点（同 Last-Event-ID 请求头）"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """批量分析进度流（event: progress，含 job、job_id、status、processed、total）"""
+    return StreamingResponse(
+        _event_source(
+            request,
+            stream_broker.get("analysis"),
+            _parse_last_event_id(last_event_id_header, last_event_id)
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
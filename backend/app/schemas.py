@@ -136,7 +136,10 @@ class LLMCostResponse(BaseModel):
 class CostSummary(BaseModel):
     total_requests: int
     total_tokens: int
+    total_cost_usd: float = 0.0
     by_model: Dict[str, Dict[str, Any]]
+    by_stage: Dict[str, Dict[str, Any]] = {}  # 按调用环节（request_type）
+    by_source: Dict[str, Dict[str, Any]] = {}  # 按新闻来源
 
 class PushTestRequest(BaseModel):
     channel: str = Field(..., pattern="^(feishu|email)$")
@@ -174,6 +177,7 @@ class DashboardStats(BaseModel):
     total_tokens: int
     active_crawlers: int
     recent_news: List[NewsResponse]
+    analysis_queue: Optional[Dict[str, Any]] = None  # 分析队列深度、等待时间和预算档位
 
 class ImpactDimension(BaseModel):
     """影响维度数据"""
@@ -357,6 +361,7 @@ class UserConfigResponse(UserConfigBase):
     blocked_sources: List[str] = Field(default_factory=list)
     pending_ai_config: Dict[str, Any] = Field(default_factory=dict)
     last_config_analysis_at: Optional[datetime] = None
+    rescore_task_id: Optional[str] = None  # 配置变更触发的重新评分任务
     
     class Config:
         from_attributes = True
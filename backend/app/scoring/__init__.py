@@ -1,3 +1,4 @@
 from .engine import NewsScorer, ScoringEngine, ScoreWeights, scoring_engine
+from .cascade import CascadeDecision, CascadeFilter
 
-__all__ = ['NewsScorer', 'ScoringEngine', 'ScoreWeights', 'scoring_engine']
+__all__ = ['NewsScorer', 'ScoringEngine', 'ScoreWeights', 'scoring_engine', 'CascadeDecision', 'CascadeFilter']
@@ -0,0 +1,104 @@
+"""
+级联预筛选
+LLM分析前先用本地规则计算低成本评分（NewsScorer 规则评分、来源优先级、时效性、关键词/行业匹配），
+对所有用户都低于阈值、或被屏蔽来源/排除关键词命中的新闻不进入分析队列，
+标记为 skipped，用户首次打开时再按需分析
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.models import News
+from app.scoring.engine import NewsScorer, to_naive_utc
+
+# 本地评分各项权重（上限100）：规则评分(0-100)、来源优先级(1-10)、时效性(0-1)、关键词/行业命中
+RULE_SCORE_WEIGHT = 0.5
+SOURCE_PRIORITY_WEIGHT = 2.0
+FRESHNESS_WEIGHT = 15.0
+MATCH_WEIGHT = 25.0
+
+# 时效性在该时间内线性衰减到0
+FRESHNESS_HORIZON_HOURS = 24
+
+
+def freshness(news: News, now: Optional[datetime] = None, horizon_hours: float = FRESHNESS_HORIZON_HOURS) -> float:
+    """时效性 0-1：刚发布为1，horizon_hours 后为0"""
+    now = to_naive_utc(now) or datetime.utcnow()
+    # API/网页爬虫给出的发布时间可能带时区
+    published_at = to_naive_utc(news.published_at or news.crawled_at) or now
+    hours_ago = max(0.0, (now - published_at).total_seconds() / 3600)
+    return max(0.0, 1 - hours_ago / horizon_hours)
+
+
+@dataclass
+class CascadeDecision:
+    """预筛选结果"""
+    score: float  # 各用户中的最高本地评分
+    passed: bool
+    reason: str  # passed, below_threshold, blocked_source, excluded_keyword
+
+
+class CascadeFilter:
+    """按全部用户配置做本地预筛选，任一用户通过即进入LLM分析"""
+
+    def __init__(self, user_configs: List[Dict[str, Any]], min_score: Optional[float] = None):
+        # 没有用户配置时按无偏好的默认配置判断
+        self.profiles = [
+            (NewsScorer(config), set(config.get('blocked_sources') or []))
+            for config in (user_configs or [{}])
+        ]
+        self.min_score = settings.CASCADE_MIN_SCORE if min_score is None else min_score
+
+    def local_score(self, scorer: NewsScorer, news: News, source_priority: int = 5, now: Optional[datetime] = None) -> float:
+        """单个用户视角下的本地评分 0-100"""
+        item = {
+            'title': news.title or '',
+            'content': news.content or '',
+            'source': news.source or '',
+            'categories': news.categories or [],
+            'published_at': to_naive_utc(news.published_at),
+        }
+        result = scorer.calculate_final_score({}, item, now=now)
+        details = result['breakdown']['rule_details']
+
+        # 没有配置关键词和行业的用户视为全部相关
+        if not scorer.keywords and not scorer.industries:
+            matched = True
+        else:
+            matched = bool(details['keyword_matches'] or details['industry_matches'])
+
+        score = (
+            result['rule_score'] * RULE_SCORE_WEIGHT
+            + (source_priority or 5) * SOURCE_PRIORITY_WEIGHT
+            + freshness(news, now) * FRESHNESS_WEIGHT
+            + (MATCH_WEIGHT if matched else 0)
+        )
+        return round(min(100.0, score), 2)
+
+    def evaluate(self, news: News, source_priority: int = 5, now: Optional[datetime] = None) -> CascadeDecision:
+        if not settings.CASCADE_ENABLED:
+            return CascadeDecision(score=100.0, passed=True, reason='passed')
+
+        text = f"{news.title or ''} {news.content or ''}".lower()
+        best_score = 0.0
+        reasons = set()
+        for scorer, blocked_sources in self.profiles:
+            if news.source in blocked_sources:
+                reasons.add('blocked_source')
+                continue
+            if any(excluded.lower() in text for excluded in scorer.excluded_keywords):
+                reasons.add('excluded_keyword')
+                continue
+
+            score = self.local_score(scorer, news, source_priority, now)
+            best_score = max(best_score, score)
+            if score >= self.min_score:
+                return CascadeDecision(score=score, passed=True, reason='passed')
+            reasons.add('below_threshold')
+
+        # 所有用户都未通过时，优先报告低分原因
+        for reason in ('below_threshold', 'excluded_keyword', 'blocked_source'):
+            if reason in reasons:
+                return CascadeDecision(score=best_score, passed=False, reason=reason)
+        return CascadeDecision(score=best_score, passed=False, reason='below_threshold')
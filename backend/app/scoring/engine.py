@@ -1,8 +1,17 @@
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 import math
 
+from app.monitoring import metrics
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的时间转为不带时区的UTC时间（与 datetime.utcnow() 和数据库中的时间一致）"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @dataclass
 class ScoreWeights:
     """评分权重配置"""
@@ -29,21 +38,25 @@ class NewsScorer:
         self.categories = config.get('categories', [])
         self.excluded_keywords = config.get('excluded_keywords', [])
     
+    @metrics.timed("scoring")
     def calculate_final_score(
         self, 
         ai_scores: Dict[str, float],
-        news_item: Dict[str, Any]
+        news_item: Dict[str, Any],
+        now: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """
         计算最终综合评分
         
         总分 = AI评分 * AI权重 + 规则评分 * 规则权重
+        
+        now: 时效性加分的参考时间，默认当前时间（重新评分时传入抓取时间）
         """
         # 1. 计算AI综合评分
         ai_score = self._calculate_ai_composite_score(ai_scores)
         
         # 2. 计算规则评分
-        rule_score = self._calculate_rule_score(news_item)
+        rule_score = self._calculate_rule_score(news_item, now)
         
         # 3. 加权计算最终分数
         final_score = (
@@ -60,7 +73,7 @@ class NewsScorer:
             'rule_score': round(rule_score, 2),
             'breakdown': {
                 'ai_component': ai_scores,
-                'rule_details': self._get_rule_details(news_item),
+                'rule_details': self._get_rule_details(news_item, now),
             },
             'factors': {
                 'ai_weight': self.weights.ai_weight,
@@ -83,7 +96,7 @@ class NewsScorer:
         
         return weighted_sum
     
-    def _calculate_rule_score(self, news_item: Dict[str, Any]) -> float:
+    def _calculate_rule_score(self, news_item: Dict[str, Any], now: Optional[datetime] = None) -> float:
         """基于规则的评分"""
         score = 0
         
@@ -126,7 +139,7 @@ class NewsScorer:
             try:
                 if isinstance(published_at, str):
                     published_at = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-                hours_ago = (datetime.utcnow() - published_at).total_seconds() / 3600
+                hours_ago = ((now or datetime.utcnow()) - published_at).total_seconds() / 3600
                 if hours_ago < 1:
                     score += 10  # 1小时内
                 elif hours_ago < 6:
@@ -141,7 +154,7 @@ class NewsScorer:
         
         return max(0, min(100, score))
     
-    def _get_rule_details(self, news_item: Dict[str, Any]) -> Dict[str, Any]:
+    def _get_rule_details(self, news_item: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
         """获取规则评分详情"""
         details = {
             'keyword_matches': [],
@@ -193,7 +206,7 @@ class NewsScorer:
             try:
                 if isinstance(published_at, str):
                     published_at = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-                hours_ago = (datetime.utcnow() - published_at).total_seconds() / 3600
+                hours_ago = ((now or datetime.utcnow()) - published_at).total_seconds() / 3600
                 if hours_ago < 1:
                     details['timeliness_bonus'] = 10
                 elif hours_ago < 6:
@@ -257,7 +270,17 @@ class ScoringEngine:
 scoring_engine = ScoringEngine()
 
 
-def calculate_decayed_score(final_score: float, crawled_at: datetime, half_life_hours: float = 24.0) -> float:
+# 时间衰减常数（小时）
+DECAY_HALF_LIFE_HOURS = 24.0
+
+# 排序键的时间基准，减小浮点数量级
+_DECAY_RANK_EPOCH = datetime(2020, 1, 1)
+
+# final_score为0时取对数的下限
+_MIN_RANK_SCORE = 1e-6
+
+
+def calculate_decayed_score(final_score: float, crawled_at: datetime, half_life_hours: float = DECAY_HALF_LIFE_HOURS) -> float:
     """计算时间衰减后的评分
     
     使用指数衰减公式：decayed_score = final_score * exp(-hours_ago / half_life_hours)
@@ -290,6 +313,25 @@ def calculate_decayed_score(final_score: float, crawled_at: datetime, half_life_
     return round(decayed_score, 2)
 
 
+def calculate_decay_rank_key(final_score: float, crawled_at: datetime, half_life_hours: float = DECAY_HALF_LIFE_HOURS) -> float:
+    """计算时间衰减排序键（与当前时间无关，可持久化并建索引）
+    
+    final_score * exp(-(now - t) / τ) 按 now 取公因子后与 log(final_score) + t / τ 单调等价，
+    因此按该键降序即为按 calculate_decayed_score 降序，Top-K 可直接走索引。
+    
+    Args:
+        final_score: 原始综合评分
+        crawled_at: 抓取时间
+        half_life_hours: 衰减常数（小时），需与 calculate_decayed_score 一致
+    
+    Returns:
+        排序键
+    """
+    score = max(final_score or 0.0, _MIN_RANK_SCORE)
+    hours = (crawled_at - _DECAY_RANK_EPOCH).total_seconds() / 3600
+    return math.log(score) + hours / half_life_hours
+
+
 def calculate_position_bias(
     sentiment: str,
     market_impact: float,
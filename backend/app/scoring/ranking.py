@@ -0,0 +1,31 @@
+"""
+信息流排序引擎
+在数据库中按时间衰减评分排序，避免先按原始分数取页再在Python中衰减
+"""
+from sqlalchemy.orm import Query
+
+from app.models import News
+from app.scoring.engine import (
+    DECAY_HALF_LIFE_HOURS, calculate_decayed_score
+)
+
+
+class FeedRankingEngine:
+    """信息流排序引擎
+    
+    News.decay_rank_key = log(final_score) + t/τ 在写入时维护并建有索引，
+    按其降序即为按 calculate_decayed_score 降序，Top-K 为一次索引扫描。
+    """
+    
+    half_life_hours = DECAY_HALF_LIFE_HOURS
+    
+    def order_by_decayed_score(self, query: Query) -> Query:
+        """按时间衰减评分降序排序"""
+        return query.order_by(News.decay_rank_key.desc(), News.id.desc())
+    
+    def decayed_score(self, news: News) -> float:
+        """计算单条新闻当前的时间衰减评分（与排序结果一致）"""
+        return calculate_decayed_score(news.final_score or 0.0, news.crawled_at, self.half_life_hours)
+
+# 全局排序引擎实例
+feed_ranking_engine = FeedRankingEngine()
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+LLM分析队列服务
+新闻入库后写入分析队列，按来源优先级、规则预评分、时效性和同类报道数计算优先级，
+由后台任务按优先级领取分析；当月预算消耗到一定比例后依次降级为低价模型单次分析、
+只分析标题，预算用尽时延后，下月预算重置后恢复
+"""
+import asyncio
+import math
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import AnalysisJob, News, UserConfig
+from app.monitoring import metrics
+from app.scoring.cascade import freshness
+
+# 优先级各项权重：来源优先级(1-10)、规则预评分(0-100)、时效性(0-1)、同类报道数(对数)
+SOURCE_PRIORITY_WEIGHT = 3.0
+RULE_SCORE_WEIGHT = 0.4
+FRESHNESS_WEIGHT = 20.0
+CLUSTER_WEIGHT = 5.0
+CLUSTER_BONUS_MAX = 15.0
+
+# 同类报道：近24小时内标题字符二元组的 Jaccard 相似度不低于该值
+CLUSTER_SIMILARITY = 0.5
+CLUSTER_WINDOW_HOURS = 24
+CLUSTER_SCAN_LIMIT = 500
+
+# 用户打开被预筛选跳过的新闻时使用的优先级（排在所有自动任务之前）
+ON_DEMAND_PRIORITY = 1000.0
+
+# 分析中任务的租约时长
+RUNNING_LEASE_SECONDS = 600
+
+# 分析档位
+TIER_FULL = 'full'  # 默认模型，逐项分析（摘要/分类/评分/关键词/情感）
+TIER_BUDGET = 'budget'  # 低价模型，单次合并分析
+TIER_TITLE_ONLY = 'title_only'  # 低价模型，只分析标题
+TIER_DEFERRED = 'deferred'  # 延后到预算恢复
+
+
+def _title_shingles(title: str) -> Set[str]:
+    """标题的字符二元组（去掉空白和标点，中英文通用）"""
+    text = re.sub(r'[\W_]+', '', (title or '').lower())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class AnalysisQueueService:
+    """LLM分析队列服务"""
+
+    @staticmethod
+    def compute_priority(
+        news: News,
+        source_priority: int = 5,
+        cluster_size: int = 1,
+        now: Optional[datetime] = None
+    ) -> float:
+        """任务优先级，越大越先分析"""
+        cluster_bonus = min(CLUSTER_BONUS_MAX, CLUSTER_WEIGHT * math.log2(max(1, cluster_size)))
+
+        return round(
+            (source_priority or 5) * SOURCE_PRIORITY_WEIGHT
+            + (news.rule_score or 0) * RULE_SCORE_WEIGHT
+            + freshness(news, now) * FRESHNESS_WEIGHT
+            + cluster_bonus,
+            2
+        )
+
+    @staticmethod
+    def cluster_sizes(db: Session, news_list: List[News]) -> Dict[int, int]:
+        """各新闻在近24小时内的同类报道数（含自身）"""
+        since = datetime.utcnow() - timedelta(hours=CLUSTER_WINDOW_HOURS)
+        batch_ids = {news.id for news in news_list}
+        recent = [
+            _title_shingles(title)
+            for news_id, title in db.query(News.id, News.title).filter(
+                News.crawled_at >= since
+            ).order_by(News.crawled_at.desc()).limit(CLUSTER_SCAN_LIMIT)
+            if news_id not in batch_ids
+        ]
+        batch = [(news.id, _title_shingles(news.title)) for news in news_list]
+
+        sizes = {}
+        for news_id, shingles in batch:
+            size = 1
+            size += sum(1 for other in recent if _jaccard(shingles, other) >= CLUSTER_SIMILARITY)
+            size += sum(1 for other_id, other in batch if other_id != news_id and _jaccard(shingles, other) >= CLUSTER_SIMILARITY)
+            sizes[news_id] = size
+        return sizes
+
+    @staticmethod
+    def enqueue(db: Session, news_list: List[News], source_priority: int = 5) -> int:
+        """
+        为新入库的新闻写入分析任务（不提交事务，由调用方与新闻一起提交）
+
+        Returns:
+            新增的任务数
+        """
+        news_list = [news for news in news_list if news.id is not None and not news.is_analyzed]
+        if not news_list:
+            return 0
+
+        queued = {
+            row.news_id for row in db.query(AnalysisJob.news_id).filter(
+                AnalysisJob.news_id.in_([news.id for news in news_list])
+            )
+        }
+        news_list = [news for news in news_list if news.id not in queued]
+        if not news_list:
+            return 0
+
+        now = datetime.utcnow()
+        sizes = AnalysisQueueService.cluster_sizes(db, news_list)
+        for news in news_list:
+            cluster_size = sizes.get(news.id, 1)
+            db.add(AnalysisJob(
+                news_id=news.id,
+                priority=AnalysisQueueService.compute_priority(news, source_priority, cluster_size, now),
+                cluster_size=cluster_size,
+                status='queued',
+                attempts=0,
+                enqueued_at=now
+            ))
+        metrics.inc("analysis_jobs_enqueued_total", len(news_list))
+        return len(news_list)
+
+    @staticmethod
+    def request_analysis(db: Session, news: News) -> bool:
+        """
+        按需分析：用户打开被预筛选跳过的新闻时以最高优先级写入队列并触发处理
+
+        预算档位仍然生效（预算用尽时任务会被延后）
+
+        Returns:
+            是否已在队列中或已提交
+        """
+        if news.is_analyzed:
+            return False
+
+        job = db.query(AnalysisJob).filter(AnalysisJob.news_id == news.id).first()
+        if job is None:
+            job = AnalysisJob(news_id=news.id, cluster_size=1, status='queued', attempts=0, enqueued_at=datetime.utcnow())
+            db.add(job)
+        elif job.status in ('running', 'failed', 'done'):
+            return job.status == 'running'
+        if (job.priority or 0) >= ON_DEMAND_PRIORITY:
+            return True
+
+        job.priority = ON_DEMAND_PRIORITY
+        db.commit()
+        metrics.inc("analysis_on_demand_total")
+
+        from app.services.tasks import process_analysis_queue
+        process_analysis_queue.delay()
+        return True
+
+    @staticmethod
+    def admission_tier(budget_percentage: float, priority: float) -> str:
+        """按当月预算消耗比例和任务优先级决定分析档位"""
+        if budget_percentage >= 100:
+            return TIER_DEFERRED
+        if budget_percentage >= settings.ANALYSIS_BUDGET_TITLE_ONLY_PCT:
+            if priority < settings.ANALYSIS_TITLE_ONLY_MIN_PRIORITY:
+                return TIER_DEFERRED
+            return TIER_TITLE_ONLY
+        if budget_percentage >= settings.ANALYSIS_BUDGET_DOWNGRADE_PCT:
+            return TIER_BUDGET
+        return TIER_FULL
+
+    @staticmethod
+    def apply_admission(db: Session, budget_percentage: float) -> Dict[str, int]:
+        """
+        按预算批量调整排队状态：应延后的任务标记为 deferred，
+        预算恢复（如进入新的月份）后把可处理的延后任务放回队列
+        """
+        if budget_percentage >= 100:
+            deferrable = AnalysisJob.status == 'queued'
+            restorable = None
+        elif budget_percentage >= settings.ANALYSIS_BUDGET_TITLE_ONLY_PCT:
+            min_priority = settings.ANALYSIS_TITLE_ONLY_MIN_PRIORITY
+            deferrable = and_(AnalysisJob.status == 'queued', AnalysisJob.priority < min_priority)
+            restorable = and_(AnalysisJob.status == 'deferred', AnalysisJob.priority >= min_priority)
+        else:
+            deferrable = None
+            restorable = AnalysisJob.status == 'deferred'
+
+        deferred = restored = 0
+        if deferrable is not None:
+            deferred = db.query(AnalysisJob).filter(deferrable).update({'status': 'deferred'}, synchronize_session=False)
+        if restorable is not None:
+            restored = db.query(AnalysisJob).filter(restorable).update({'status': 'queued'}, synchronize_session=False)
+        db.commit()
+        return {'deferred': deferred, 'restored': restored}
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            AnalysisJob.status == 'queued',
+            # 分析中但租约已过期（worker 崩溃或超时）
+            and_(AnalysisJob.status == 'running', AnalysisJob.lease_until <= now),
+        )
+
+    @staticmethod
+    def claim_next(db: Session, budget_percentage: float, limit: int) -> List[AnalysisJob]:
+        """
+        按优先级领取任务并标记为分析中，同时确定每个任务的分析档位
+
+        逐条条件更新，多个 worker 并发处理时每个任务只会被一个 worker 领取
+        """
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=RUNNING_LEASE_SECONDS)
+        candidates = db.query(AnalysisJob.id, AnalysisJob.priority).filter(
+            AnalysisQueueService._claimable(now)
+        ).order_by(AnalysisJob.priority.desc(), AnalysisJob.enqueued_at).limit(limit).all()
+
+        claimed_ids = []
+        for job_id, priority in candidates:
+            tier = AnalysisQueueService.admission_tier(budget_percentage, priority or 0)
+            if tier == TIER_DEFERRED:
+                continue
+            updated = db.query(AnalysisJob).filter(
+                AnalysisJob.id == job_id,
+                AnalysisQueueService._claimable(now)
+            ).update({
+                'status': 'running',
+                'tier': tier,
+                'model': settings.DEFAULT_LLM_MODEL if tier == TIER_FULL else settings.ANALYSIS_BUDGET_MODEL,
+                'started_at': now,
+                'lease_until': lease_until,
+                'attempts': AnalysisJob.attempts + 1,
+            }, synchronize_session=False)
+            if updated:
+                claimed_ids.append(job_id)
+        db.commit()
+
+        if not claimed_ids:
+            return []
+        jobs = db.query(AnalysisJob).filter(AnalysisJob.id.in_(claimed_ids)).all()
+        for job in jobs:
+            metrics.observe("analysis_queue_wait_seconds", (now - job.enqueued_at).total_seconds(), tier=job.tier)
+        return sorted(jobs, key=lambda job: -(job.priority or 0))
+
+    @staticmethod
+    def apply_full_result(news: News, ai_result: Dict[str, Any]):
+        """写入逐项分析（process_news）的结果"""
+        if 'error' in ai_result:
+            print(f"AI分析错误: {ai_result['error']}")
+            # 即使有错误，也更新可用的结果
+        if 'summary' in ai_result:
+            news.summary = ai_result['summary']
+        if 'categories' in ai_result:
+            news.categories = ai_result['categories']
+        if 'keywords' in ai_result:
+            news.keywords = ai_result['keywords']
+        if 'sentiment' in ai_result:
+            news.sentiment = ai_result['sentiment']
+        if 'scores' in ai_result:
+            scores = ai_result['scores']
+            news.ai_score = sum(scores.values()) / len(scores) if scores else 50
+            news.market_impact = scores.get('market_impact', 50)
+            news.industry_relevance = scores.get('industry_relevance', 50)
+            news.novelty_score = scores.get('novelty_score', 50)
+            news.urgency = scores.get('urgency', 50)
+
+        news.is_analyzed = True
+        news.analyzed_at = datetime.utcnow()
+        news.analysis_type = 'full'
+        news.llm_model_used = ai_result.get('model_used')
+        news.prompt_versions = ai_result.get('prompt_versions')
+
+    @staticmethod
+    def apply_brief_result(news: News, analysis_result: Dict[str, Any], analysis_type: str = 'vapi'):
+        """写入单次合并分析（brief_analyze_with_vapi）的结果"""
+        news.summary = analysis_result.get('summary', '')
+        news.keywords = analysis_result.get('keywords', [])
+        news.sentiment = analysis_result.get('sentiment', 'neutral')
+        news.categories = analysis_result.get('categories', [])
+        news.ai_score = analysis_result.get('importance', 50)
+        news.final_score = analysis_result.get('importance', 50)
+
+        # 多空分析
+        news.position_bias = analysis_result.get('position_bias', 'neutral')
+        news.position_magnitude = analysis_result.get('position_magnitude', 0)
+
+        # 各维度评分
+        news.market_impact = analysis_result.get('market_impact', 50)
+        news.industry_relevance = analysis_result.get('industry_relevance', 50)
+        news.novelty_score = analysis_result.get('novelty_score', 50)
+        news.urgency = analysis_result.get('urgency', 50)
+
+        news.is_analyzed = True
+        news.analyzed_at = datetime.utcnow()
+        news.analysis_type = analysis_type
+        news.llm_model_used = analysis_result.get('model_used', 'vapi')
+        news.prompt_versions = analysis_result.get('prompt_versions')
+
+    @staticmethod
+    async def _analyze(job: AnalysisJob, news: News) -> Dict[str, Any]:
+        """按档位调用LLM，返回分析结果（含 input_tokens / output_tokens / cached_tokens）"""
+        from app.llm import llm_engine
+
+        with metrics.span("analysis", tier=job.tier):
+            if job.tier == TIER_FULL:
+                result = await llm_engine.process_news(news.title, news.content or '', model=job.model)
+                cost = result.get('cost') or {}
+                return {
+                    **result,
+                    'input_tokens': cost.get('input_tokens', 0),
+                    'output_tokens': cost.get('output_tokens', 0),
+                    'cached_tokens': cost.get('cached_tokens', 0),
+                }
+
+            content = '' if job.tier == TIER_TITLE_ONLY else (news.content or '')
+            result = await llm_engine.brief_analyze_with_vapi(title=news.title, content=content, model=job.model)
+            if result.get('error'):
+                raise RuntimeError(result['error'])
+            return result
+
+    @staticmethod
+    def _packable(job: AnalysisJob, news: Optional[News]) -> bool:
+        """只分析标题或正文较短的新闻可与其他新闻打包分析"""
+        if news is None:
+            return False
+        return job.tier == TIER_TITLE_ONLY or len(news.content or '') <= settings.LLM_BATCH_ITEM_MAX_CHARS
+
+    @staticmethod
+    async def _analyze_packed(
+        model: str,
+        jobs: List[AnalysisJob],
+        news_by_id: Dict[int, News],
+        semaphore: asyncio.Semaphore
+    ) -> Dict[int, Any]:
+        """打包分析同一模型的一组任务，返回 {任务ID: 结果或异常}"""
+        from app.llm import llm_engine
+
+        items = [
+            {
+                'id': job.news_id,
+                'title': news_by_id[job.news_id].title,
+                'content': '' if job.tier == TIER_TITLE_ONLY else (news_by_id[job.news_id].content or ''),
+            }
+            for job in jobs
+        ]
+        try:
+            async with semaphore:
+                with metrics.span("analysis", tier='batch'):
+                    results = await llm_engine.analyze_batch(items, model)
+        except Exception as e:
+            return {job.id: e for job in jobs}
+
+        outcome = {}
+        for job in jobs:
+            result = results.get(job.news_id)
+            if result is None:
+                outcome[job.id] = RuntimeError('打包分析未返回结果')
+            elif result.get('error'):
+                outcome[job.id] = RuntimeError(result['error'])
+            else:
+                outcome[job.id] = result
+        return outcome
+
+    @staticmethod
+    def _request_type(job: AnalysisJob, packed: bool) -> str:
+        """成本记录的请求类型"""
+        if packed:
+            return 'news_analysis_batch' if job.tier == TIER_FULL else f'news_analysis_batch_{job.tier}'
+        return 'news_analysis' if job.tier == TIER_FULL else f'news_analysis_{job.tier}'
+
+    @staticmethod
+    def _finish(job: AnalysisJob, error: Optional[str] = None, now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        job.lease_until = None
+        if error is None:
+            job.status = 'done'
+            job.finished_at = now
+            job.last_error = None
+        elif (job.attempts or 0) >= settings.ANALYSIS_QUEUE_MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.finished_at = now
+            job.last_error = error
+        else:
+            job.status = 'queued'
+            job.last_error = error
+        metrics.inc("analysis_jobs_total", tier=job.tier, status=job.status)
+
+    @staticmethod
+    async def process(db: Session, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        处理一批分析任务：先按预算调整延后状态，再按优先级领取并发分析
+
+        分析结果、成本记录、关联度和推送发件箱在同一事务中提交，提交后发布评分事件
+        """
+        from app.llm import llm_engine
+        from app.scoring import scoring_engine, NewsScorer
+        from app.services.news_service import CostService
+        from app.services.news_filter import NewsFilterService
+        from app.services.push_outbox import PushOutboxService
+        from app.services.rescoring import RescoringService
+        from app.events import publish_news_scored
+
+        limit = limit or settings.ANALYSIS_QUEUE_BATCH_SIZE
+        budget = CostService.check_budget(db)
+        admission = AnalysisQueueService.apply_admission(db, budget['percentage'])
+        jobs = AnalysisQueueService.claim_next(db, budget['percentage'], limit)
+        if not jobs:
+            return {'claimed': 0, 'analyzed': 0, 'retrying': 0, 'failed': 0, 'budget_percentage': budget['percentage'], **admission}
+
+        news_by_id = {
+            news.id: news
+            for news in db.query(News).filter(News.id.in_([job.news_id for job in jobs]))
+        }
+        semaphore = asyncio.Semaphore(settings.ANALYSIS_QUEUE_CONCURRENCY)
+
+        async def run(job: AnalysisJob):
+            news = news_by_id.get(job.news_id)
+            if news is None:
+                raise LookupError('新闻不存在')
+            async with semaphore:
+                return await AnalysisQueueService._analyze(job, news)
+
+        # 短讯和只分析标题的任务按模型打包，一次请求分析多条
+        packable = [job for job in jobs if AnalysisQueueService._packable(job, news_by_id.get(job.news_id))]
+        packed_ids = {job.id for job in packable}
+        single_jobs = [job for job in jobs if job.id not in packed_ids]
+        by_model: Dict[str, List[AnalysisJob]] = {}
+        for job in packable:
+            by_model.setdefault(job.model, []).append(job)
+
+        single_results, packed_results = await asyncio.gather(
+            asyncio.gather(*(run(job) for job in single_jobs), return_exceptions=True),
+            asyncio.gather(*(
+                AnalysisQueueService._analyze_packed(model, group, news_by_id, semaphore)
+                for model, group in by_model.items()
+            ))
+        )
+        results_by_job: Dict[int, Any] = dict(zip((job.id for job in single_jobs), single_results))
+        for group_results in packed_results:
+            results_by_job.update(group_results)
+        results = [results_by_job[job.id] for job in jobs]
+
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
+        scorer = scoring_engine.create_scorer("default", user_config.to_dict()) if user_config else NewsScorer({})
+
+        now = datetime.utcnow()
+        analyzed = []
+        for job, result in zip(jobs, results):
+            news = news_by_id.get(job.news_id)
+            if isinstance(result, BaseException):
+                print(f"分析新闻失败 (ID: {job.news_id}): {result}")
+                AnalysisQueueService._finish(job, str(result), now)
+                if isinstance(result, LookupError):
+                    job.status = 'failed'
+                continue
+
+            if job.id in packed_ids:
+                AnalysisQueueService.apply_brief_result(news, result, analysis_type='batch' if job.tier == TIER_FULL else job.tier)
+            elif job.tier == TIER_FULL:
+                AnalysisQueueService.apply_full_result(news, result)
+            else:
+                AnalysisQueueService.apply_brief_result(news, result, analysis_type=job.tier)
+
+            if result.get('input_tokens') or result.get('output_tokens'):
+                cost = llm_engine.calculate_cost(
+                    job.model, result.get('input_tokens', 0), result.get('output_tokens', 0), result.get('cached_tokens', 0)
+                )
+                CostService.record_cost(
+                    db,
+                    model=job.model,
+                    provider=llm_engine.provider_of(job.model),
+                    prompt_tokens=cost['input_tokens'],
+                    completion_tokens=cost['output_tokens'],
+                    cached_tokens=cost['cached_tokens'],
+                    cost_usd=cost['cost_usd'],
+                    cost_cny=cost['cost_cny'],
+                    request_type=AnalysisQueueService._request_type(job, job.id in packed_ids),
+                    source=news.source,
+                    news_id=news.id
+                )
+
+            RescoringService.rescore_news(news, scorer)
+            AnalysisQueueService._finish(job, now=now)
+            analyzed.append(news)
+
+        NewsFilterService.store_relevance_for_all_users(db, analyzed)
+        PushOutboxService.enqueue(db, analyzed, user_config)
+        db.commit()
+
+        # 发布评分事件，推送、实时订阅等由订阅者处理
+        publish_news_scored(analyzed)
+
+        statuses = [job.status for job in jobs]
+        return {
+            'claimed': len(jobs),
+            'analyzed': statuses.count('done'),
+            'retrying': statuses.count('queued'),
+            'failed': statuses.count('failed'),
+            'budget_percentage': budget['percentage'],
+            **admission
+        }
+
+    @staticmethod
+    def pending_news_ids(db: Session):
+        """排队或分析中的新闻ID子查询"""
+        return db.query(AnalysisJob.news_id).filter(AnalysisJob.status.in_(['queued', 'running', 'deferred']))
+
+    @staticmethod
+    def get_stats(db: Session) -> Dict[str, Any]:
+        """队列深度、等待时间和当前预算档位（仪表盘展示）"""
+        from app.services.news_service import CostService
+
+        now = datetime.utcnow()
+        by_status = {
+            status: count
+            for status, count in db.query(AnalysisJob.status, func.count(AnalysisJob.id)).group_by(AnalysisJob.status)
+        }
+        oldest_queued = db.query(func.min(AnalysisJob.enqueued_at)).filter(AnalysisJob.status == 'queued').scalar()
+
+        since = now - timedelta(hours=1)
+        started = db.query(AnalysisJob.enqueued_at, AnalysisJob.started_at, AnalysisJob.tier).filter(
+            AnalysisJob.started_at >= since
+        ).all()
+        waits = sorted((started_at - enqueued_at).total_seconds() for enqueued_at, started_at, _ in started)
+        by_tier: Dict[str, int] = {}
+        for _, _, tier in started:
+            by_tier[tier] = by_tier.get(tier, 0) + 1
+
+        percentage = CostService.check_budget(db)['percentage']
+        # 当前预算下高优先级任务的分析档位
+        admission = AnalysisQueueService.admission_tier(percentage, float('inf'))
+
+        return {
+            'depth': by_status.get('queued', 0) + by_status.get('running', 0),
+            'queued': by_status.get('queued', 0),
+            'running': by_status.get('running', 0),
+            'deferred': by_status.get('deferred', 0),
+            'failed': by_status.get('failed', 0),
+            'oldest_wait_seconds': round((now - oldest_queued).total_seconds(), 1) if oldest_queued else 0,
+            'avg_wait_seconds': round(sum(waits) / len(waits), 1) if waits else 0,
+            'p95_wait_seconds': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0,
+            'started_last_hour': len(waits),
+            'by_tier': by_tier,
+            'admission': admission,
+            'budget_percentage': percentage,
+        }
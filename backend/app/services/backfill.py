@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+离线回填服务
+历史新闻的补充分析和重新分析不走实时分析队列：按块生成 JSONL 请求文件并登记为批处理作业，
+由定时任务逐步推进 pending -> submitted -> completed -> applied，结果按断点分段写回。
+作业中的新闻在作业结束前不会被再次选中，排队中的新闻留给实时队列处理
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import LLMBatchJob, News, UserConfig
+from app.monitoring import metrics
+from app.services.analysis_queue import AnalysisQueueService
+
+# 尚未结束的作业状态（其中的新闻不会再被选入新作业）
+ACTIVE_STATUSES = ('pending', 'submitted', 'completed')
+
+CUSTOM_ID_PREFIX = 'news-'
+
+
+class BackfillService:
+    """离线批处理回填"""
+
+    @staticmethod
+    def active_news_ids(db: Session) -> Set[int]:
+        """未结束作业中包含的新闻ID"""
+        news_ids: Set[int] = set()
+        for (ids,) in db.query(LLMBatchJob.news_ids).filter(LLMBatchJob.status.in_(ACTIVE_STATUSES)):
+            news_ids.update(ids or [])
+        return news_ids
+
+    @staticmethod
+    def select_news(
+        db: Session,
+        only_missing: bool = True,
+        days: Optional[int] = 30,
+        limit: Optional[int] = None,
+        stale_prompts: bool = False
+    ) -> List[News]:
+        """
+        选出需要回填的新闻（按ID升序）
+
+        Args:
+            only_missing: 只选未分析或AI评分为0的新闻；否则重新分析时间范围内的全部新闻
+            days: 只选最近N天入库的新闻，None 表示不限
+            stale_prompts: 再加上分析时使用的提示词模板已有新版本（或未记录版本）的新闻
+        """
+        from app.llm.prompts import prompt_registry
+
+        query = db.query(News).filter(
+            News.title.isnot(None),
+            or_(News.analysis_type.is_(None), News.analysis_type != 'skipped'),
+            ~News.id.in_(AnalysisQueueService.pending_news_ids(db))
+        )
+        missing = or_(News.is_analyzed == False, News.ai_score.is_(None), News.ai_score == 0)
+        if only_missing and not stale_prompts:
+            query = query.filter(missing)
+        if days:
+            query = query.filter(News.crawled_at >= datetime.utcnow() - timedelta(days=days))
+
+        exclude = BackfillService.active_news_ids(db)
+        selected = []
+        for news in query.order_by(News.id).yield_per(500):
+            if news.id in exclude:
+                continue
+            # 模板版本记录在 JSON 字段中，逐条比较
+            if stale_prompts and news.is_analyzed and news.ai_score and not prompt_registry.is_stale(news.prompt_versions):
+                continue
+            selected.append(news)
+            if limit and len(selected) >= limit:
+                break
+        return selected
+
+    @staticmethod
+    def create_jobs(
+        db: Session,
+        name: str,
+        only_missing: bool = True,
+        days: Optional[int] = 30,
+        limit: Optional[int] = None,
+        model: Optional[str] = None,
+        provider: Optional[str] = None,
+        stale_prompts: bool = False
+    ) -> List[LLMBatchJob]:
+        """按 BACKFILL_CHUNK_SIZE 切块生成请求文件并登记作业（每块单独提交，中断后重跑不会重复）"""
+        from app.llm import llm_engine
+        from app.llm.batch import build_request, write_jsonl
+        from app.llm.prompts import prompt_registry
+
+        model = model or settings.BACKFILL_MODEL or llm_engine.default_model
+        if model not in llm_engine.AVAILABLE_MODELS:
+            model = llm_engine.default_model
+        provider = provider or settings.BACKFILL_PROVIDER
+
+        news_list = BackfillService.select_news(
+            db, only_missing=only_missing, days=days, limit=limit, stale_prompts=stale_prompts
+        )
+        prompt_version = prompt_registry.version('brief')
+        jobs = []
+        for start in range(0, len(news_list), settings.BACKFILL_CHUNK_SIZE):
+            chunk = news_list[start:start + settings.BACKFILL_CHUNK_SIZE]
+            job = LLMBatchJob(name=name, provider=provider, model=model, prompt_version=prompt_version, status='pending')
+            db.add(job)
+            db.flush()
+
+            job.input_file = os.path.join(settings.BACKFILL_DIR, f"job-{job.id}.jsonl")
+            job.output_file = os.path.join(settings.BACKFILL_DIR, f"job-{job.id}.output.jsonl")
+            write_jsonl(job.input_file, [
+                build_request(
+                    f"{CUSTOM_ID_PREFIX}{news.id}",
+                    llm_engine.AVAILABLE_MODELS[model]['model'],
+                    llm_engine.brief_messages(news.title, llm_engine.fit_content(news.content, model, 'brief')),
+                    temperature=0.3,
+                    max_tokens=400,
+                    **llm_engine.json_mode_params(model),
+                )
+                for news in chunk
+            ])
+            job.news_ids = [news.id for news in chunk]
+            job.request_count = len(chunk)
+            db.commit()
+            jobs.append(job)
+
+        metrics.inc("backfill_requests_total", len(news_list), job=name)
+        return jobs
+
+    @staticmethod
+    def start(db: Session, name: str, **options) -> Dict[str, Any]:
+        """登记回填作业并立即触发一次推进（后续由定时任务继续）"""
+        from app.services.tasks import run_backfill_jobs
+
+        jobs = BackfillService.create_jobs(db, name, **options)
+        if jobs:
+            run_backfill_jobs.delay()
+        return {
+            'jobs': [job.to_dict() for job in jobs],
+            'requests': sum(job.request_count for job in jobs),
+        }
+
+    @staticmethod
+    async def advance(db: Session, job: LLMBatchJob, budget_percentage: float = 0.0) -> LLMBatchJob:
+        """推进单个作业一步；预算接近用尽时暂停提交和本地执行，已完成的结果照常写回"""
+        from app.llm import get_batch_provider
+
+        paused = budget_percentage >= settings.ANALYSIS_BUDGET_TITLE_ONLY_PCT
+        provider = get_batch_provider(job.provider)
+        try:
+            if job.status == 'pending' and not paused:
+                job.provider_batch_id = await provider.submit(job.input_file)
+                job.status = 'submitted'
+                job.submitted_at = datetime.utcnow()
+                job.error = None
+                db.commit()
+            elif job.status == 'submitted' and not (paused and job.provider == 'local'):
+                result = await provider.retrieve(job.provider_batch_id, job.input_file, job.output_file)
+                job.completed_count = result.get('completed', job.completed_count)
+                if result['status'] == 'failed':
+                    job.status = 'failed'
+                    job.error = result.get('error')
+                elif result['status'] == 'completed':
+                    job.status = 'completed'
+                    job.completed_at = datetime.utcnow()
+                db.commit()
+
+            if job.status == 'completed':
+                BackfillService.apply_results(db, job, price_ratio=provider.price_ratio)
+        except Exception as e:
+            db.rollback()
+            print(f"回填作业 {job.id} 推进失败: {e}")
+            job.error = str(e)
+            db.commit()
+        return job
+
+    @staticmethod
+    def apply_results(db: Session, job: LLMBatchJob, price_ratio: float = 1.0) -> LLMBatchJob:
+        """
+        从断点（applied_count）开始写回输出文件，每 BACKFILL_APPLY_BATCH 行提交一次
+
+        作业创建后已被实时流程重新分析的新闻不覆盖；失败的请求保持未分析状态，可由之后的回填再次选中
+        """
+        from app.llm import llm_engine
+        from app.llm.batch import read_jsonl, response_content, response_usage
+        from app.llm.schemas import BriefOutput, parse_output
+        from app.scoring import scoring_engine, NewsScorer
+        from app.services.news_service import CostService
+        from app.services.news_filter import NewsFilterService
+        from app.services.rescoring import RescoringService
+
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
+        scorer = scoring_engine.create_scorer("default", user_config.to_dict()) if user_config else NewsScorer({})
+        # 本地执行经实时路由调用，Batch API 记为批处理提供方
+        provider_name = llm_engine.provider_of(job.model) if job.provider == 'local' else job.provider
+
+        rows = list(read_jsonl(job.output_file))
+        for start in range(job.applied_count or 0, len(rows), settings.BACKFILL_APPLY_BATCH):
+            chunk = rows[start:start + settings.BACKFILL_APPLY_BATCH]
+            ids = [BackfillService._news_id(row) for row in chunk]
+            news_by_id = {news.id: news for news in db.query(News).filter(News.id.in_([i for i in ids if i]))}
+
+            analyzed = []
+            for news_id, row in zip(ids, chunk):
+                news = news_by_id.get(news_id)
+                content = response_content(row)
+                result = parse_output(content, BriefOutput, 'backfill', job.model) if content else None
+                if news is None or result is None:
+                    job.failed_count = (job.failed_count or 0) + 1
+                    continue
+
+                usage = response_usage(row)
+                if usage['input_tokens'] or usage['output_tokens']:
+                    cost = llm_engine.calculate_cost(job.model, usage['input_tokens'], usage['output_tokens'], usage['cached_tokens'])
+                    CostService.record_cost(
+                        db,
+                        model=job.model,
+                        provider=provider_name,
+                        prompt_tokens=usage['input_tokens'],
+                        completion_tokens=usage['output_tokens'],
+                        cached_tokens=cost['cached_tokens'],
+                        cost_usd=round(cost['cost_usd'] * price_ratio, 6),
+                        cost_cny=round(cost['cost_cny'] * price_ratio, 6),
+                        request_type='backfill',
+                        source=news.source,
+                        news_id=news.id
+                    )
+
+                job.succeeded_count = (job.succeeded_count or 0) + 1
+                if news.analyzed_at and job.created_at and news.analyzed_at > job.created_at:
+                    continue
+                AnalysisQueueService.apply_brief_result(
+                    news,
+                    {
+                        **llm_engine._brief_fields(result.model_dump()),
+                        'model_used': job.model,
+                        'prompt_versions': {'brief': job.prompt_version} if job.prompt_version else None,
+                    },
+                    analysis_type='backfill'
+                )
+                RescoringService.rescore_news(news, scorer)
+                analyzed.append(news)
+
+            # 历史新闻只更新关联度，不进入推送
+            NewsFilterService.store_relevance_for_all_users(db, analyzed)
+            job.applied_count = start + len(chunk)
+            db.commit()
+            metrics.inc("backfill_applied_total", len(analyzed), job=job.name)
+
+        job.status = 'applied'
+        job.applied_at = datetime.utcnow()
+        db.commit()
+        return job
+
+    @staticmethod
+    def _news_id(row: Dict[str, Any]) -> Optional[int]:
+        custom_id = row.get('custom_id') or ''
+        if not custom_id.startswith(CUSTOM_ID_PREFIX):
+            return None
+        try:
+            return int(custom_id[len(CUSTOM_ID_PREFIX):])
+        except ValueError:
+            return None
+
+    @staticmethod
+    async def run(db: Session) -> Dict[str, Any]:
+        """推进所有未结束的作业（定时任务和脚本调用，可重复执行）"""
+        from app.services.news_service import CostService
+
+        budget = CostService.check_budget(db)
+        jobs = db.query(LLMBatchJob).filter(LLMBatchJob.status.in_(ACTIVE_STATUSES)).order_by(LLMBatchJob.id).all()
+        for job in jobs:
+            await BackfillService.advance(db, job, budget['percentage'])
+        return BackfillService.get_stats(db)
+
+    @staticmethod
+    def cancel(db: Session, job_id: int) -> Optional[LLMBatchJob]:
+        """取消未结束的作业（已提交到服务端的批处理不会被撤回，其结果不再写回）"""
+        job = db.query(LLMBatchJob).filter(LLMBatchJob.id == job_id).first()
+        if job and job.status in ACTIVE_STATUSES:
+            job.status = 'cancelled'
+            db.commit()
+        return job
+
+    @staticmethod
+    def get_stats(db: Session, limit: int = 20) -> Dict[str, Any]:
+        by_status = {
+            status: count
+            for status, count in db.query(LLMBatchJob.status, func.count(LLMBatchJob.id)).group_by(LLMBatchJob.status)
+        }
+        recent = db.query(LLMBatchJob).order_by(LLMBatchJob.id.desc()).limit(limit).all()
+        return {
+            'active': sum(by_status.get(status, 0) for status in ACTIVE_STATUSES),
+            'by_status': by_status,
+            'jobs': [job.to_dict() for job in recent],
+        }
@@ -1,11 +1,65 @@
+"""
+Celery 配置
+
+CELERY_BACKEND=memory 时使用内存消息代理（单进程开发）；redis 时消息代理和结果后端都使用 Redis，
+任务按类型路由到 crawl / analyze / push / maintenance 队列，各队列由单独的 worker 消费：
+
+    celery -A app.services.celery_app worker -Q crawl
+    celery -A app.services.celery_app worker -Q analyze
+
+只消费一个队列的 worker 使用该队列的并发数和预取倍数（CELERY_<QUEUE>_CONCURRENCY / _PREFETCH），
+爬取的网络I/O和LLM分析可以分别在不同节点上扩容；不带 -Q 启动的 worker 消费全部队列
+"""
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import celeryd_init
+from kombu import Queue
 from app.config import settings
 
+CRAWL_QUEUE = "crawl"
+ANALYZE_QUEUE = "analyze"
+PUSH_QUEUE = "push"
+MAINTENANCE_QUEUE = "maintenance"
+
+# 队列 -> (并发数, 预取倍数)
+QUEUE_WORKER_SETTINGS = {
+    CRAWL_QUEUE: (settings.CELERY_CRAWL_CONCURRENCY, settings.CELERY_CRAWL_PREFETCH),
+    ANALYZE_QUEUE: (settings.CELERY_ANALYZE_CONCURRENCY, settings.CELERY_ANALYZE_PREFETCH),
+    PUSH_QUEUE: (settings.CELERY_PUSH_CONCURRENCY, settings.CELERY_PUSH_PREFETCH),
+    MAINTENANCE_QUEUE: (settings.CELERY_MAINTENANCE_CONCURRENCY, settings.CELERY_MAINTENANCE_PREFETCH),
+}
+
+TASK_ROUTES = {
+    'app.services.tasks.crawl_single_source': {'queue': CRAWL_QUEUE},
+    'app.services.tasks.crawl_all_sources': {'queue': CRAWL_QUEUE},
+    'app.services.tasks.process_analysis_queue': {'queue': ANALYZE_QUEUE},
+    'app.services.tasks.process_news_with_ai': {'queue': ANALYZE_QUEUE},
+    'app.services.tasks.run_backfill_jobs': {'queue': ANALYZE_QUEUE},
+    'app.services.tasks.push_scored_news': {'queue': PUSH_QUEUE},
+    'app.services.tasks.push_high_score_news': {'queue': PUSH_QUEUE},
+    'app.services.tasks.drain_push_outbox': {'queue': PUSH_QUEUE},
+    'app.services.tasks.rescore_news_for_config': {'queue': MAINTENANCE_QUEUE},
+    'app.services.tasks.refresh_user_relevance': {'queue': MAINTENANCE_QUEUE},
+    'app.services.tasks.cleanup_old_news': {'queue': MAINTENANCE_QUEUE},
+}
+
+
+def broker_urls():
+    """(消息代理, 结果后端)"""
+    if settings.CELERY_BACKEND == "redis":
+        return (
+            settings.CELERY_BROKER_URL or settings.REDIS_URL,
+            settings.CELERY_RESULT_BACKEND_URL or settings.REDIS_URL,
+        )
+    return "memory://", "cache+memory://"
+
+
+broker_url, result_backend = broker_urls()
+
 celery_app = Celery(
     "llmquant",
-    broker="memory://",  # 使用内存消息代理
-    backend="memory://",  # 使用内存结果后端
+    broker=broker_url,
+    backend=result_backend,
     include=["app.services.tasks"]
 )
 
@@ -18,15 +72,31 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=3600,
     worker_prefetch_multiplier=1,
+    result_expires=settings.CELERY_RESULT_EXPIRES_SECONDS,
+    task_queues=[Queue(name) for name in QUEUE_WORKER_SETTINGS],
+    task_default_queue=MAINTENANCE_QUEUE,
+    task_routes=TASK_ROUTES,
+    broker_connection_retry_on_startup=True,
+    # Redis 中未确认的任务超过该时间会重新投递，需大于最长任务时间
+    broker_transport_options={'visibility_timeout': 2 * 3600},
+    result_backend_transport_options={'visibility_timeout': 2 * 3600},
     # 定时任务配置
     beat_schedule={
         'crawl-all-sources-every-5-minutes': {
             'task': 'app.services.tasks.crawl_all_sources',
             'schedule': 300.0,  # 每5分钟
         },
-        'push-high-score-news': {
-            'task': 'app.services.tasks.push_high_score_news',
-            'schedule': 600.0,  # 每10分钟检查推送
+        'process-analysis-queue': {
+            'task': 'app.services.tasks.process_analysis_queue',
+            'schedule': float(settings.ANALYSIS_QUEUE_POLL_SECONDS),  # 兜底处理积压、失败重试和延后任务
+        },
+        'run-backfill-jobs': {
+            'task': 'app.services.tasks.run_backfill_jobs',
+            'schedule': float(settings.BACKFILL_POLL_SECONDS),  # 离线回填作业按步推进
+        },
+        'drain-push-outbox': {
+            'task': 'app.services.tasks.drain_push_outbox',
+            'schedule': float(settings.PUSH_OUTBOX_POLL_SECONDS),  # 兜底投递与失败重试
         },
         'cleanup-old-news-daily': {
             'task': 'app.services.tasks.cleanup_old_news',
@@ -34,3 +104,24 @@ celery_app.conf.update(
         },
     },
 )
+
+# 即时推送由 news.scored 事件触发；汇总模式按汇总窗口定时检查，保证等待时间不超过窗口
+if settings.PUSH_DIGEST_ENABLED:
+    celery_app.conf.beat_schedule['push-high-score-news'] = {
+        'task': 'app.services.tasks.push_high_score_news',
+        'schedule': float(min(600, settings.PUSH_DIGEST_WINDOW_SECONDS)),
+    }
+
+
+@celeryd_init.connect
+def configure_queue_worker(conf=None, options=None, **kwargs):
+    """只消费一个队列的 worker 使用该队列的并发数和预取倍数（命令行显式指定的 -c 优先）"""
+    queues = (options or {}).get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    queues = [queue.strip() for queue in queues if queue.strip()]
+    if len(queues) != 1 or queues[0] not in QUEUE_WORKER_SETTINGS:
+        return
+    concurrency, prefetch = QUEUE_WORKER_SETTINGS[queues[0]]
+    conf.worker_concurrency = concurrency
+    conf.worker_prefetch_multiplier = prefetch
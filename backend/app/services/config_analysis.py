@@ -3,27 +3,13 @@
 AI配置分析服务
 将用户的自然语言描述转换为结构化的配置
 """
-import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from datetime import datetime
-import litellm
 from app.models import UserConfig
-from app.config import settings
 
 class ConfigAnalysisService:
     """配置分析服务"""
     
-    def __init__(self):
-        self._setup_llm()
-    
-    def _setup_llm(self):
-        """设置LLM配置"""
-        if settings.VAPI_API_KEY:
-            litellm.api_base = f"{settings.VAPI_BASE_URL or 'https://api.vveai.com'}/v1"
-            litellm.api_key = settings.VAPI_API_KEY
-        elif settings.OPENAI_API_KEY:
-            litellm.api_key = settings.OPENAI_API_KEY
-    
     async def analyze_description(self, description: str, existing_config: Optional[Dict] = None) -> Dict[str, Any]:
         """
         分析用户描述并生成配置
@@ -35,16 +21,20 @@ class ConfigAnalysisService:
         Returns:
             AI生成的配置字典
         """
+        from app.llm import llm_engine
+        
         # 构建提示词
         prompt = self._build_analysis_prompt(description, existing_config)
         
-        # 调用AI分析
+        # 调用AI分析（端点和凭证由 LLM 路由按请求选择）
         try:
-            response = await litellm.acompletion(
+            response = await llm_engine._completion(
+                "config_analysis",
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
-                max_tokens=2000
+                max_tokens=2000,
+                **llm_engine.json_mode_params("gpt-4o-mini")
             )
             
             content = response.choices[0].message.content.strip()
@@ -53,19 +43,52 @@ class ConfigAnalysisService:
             # 返回默认配置
             return self._get_default_config()
         
-        # 解析AI响应
-        try:
-            # 尝试直接解析JSON
-            config = json.loads(content)
-        except json.JSONDecodeError:
-            # 如果AI返回的不是纯JSON，尝试提取JSON部分
-            config = self._extract_json_from_response(content)
+        # 解析AI响应（兼容代码块、说明文字和截断的输出）
+        config = self._extract_json_from_response(content)
         
         # 验证和补充默认配置
         config = self._validate_and_fill_defaults(config)
         
         return config
     
+    async def analyze_description_stream(
+        self,
+        description: str,
+        existing_config: Optional[Dict] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        流式分析用户描述
+
+        每个顶层配置字段生成完毕即产出 ('field', {'key', 'value'})，
+        最后产出 ('done', {'config': 校验并补全默认值后的配置})；LLM 调用失败时产出默认配置
+        """
+        from app.llm import llm_engine
+        from app.llm.json_utils import IncrementalJSONParser
+        
+        prompt = self._build_analysis_prompt(description, existing_config)
+        parser = IncrementalJSONParser()
+        
+        try:
+            async for delta in llm_engine.stream_completion(
+                "config_analysis",
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=2000,
+                **llm_engine.json_mode_params("gpt-4o-mini")
+            ):
+                for kind, key, value in parser.feed(delta):
+                    if kind == 'field':
+                        yield 'field', {'key': key, 'value': value}
+        except Exception as e:
+            print(f"LLM调用失败: {e}")
+            yield 'done', {'config': self._get_default_config()}
+            return
+        
+        # 流中已解析出的字段优先，否则整体提取
+        config = parser.fields if parser.done else (self._extract_json_from_response(parser.buffer) or parser.fields)
+        yield 'done', {'config': self._validate_and_fill_defaults(dict(config))}
+    
     def _build_analysis_prompt(self, description: str, existing_config: Optional[Dict] = None) -> str:
         """构建分析提示词"""
         prompt = f"""你是一位专业的金融信息分析助手。请根据用户的描述，分析并生成适合的新闻筛选和展示配置。
@@ -149,19 +172,19 @@ class ConfigAnalysisService:
         return prompt
     
     def _extract_json_from_response(self, response: str) -> Dict:
-        """从AI响应中提取JSON"""
-        # 尝试找到JSON的开始和结束
-        start_idx = response.find('{')
-        end_idx = response.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1:
-            try:
-                return json.loads(response[start_idx:end_idx+1])
-            except:
-                pass
+        """从AI响应中提取JSON，记录解析结果（llm_parse_total），提取失败时返回空配置"""
+        from app.llm.json_utils import extract_json_object
+        from app.monitoring import metrics
         
-        # 如果提取失败，返回空配置
-        return {}
+        config = extract_json_object(response or '')
+        if config is None:
+            outcome = 'failed'
+        elif (response or '').strip().startswith('{') and (response or '').strip().endswith('}'):
+            outcome = 'ok'
+        else:
+            outcome = 'repaired'
+        metrics.inc("llm_parse_total", task='config_analysis', model='gpt-4o-mini', outcome=outcome)
+        return config or {}
     
     def _get_default_config(self) -> Dict:
         """获取默认配置"""
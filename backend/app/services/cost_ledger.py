@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+LLM成本账本
+LLM 调用的成本记录先进入内存缓冲，攒够 COST_LEDGER_FLUSH_SIZE 条或超过 COST_LEDGER_FLUSH_SECONDS
+后由后台线程批量写入 llm_costs，同一事务内把增量累加到 cost_rollups（按日/按月、按模型、
+调用环节 request_type 和新闻来源 source）。
+
+内存中保留 cost_rollups 的快照（后台线程每 COST_LEDGER_REFRESH_SECONDS 重新加载一次，合并 API 进程和
+各 worker 的写入）加上本进程尚未写入的增量，预算检查和成本统计不再扫描 llm_costs；
+预算检查用的月度总成本单独维护累计值，读取时不遍历汇总、不等待数据库。
+进程异常退出时最多丢失一个缓冲周期的记录；正常退出时会写完缓冲
+"""
+import atexit
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import CostRollup, LLMCost
+from app.monitoring import metrics
+
+DAY = 'day'
+MONTH = 'month'
+
+# (period, period_key, model, request_type, source)
+RollupKey = Tuple[str, str, str, str, str]
+
+# 汇总的归属维度（RollupKey 中的位置）
+DIMENSIONS = {'model': 2, 'stage': 3, 'source': 4}
+
+# 写入失败时缓冲的最大条数（超出后丢弃最早的记录）
+MAX_BUFFERED_FACTOR = 20
+
+
+@dataclass
+class CostTotals:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    total_tokens: int = 0
+    cost_usd: float = 0.0
+    cost_cny: float = 0.0
+
+    def add(self, other: 'CostTotals', sign: int = 1):
+        for field, value in asdict(other).items():
+            setattr(self, field, getattr(self, field) + sign * value)
+
+    @classmethod
+    def of_record(cls, record: Dict[str, Any]) -> 'CostTotals':
+        return cls(
+            requests=1,
+            prompt_tokens=record['prompt_tokens'] or 0,
+            completion_tokens=record['completion_tokens'] or 0,
+            cached_tokens=record['cached_tokens'] or 0,
+            total_tokens=record['total_tokens'] or 0,
+            cost_usd=record['cost_usd'] or 0.0,
+            cost_cny=record['cost_cny'] or 0.0,
+        )
+
+
+def rollup_keys(record: Dict[str, Any]) -> List[RollupKey]:
+    created_at = record['created_at']
+    attribution = (record['model'], record.get('request_type') or '', record.get('source') or '')
+    return [
+        (DAY, created_at.strftime('%Y-%m-%d'), *attribution),
+        (MONTH, created_at.strftime('%Y-%m'), *attribution),
+    ]
+
+
+class CostLedger:
+    """缓冲写入的成本账本，维护按日/按月、按模型的累计值"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # 保护缓冲和内存汇总
+        self._io_lock = threading.Lock()  # 写入和重新加载互斥，避免同一批增量被计两次
+        self._buffer: List[Dict[str, Any]] = []
+        self._pending: Dict[RollupKey, CostTotals] = {}  # 尚未写入数据库的增量
+        self._persisted: Dict[RollupKey, CostTotals] = {}  # cost_rollups 快照
+        # 月份 -> 总成本（美元），分别对应 _pending 和 _persisted 中按月汇总的合计
+        self._pending_month_cost: Dict[str, float] = {}
+        self._persisted_month_cost: Dict[str, float] = {}
+        self._last_refresh = 0.0
+        self._flusher: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+    def record(self, **fields) -> Dict[str, Any]:
+        """登记一条成本记录（字段同 LLMCost），立即计入内存汇总，由后台线程批量写入"""
+        record = {
+            'created_at': datetime.utcnow(),
+            'cached_tokens': 0,
+            **fields,
+        }
+        record['total_tokens'] = (record.get('prompt_tokens') or 0) + (record.get('completion_tokens') or 0)
+        totals = CostTotals.of_record(record)
+        with self._lock:
+            self._buffer.append(record)
+            for key in rollup_keys(record):
+                self._pending.setdefault(key, CostTotals()).add(totals)
+                if key[0] == MONTH:
+                    self._pending_month_cost[key[1]] = self._pending_month_cost.get(key[1], 0.0) + totals.cost_usd
+            full = len(self._buffer) >= settings.COST_LEDGER_FLUSH_SIZE
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+        return record
+
+    def _ensure_flusher(self):
+        if self._flusher and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher and self._flusher.is_alive():
+                return
+            self._stopped = False
+            self._flusher = threading.Thread(target=self._run, name="cost-ledger-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(settings.COST_LEDGER_FLUSH_SECONDS)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"成本记录写入失败: {e}")
+            # 重新加载也在后台线程中进行，预算检查只读内存
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"成本汇总加载失败: {e}")
+
+    def stop(self):
+        """停止后台线程并写完缓冲（进程退出时调用）"""
+        self._stopped = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"成本记录写入失败: {e}")
+
+    def flush(self, db: Optional[Session] = None) -> int:
+        """把缓冲的记录写入 llm_costs 并累加到 cost_rollups（同一事务），返回写入条数"""
+        with self._io_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return 0
+
+            deltas: Dict[RollupKey, CostTotals] = {}
+            for record in records:
+                totals = CostTotals.of_record(record)
+                for key in rollup_keys(record):
+                    deltas.setdefault(key, CostTotals()).add(totals)
+
+            own_session = db is None
+            db = db or SessionLocal()
+            try:
+                db.add_all([LLMCost(**record) for record in records])
+                for key, delta in deltas.items():
+                    self._apply_delta(db, key, delta)
+                db.commit()
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    # 放回缓冲等待下次写入
+                    self._buffer = (records + self._buffer)[-settings.COST_LEDGER_FLUSH_SIZE * MAX_BUFFERED_FACTOR:]
+                raise
+            finally:
+                if own_session:
+                    db.close()
+
+            with self._lock:
+                for key, delta in deltas.items():
+                    self._pending[key].add(delta, sign=-1)
+                    if not self._pending[key].requests:
+                        del self._pending[key]
+                    self._persisted.setdefault(key, CostTotals()).add(delta)
+                    if key[0] == MONTH:
+                        self._move_month_cost(key[1], delta.cost_usd)
+            metrics.inc("cost_ledger_flushed_total", len(records))
+            return len(records)
+
+    def _move_month_cost(self, month: str, cost_usd: float):
+        """已写入的成本从未写入的月度累计转到已写入的月度累计（调用方持有 _lock）"""
+        pending = self._pending_month_cost.get(month, 0.0) - cost_usd
+        # 全部写入后只剩浮点误差
+        if abs(pending) > 1e-9:
+            self._pending_month_cost[month] = pending
+        else:
+            self._pending_month_cost.pop(month, None)
+        self._persisted_month_cost[month] = self._persisted_month_cost.get(month, 0.0) + cost_usd
+
+    @staticmethod
+    def _apply_delta(db: Session, key: RollupKey, delta: CostTotals):
+        """累加一行汇总（行不存在时插入，并发插入冲突时改为累加）"""
+        period, period_key, model, request_type, source = key
+        match = (
+            CostRollup.period == period, CostRollup.period_key == period_key, CostRollup.model == model,
+            CostRollup.request_type == request_type, CostRollup.source == source,
+        )
+        values = {
+            field: getattr(CostRollup, field) + value
+            for field, value in asdict(delta).items()
+        }
+        if db.execute(update(CostRollup).where(*match).values(**values)).rowcount:
+            return
+        try:
+            with db.begin_nested():
+                db.add(CostRollup(
+                    period=period, period_key=period_key, model=model, request_type=request_type, source=source,
+                    **asdict(delta)
+                ))
+        except IntegrityError:
+            db.execute(update(CostRollup).where(*match).values(**values))
+
+    def refresh(self, db: Optional[Session] = None, force: bool = False):
+        """按间隔从 cost_rollups 重新加载内存快照（只加载 COST_LEDGER_MEMORY_DAYS 内的数据），
+        正常由后台线程调用"""
+        if not force and time.monotonic() - self._last_refresh < settings.COST_LEDGER_REFRESH_SECONDS:
+            return
+        since = datetime.utcnow() - timedelta(days=settings.COST_LEDGER_MEMORY_DAYS)
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            self._load(db, since)
+        finally:
+            if own_session:
+                db.close()
+
+    def _load(self, db: Session, since: datetime):
+        with self._io_lock:
+            rows = db.query(CostRollup).filter(
+                ((CostRollup.period == DAY) & (CostRollup.period_key >= since.strftime('%Y-%m-%d')))
+                | ((CostRollup.period == MONTH) & (CostRollup.period_key >= since.strftime('%Y-%m')))
+            ).all()
+            snapshot = {
+                (row.period, row.period_key, row.model, row.request_type or '', row.source or ''): CostTotals(
+                    requests=row.requests or 0,
+                    prompt_tokens=row.prompt_tokens or 0,
+                    completion_tokens=row.completion_tokens or 0,
+                    cached_tokens=row.cached_tokens or 0,
+                    total_tokens=row.total_tokens or 0,
+                    cost_usd=row.cost_usd or 0.0,
+                    cost_cny=row.cost_cny or 0.0,
+                )
+                for row in rows
+            }
+            month_cost: Dict[str, float] = {}
+            for key, totals in snapshot.items():
+                if key[0] == MONTH:
+                    month_cost[key[1]] = month_cost.get(key[1], 0.0) + totals.cost_usd
+            with self._lock:
+                self._persisted = snapshot
+                self._persisted_month_cost = month_cost
+                self._last_refresh = time.monotonic()
+
+    def _ensure_loaded(self, db: Session):
+        """首次读取时同步加载快照，之后由后台线程定期重新加载"""
+        if not self._last_refresh:
+            self.refresh(db, force=True)
+        self._ensure_flusher()
+
+    def totals(
+        self,
+        db: Session,
+        period: str,
+        period_keys: Optional[Set[str]] = None,
+        since: Optional[str] = None,
+        group_by: Tuple[str, ...] = ('model',),
+    ) -> Dict[str, Dict[str, CostTotals]]:
+        """
+        某类汇总（日/月）按维度合计，period_keys 指定周期，或 since 指定起始周期（含）
+
+        Returns:
+            {维度: {取值: 合计}}，维度为 group_by 中的 model / stage（request_type）/ source
+        """
+        self._ensure_loaded(db)
+        grouped: Dict[str, Dict[str, CostTotals]] = {dimension: {} for dimension in group_by}
+        with self._lock:
+            for entries in (self._persisted, self._pending):
+                for key, totals in entries.items():
+                    if key[0] != period:
+                        continue
+                    if period_keys is not None and key[1] not in period_keys:
+                        continue
+                    if since is not None and key[1] < since:
+                        continue
+                    for dimension in group_by:
+                        grouped[dimension].setdefault(key[DIMENSIONS[dimension]], CostTotals()).add(totals)
+        return grouped
+
+    def month_cost(self, db: Session, month: Optional[str] = None) -> float:
+        """当月（或指定月份）总成本（美元），只读内存中的月度累计（预算检查的热路径）"""
+        month = month or datetime.utcnow().strftime('%Y-%m')
+        self._ensure_loaded(db)
+        with self._lock:
+            return self._persisted_month_cost.get(month, 0.0) + self._pending_month_cost.get(month, 0.0)
+
+    def summary(self, db: Session, days: int = 30) -> Dict[str, Any]:
+        """最近 days 天（含今天往前 days 天）按模型的用量，以及按调用环节和新闻来源的成本归属"""
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+        grouped = self.totals(db, DAY, since=since, group_by=('model', 'stage', 'source'))
+        by_model = grouped['model']
+        return {
+            'total_requests': sum(totals.requests for totals in by_model.values()),
+            'total_tokens': sum(totals.total_tokens for totals in by_model.values()),
+            'total_cost_usd': round(sum(totals.cost_usd for totals in by_model.values()), 4),
+            'by_model': {
+                model: {
+                    'requests': totals.requests,
+                    'tokens': totals.total_tokens,
+                    'prompt_tokens': totals.prompt_tokens,
+                    'completion_tokens': totals.completion_tokens,
+                    'cached_tokens': totals.cached_tokens,
+                    # 输入token中命中前缀缓存的比例
+                    'cache_hit_rate': round(totals.cached_tokens / totals.prompt_tokens, 4) if totals.prompt_tokens else 0.0,
+                    'cost_usd': round(totals.cost_usd, 4),
+                }
+                for model, totals in sorted(by_model.items())
+            },
+            'by_stage': CostLedger._attribution(grouped['stage']),
+            'by_source': CostLedger._attribution(grouped['source']),
+        }
+
+    @staticmethod
+    def _attribution(grouped: Dict[str, CostTotals]) -> Dict[str, Dict[str, Any]]:
+        """按成本从高到低排列，未归属的记为 other"""
+        return {
+            name or 'other': {
+                'requests': totals.requests,
+                'tokens': totals.total_tokens,
+                'cost_usd': round(totals.cost_usd, 4),
+            }
+            for name, totals in sorted(grouped.items(), key=lambda item: -item[1].cost_usd)
+        }
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """由 llm_costs 重建 cost_rollups（迁移和修复用），返回汇总行数"""
+        db.query(CostRollup).delete()
+        rollups: Dict[RollupKey, CostTotals] = {}
+        query = db.query(
+            LLMCost.created_at, LLMCost.model, LLMCost.request_type, LLMCost.source, LLMCost.prompt_tokens,
+            LLMCost.completion_tokens, LLMCost.cached_tokens, LLMCost.total_tokens, LLMCost.cost_usd, LLMCost.cost_cny
+        ).yield_per(1000)
+        for row in query:
+            if row.created_at is None:
+                continue
+            record = row._asdict()
+            totals = CostTotals.of_record(record)
+            for key in rollup_keys(record):
+                rollups.setdefault(key, CostTotals()).add(totals)
+        db.add_all([
+            CostRollup(
+                period=period, period_key=period_key, model=model, request_type=request_type, source=source,
+                **asdict(totals)
+            )
+            for (period, period_key, model, request_type, source), totals in rollups.items()
+        ])
+        db.commit()
+        return len(rollups)
+
+
+cost_ledger = CostLedger()
+atexit.register(cost_ledger.stop)
@@ -7,9 +7,18 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, not_
-from app.models import News, UserConfig, CrawlerConfig
+from app.models import News, UserConfig, CrawlerConfig, NewsUserRelevance
+from app.scoring.ranking import feed_ranking_engine
 import math
 
+# 信息流默认时间窗口（天）
+FEED_WINDOW_DAYS = 7
+
+# 影响关联度的配置字段（变化后由后台任务刷新关联度）
+RELEVANCE_FIELDS = (
+    'keywords', 'industries', 'categories', 'preferred_sources', 'excluded_keywords', 'blocked_sources',
+)
+
 class NewsFilterService:
     """新闻筛选服务"""
     
@@ -125,6 +134,122 @@ class NewsFilterService:
         
         return max(0.1, decay_factor)  # 最小保留10%
     
+    @staticmethod
+    def _relevance_user_id(user_config: UserConfig) -> str:
+        """关联度表中使用的用户标识（未持久化的临时配置按default处理）"""
+        return user_config.user_id or "default"
+    
+    @staticmethod
+    def store_relevance(db: Session, news_list: List[News], user_config: UserConfig) -> int:
+        """
+        计算并写入新闻与指定用户的关联度（不提交事务）
+        
+        Returns:
+            写入的记录数
+        """
+        if not news_list:
+            return 0
+        
+        user_id = NewsFilterService._relevance_user_id(user_config)
+        news_ids = [news.id for news in news_list if news.id is not None]
+        existing = {
+            row.news_id: row
+            for row in db.query(NewsUserRelevance).filter(
+                NewsUserRelevance.user_id == user_id,
+                NewsUserRelevance.news_id.in_(news_ids)
+            ).all()
+        }
+        
+        now = datetime.utcnow()
+        for news in news_list:
+            if news.id is None:
+                continue
+            relevance = NewsFilterService.calculate_user_relevance(news, user_config)
+            row = existing.get(news.id)
+            if row:
+                row.relevance = relevance
+                row.computed_at = now
+            else:
+                db.add(NewsUserRelevance(
+                    news_id=news.id,
+                    user_id=user_id,
+                    relevance=relevance,
+                    computed_at=now
+                ))
+        
+        return len(news_ids)
+    
+    @staticmethod
+    def store_relevance_for_all_users(db: Session, news_list: List[News]) -> int:
+        """入库/分析后为所有用户写入关联度（不提交事务）"""
+        count = 0
+        for user_config in db.query(UserConfig).all():
+            count += NewsFilterService.store_relevance(db, news_list, user_config)
+        return count
+    
+    @staticmethod
+    def refresh_stale_relevance(db: Session, user_config: UserConfig, batch_size: int = 500) -> int:
+        """
+        增量刷新过期的关联度（关联度相关配置变更后由后台任务调用）
+        
+        只处理时间窗口内缺少关联度记录、或记录早于UserConfig.updated_at的新闻
+        
+        Returns:
+            重新计算的新闻数量
+        """
+        return NewsFilterService._compute_relevance(
+            db, user_config, user_config.updated_at or datetime.min, batch_size
+        )
+    
+    @staticmethod
+    def fill_missing_relevance(db: Session, user_config: UserConfig, batch_size: int = 500) -> int:
+        """
+        补算时间窗口内缺少关联度记录的新闻（信息流读取时调用，不重算已有记录）
+        
+        Returns:
+            补算的新闻数量
+        """
+        return NewsFilterService._compute_relevance(db, user_config, None, batch_size)
+    
+    @staticmethod
+    def _compute_relevance(
+        db: Session,
+        user_config: UserConfig,
+        fresh_since: Optional[datetime],
+        batch_size: int
+    ) -> int:
+        """计算窗口内没有记录（或记录早于 fresh_since）的新闻的关联度，有写入时提交"""
+        user_id = NewsFilterService._relevance_user_id(user_config)
+        window_start = datetime.utcnow() - timedelta(days=FEED_WINDOW_DAYS)
+        
+        fresh_ids = db.query(NewsUserRelevance.news_id).filter(NewsUserRelevance.user_id == user_id)
+        if fresh_since is not None:
+            fresh_ids = fresh_ids.filter(NewsUserRelevance.computed_at >= fresh_since)
+        stale_query = db.query(News).filter(
+            News.published_at >= window_start,
+            not_(News.id.in_(fresh_ids))
+        ).order_by(News.id)
+        
+        refreshed = 0
+        last_id = 0
+        while True:
+            batch = stale_query.filter(News.id > last_id).limit(batch_size).all()
+            if not batch:
+                break
+            NewsFilterService.store_relevance(db, batch, user_config)
+            db.flush()
+            refreshed += len(batch)
+            last_id = batch[-1].id
+        
+        if refreshed:
+            db.commit()
+        return refreshed
+    
+    @staticmethod
+    def relevance_changed(old_snapshot: Dict[str, Any], user_config: UserConfig) -> bool:
+        """配置变更是否影响关联度（old_snapshot 为变更前的配置快照）"""
+        return any(old_snapshot.get(key) != getattr(user_config, key) for key in RELEVANCE_FIELDS)
+    
     @staticmethod
     def filter_news_by_config(
         db: Session,
@@ -152,8 +277,18 @@ class NewsFilterService:
         Returns:
             筛选后的新闻列表
         """
-        # 基础查询
-        query = db.query(News)
+        # 只补算缺少关联度的新闻；配置变更后的重算由后台任务完成
+        NewsFilterService.fill_missing_relevance(db, user_config)
+        user_id = NewsFilterService._relevance_user_id(user_config)
+        
+        # 基础查询：关联预计算的用户相关度
+        query = db.query(News, NewsUserRelevance.relevance).join(
+            NewsUserRelevance,
+            and_(
+                NewsUserRelevance.news_id == News.id,
+                NewsUserRelevance.user_id == user_id
+            )
+        )
         
         # 1. 屏蔽来源过滤
         if user_config.blocked_sources:
@@ -176,31 +311,22 @@ class NewsFilterService:
             query = query.filter(or_(News.is_analyzed == False, News.market_impact >= 80))
         
         # 5. 时间范围（默认最近7天）
-        week_ago = datetime.utcnow() - timedelta(days=7)
+        week_ago = datetime.utcnow() - timedelta(days=FEED_WINDOW_DAYS)
         query = query.filter(News.published_at >= week_ago)
         
-        # 6. 排序：先按综合分数，再按发布时间
-        query = query.order_by(News.final_score.desc(), News.published_at.desc())
+        # 6. 相关度筛选：不显示被排除的新闻时，跳过相关度为0的
+        if not show_excluded:
+            query = query.filter(NewsUserRelevance.relevance > 0)
         
-        # 7. 分页
-        news_list = query.offset(offset).limit(limit * 2).all()  # 多取一些用于后续筛选
+        # 7. 排序：按时间衰减评分（数据库索引排序）
+        query = feed_ranking_engine.order_by_decayed_score(query)
         
-        # 8. 计算用户相关度并再次筛选
+        # 8. 分页
         filtered_news = []
-        for news in news_list:
-            relevance = NewsFilterService.calculate_user_relevance(news, user_config)
-            
-            # 如果不显示被排除的，且相关度为0，则跳过
-            if not show_excluded and relevance == 0:
-                continue
-            
+        for news, relevance in query.offset(offset).limit(limit).all():
             # 附加相关度分数（供前端显示）
             news.user_relevance_score = relevance
-            
             filtered_news.append(news)
-            
-            if len(filtered_news) >= limit:
-                break
         
         return filtered_news
     
@@ -222,49 +348,47 @@ class NewsFilterService:
             db, user_config, mode=mode, limit=limit, offset=offset
         )
         
-        feed_items = []
-        for news in news_list:
-            # 计算时间衰减分数
-            decay_factor = NewsFilterService.calculate_time_decay_score(news)
-            decayed_score = news.final_score * decay_factor
-            
-            # 计算"多久前"
-            time_ago = NewsFilterService._format_time_ago(news.published_at)
-            
-            # 多空时间分析（简化版）
-            position_time_analysis = NewsFilterService._get_position_time_analysis(news)
-            
-            item = {
-                "id": news.id,
-                "title": news.title,
-                "brief_summary": news.summary[:200] if news.summary else news.title[:200],
-                "brief_impact": news.brief_impact or "",
-                "position_bias": news.position_bias or "neutral",
-                "position_magnitude": news.position_magnitude or 0,
-                "decayed_score": round(decayed_score, 2),
-                "final_score": round(news.final_score, 2),
-                "user_relevance_score": round(getattr(news, 'user_relevance_score', 0), 2),
-                "source": news.source,
-                "source_url": news.url,
-                "published_at": news.published_at.isoformat() if news.published_at else None,
-                "crawled_at": news.crawled_at.isoformat() if news.crawled_at else None,
-                "time_ago": time_ago,
-                "keywords": news.keywords or [],
-                "categories": news.categories or [],
-                "ai_score": news.ai_score or 0,
-                "market_impact": news.market_impact or 0,
-                "industry_relevance": news.industry_relevance or 0,
-                "novelty_score": news.novelty_score or 0,
-                "urgency": news.urgency or 0,
-                "sentiment": news.sentiment,
-                "is_analyzed": news.is_analyzed,
-                "analyzed_at": news.analyzed_at.isoformat() if news.analyzed_at else None,
-                "position_time_analysis": position_time_analysis
-            }
-            
-            feed_items.append(item)
+        return [NewsFilterService.build_feed_item(news) for news in news_list]
+    
+    @staticmethod
+    def build_feed_item(news: News) -> Dict[str, Any]:
+        """构建单条信息流列表项（信息流接口与实时推送共用）"""
+        # 时间衰减分数（与数据库排序一致）
+        decayed_score = feed_ranking_engine.decayed_score(news)
         
-        return feed_items
+        # 计算"多久前"
+        time_ago = NewsFilterService._format_time_ago(news.published_at)
+        
+        # 多空时间分析（简化版）
+        position_time_analysis = NewsFilterService._get_position_time_analysis(news)
+        
+        return {
+            "id": news.id,
+            "title": news.title,
+            "brief_summary": news.summary[:200] if news.summary else news.title[:200],
+            "brief_impact": news.brief_impact or "",
+            "position_bias": news.position_bias or "neutral",
+            "position_magnitude": news.position_magnitude or 0,
+            "decayed_score": round(decayed_score, 2),
+            "final_score": round(news.final_score, 2),
+            "user_relevance_score": round(getattr(news, 'user_relevance_score', 0), 2),
+            "source": news.source,
+            "source_url": news.url,
+            "published_at": news.published_at.isoformat() if news.published_at else None,
+            "crawled_at": news.crawled_at.isoformat() if news.crawled_at else None,
+            "time_ago": time_ago,
+            "keywords": news.keywords or [],
+            "categories": news.categories or [],
+            "ai_score": news.ai_score or 0,
+            "market_impact": news.market_impact or 0,
+            "industry_relevance": news.industry_relevance or 0,
+            "novelty_score": news.novelty_score or 0,
+            "urgency": news.urgency or 0,
+            "sentiment": news.sentiment,
+            "is_analyzed": news.is_analyzed,
+            "analyzed_at": news.analyzed_at.isoformat() if news.analyzed_at else None,
+            "position_time_analysis": position_time_analysis
+        }
     
     @staticmethod
     def _format_time_ago(published_at: Optional[datetime]) -> str:
@@ -1,13 +1,19 @@
+import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, or_
 
-from app.models import News, UserConfig, CrawlerConfig, LLMCost, PushLog
+from app.models import News, UserConfig, CrawlerConfig, PushLog, NewsUserRelevance, PushOutbox, AnalysisJob
 from app.schemas import NewsCreate, NewsUpdate, NewsFilter
+from app.services.news_filter import NewsFilterService
+from app.services.rescoring import RescoringService
+from app.services.push_outbox import PushOutboxService
+from app.services.analysis_queue import AnalysisQueueService
+from app.events import event_bus, publish_news_scored, publish_analysis_progress, NEWS_PUSHED
 from app.llm import llm_engine
 from app.scoring import scoring_engine
-from app.push import push_manager
+from app.push import push_manager, push_dispatcher, PushJob, DigestJob, PushResult
 from app.config import settings
 
 class NewsService:
@@ -101,6 +107,7 @@ class NewsService:
                 db_news.is_analyzed = True
                 db_news.analyzed_at = datetime.utcnow()
                 db_news.analysis_type = 'full'
+                db_news.prompt_versions = ai_result.get('prompt_versions')
                 
                 # 记录成本
                 if ai_result.get('cost'):
@@ -108,20 +115,26 @@ class NewsService:
                     cost = llm_engine.calculate_cost(
                         ai_result.get('model_used', 'deepseek-chat'),
                         cost_data.get('input_tokens', 0),
-                        cost_data.get('output_tokens', 0)
+                        cost_data.get('output_tokens', 0),
+                        cost_data.get('cached_tokens', 0)
                     )
                     CostService.record_cost(
                         db,
                         model=ai_result.get('model_used', 'deepseek-chat'),
-                        provider='openai',
+                        provider=llm_engine.provider_of(ai_result.get('model_used', 'deepseek-chat')),
                         prompt_tokens=cost_data.get('input_tokens', 0),
                         completion_tokens=cost_data.get('output_tokens', 0),
+                        cached_tokens=cost['cached_tokens'],
                         cost_usd=cost['cost_usd'],
                         cost_cny=cost['cost_cny'],
                         request_type='news_analysis',
+                        source=db_news.source,
                         news_id=db_news.id
                     )
                 
+                # 分析结果会影响用户相关度，重新计算
+                NewsFilterService.store_relevance_for_all_users(db, [db_news])
+                
                 db.commit()
                 db.refresh(db_news)
                     
@@ -145,6 +158,7 @@ class NewsService:
             update_data = news_data.model_dump(exclude_unset=True)
             for key, value in update_data.items():
                 setattr(db_news, key, value)
+            NewsFilterService.store_relevance_for_all_users(db, [db_news])
             db.commit()
             db.refresh(db_news)
         return db_news
@@ -154,6 +168,9 @@ class NewsService:
         """删除新闻"""
         db_news = db.query(News).filter(News.id == news_id).first()
         if db_news:
+            db.query(NewsUserRelevance).filter(NewsUserRelevance.news_id == news_id).delete()
+            db.query(PushOutbox).filter(PushOutbox.news_id == news_id).delete()
+            db.query(AnalysisJob).filter(AnalysisJob.news_id == news_id).delete()
             db.delete(db_news)
             db.commit()
             return True
@@ -178,11 +195,41 @@ class NewsService:
     @staticmethod
     async def search_news(db: Session, query: str, skip: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
         """基于自然语言查询搜索新闻"""
-        # 获取基础新闻列表
-        news_list = db.query(News).order_by(desc(News.published_at)).limit(100).all()
+        news_items = NewsService._search_candidates(db)
+        
+        # 使用AI进行搜索
+        if news_items:
+            try:
+                search_results = await llm_engine.search_news(query, news_items)
+                return search_results[skip:skip+limit]
+            except Exception as e:
+                print(f"搜索失败: {e}")
         
-        # 转换为字典格式
-        news_items = [
+        # 失败时返回原始列表
+        return news_items[skip:skip+limit]
+    
+    @staticmethod
+    async def search_news_stream(db: Session, query: str, skip: int = 0, limit: int = 20):
+        """流式搜索：模型每排出一条结果即产出 ('item', 新闻)，分页按到达顺序计算"""
+        news_items = NewsService._search_candidates(db)
+        if not news_items:
+            yield 'done', {'total': 0}
+            return
+        
+        position = 0
+        async for event_type, data in llm_engine.search_news_stream(query, news_items):
+            if event_type == 'item':
+                position += 1
+                if skip < position <= skip + limit:
+                    yield event_type, data
+            else:
+                yield event_type, data
+    
+    @staticmethod
+    def _search_candidates(db: Session) -> List[Dict[str, Any]]:
+        """搜索的候选新闻（最近100条）"""
+        news_list = db.query(News).order_by(desc(News.published_at)).limit(100).all()
+        return [
             {
                 'id': news.id,
                 'title': news.title,
@@ -195,17 +242,6 @@ class NewsService:
             }
             for news in news_list
         ]
-        
-        # 使用AI进行搜索
-        if news_items:
-            try:
-                search_results = await llm_engine.search_news(query, news_items)
-                return search_results[skip:skip+limit]
-            except Exception as e:
-                print(f"搜索失败: {e}")
-        
-        # 失败时返回原始列表
-        return news_items[skip:skip+limit]
     
     @staticmethod
     def get_all_tags(db: Session) -> List[str]:
@@ -249,6 +285,7 @@ class NewsService:
                 news.keywords = ai_result['keywords']
                 news.is_analyzed = True
                 news.analyzed_at = datetime.utcnow()
+                NewsFilterService.store_relevance_for_all_users(db, [news])
                 db.commit()
                 db.refresh(news)
                 return {'tags': news.keywords}
@@ -270,18 +307,33 @@ class NewsService:
             分析结果统计
         """
         # 获取未分析的新闻
-        unanalyzed_news = db.query(News).filter(News.is_analyzed == False).limit(limit).all()
+        # 已在分析队列中的新闻由队列按优先级处理，预筛选跳过的新闻在打开时再分析
+        unanalyzed_news = db.query(News).filter(
+            News.is_analyzed == False,
+            or_(News.analysis_type.is_(None), News.analysis_type != 'skipped'),
+            ~News.id.in_(AnalysisQueueService.pending_news_ids(db))
+        ).limit(limit).all()
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
         
         analyzed_count = 0
         failed_count = 0
         
-        for news in unanalyzed_news:
+        # 进度事件（SSE /stream/analysis 订阅）
+        job_id = uuid.uuid4().hex
+        total = len(unanalyzed_news)
+        publish_analysis_progress('analyze_unanalyzed_news', job_id, 'running', 0, total, analyzed=0, failed=0)
+        
+        for index, news in enumerate(unanalyzed_news, 1):
             if not news.title or not news.content:
                 # 标记为已分析（无内容）
                 news.is_analyzed = True
                 news.analysis_type = 'none'
                 db.commit()
                 failed_count += 1
+                publish_analysis_progress(
+                    'analyze_unanalyzed_news', job_id, 'running', index, total,
+                    analyzed=analyzed_count, failed=failed_count, news_id=news.id
+                )
                 continue
             
             try:
@@ -292,57 +344,50 @@ class NewsService:
                 )
                 
                 # 更新新闻分析结果
-                news.summary = analysis_result.get('summary', '')
-                news.keywords = analysis_result.get('keywords', [])
-                news.sentiment = analysis_result.get('sentiment', 'neutral')
-                news.categories = analysis_result.get('categories', [])
-                news.ai_score = analysis_result.get('importance', 50)
-                news.final_score = analysis_result.get('importance', 50)
-                
-                # 更新多空分析
-                news.position_bias = analysis_result.get('position_bias', 'neutral')
-                news.position_magnitude = analysis_result.get('position_magnitude', 0)
-                
-                # 更新各维度评分
-                news.market_impact = analysis_result.get('market_impact', 50)
-                news.industry_relevance = analysis_result.get('industry_relevance', 50)
-                news.novelty_score = analysis_result.get('novelty_score', 50)
-                news.urgency = analysis_result.get('urgency', 50)
-                
-                # 标记为已分析
-                news.is_analyzed = True
-                news.analyzed_at = datetime.utcnow()
-                news.analysis_type = 'vapi'
-                news.llm_model_used = analysis_result.get('model_used', 'vapi')
+                AnalysisQueueService.apply_brief_result(news, analysis_result)
                 
                 # 记录成本
                 if analysis_result.get('input_tokens') and analysis_result.get('output_tokens'):
                     cost = llm_engine.calculate_cost(
                         analysis_result.get('model_used', 'vapi'),
                         analysis_result['input_tokens'],
-                        analysis_result['output_tokens']
+                        analysis_result['output_tokens'],
+                        analysis_result.get('cached_tokens', 0)
                     )
                     CostService.record_cost(
                         db,
                         model=analysis_result.get('model_used', 'vapi'),
-                        provider='vapi',
+                        provider=llm_engine.provider_of(analysis_result.get('model_used', 'vapi')),
                         prompt_tokens=analysis_result['input_tokens'],
                         completion_tokens=analysis_result['output_tokens'],
+                        cached_tokens=cost['cached_tokens'],
                         cost_usd=cost['cost_usd'],
                         cost_cny=cost['cost_cny'],
                         request_type='brief_analysis',
+                        source=news.source,
                         news_id=news.id
                     )
                 
+                NewsFilterService.store_relevance_for_all_users(db, [news])
+                PushOutboxService.enqueue(db, [news], user_config)
                 db.commit()
+                publish_news_scored([news], reason='analysis')
                 analyzed_count += 1
                 
             except Exception as e:
                 print(f"分析新闻失败 (ID: {news.id}): {e}")
                 failed_count += 1
                 db.rollback()
+            
+            publish_analysis_progress(
+                'analyze_unanalyzed_news', job_id, 'running', index, total,
+                analyzed=analyzed_count, failed=failed_count, news_id=news.id
+            )
+        
+        publish_analysis_progress('analyze_unanalyzed_news', job_id, 'completed', total, total, analyzed=analyzed_count, failed=failed_count)
         
         return {
+            'job_id': job_id,
             'total_processed': len(unanalyzed_news),
             'analyzed': analyzed_count,
             'failed': failed_count
@@ -383,8 +428,9 @@ class ConfigService:
     
     @staticmethod
     def update_user_config(db: Session, user_id: str, config_data: Dict[str, Any]) -> UserConfig:
-        """更新用户配置"""
+        """更新用户配置（评分相关配置变化时提交后台重新评分任务）"""
         config = ConfigService.get_user_config(db, user_id)
+        old_snapshot = RescoringService.snapshot_config(config)
         
         for key, value in config_data.items():
             if hasattr(config, key):
@@ -393,6 +439,8 @@ class ConfigService:
         config.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(config)
+        
+        config.rescore_task_id = RescoringService.schedule_if_needed(old_snapshot, config)
         return config
 
 class CrawlerService:
@@ -478,83 +526,40 @@ class CostService:
         news_id: int = None,
         duration_ms: int = None,
         status: str = "success",
-        error_message: str = None
-    ) -> LLMCost:
-        """记录API调用成本"""
-        cost_record = LLMCost(
+        error_message: str = None,
+        cached_tokens: int = 0,
+        source: str = None
+    ) -> Dict[str, Any]:
+        """记录API调用成本（进入成本账本缓冲，批量写入 llm_costs 和 cost_rollups），source 为新闻来源"""
+        from app.services.cost_ledger import cost_ledger
+        
+        return cost_ledger.record(
             model=model,
             provider=provider,
             prompt_tokens=prompt_tokens,
             completion_tokens=completion_tokens,
-            total_tokens=prompt_tokens + completion_tokens,
+            cached_tokens=cached_tokens,
             cost_usd=cost_usd,
             cost_cny=cost_cny,
             request_type=request_type,
+            source=source,
             news_id=news_id,
             duration_ms=duration_ms,
             status=status,
             error_message=error_message
         )
-        db.add(cost_record)
-        db.commit()
-        db.refresh(cost_record)
-        return cost_record
     
     @staticmethod
     def get_cost_summary(db: Session, days: int = 30) -> Dict[str, Any]:
-        """获取使用统计汇总"""
-        from datetime import timedelta
-        from_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        from_date = from_date - timedelta(days=days)
-        
-        # 总请求数
-        total_requests = db.query(func.count(LLMCost.id)).filter(
-            LLMCost.created_at >= from_date
-        ).scalar() or 0
-        
-        # 总token数
-        total_tokens = db.query(func.sum(LLMCost.total_tokens)).filter(
-            LLMCost.created_at >= from_date
-        ).scalar() or 0
-        
-        # 按模型统计
-        by_model = db.query(
-            LLMCost.model,
-            func.count(LLMCost.id).label('count'),
-            func.sum(LLMCost.total_tokens).label('tokens'),
-            func.sum(LLMCost.prompt_tokens).label('prompt_tokens'),
-            func.sum(LLMCost.completion_tokens).label('completion_tokens')
-        ).filter(
-            LLMCost.created_at >= from_date
-        ).group_by(LLMCost.model).all()
-        
-        by_model_dict = {
-            row.model: {
-                'requests': row.count,
-                'tokens': row.tokens or 0,
-                'prompt_tokens': row.prompt_tokens or 0,
-                'completion_tokens': row.completion_tokens or 0
-            }
-            for row in by_model
-        }
-        
-        return {
-            'total_requests': total_requests,
-            'total_tokens': total_tokens or 0,
-            'by_model': by_model_dict,
-        }
+        """获取使用统计汇总（读取成本账本的按日汇总）"""
+        from app.services.cost_ledger import cost_ledger
+        return cost_ledger.summary(db, days)
     
     @staticmethod
     def get_monthly_cost(db: Session) -> float:
-        """获取当月成本"""
-        now = datetime.utcnow()
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        cost = db.query(func.sum(LLMCost.cost_usd)).filter(
-            LLMCost.created_at >= month_start
-        ).scalar() or 0
-        
-        return round(cost, 4)
+        """获取当月成本（读取成本账本的按月汇总）"""
+        from app.services.cost_ledger import cost_ledger
+        return round(cost_ledger.month_cost(db), 4)
     
     @staticmethod
     def check_budget(db: Session) -> Dict[str, Any]:
@@ -576,17 +581,9 @@ class PushService:
     """推送服务"""
     
     @staticmethod
-    async def push_news(
-        db: Session,
-        news_item: News,
-        channels: List[str],
-        config: UserConfig
-    ) -> Dict[str, Any]:
-        """推送新闻到指定渠道"""
-        news_dict = news_item.to_dict()
-        
-        # 构建推送配置
-        push_configs = {
+    def build_push_configs(config: UserConfig) -> Dict[str, Dict[str, Any]]:
+        """根据用户配置构建各渠道的推送参数"""
+        return {
             'feishu': {
                 'webhook': config.feishu_webhook,
                 'chat_id': config.feishu_chat_id,
@@ -595,41 +592,128 @@ class PushService:
                 'recipients': config.email_recipients,
             }
         }
-        
-        # 执行推送
-        results = await push_manager.push(news_dict, channels, push_configs)
-        
-        # 更新推送状态
-        pushed_channels = []
-        for channel, result in results.items():
-            if result.success:
-                pushed_channels.append(channel)
+    
+    @staticmethod
+    def record_push_results(
+        db: Session,
+        news_items: List[News],
+        results: Dict[int, Dict[str, PushResult]]
+    ) -> Dict[int, Dict[str, Any]]:
+        """批量写入推送日志、更新新闻推送状态并统一提交"""
+        push_logs = []
+        summary = {}
+        now = datetime.utcnow()
+        for news_item in news_items:
+            channel_results = results.get(news_item.id, {})
+            pushed_channels = [channel for channel, result in channel_results.items() if result.success]
             
             # 记录推送日志
-            push_log = PushLog(
-                news_id=news_item.id,
-                channel=channel,
-                status='success' if result.success else 'error',
-                error_message=result.error_message,
-                title=news_item.title,
-                content_preview=news_item.content[:500] if news_item.content else None,
-                score=news_item.final_score
-            )
-            db.add(push_log)
-        
-        # 更新新闻推送状态
-        if pushed_channels:
-            news_item.is_pushed = True
-            news_item.pushed_to = pushed_channels
-            news_item.push_attempts += 1
-            news_item.last_push_at = datetime.utcnow()
-            db.commit()
+            for channel, result in channel_results.items():
+                push_logs.append(PushLog(
+                    news_id=news_item.id,
+                    channel=channel,
+                    status='success' if result.success else 'error',
+                    error_message=result.error_message,
+                    title=news_item.title,
+                    content_preview=news_item.content[:500] if news_item.content else None,
+                    score=news_item.final_score
+                ))
+            
+            # 更新新闻推送状态
+            if pushed_channels:
+                news_item.is_pushed = True
+                news_item.pushed_to = list(dict.fromkeys((news_item.pushed_to or []) + pushed_channels))
+                news_item.push_attempts = (news_item.push_attempts or 0) + 1
+                news_item.last_push_at = now
+            
+            summary[news_item.id] = {
+                'success': len(pushed_channels) > 0,
+                'pushed_to': pushed_channels,
+                'results': {k: {'success': v.success, 'error': v.error_message} for k, v in channel_results.items()}
+            }
         
-        return {
-            'success': len(pushed_channels) > 0,
-            'pushed_to': pushed_channels,
-            'results': {k: {'success': v.success, 'error': v.error_message} for k, v in results.items()}
-        }
+        db.add_all(push_logs)
+        db.commit()
+        
+        pushed_ids = [news_id for news_id, item in summary.items() if item['success']]
+        if pushed_ids:
+            event_bus.publish(NEWS_PUSHED, {'ids': pushed_ids})
+        
+        return summary
+    
+    @staticmethod
+    async def push_news_batch(
+        db: Session,
+        news_items: List[News],
+        channels: List[str],
+        config: UserConfig
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        并发推送多条新闻到指定渠道，推送日志批量写入并统一提交
+        
+        Returns:
+            news_id -> 推送结果
+        """
+        push_configs = PushService.build_push_configs(config)
+        jobs = [
+            PushJob(news_item=news.to_dict(), channel=channel, config=push_configs.get(channel, {}))
+            for news in news_items
+            for channel in channels
+        ]
+        
+        # 执行推送（所有新闻 x 渠道并发，按渠道限流）
+        job_results = await push_dispatcher.dispatch(jobs)
+        
+        results: Dict[int, Dict[str, PushResult]] = {}
+        for job_index, result in enumerate(job_results):
+            news_item = news_items[job_index // len(channels)]
+            channel = channels[job_index % len(channels)]
+            results.setdefault(news_item.id, {})[channel] = result
+        
+        return PushService.record_push_results(db, news_items, results)
+    
+    @staticmethod
+    async def push_digest_batch(
+        db: Session,
+        news_items: List[News],
+        channels: List[str],
+        config: UserConfig
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        汇总推送：每个渠道把新闻按 PUSH_DIGEST_MAX_ITEMS 分组，每组合并为一条消息
+        
+        Returns:
+            news_id -> 推送结果（同组新闻共享该组的推送结果）
+        """
+        push_configs = PushService.build_push_configs(config)
+        groups = push_manager.split_digest(news_items)
+        jobs = [
+            DigestJob(news_items=[news.to_dict() for news in group], channel=channel, config=push_configs.get(channel, {}))
+            for group in groups
+            for channel in channels
+        ]
+        
+        job_results = await push_dispatcher.dispatch(jobs)
+        
+        results: Dict[int, Dict[str, PushResult]] = {}
+        for job_index, result in enumerate(job_results):
+            group = groups[job_index // len(channels)]
+            channel = channels[job_index % len(channels)]
+            for news_item in group:
+                results.setdefault(news_item.id, {})[channel] = result
+        
+        return PushService.record_push_results(db, news_items, results)
+    
+    @staticmethod
+    async def push_news(
+        db: Session,
+        news_item: News,
+        channels: List[str],
+        config: UserConfig
+    ) -> Dict[str, Any]:
+        """推送新闻到指定渠道"""
+        results = await PushService.push_news_batch(db, [news_item], channels, config)
+        return results[news_item.id]
     
     @staticmethod
     async def test_push_channel(channel: str, config: Dict[str, Any]) -> bool:
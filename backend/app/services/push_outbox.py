@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+推送发件箱服务
+评分完成后在同一事务中写入待推送记录，由后台任务投递；
+失败按指数退避加随机抖动重试，每条记录带固定的幂等键，重试或崩溃恢复时下游可去重
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import News, PushOutbox, UserConfig
+from app.push import PushJob, PushResult, push_dispatcher
+
+# 幂等键命名空间（同一新闻+渠道始终生成相同的键）
+IDEMPOTENCY_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "llmquant-news/push-outbox")
+
+# 投递中记录的租约时长，worker 崩溃后租约到期可被重新领取
+SENDING_LEASE_SECONDS = 120
+
+# 单次投递最多领取的记录数
+DRAIN_BATCH_SIZE = 100
+
+
+class PushOutboxService:
+    """推送发件箱服务"""
+
+    @staticmethod
+    def idempotency_key(news_id: int, channel: str) -> str:
+        return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, f"{news_id}:{channel}"))
+
+    @staticmethod
+    def is_eligible(news: News, user_config: Optional[UserConfig], min_score: Optional[float] = None) -> bool:
+        """新闻是否满足推送条件"""
+        if not user_config or not user_config.push_enabled or not user_config.push_channels:
+            return False
+        if min_score is None:
+            min_score = settings.SCORE_THRESHOLD
+        return not news.is_pushed and (news.final_score or 0) >= min_score
+
+    @staticmethod
+    def enqueue(db: Session, news_list: List[News], user_config: Optional[UserConfig], min_score: Optional[float] = None) -> int:
+        """
+        为满足条件的新闻写入发件箱（不提交事务，由调用方与评分结果一起提交）
+
+        汇总推送模式下不使用发件箱，由 push_high_score_news 按窗口合并推送
+
+        Returns:
+            新增的记录数
+        """
+        if settings.PUSH_DIGEST_ENABLED:
+            return 0
+
+        eligible = [
+            news for news in news_list
+            if news.id is not None and PushOutboxService.is_eligible(news, user_config, min_score)
+        ]
+        if not eligible:
+            return 0
+
+        existing = {
+            (row.news_id, row.channel)
+            for row in db.query(PushOutbox.news_id, PushOutbox.channel).filter(
+                PushOutbox.news_id.in_([news.id for news in eligible])
+            )
+        }
+
+        now = datetime.utcnow()
+        added = 0
+        for news in eligible:
+            for channel in user_config.push_channels:
+                if (news.id, channel) in existing:
+                    continue
+                db.add(PushOutbox(
+                    news_id=news.id,
+                    channel=channel,
+                    status='pending',
+                    attempts=0,
+                    next_attempt_at=now,
+                    idempotency_key=PushOutboxService.idempotency_key(news.id, channel)
+                ))
+                added += 1
+
+        return added
+
+    @staticmethod
+    def enqueue_pending_news(db: Session, user_config: Optional[UserConfig], min_score: Optional[float] = None, limit: int = 200) -> int:
+        """补漏：把未推送、尚未进入发件箱的高分新闻写入发件箱（如重新评分后分数升高的新闻）"""
+        if min_score is None:
+            min_score = settings.SCORE_THRESHOLD
+
+        queued_ids = db.query(PushOutbox.news_id)
+        news_list = db.query(News).filter(
+            News.is_pushed == False,
+            News.final_score >= min_score,
+            ~News.id.in_(queued_ids)
+        ).order_by(News.final_score.desc()).limit(limit).all()
+
+        return PushOutboxService.enqueue(db, news_list, user_config, min_score)
+
+    @staticmethod
+    def backoff_delay(attempts: int) -> float:
+        """指数退避 + 随机抖动（秒）：base * 2^(n-1)，上限 max，实际取 [d/2, d]"""
+        delay = min(
+            settings.PUSH_OUTBOX_MAX_BACKOFF_SECONDS,
+            settings.PUSH_OUTBOX_BASE_BACKOFF_SECONDS * (2 ** max(0, attempts - 1))
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            and_(PushOutbox.status == 'pending', PushOutbox.next_attempt_at <= now),
+            # 投递中但租约已过期（worker 崩溃或超时）
+            and_(PushOutbox.status == 'sending', PushOutbox.next_attempt_at <= now),
+        )
+
+    @staticmethod
+    def claim_due(db: Session, limit: int = DRAIN_BATCH_SIZE) -> List[PushOutbox]:
+        """
+        领取到期的记录并标记为投递中
+
+        逐条条件更新，多个 worker 并发投递时每条记录只会被一个 worker 领取
+        """
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=SENDING_LEASE_SECONDS)
+        candidate_ids = [
+            row.id for row in db.query(PushOutbox.id).filter(
+                PushOutboxService._claimable(now)
+            ).order_by(PushOutbox.next_attempt_at).limit(limit)
+        ]
+
+        claimed_ids = []
+        for entry_id in candidate_ids:
+            updated = db.query(PushOutbox).filter(
+                PushOutbox.id == entry_id,
+                PushOutboxService._claimable(now)
+            ).update({'status': 'sending', 'next_attempt_at': lease_until}, synchronize_session=False)
+            if updated:
+                claimed_ids.append(entry_id)
+        db.commit()
+
+        if not claimed_ids:
+            return []
+        return db.query(PushOutbox).filter(PushOutbox.id.in_(claimed_ids)).all()
+
+    @staticmethod
+    def record_result(entry: PushOutbox, result: PushResult, now: Optional[datetime] = None):
+        """根据投递结果更新记录：成功标记已发送，失败退避重试，超过次数标记失败"""
+        now = now or datetime.utcnow()
+        entry.attempts = (entry.attempts or 0) + 1
+        if result.success:
+            entry.status = 'sent'
+            entry.sent_at = now
+            entry.last_error = None
+        elif entry.attempts >= settings.PUSH_OUTBOX_MAX_ATTEMPTS:
+            entry.status = 'failed'
+            entry.last_error = result.error_message
+        else:
+            entry.status = 'pending'
+            entry.next_attempt_at = now + timedelta(seconds=PushOutboxService.backoff_delay(entry.attempts))
+            entry.last_error = result.error_message
+
+    @staticmethod
+    async def drain(db: Session, limit: int = DRAIN_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        投递到期的发件箱记录（所有记录并发发出，按渠道限流）
+
+        推送日志、新闻推送状态和发件箱状态在同一事务中提交
+        """
+        from app.services.news_service import PushService
+
+        entries = PushOutboxService.claim_due(db, limit)
+        if not entries:
+            return {'claimed': 0, 'sent': 0, 'retrying': 0, 'failed': 0}
+
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
+        push_configs = PushService.build_push_configs(user_config) if user_config else {}
+        news_by_id = {
+            news.id: news
+            for news in db.query(News).filter(News.id.in_({entry.news_id for entry in entries}))
+        }
+
+        # 新闻已被删除的记录直接标记失败
+        sendable = []
+        for entry in entries:
+            if entry.news_id in news_by_id:
+                sendable.append(entry)
+            else:
+                PushOutboxService.record_result(entry, PushResult(success=False, channel=entry.channel, error_message='新闻不存在'))
+                entry.status = 'failed'
+
+        jobs = [
+            PushJob(
+                news_item={**news_by_id[entry.news_id].to_dict(), 'idempotency_key': entry.idempotency_key},
+                channel=entry.channel,
+                config=push_configs.get(entry.channel, {})
+            )
+            for entry in sendable
+        ]
+        results = await push_dispatcher.dispatch(jobs)
+
+        now = datetime.utcnow()
+        channel_results: Dict[int, Dict[str, PushResult]] = {}
+        for entry, result in zip(sendable, results):
+            PushOutboxService.record_result(entry, result, now)
+            channel_results.setdefault(entry.news_id, {})[entry.channel] = result
+
+        # 写推送日志并更新新闻推送状态（内部统一提交，包括上面的发件箱状态）
+        PushService.record_push_results(
+            db,
+            [news_by_id[news_id] for news_id in channel_results],
+            channel_results
+        )
+
+        statuses = [entry.status for entry in entries]
+        return {
+            'claimed': len(entries),
+            'sent': statuses.count('sent'),
+            'retrying': statuses.count('pending'),
+            'failed': statuses.count('failed'),
+        }
+
+    @staticmethod
+    def get_stats(db: Session) -> Dict[str, int]:
+        """各状态的记录数"""
+        from sqlalchemy import func
+        rows = db.query(PushOutbox.status, func.count(PushOutbox.id)).group_by(PushOutbox.status).all()
+        return {status: count for status, count in rows}
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+增量重新评分服务
+用户配置（关键词、权重、多空映射）变更后，只对受影响的新闻重新计算评分
+"""
+import copy
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import String, cast, or_
+from sqlalchemy.orm import Session
+
+from app.models import News, UserConfig
+from app.scoring.engine import NewsScorer, calculate_position_bias
+from app.events import publish_news_scored
+from app.services.news_filter import RELEVANCE_FIELDS, NewsFilterService
+from app.services.push_outbox import PushOutboxService
+
+# 影响评分的配置字段
+SCORING_FIELDS = (
+    'keywords', 'industries', 'excluded_keywords', 'ai_weight', 'rule_weight',
+    'keyword_positions', 'position_sensitivity',
+)
+
+# 重新评分的时间窗口（天），与旧新闻清理周期一致
+RESCORE_WINDOW_DAYS = 30
+
+# 分数变化小于该值视为未变化，不回写
+SCORE_EPSILON = 0.01
+
+
+@dataclass
+class ConfigDiff:
+    """评分相关配置的差异"""
+    added_keywords: List[str] = field(default_factory=list)
+    removed_keywords: List[str] = field(default_factory=list)
+    reweighted_keywords: List[str] = field(default_factory=list)
+    changed_excluded: List[str] = field(default_factory=list)
+    changed_industries: List[str] = field(default_factory=list)
+    changed_positions: List[str] = field(default_factory=list)
+    weights_changed: bool = False
+    sensitivity_changed: bool = False
+
+    def is_empty(self) -> bool:
+        return not (
+            self.added_keywords or self.removed_keywords or self.reweighted_keywords
+            or self.changed_excluded or self.changed_industries or self.changed_positions
+            or self.weights_changed or self.sensitivity_changed
+        )
+
+    @property
+    def requires_full_rescore(self) -> bool:
+        """AI/规则权重或多空敏感度变化会影响所有新闻"""
+        return self.weights_changed or self.sensitivity_changed
+
+    @property
+    def affected_terms(self) -> Set[str]:
+        """需要在标题/正文中匹配的词"""
+        return set(
+            self.added_keywords + self.removed_keywords + self.reweighted_keywords
+            + self.changed_excluded + self.changed_positions
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConfigDiff":
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+
+class RescoringService:
+    """增量重新评分服务"""
+
+    @staticmethod
+    def snapshot_config(user_config: UserConfig) -> Dict[str, Any]:
+        """保存评分和关联度相关配置的快照（用于变更前后对比）"""
+        return {
+            key: copy.deepcopy(getattr(user_config, key))
+            for key in dict.fromkeys(SCORING_FIELDS + RELEVANCE_FIELDS)
+        }
+
+    @staticmethod
+    def diff_configs(old: Dict[str, Any], new: Dict[str, Any]) -> ConfigDiff:
+        """对比新旧配置，找出影响评分的变化"""
+        old_keywords = old.get('keywords') or {}
+        new_keywords = new.get('keywords') or {}
+        old_positions = old.get('keyword_positions') or {}
+        new_positions = new.get('keyword_positions') or {}
+        old_excluded = set(old.get('excluded_keywords') or [])
+        new_excluded = set(new.get('excluded_keywords') or [])
+        old_industries = set(old.get('industries') or [])
+        new_industries = set(new.get('industries') or [])
+
+        return ConfigDiff(
+            added_keywords=sorted(set(new_keywords) - set(old_keywords)),
+            removed_keywords=sorted(set(old_keywords) - set(new_keywords)),
+            reweighted_keywords=sorted(
+                k for k in set(old_keywords) & set(new_keywords)
+                if old_keywords[k] != new_keywords[k]
+            ),
+            changed_excluded=sorted(old_excluded ^ new_excluded),
+            changed_industries=sorted(old_industries ^ new_industries),
+            changed_positions=sorted(
+                k for k in set(old_positions) | set(new_positions)
+                if old_positions.get(k) != new_positions.get(k)
+            ),
+            weights_changed=(
+                old.get('ai_weight') != new.get('ai_weight')
+                or old.get('rule_weight') != new.get('rule_weight')
+            ),
+            sensitivity_changed=old.get('position_sensitivity') != new.get('position_sensitivity'),
+        )
+
+    @staticmethod
+    def schedule_if_needed(old_snapshot: Dict[str, Any], user_config: UserConfig) -> Optional[str]:
+        """
+        配置变更后按需提交后台重新评分任务；关联度相关配置变化时同时提交关联度刷新任务
+
+        Returns:
+            重新评分任务ID，无需重新评分时返回None
+        """
+        from app.services.tasks import refresh_user_relevance, rescore_news_for_config
+
+        user_id = user_config.user_id or "default"
+        if NewsFilterService.relevance_changed(old_snapshot, user_config):
+            refresh_user_relevance.delay(user_id)
+
+        diff = RescoringService.diff_configs(old_snapshot, RescoringService.snapshot_config(user_config))
+        if diff.is_empty():
+            return None
+
+        result = rescore_news_for_config.delay(user_id, diff.to_dict())
+        return result.id
+
+    @staticmethod
+    def find_affected_news_ids(db: Session, diff: ConfigDiff) -> List[int]:
+        """
+        找出受配置变更影响的新闻ID
+
+        权重/敏感度变化影响窗口内所有新闻；否则只取标题/正文包含变更关键词、
+        或分类包含变更行业的新闻
+        """
+        window_start = datetime.utcnow() - timedelta(days=RESCORE_WINDOW_DAYS)
+        query = db.query(News.id).filter(News.crawled_at >= window_start)
+
+        if not diff.requires_full_rescore:
+            conditions = []
+            for term in diff.affected_terms:
+                pattern = f"%{term}%"
+                conditions.append(News.title.ilike(pattern))
+                conditions.append(News.content.ilike(pattern))
+            for industry in diff.changed_industries:
+                conditions.append(cast(News.categories, String).ilike(f"%{industry}%"))
+            if not conditions:
+                return []
+            query = query.filter(or_(*conditions))
+
+        return [row.id for row in query.order_by(News.id).all()]
+
+    @staticmethod
+    def build_scoring_item(news: News) -> Dict[str, Any]:
+        """构建评分引擎所需的新闻数据"""
+        return {
+            'title': news.title or '',
+            'content': news.content or '',
+            'source': news.source or '',
+            'categories': news.categories or [],
+            'published_at': news.published_at,
+        }
+
+    @staticmethod
+    def build_ai_scores(news: News) -> Dict[str, float]:
+        """从已存储的分析结果中取AI维度评分"""
+        if not news.is_analyzed:
+            return {}
+        return {
+            'market_impact': news.market_impact if news.market_impact is not None else 50,
+            'industry_relevance': news.industry_relevance if news.industry_relevance is not None else 50,
+            'novelty_score': news.novelty_score if news.novelty_score is not None else 50,
+            'urgency': news.urgency if news.urgency is not None else 50,
+        }
+
+    @staticmethod
+    def rescore_news(
+        news: News,
+        scorer: NewsScorer,
+        user_config: Optional[UserConfig] = None,
+        recompute_position: bool = False
+    ) -> bool:
+        """
+        用指定评分器重新计算单条新闻的评分
+
+        Returns:
+            是否有字段发生变化
+        """
+        score_result = scorer.calculate_final_score(
+            RescoringService.build_ai_scores(news),
+            RescoringService.build_scoring_item(news),
+            now=news.crawled_at
+        )
+
+        updates = {
+            'rule_score': score_result['rule_score'],
+            'final_score': score_result['final_score'],
+        }
+
+        if recompute_position and user_config is not None:
+            bias, magnitude = calculate_position_bias(
+                news.sentiment or 'neutral',
+                news.market_impact if news.market_impact is not None else 50,
+                score_result['breakdown']['rule_details']['keyword_matches'],
+                user_config.keyword_positions or {},
+                user_config.position_sensitivity or 1.0
+            )
+            updates['position_bias'] = bias
+            updates['position_magnitude'] = magnitude
+
+        changed = False
+        for key, value in updates.items():
+            current = getattr(news, key)
+            if isinstance(value, float):
+                if current is not None and abs(current - value) < SCORE_EPSILON:
+                    continue
+            elif current == value:
+                continue
+            setattr(news, key, value)
+            changed = True
+
+        return changed
+
+    @staticmethod
+    def run(
+        db: Session,
+        user_id: str,
+        diff: ConfigDiff,
+        batch_size: int = 200,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        按批次重新评分受影响的新闻，只回写发生变化的记录
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            diff: 配置差异
+            batch_size: 每批处理数量
+            progress_callback: 进度回调 (已处理数, 总数, 已变更数)
+        """
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == user_id).first()
+        if not user_config:
+            return {'total': 0, 'processed': 0, 'changed': 0}
+
+        scorer = NewsScorer(user_config.to_dict())
+        recompute_position = bool(
+            diff.changed_positions or diff.sensitivity_changed
+            or (user_config.keyword_positions and (diff.added_keywords or diff.removed_keywords))
+        )
+
+        news_ids = RescoringService.find_affected_news_ids(db, diff)
+        total = len(news_ids)
+        processed = 0
+        changed = 0
+
+        for start in range(0, total, batch_size):
+            batch_ids = news_ids[start:start + batch_size]
+            batch = db.query(News).filter(News.id.in_(batch_ids)).all()
+
+            changed_news = [
+                news for news in batch
+                if RescoringService.rescore_news(news, scorer, user_config, recompute_position)
+            ]
+            changed += len(changed_news)
+
+            # 分数升高到推送阈值以上的新闻与评分结果一起写入推送发件箱
+            PushOutboxService.enqueue(db, changed_news, user_config)
+
+            # 只有变化的记录会产生UPDATE
+            db.commit()
+            publish_news_scored(changed_news, reason='rescore')
+            processed += len(batch_ids)
+
+            if progress_callback:
+                progress_callback(processed, total, changed)
+
+        return {'total': total, 'processed': processed, 'changed': changed}
@@ -4,20 +4,69 @@ Celery 任务模块 - 爬虫和推送任务
 """
 
 import asyncio
+import threading
+import uuid
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+
 from app.services.celery_app import celery_app
 from app.database import SessionLocal
-from app.models import News, CrawlerConfig, UserConfig, PushLog
+from app.models import News, CrawlerConfig, UserConfig, PushLog, NewsUserRelevance, PushOutbox, AnalysisJob
 from app.services.news_service import CrawlerService, PushService
+from app.services.news_filter import NewsFilterService
+from app.services.rescoring import RescoringService, ConfigDiff
+from app.services.push_outbox import PushOutboxService
+from app.services.analysis_queue import AnalysisQueueService
+from app.services.backfill import BackfillService
+from app.services.cost_ledger import cost_ledger
 from app.crawler import crawler_manager
-from app.scoring.engine import ScoringEngine
+from app.scoring.engine import ScoringEngine, NewsScorer, to_naive_utc
+from app.scoring import scoring_engine, CascadeFilter
 from app.llm import llm_engine
+from app.push import push_manager
 from app.config import settings
+from app.monitoring import metrics, metrics_aggregator, task_profiler
+from app.events import event_bus, Event, NEWS_SCORED, publish_news_scored, publish_analysis_progress
+
+# 汇总模式下单次推送任务最多发出的汇总组数
+DIGEST_GROUPS_PER_RUN = 5
+
+# 每个 worker 线程一个常驻事件循环，推送器的HTTP会话等连接可跨任务复用
+_worker_state = threading.local()
+
+
+def run_async(coro):
+    """在当前 worker 线程的常驻事件循环中执行协程"""
+    loop = getattr(_worker_state, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _worker_state.loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
+
+
+@worker_init.connect
+def log_llm_endpoints(**kwargs):
+    """worker 启动时输出已配置的 LLM 端点"""
+    llm_engine.log_endpoints()
+
+
+@worker_process_init.connect
+def start_metrics_publisher(**kwargs):
+    """worker 子进程定期把指标上报到 Redis，由 API 进程的 /metrics 汇总导出"""
+    metrics_aggregator.start_publisher()
+
+
+@worker_process_shutdown.connect
+def flush_cost_ledger(**kwargs):
+    """worker 子进程退出时不会执行 atexit，在此写完缓冲中的成本记录和指标"""
+    cost_ledger.stop()
+    metrics_aggregator.stop_publisher()
 
 
 @celery_app.task(bind=True, max_retries=3)
+@task_profiler.profiled("crawl_single_source")
 def crawl_single_source(self, config_id: int):
     """爬取单个信息源"""
     db = SessionLocal()
@@ -34,43 +83,48 @@ def crawl_single_source(self, config_id: int):
             return {"status": "error", "reason": "Failed to create crawler"}
         
         # 执行爬取（使用asyncio运行异步爬虫）
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        news_items = run_async(crawler.crawl())
         
-        try:
-            news_items = loop.run_until_complete(crawler.crawl())
-        finally:
-            loop.close()
+        # 按用户配置评分（无配置时使用默认评分器）
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
+        if user_config:
+            scorer = scoring_engine.create_scorer("default", user_config.to_dict())
+        else:
+            scorer = NewsScorer({})
+        
+        # LLM分析前的本地预筛选（按全部用户配置）
+        cascade = CascadeFilter([config.to_dict() for config in db.query(UserConfig).all()])
         
         # 处理爬取的新闻
         processed_count = 0
+        processed_news = []
+        analysis_news = []
         for item in news_items:
             try:
-                # 检查是否已存在（根据URL去重）
-                existing = db.query(News).filter(News.url == item.url).first()
+                with metrics.span("dedup", source=config.name):
+                    # 检查是否已存在（根据URL去重）
+                    existing = db.query(News).filter(News.url == item.url).first()
+                    
+                    # 检查最近的新闻是否有相似内容（基于标题和内容）
+                    recent_news = None
+                    if not existing:
+                        from sqlalchemy import or_
+                        recent_news = db.query(News).filter(
+                            or_(
+                                News.title == item.title,
+                                News.content == item.content
+                            ),
+                            News.crawled_at >= datetime.utcnow() - timedelta(days=1)
+                        ).first()
+                
                 if existing:
                     print(f"新闻已存在（URL重复）: {item.title}")
+                    metrics.inc("duplicate_news_total", source=config.name, reason="url")
                     continue
                 
-                # 检查内容相似性（基于标题和内容）
-                import hashlib
-                from sqlalchemy import or_
-                
-                # 生成内容摘要
-                content_text = f"{item.title} {item.content or ''}"
-                content_hash = hashlib.md5(content_text.encode('utf-8')).hexdigest()
-                
-                # 检查最近的新闻是否有相似内容
-                recent_news = db.query(News).filter(
-                    or_(
-                        News.title == item.title,
-                        News.content == item.content
-                    ),
-                    News.crawled_at >= datetime.utcnow() - timedelta(days=1)
-                ).first()
-                
                 if recent_news:
                     print(f"新闻已存在（内容重复）: {item.title}")
+                    metrics.inc("duplicate_news_total", source=config.name, reason="content")
                     continue
                 
                 # 创建新闻记录
@@ -82,148 +136,54 @@ def crawl_single_source(self, config_id: int):
                     source=config.name,
                     source_type=config.crawler_type,
                     author=item.author,
-                    published_at=item.published_at,
+                    published_at=to_naive_utc(item.published_at),  # 统一为不带时区的UTC时间
                     categories=item.categories or [],
                     crawled_at=datetime.utcnow()
                 )
                 db.add(news)
                 db.flush()  # 获取ID
                 
-                # AI处理（直接调用）
-                ai_scores = None
-                try:
-                    print(f"开始AI分析: {news.title}")
-                    
-                    # 启用LiteLLM的详细日志
-                    import litellm
-                    litellm.verbose = True
-                    
-                    # 使用asyncio运行异步AI处理
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    
-                    try:
-                        ai_result = loop.run_until_complete(
-                            llm_engine.process_news(
-                                news.title,
-                                news.content or ''
-                            )
-                        )
-                    finally:
-                        loop.close()
-                    
-                    print(f"AI分析结果: {ai_result}")
-                    
-                    # 检查是否有错误
-                    if 'error' in ai_result:
-                        print(f"AI分析错误: {ai_result['error']}")
-                        # 即使有错误，也尝试更新可用的结果
-                    
-                    # 更新新闻记录
-                    if 'summary' in ai_result:
-                        news.summary = ai_result['summary']
-                        print(f"生成摘要: {ai_result['summary'][:100]}...")
-                    if 'categories' in ai_result:
-                        news.categories = ai_result['categories']
-                        print(f"分类: {ai_result['categories']}")
-                    if 'keywords' in ai_result:
-                        news.keywords = ai_result['keywords']
-                        print(f"关键词: {ai_result['keywords']}")
-                    if 'sentiment' in ai_result:
-                        news.sentiment = ai_result['sentiment']
-                        print(f"情感: {ai_result['sentiment']}")
-                    if 'scores' in ai_result:
-                        scores = ai_result['scores']
-                        news.ai_score = sum(scores.values()) / len(scores) if scores else 50
-                        news.market_impact = scores.get('market_impact', 50)
-                        news.industry_relevance = scores.get('industry_relevance', 50)
-                        news.novelty_score = scores.get('novelty_score', 50)
-                        news.urgency = scores.get('urgency', 50)
-                        print(f"评分: {scores}")
-                    
-                    # 更新分析状态
-                    news.is_analyzed = True
-                    news.analyzed_at = datetime.utcnow()
-                    news.analysis_type = 'full'
-                    
-                    # 记录成本
-                    if ai_result.get('cost'):
-                        cost_data = ai_result['cost']
-                        cost = llm_engine.calculate_cost(
-                            ai_result.get('model_used', 'deepseek-chat'),
-                            cost_data.get('input_tokens', 0),
-                            cost_data.get('output_tokens', 0)
-                        )
-                        from app.services.news_service import CostService
-                        CostService.record_cost(
-                            db,
-                            model=ai_result.get('model_used', 'deepseek-chat'),
-                            provider='openai',
-                            prompt_tokens=cost_data.get('input_tokens', 0),
-                            completion_tokens=cost_data.get('output_tokens', 0),
-                            cost_usd=cost['cost_usd'],
-                            cost_cny=cost['cost_cny'],
-                            request_type='news_analysis',
-                            news_id=news.id
-                        )
-                    
-                    print(f"AI处理成功: {news.title}")
-                    
-                except Exception as e:
-                    import traceback
-                    error_msg = f"AI处理失败: {e}\n{traceback.format_exc()}"
-                    print(error_msg)
-                    # 即使AI分析失败，也继续处理新闻
-                    # 设置默认值，确保新闻记录完整
-                    news.is_analyzed = False
-                    news.ai_score = 50  # 默认评分
-                    news.summary = f"AI分析失败: {str(e)}"
-                    news.sentiment = 'neutral'  # 默认情感
-                    news.keywords = []  # 默认关键词
-                    news.categories = []  # 默认分类
-                
-                # 评分计算
-                from app.scoring.engine import NewsScorer
-                scorer = NewsScorer({})
-                
-                # 准备AI评分数据
-                ai_scores_data = {}
-                if ai_scores:
-                    ai_scores_data = {
-                        'market_impact': ai_scores.get('market_impact', 50),
-                        'industry_relevance': ai_scores.get('industry_relevance', 50),
-                        'novelty_score': ai_scores.get('novelty_score', 50),
-                        'urgency': ai_scores.get('urgency', 50),
-                    }
-                    news.ai_score = ai_scores.get('ai_score', 50)
-                
-                # 计算综合评分
-                news_data = news.to_dict()
-                score_result = scorer.calculate_final_score(ai_scores_data, news_data)
+                # 规则预评分（与配置变更后的重新评分使用同一逻辑），LLM分析由分析队列按优先级处理
+                RescoringService.rescore_news(news, scorer)
                 
-                news.rule_score = score_result['rule_score']
-                news.final_score = score_result['final_score']
+                # 预筛选未通过的新闻不调用LLM，用户打开时再分析
+                decision = cascade.evaluate(news, source_priority=config.priority)
+                if decision.passed:
+                    analysis_news.append(news)
+                else:
+                    news.analysis_type = 'skipped'
+                    metrics.inc("cascade_skipped_total", source=config.name, reason=decision.reason)
                 
+                processed_news.append(news)
                 processed_count += 1
                 
             except Exception as e:
                 print(f"处理新闻失败: {e}")
                 continue
         
-        # 提交所有更改
-        db.commit()
+        with metrics.span("db_commit", source=config.name):
+            # 预计算所有用户的相关度，与新闻同一事务提交（分析完成后按AI评分刷新）
+            NewsFilterService.store_relevance_for_all_users(db, processed_news)
+            
+            # 写入分析队列，与新闻同一事务提交
+            AnalysisQueueService.enqueue(db, analysis_news, source_priority=config.priority)
+            
+            # 提交所有更改
+            db.commit()
+        metrics.inc("processed_news_total", processed_count, source=config.name)
         
         # 更新爬虫统计
         CrawlerService.update_stats(db, config_id, success=True)
         
-        # 自动推送高分新闻
-        if config.priority >= 8:  # 高优先级源自动推送
-            push_high_score_news(db)
+        # 立即处理分析队列（分析完成后发布评分事件，推送、实时订阅等由订阅者处理）
+        if analysis_news:
+            process_analysis_queue.delay()
         
         return {
             "status": "success",
             "crawled": len(news_items),
             "processed": processed_count,
+            "queued_for_analysis": len(analysis_news),
             "source": config.name
         }
         
@@ -245,6 +205,100 @@ def crawl_single_source(self, config_id: int):
         db.close()
 
 
+@celery_app.task
+@task_profiler.profiled("process_analysis_queue")
+def process_analysis_queue(limit: int = None):
+    """按优先级处理分析队列（预算消耗后降级模型、只分析标题或延后）"""
+    db = SessionLocal()
+    
+    try:
+        stats = run_async(AnalysisQueueService.process(db, limit))
+        return {"status": "success", **stats}
+        
+    except Exception as e:
+        db.rollback()
+        print(f"处理分析队列失败: {e}")
+        return {"status": "error", "reason": str(e)}
+        
+    finally:
+        db.close()
+
+
+@celery_app.task
+@task_profiler.profiled("run_backfill_jobs")
+def run_backfill_jobs():
+    """推进离线回填作业：提交、轮询批处理结果并分段写回"""
+    db = SessionLocal()
+    
+    try:
+        stats = run_async(BackfillService.run(db))
+        return {"status": "success", "active": stats['active'], "by_status": stats['by_status']}
+        
+    except Exception as e:
+        db.rollback()
+        print(f"推进回填作业失败: {e}")
+        return {"status": "error", "reason": str(e)}
+        
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True)
+def rescore_news_for_config(self, user_id: str, diff: Dict[str, Any], batch_size: int = 200):
+    """用户配置变更后，按批次重新评分受影响的新闻"""
+    db = SessionLocal()
+    job_id = self.request.id or uuid.uuid4().hex
+    
+    def report_progress(processed: int, total: int, changed: int):
+        meta = {"processed": processed, "total": total, "changed": changed}
+        print(f"重新评分进度: {processed}/{total}，已变更 {changed}")
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta=meta)
+        publish_analysis_progress('rescore', job_id, 'running', processed, total, changed=changed, user_id=user_id)
+    
+    try:
+        result = RescoringService.run(
+            db, user_id, ConfigDiff.from_dict(diff),
+            batch_size=batch_size,
+            progress_callback=report_progress
+        )
+        publish_analysis_progress(
+            'rescore', job_id, 'completed', result['processed'], result['total'],
+            changed=result['changed'], user_id=user_id
+        )
+        return {"status": "success", **result}
+        
+    except Exception as e:
+        db.rollback()
+        publish_analysis_progress('rescore', job_id, 'failed', 0, 0, error=str(e), user_id=user_id)
+        return {"status": "error", "reason": str(e)}
+        
+    finally:
+        db.close()
+
+
+@celery_app.task
+def refresh_user_relevance(user_id: str):
+    """关联度相关配置变更后，重新计算信息流窗口内新闻与该用户的关联度"""
+    db = SessionLocal()
+    
+    try:
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == user_id).first()
+        if not user_config:
+            return {"status": "skipped", "reason": "user config not found"}
+        refreshed = NewsFilterService.refresh_stale_relevance(db, user_config)
+        print(f"关联度刷新完成: 用户 {user_id}，重新计算 {refreshed} 条")
+        return {"status": "success", "refreshed": refreshed}
+        
+    except Exception as e:
+        db.rollback()
+        print(f"关联度刷新失败: {e}")
+        return {"status": "error", "reason": str(e)}
+        
+    finally:
+        db.close()
+
+
 @celery_app.task
 def crawl_all_sources():
     """爬取所有活跃信息源"""
@@ -293,11 +347,21 @@ def push_high_score_news(db_session=None, min_score: float = None):
         if not user_config or not user_config.push_enabled:
             return {"status": "skipped", "reason": "Push disabled"}
         
-        # 获取未推送的高分新闻
+        # 即时模式：补录未进入发件箱的高分新闻，并投递到期记录（含失败重试）
+        if not push_manager.digest_enabled:
+            PushOutboxService.enqueue_pending_news(db, user_config, min_score)
+            db.commit()
+            stats = run_async(PushOutboxService.drain(db))
+            if not stats['claimed']:
+                return {"status": "no_news", "count": 0}
+            return {"status": "success", "pushed": stats['sent'], "total": stats['claimed'], **stats}
+        
+        # 汇总模式：获取未推送的高分新闻（一次最多发出 DIGEST_GROUPS_PER_RUN 组）
+        limit = push_manager.digest_max_items * DIGEST_GROUPS_PER_RUN
         news_to_push = db.query(News).filter(
             News.is_pushed == False,
             News.final_score >= min_score
-        ).order_by(News.final_score.desc()).limit(10).all()
+        ).order_by(News.final_score.desc()).limit(limit).all()
         
         if not news_to_push:
             return {"status": "no_news", "count": 0}
@@ -307,30 +371,22 @@ def push_high_score_news(db_session=None, min_score: float = None):
         if not channels:
             return {"status": "skipped", "reason": "No push channels configured"}
         
-        # 执行推送
-        pushed_count = 0
-        for news in news_to_push:
-            try:
-                # 使用asyncio运行异步推送
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                try:
-                    result = loop.run_until_complete(
-                        PushService.push_news(db, news, channels, user_config)
-                    )
-                    
-                    if result.get('success'):
-                        pushed_count += 1
-                        
-                finally:
-                    loop.close()
-                    
-            except Exception as e:
-                print(f"推送失败 [{news.id}]: {e}")
-                continue
+        # 未达到条数且最早一条未超过等待窗口时，继续累积
+        oldest_pending_at = min(news.analyzed_at or news.crawled_at or datetime.utcnow() for news in news_to_push)
+        if not push_manager.digest_ready(len(news_to_push), oldest_pending_at):
+            return {"status": "waiting", "pending": len(news_to_push)}
         
-        db.commit()
+        # 执行推送（各渠道并发发出，推送日志批量写入）
+        try:
+            results = run_async(
+                PushService.push_digest_batch(db, news_to_push, channels, user_config)
+            )
+        except Exception as e:
+            db.rollback()
+            print(f"批量推送失败: {e}")
+            return {"status": "error", "reason": str(e)}
+        
+        pushed_count = sum(1 for result in results.values() if result['success'])
         
         return {
             "status": "success",
@@ -343,6 +399,63 @@ def push_high_score_news(db_session=None, min_score: float = None):
             db.close()
 
 
+@celery_app.task
+def push_scored_news(news_id: int):
+    """推送刚完成评分的新闻（补写发件箱后立即投递）"""
+    db = SessionLocal()
+    
+    try:
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
+        news = db.query(News).filter(News.id == news_id).first()
+        if news:
+            PushOutboxService.enqueue(db, [news], user_config)
+            db.commit()
+        
+        with metrics.span("push"):
+            stats = run_async(PushOutboxService.drain(db))
+        return {"status": "success", **stats}
+        
+    except Exception as e:
+        db.rollback()
+        print(f"推送新闻失败 (ID: {news_id}): {e}")
+        return {"status": "error", "reason": str(e)}
+        
+    finally:
+        db.close()
+
+
+def on_news_scored(event: Event):
+    """news.scored 订阅者：满足推送条件的新闻立即触发推送，汇总模式由定时任务按窗口合并"""
+    news = event.payload
+    if push_manager.digest_enabled or news.get('is_pushed'):
+        return
+    if (news.get('final_score') or 0) < settings.SCORE_THRESHOLD:
+        return
+    push_scored_news.delay(news['id'])
+
+# 只处理本进程发布的事件，多进程共用 Redis 事件总线时不会重复触发
+event_bus.subscribe(NEWS_SCORED, on_news_scored, local_only=True)
+
+
+@celery_app.task
+def drain_push_outbox(limit: int = 100):
+    """投递推送发件箱中到期的记录（新记录立即投递，失败记录按退避时间重试）"""
+    db = SessionLocal()
+    
+    try:
+        with metrics.span("push"):
+            stats = run_async(PushOutboxService.drain(db, limit))
+        return {"status": "success", **stats}
+        
+    except Exception as e:
+        db.rollback()
+        print(f"投递推送发件箱失败: {e}")
+        return {"status": "error", "reason": str(e)}
+        
+    finally:
+        db.close()
+
+
 @celery_app.task
 def process_news_with_ai(db_session=None, news_item=None):
     """使用AI处理新闻（分类、评分、摘要）"""
@@ -353,18 +466,12 @@ def process_news_with_ai(db_session=None, news_item=None):
         # 使用LLM引擎处理
         if hasattr(llm_engine, 'process_news'):
             # 使用asyncio运行异步方法
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                result = loop.run_until_complete(
-                    llm_engine.process_news(
-                        news_item.title,
-                        news_item.content or ''
-                    )
+            result = run_async(
+                llm_engine.process_news(
+                    news_item.title,
+                    news_item.content or ''
                 )
-            finally:
-                loop.close()
+            )
             
             # 更新新闻记录
             if 'summary' in result:
@@ -406,7 +513,17 @@ def cleanup_old_news(days: int = 30):
         
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # 删除旧新闻
+        # 删除旧新闻及其关联度、发件箱记录和分析任务
+        old_news_ids = db.query(News.id).filter(News.crawled_at < cutoff_date)
+        db.query(NewsUserRelevance).filter(
+            NewsUserRelevance.news_id.in_(old_news_ids)
+        ).delete(synchronize_session=False)
+        db.query(PushOutbox).filter(
+            PushOutbox.news_id.in_(old_news_ids)
+        ).delete(synchronize_session=False)
+        db.query(AnalysisJob).filter(
+            AnalysisJob.news_id.in_(old_news_ids)
+        ).delete(synchronize_session=False)
         deleted = db.query(News).filter(News.crawled_at < cutoff_date).delete()
         db.commit()
         
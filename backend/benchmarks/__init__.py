@@ -0,0 +1,3 @@
+"""
+离线基准测试套件（抓取 → 分析 → 评分 → 推送）
+"""
@@ -0,0 +1,86 @@
+"""
+对比两次基准测试结果，找出性能回退
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+
+延迟（p50/p99）上升或吞吐量下降超过阈值即视为回退，存在回退时退出码为 1
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+# 指标 -> 数值越大越好
+METRICS = {
+    "items_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+}
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """展开嵌套的场景结果（如 crawl_single_source 下按信息源类型分组）"""
+    for name, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        key = f"{prefix}{name}"
+        if any(metric in value for metric in METRICS):
+            yield key, value
+        else:
+            yield from _flatten(value, f"{key}.")
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """返回每个 规模/场景/指标 的对比行"""
+    rows = []
+    for size, scenarios in current.get("results", {}).items():
+        base_scenarios = dict(_flatten(baseline.get("results", {}).get(size, {})))
+        for scenario, values in _flatten(scenarios):
+            base_values = base_scenarios.get(scenario)
+            if not base_values:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                old, new = base_values.get(metric), values.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old * 100
+                regressed = change < -threshold if higher_is_better else change > threshold
+                rows.append({
+                    "size": size,
+                    "scenario": scenario,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change_pct": round(change, 1),
+                    "regressed": regressed,
+                })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="回退阈值（百分比）")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    rows = compare(baseline, current, args.threshold)
+
+    print(f"{'规模':>8}  {'场景':<32} {'指标':<14} {'基线':>12} {'当前':>12} {'变化':>8}")
+    for row in rows:
+        flag = "  <-- 回退" if row["regressed"] else ""
+        print(
+            f"{row['size']:>8}  {row['scenario']:<32} {row['metric']:<14} "
+            f"{row['baseline']:>12} {row['current']:>12} {row['change_pct']:>7}%{flag}"
+        )
+
+    regressions = [row for row in rows if row["regressed"]]
+    print(f"\n共 {len(rows)} 项对比，{len(regressions)} 项回退（阈值 {args.threshold}%）")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+离线基准测试入口
+
+    cd backend
+    python -m benchmarks.run                              # 1k / 10k / 100k 全部场景
+    python -m benchmarks.run --sizes 1000 --scenarios scoring feed_endpoint
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+
+数据库、LLM、飞书和 SMTP 全部指向本地临时文件/桩服务，不访问外网
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+from benchmarks.scenarios import SCENARIOS, BenchContext
+from benchmarks.stubs import StubServices
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def configure_environment(stubs: StubServices, db_path: str):
+    """在导入 app 之前把所有外部依赖指向本地"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "VAPI_BASE_URL": stubs.llm_base_url,
+        "VAPI_API_KEY": "sk-bench",
+        "OPENAI_API_KEY": "sk-bench",
+        "SMTP_HOST": stubs.host,
+        "SMTP_PORT": str(stubs.smtp_port),
+        "SMTP_TLS": "false",
+        "SCORE_THRESHOLD": "60",
+    })
+
+
+def prepare_database(stubs: StubServices):
+    """建表并写入基准测试用户配置（开启飞书+邮件推送）"""
+    from app.database import Base, SessionLocal, engine
+    from app.models import UserConfig
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not db.query(UserConfig).filter(UserConfig.user_id == "default").first():
+            db.add(UserConfig(
+                user_id="default",
+                keywords={"AI": 1.5, "芯片": 1.2, "央行": 1.0, "新能源": 1.0},
+                industries=["科技", "金融"],
+                excluded_keywords=["广告"],
+                push_enabled=True,
+                push_channels=["feishu", "email"],
+                feishu_webhook=stubs.feishu_webhook,
+                email_recipients=["bench@example.com"],
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="llmquant-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+
+    with StubServices(llm_latency_ms=args.llm_latency_ms) as stubs:
+        configure_environment(stubs, db_path)
+        prepare_database(stubs)
+
+        from app.database import SessionLocal
+        from benchmarks.corpus import seed_news
+
+        report: Dict[str, Any] = {
+            "meta": {
+                "started_at": datetime.utcnow().isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "options": {key: value for key, value in vars(args).items() if key != "output"},
+            },
+            "results": {},
+        }
+
+        for size in sorted(args.sizes):
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                added = seed_news(db, size)
+                print(f"[{size}] 写入 {added} 条新闻，耗时 {time.perf_counter() - start:.1f}s")
+            finally:
+                db.close()
+
+            ctx = BenchContext(
+                stubs=stubs,
+                size=size,
+                iterations=args.iterations,
+                llm_sample=args.llm_sample,
+                crawl_items=args.crawl_items,
+                crawler_types=args.crawler_types,
+            )
+            size_results = report["results"][str(size)] = {}
+            for name in args.scenarios:
+                print(f"[{size}] 运行场景 {name} ...")
+                try:
+                    size_results[name] = SCENARIOS[name](ctx)
+                except Exception as e:
+                    traceback.print_exc()
+                    size_results[name] = {"error": str(e)}
+                print(f"[{size}] {name}: {json.dumps(size_results[name], ensure_ascii=False)}")
+
+        report["meta"]["stub_counters"] = stubs.counters()
+        report["meta"]["finished_at"] = datetime.utcnow().isoformat()
+
+    if args.keep_db:
+        print(f"基准数据库保留在 {db_path}")
+    else:
+        os.remove(db_path)
+        os.rmdir(workdir)
+
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="LLMQuant 离线基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="新闻表规模")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=20, help="接口/推送场景的请求次数")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="LLM 桩服务的模拟延迟")
+    parser.add_argument("--llm-sample", type=int, default=50, help="process_news 场景的新闻条数")
+    parser.add_argument("--crawl-items", type=int, default=20, help="每次爬取的信息源条目数")
+    parser.add_argument("--crawler-types", nargs="+", default=["rss", "api", "web"], choices=["rss", "api", "web"])
+    parser.add_argument("--output", type=Path, help="结果JSON路径，默认 benchmarks/results/<时间>-<版本>.json")
+    parser.add_argument("--keep-db", action="store_true", help="保留基准数据库便于排查")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    output = args.output or RESULTS_DIR / f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['meta']['git_revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已保存: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+基准测试场景
+每个场景返回 {'items', 'samples', 'wall_seconds', 'items_per_sec', 'p50_ms', 'p99_ms', ...}
+
+应用模块在函数内部导入，保证 run.py 先设置好 DATABASE_URL 等环境变量
+"""
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+from benchmarks.stubs import StubServices
+
+# 爬取场景每次使用新的 run 编号，避免不同轮次的条目被去重
+_run_ids = itertools.count(1)
+
+# 评分场景分批读取新闻的大小
+SCORING_FETCH_SIZE = 1000
+
+
+@dataclass
+class BenchContext:
+    """场景运行参数"""
+    stubs: StubServices
+    size: int
+    iterations: int = 20
+    llm_sample: int = 50
+    crawl_items: int = 20
+    crawler_types: List[str] = field(default_factory=lambda: ["rss", "api", "web"])
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], items: int, wall_seconds: float, **extra) -> Dict[str, Any]:
+    """汇总单个场景的吞吐量与延迟分布（延迟单位：秒）"""
+    ordered = sorted(latencies)
+    return {
+        "items": items,
+        "samples": len(ordered),
+        "wall_seconds": round(wall_seconds, 4),
+        "items_per_sec": round(items / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        **extra,
+    }
+
+
+def _timed_loop(calls: List[Callable[[], int]]) -> Dict[str, Any]:
+    """依次执行调用并计时，每个调用返回本次处理的条数"""
+    latencies = []
+    items = 0
+    wall_start = time.perf_counter()
+    for call in calls:
+        start = time.perf_counter()
+        items += call()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, items, time.perf_counter() - wall_start)
+
+
+def scenario_scoring(ctx: BenchContext) -> Dict[str, Any]:
+    """NewsScorer 对库中全部新闻评分"""
+    from app.database import SessionLocal
+    from app.models import News, UserConfig
+    from app.scoring.engine import NewsScorer
+    from app.services.rescoring import RescoringService
+
+    db = SessionLocal()
+    try:
+        user_config = db.query(UserConfig).filter(UserConfig.user_id == "default").first()
+        scorer = NewsScorer(user_config.to_dict())
+        inputs = [
+            (RescoringService.build_ai_scores(news), RescoringService.build_scoring_item(news), news.crawled_at)
+            for news in db.query(News).yield_per(SCORING_FETCH_SIZE)
+        ]
+    finally:
+        db.close()
+
+    def score(args):
+        scorer.calculate_final_score(*args)
+        return 1
+
+    return _timed_loop([lambda args=args: score(args) for args in inputs])
+
+
+def scenario_process_news(ctx: BenchContext) -> Dict[str, Any]:
+    """LLMEngine.process_news（对桩服务，逐条执行五个分析任务）"""
+    from app.database import SessionLocal
+    from app.models import News
+    from app.llm import llm_engine
+
+    db = SessionLocal()
+    try:
+        samples = [(news.title, news.content or "") for news in db.query(News).order_by(News.id).limit(ctx.llm_sample)]
+    finally:
+        db.close()
+
+    llm_before = ctx.stubs.llm.requests
+    loop = asyncio.new_event_loop()
+    try:
+        def process(title, content):
+            result = loop.run_until_complete(llm_engine.process_news(title, content))
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            return 1
+
+        result = _timed_loop([lambda t=t, c=c: process(t, c) for t, c in samples])
+    finally:
+        loop.close()
+
+    result["llm_requests"] = ctx.stubs.llm.requests - llm_before
+    return result
+
+
+def _crawler_source_url(ctx: BenchContext, crawler_type: str, run_id: str) -> str:
+    paths = {"rss": "/rss", "api": "/api/news", "web": "/html/list"}
+    return ctx.stubs.url(f"{paths[crawler_type]}?run={run_id}&items={ctx.crawl_items}")
+
+
+def scenario_crawl_single_source(ctx: BenchContext) -> Dict[str, Any]:
+    """crawl_single_source 完整流程（抓取→解析→去重→LLM→评分→入库），按信息源类型分别统计"""
+    from app.database import SessionLocal
+    from app.models import CrawlerConfig
+    from app.services.tasks import crawl_single_source
+
+    results = {}
+    for crawler_type in ctx.crawler_types:
+        db = SessionLocal()
+        try:
+            config = CrawlerConfig(
+                name=f"bench-{crawler_type}-{ctx.size}",
+                crawler_type=crawler_type,
+                source_url="",
+                priority=5,  # 低于自动推送阈值，推送单独测量
+                custom_config={"article_selector": "a.news-item", "max_articles": ctx.crawl_items},
+            )
+            db.add(config)
+            db.commit()
+            config_id = config.id
+        finally:
+            db.close()
+
+        def crawl():
+            db = SessionLocal()
+            try:
+                config = db.query(CrawlerConfig).get(config_id)
+                config.source_url = _crawler_source_url(ctx, crawler_type, f"{ctx.size}x{next(_run_ids)}")
+                db.commit()
+            finally:
+                db.close()
+
+            result = crawl_single_source(config_id)
+            if result.get("status") != "success":
+                raise RuntimeError(f"crawl_single_source 失败: {result}")
+            return result["processed"]
+
+        results[crawler_type] = _timed_loop([crawl for _ in range(max(1, ctx.iterations // 4))])
+
+    return results
+
+
+def _api_client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
+
+
+def _endpoint_loop(ctx: BenchContext, path: str, params: Callable[[int], Dict[str, Any]], items_key: str) -> Dict[str, Any]:
+    client = _api_client()
+
+    def request(i):
+        response = client.get(path, params=params(i))
+        response.raise_for_status()
+        return len(response.json()[items_key])
+
+    # 预热一次，排除首次导入/编译的开销
+    request(0)
+    return _timed_loop([lambda i=i: request(i) for i in range(ctx.iterations)])
+
+
+def scenario_list_endpoint(ctx: BenchContext) -> Dict[str, Any]:
+    """GET /api/v1/news 列表接口（翻页）"""
+    return _endpoint_loop(
+        ctx, "/api/v1/news",
+        lambda i: {"skip": (i % 10) * 20, "limit": 20},
+        "items",
+    )
+
+
+def scenario_feed_endpoint(ctx: BenchContext) -> Dict[str, Any]:
+    """GET /api/v1/news/feed 个性化信息流（all/important 两种模式交替翻页）"""
+    return _endpoint_loop(
+        ctx, "/api/v1/news/feed",
+        lambda i: {"offset": (i % 10) * 20, "limit": 20, "mode": "all" if i % 2 else "important"},
+        "items",
+    )
+
+
+def scenario_push_high_score_news(ctx: BenchContext) -> Dict[str, Any]:
+    """push_high_score_news 推送到本地飞书/SMTP接收端"""
+    from app.services.tasks import push_high_score_news
+
+    feishu_before = ctx.stubs.feishu.messages
+    smtp_before = ctx.stubs.smtp.messages
+
+    def push():
+        result = push_high_score_news()
+        if result.get("status") not in ("success", "no_news"):
+            raise RuntimeError(f"push_high_score_news 失败: {result}")
+        return result.get("pushed", 0)
+
+    result = _timed_loop([push for _ in range(ctx.iterations)])
+    result["feishu_messages"] = ctx.stubs.feishu.messages - feishu_before
+    result["smtp_messages"] = ctx.stubs.smtp.messages - smtp_before
+    return result
+
+
+SCENARIOS: Dict[str, Callable[[BenchContext], Dict[str, Any]]] = {
+    "scoring": scenario_scoring,
+    "process_news": scenario_process_news,
+    "crawl_single_source": scenario_crawl_single_source,
+    "list_endpoint": scenario_list_endpoint,
+    "feed_endpoint": scenario_feed_endpoint,
+    "push_high_score_news": scenario_push_high_score_news,
+}
@@ -0,0 +1,356 @@
+"""
+离线基准测试用的本地桩服务
+- FixtureServer: 按录制的 RSS/HTML/API 样本生成任意条数的信息源
+- StubLLMServer: OpenAI 兼容接口，按提示词返回预置 JSON，延迟可配置
+- FeishuSink: 飞书 Webhook 接收端，只计数
+- SMTPSink: 最小化 SMTP 接收端，只计数
+
+所有服务运行在同一个后台线程的事件循环中，与 Celery 任务内部新建的事件循环互不干扰
+"""
+import asyncio
+import copy
+import json
+import random
+import socket
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from bs4 import BeautifulSoup
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def free_port() -> int:
+    """获取一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+class FixtureServer:
+    """
+    信息源样本服务
+
+    录制样本中的条目会被循环复制到请求的条数，每条的标题、链接和正文都带上
+    run/序号后缀，保证不会被 crawl_single_source 的去重逻辑过滤掉:
+
+        /rss?run=1&items=50
+        /html/list?run=1&items=50   ->  /html/article/1-0 ...
+        /api/news?run=1&items=50
+    """
+
+    def __init__(self):
+        self.rss_tree = ET.fromstring(_read_fixture("rss_feed.xml"))
+        self.api_payload = json.loads(_read_fixture("api_payload.json"))
+        self.list_html = _read_fixture("news_list.html")
+        self.article_html = _read_fixture("article.html")
+        self.titles = [a.get_text(strip=True) for a in BeautifulSoup(self.list_html, "html.parser").select("a.news-item")]
+        self.requests = 0
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.get("/rss", self.rss),
+            web.get("/html/list", self.html_list),
+            web.get("/html/article/{slug}", self.html_article),
+            web.get("/api/news", self.api_news),
+        ]
+
+    @staticmethod
+    def _params(request: web.Request):
+        return request.query.get("run", "0"), int(request.query.get("items", "20"))
+
+    async def rss(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        run, count = self._params(request)
+        tree = copy.deepcopy(self.rss_tree)
+        channel = tree.find("channel")
+        recorded = channel.findall("item")
+        for item in recorded:
+            channel.remove(item)
+
+        for index in range(count):
+            item = copy.deepcopy(recorded[index % len(recorded)])
+            suffix = f"{run}-{index}"
+            item.find("title").text = f"{item.find('title').text}（{suffix}）"
+            item.find("link").text = f"{item.find('link').text}?id={suffix}"
+            item.find("guid").text = item.find("link").text
+            item.find("description").text = f"{item.find('description').text}<p>编号 {suffix}</p>"
+            channel.append(item)
+
+        body = ET.tostring(tree, encoding="unicode", xml_declaration=True)
+        return web.Response(text=body, content_type="application/rss+xml")
+
+    async def html_list(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        run, count = self._params(request)
+        soup = BeautifulSoup(self.list_html, "html.parser")
+        anchors = soup.select("a.news-item")
+        container = anchors[0].find_parent("ul")
+        templates = [anchor.find_parent("li") for anchor in anchors]
+        for template in templates:
+            template.extract()
+
+        for index in range(count):
+            entry = copy.deepcopy(templates[index % len(templates)])
+            anchor = entry.find("a")
+            anchor["href"] = f"/html/article/{run}-{index}"
+            anchor.string = f"{anchor.get_text(strip=True)}（{run}-{index}）"
+            container.append(entry)
+
+        return web.Response(text=str(soup), content_type="text/html")
+
+    async def html_article(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        slug = request.match_info["slug"]
+        index = int(slug.rsplit("-", 1)[-1]) if slug.rsplit("-", 1)[-1].isdigit() else 0
+        title = f"{self.titles[index % len(self.titles)]}（{slug}）"
+
+        soup = BeautifulSoup(self.article_html, "html.parser")
+        soup.title.string = title
+        soup.find("h1").string = title
+        extra = soup.new_tag("p")
+        extra.string = f"编号 {slug}。{title}"
+        soup.find("div", class_="content").append(extra)
+        return web.Response(text=str(soup), content_type="text/html")
+
+    async def api_news(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        run, count = self._params(request)
+        recorded = self.api_payload["articles"]
+        articles = []
+        for index in range(count):
+            article = copy.deepcopy(recorded[index % len(recorded)])
+            suffix = f"{run}-{index}"
+            article["title"] = f"{article['title']}（{suffix}）"
+            article["url"] = f"{article['url']}?id={suffix}"
+            article["content"] = f"{article['content']} 编号 {suffix}"
+            articles.append(article)
+
+        return web.json_response({**self.api_payload, "totalResults": count, "articles": articles})
+
+
+class StubLLMServer:
+    """OpenAI 兼容的 LLM 桩服务，按提示词中的关键短语返回预置结果"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.2, seed: int = 42):
+        config = json.loads(_read_fixture("llm_responses.json"))
+        self.routes_config = [(route["match"].lower(), route["content"]) for route in config["routes"]]
+        self.default = config["default"]
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.post("/v1/chat/completions", self.chat_completions),
+            web.get("/v1/models", self.models),
+        ]
+
+    def _answer(self, prompt: str) -> str:
+        lowered = prompt.lower()
+        for marker, content in self.routes_config:
+            if marker in lowered:
+                return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+        return json.dumps(self.default, ensure_ascii=False)
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        prompt = "\n".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        answer = self._answer(prompt)
+
+        if self.latency_ms:
+            factor = 1 + self.random.uniform(-self.jitter, self.jitter)
+            await asyncio.sleep(self.latency_ms * factor / 1000)
+
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(answer) // 4)
+        return web.json_response({
+            "id": f"chatcmpl-bench-{self.requests}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "stub"}]})
+
+
+class FeishuSink:
+    """飞书 Webhook 接收端"""
+
+    def __init__(self):
+        self.messages = 0
+
+    def routes(self) -> List[web.RouteDef]:
+        return [web.post("/feishu/hook", self.hook)]
+
+    async def hook(self, request: web.Request) -> web.Response:
+        await request.read()
+        self.messages += 1
+        return web.json_response({"code": 0, "msg": "success", "data": {"message_id": f"om_{self.messages}"}})
+
+
+class SMTPSink:
+    """最小化 SMTP 接收端（不支持 STARTTLS/AUTH），只统计收到的邮件数"""
+
+    def __init__(self):
+        self.messages = 0
+        self.server: Optional[asyncio.base_events.Server] = None
+        # 未断开的会话（推送端可能复用连接而不发送 QUIT）
+        self._sessions: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self, host: str, port: int):
+        self.server = await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        """停止监听并结束未断开的会话，避免事件循环关闭后才清理连接"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        # 关闭连接后会话读到 EOF 自行结束（取消任务会让 asyncio 的流回调报错）
+        sessions = list(self._sessions.items())
+        for _, writer in sessions:
+            writer.close()
+        await asyncio.gather(*(task for task, _ in sessions), return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        task = asyncio.current_task()
+        self._sessions[task] = writer
+        try:
+            await reply("220 bench-smtp ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="ignore").strip().upper()
+
+                if command.startswith("EHLO"):
+                    await reply("250-bench-smtp")
+                    await reply("250 8BITMIME")
+                elif command.startswith("HELO"):
+                    await reply("250 bench-smtp")
+                elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    while True:
+                        data = await reader.readline()
+                        if not data or data in (b".\r\n", b".\n"):
+                            break
+                    self.messages += 1
+                    await reply("250 OK: queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            self._sessions.pop(task, None)
+            writer.close()
+
+
+class StubServices:
+    """
+    在后台线程中启动全部桩服务
+
+        with StubServices(llm_latency_ms=50) as stubs:
+            stubs.url("/rss?items=10")
+    """
+
+    def __init__(self, llm_latency_ms: float = 0.0, host: str = "127.0.0.1"):
+        self.host = host
+        self.http_port = free_port()
+        self.smtp_port = free_port()
+        self.fixtures = FixtureServer()
+        self.llm = StubLLMServer(latency_ms=llm_latency_ms)
+        self.feishu = FeishuSink()
+        self.smtp = SMTPSink()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def url(self, path: str = "") -> str:
+        return f"http://{self.host}:{self.http_port}{path}"
+
+    @property
+    def llm_base_url(self) -> str:
+        """对应 settings.VAPI_BASE_URL（LLMEngine 会自动追加 /v1）"""
+        return self.url()
+
+    @property
+    def feishu_webhook(self) -> str:
+        return self.url("/feishu/hook")
+
+    def counters(self) -> Dict[str, Any]:
+        return {
+            "fixture_requests": self.fixtures.requests,
+            "llm_requests": self.llm.requests,
+            "feishu_messages": self.feishu.messages,
+            "smtp_messages": self.smtp.messages,
+        }
+
+    async def _start(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        for service in (self.fixtures, self.llm, self.feishu):
+            app.add_routes(service.routes())
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.http_port).start()
+        await self.smtp.start(self.host, self.smtp_port)
+
+    async def _stop(self):
+        await self.smtp.stop()
+        await self._runner.cleanup()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._stop())
+        self._loop.close()
+
+    def start(self) -> "StubServices":
+        self._thread = threading.Thread(target=self._run, name="bench-stubs", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout=10):
+            raise RuntimeError("桩服务启动超时")
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    def __enter__(self) -> "StubServices":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
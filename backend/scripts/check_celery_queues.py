@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+检查 Celery 的 Redis 消息代理和结果后端，显示各队列积压的任务数和在线 worker
+
+使用方法:
+    cd backend
+    CELERY_BACKEND=redis python scripts/check_celery_queues.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+
+from app.config import settings
+from app.services.celery_app import celery_app, broker_url, result_backend, QUEUE_WORKER_SETTINGS
+
+def main():
+    if settings.CELERY_BACKEND != "redis":
+        print("CELERY_BACKEND 不是 redis，内存消息代理只在单个进程内可见")
+        return 1
+
+    print(f"消息代理: {broker_url}")
+    broker = redis.Redis.from_url(broker_url)
+    broker.ping()
+    print(f"结果后端: {result_backend}")
+    redis.Redis.from_url(result_backend).ping()
+
+    # 消费者数来自 worker 的广播回复，没有在线 worker 时为空
+    replies = celery_app.control.inspect(timeout=2.0).active_queues() or {}
+    consumers = {}
+    for worker, queues in replies.items():
+        for queue in queues:
+            consumers.setdefault(queue['name'], []).append(worker)
+
+    print("\n队列积压:")
+    for queue, (concurrency, prefetch) in QUEUE_WORKER_SETTINGS.items():
+        workers = consumers.get(queue, [])
+        print(f"  {queue:<12} 待处理 {broker.llen(queue):>6}  worker {len(workers)}"
+              f"（单个 worker 并发 {concurrency}，预取 {prefetch}）")
+        if not workers:
+            print(f"    ⚠️  没有 worker 消费该队列: celery -A app.services.celery_app worker -Q {queue}")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except redis.RedisError as e:
+        print(f"❌ 无法连接 Redis: {e}")
+        sys.exit(1)
@@ -0,0 +1,61 @@
+"""
+数据库迁移脚本 - 添加成本归属字段（新闻来源、调用环节）
+
+llm_costs 增加 source 字段；cost_rollups 的唯一键增加 request_type 和 source，
+重新建表后由 llm_costs 重建汇总（历史记录没有来源，归入 other）
+
+使用方法:
+    cd backend
+    python scripts/migrate_add_cost_attribution.py
+
+注意：此脚本会直接修改数据库结构，请先备份数据
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import Base, SessionLocal, engine
+from app.models import CostRollup
+from app.services.cost_ledger import CostLedger
+
+def migrate():
+    """执行数据库迁移"""
+    print("开始数据库迁移...")
+
+    with engine.connect() as conn:
+        print("\n1. 迁移 llm_costs 表...")
+        result = conn.execute(text("PRAGMA table_info(llm_costs)"))
+        existing_columns = {row[1] for row in result.fetchall()}
+        if not existing_columns:
+            print("   - 表不存在，启动时自动创建: llm_costs")
+        elif "source" not in existing_columns:
+            conn.execute(text("ALTER TABLE llm_costs ADD COLUMN source VARCHAR(100)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_llm_costs_source ON llm_costs (source)"))
+            print("   ✓ 添加字段: source")
+        else:
+            print("   - 字段已存在: source")
+
+        print("\n2. 重建 cost_rollups 表...")
+        conn.execute(text("DROP TABLE IF EXISTS cost_rollups"))
+        conn.commit()
+
+    Base.metadata.create_all(bind=engine, tables=[CostRollup.__table__])
+    db = SessionLocal()
+    try:
+        rows = CostLedger.rebuild(db)
+        print(f"   ✓ 汇总行数: {rows}")
+    finally:
+        db.close()
+
+    print("\n✅ 数据库迁移完成！")
+
+if __name__ == "__main__":
+    try:
+        migrate()
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        sys.exit(1)
@@ -0,0 +1,47 @@
+"""
+数据库迁移脚本 - 添加成本汇总表（cost_rollups）
+
+由 llm_costs 的历史记录重建按日/按月、按模型的汇总；之后成本统计和预算检查只读汇总。
+汇总与明细不一致时可重新执行本脚本
+
+使用方法:
+    cd backend
+    python scripts/migrate_add_cost_rollups.py
+
+注意：此脚本会直接修改数据库结构，请先备份数据
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine
+from app.models import CostRollup
+from app.services.cost_ledger import CostLedger
+
+def migrate():
+    """执行数据库迁移"""
+    print("开始数据库迁移...")
+
+    print("\n1. 创建 cost_rollups 表...")
+    Base.metadata.create_all(bind=engine, tables=[CostRollup.__table__])
+    print("   ✓ 表已就绪")
+
+    print("\n2. 由 llm_costs 重建汇总...")
+    db = SessionLocal()
+    try:
+        rows = CostLedger.rebuild(db)
+        print(f"   ✓ 汇总行数: {rows}")
+    finally:
+        db.close()
+
+    print("\n✅ 数据库迁移完成！")
+
+if __name__ == "__main__":
+    try:
+        migrate()
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        sys.exit(1)
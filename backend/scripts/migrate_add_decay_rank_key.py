@@ -0,0 +1,67 @@
+"""
+数据库迁移脚本 - 添加时间衰减排序键字段
+
+使用方法:
+    cd backend
+    python scripts/migrate_add_decay_rank_key.py
+
+注意：此脚本会直接修改数据库结构，请先备份数据
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from app.config import settings
+from app.scoring.engine import calculate_decay_rank_key
+
+def migrate():
+    """执行数据库迁移"""
+    print("开始数据库迁移...")
+    
+    # 创建数据库连接
+    engine = create_engine(settings.DATABASE_URL)
+    
+    with engine.connect() as conn:
+        # 检查字段是否已存在
+        result = conn.execute(text("PRAGMA table_info(news)"))
+        existing_columns = {row[1] for row in result.fetchall()}
+        
+        print("\n1. 迁移 News 表...")
+        if "decay_rank_key" not in existing_columns:
+            conn.execute(text("ALTER TABLE news ADD COLUMN decay_rank_key FLOAT"))
+            print("   ✓ 添加字段: decay_rank_key")
+        else:
+            print("   - 字段已存在: decay_rank_key")
+        
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_news_decay_rank_key ON news (decay_rank_key)"))
+        print("   ✓ 索引: ix_news_decay_rank_key")
+        
+        # 补算历史数据的排序键
+        print("\n2. 补算历史数据排序键...")
+        rows = conn.execute(text(
+            "SELECT id, final_score, crawled_at, published_at FROM news WHERE decay_rank_key IS NULL"
+        )).fetchall()
+        for row in rows:
+            timestamp = row.crawled_at or row.published_at
+            crawled_at = datetime.fromisoformat(str(timestamp)) if timestamp else datetime.utcnow()
+            conn.execute(
+                text("UPDATE news SET decay_rank_key = :key WHERE id = :id"),
+                {"key": calculate_decay_rank_key(row.final_score, crawled_at), "id": row.id}
+            )
+        print(f"   ✓ 已补算 {len(rows)} 条")
+        
+        conn.commit()
+    
+    print("\n✅ 数据库迁移完成！")
+
+if __name__ == "__main__":
+    try:
+        migrate()
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        sys.exit(1)
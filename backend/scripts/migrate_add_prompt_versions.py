@@ -0,0 +1,60 @@
+"""
+数据库迁移脚本 - 添加提示词版本和缓存token字段
+
+使用方法:
+    cd backend
+    python scripts/migrate_add_prompt_versions.py
+
+注意：此脚本会直接修改数据库结构，请先备份数据
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+# 表 -> [(字段, 类型)]
+NEW_COLUMNS = {
+    "news": [("prompt_versions", "JSON")],
+    "llm_costs": [("cached_tokens", "INTEGER DEFAULT 0")],
+    "llm_batch_jobs": [("prompt_version", "VARCHAR(20)")],
+}
+
+def migrate():
+    """执行数据库迁移"""
+    print("开始数据库迁移...")
+
+    # 创建数据库连接
+    engine = create_engine(settings.DATABASE_URL)
+
+    with engine.connect() as conn:
+        for step, (table, columns) in enumerate(NEW_COLUMNS.items(), 1):
+            print(f"\n{step}. 迁移 {table} 表...")
+            result = conn.execute(text(f"PRAGMA table_info({table})"))
+            existing_columns = {row[1] for row in result.fetchall()}
+            if not existing_columns:
+                print(f"   - 表不存在，启动时自动创建: {table}")
+                continue
+
+            for column, column_type in columns:
+                if column not in existing_columns:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                    print(f"   ✓ 添加字段: {column}")
+                else:
+                    print(f"   - 字段已存在: {column}")
+
+        # 历史分析结果没有记录版本，视为过期，可由 reanalyze_news.py --stale 重新分析
+        conn.commit()
+
+    print("\n✅ 数据库迁移完成！")
+
+if __name__ == "__main__":
+    try:
+        migrate()
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        sys.exit(1)
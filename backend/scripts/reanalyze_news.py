@@ -2,8 +2,16 @@
 # -*- coding: utf-8 -*-
 """
 重新分析数据库中AI评分为0的新闻
+
+    python scripts/reanalyze_news.py 10                      # 逐条同步分析
+    python scripts/reanalyze_news.py --offline               # 离线批处理回填所有AI评分为0的新闻
+    python scripts/reanalyze_news.py --offline --all --days 30  # 离线重新分析最近30天的全部新闻
+    python scripts/reanalyze_news.py --offline --stale       # 离线重新分析提示词模板已更新的新闻
+
+离线模式登记的作业记录在 llm_batch_jobs 表中，中断后重新运行会继续推进未结束的作业，不会重复提交
 """
 
+import argparse
 import asyncio
 import sys
 import os
@@ -14,6 +22,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import SessionLocal
 from app.models import News
 from app.llm import llm_engine
+from app.config import settings
 from datetime import datetime
 
 
@@ -103,8 +112,60 @@ def reanalyze_news(limit: int = 10):
         db.close()
 
 
+def reanalyze_offline(
+    limit: int = None, only_missing: bool = True, days: int = None, provider: str = None, stale_prompts: bool = False
+):
+    """登记离线回填作业并推进到全部写回"""
+    from app.services.backfill import BackfillService
+    
+    db = SessionLocal()
+    
+    try:
+        created = BackfillService.create_jobs(
+            db,
+            'stale_prompts' if stale_prompts else 'unanalyzed' if only_missing else 'reanalyze',
+            only_missing=only_missing,
+            days=days,
+            limit=limit,
+            provider=provider,
+            stale_prompts=stale_prompts
+        )
+        print(f"新登记 {len(created)} 个回填作业，共 {sum(job.request_count for job in created)} 条请求")
+        
+        # 本地批处理每轮执行一段请求，服务端批处理需等待完成
+        poll_seconds = 1 if (provider or settings.BACKFILL_PROVIDER) == 'local' else settings.BACKFILL_POLL_SECONDS
+        
+        async def run_until_done():
+            while True:
+                stats = await BackfillService.run(db)
+                print(f"作业状态: {stats['by_status']}")
+                if not stats['active']:
+                    return
+                await asyncio.sleep(poll_seconds)
+        
+        asyncio.run(run_until_done())
+        print("回填完成")
+        
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
-    # 默认分析10条，可以通过参数指定数量
-    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 10
-    print(f"开始重新分析AI评分为0的新闻，限制数量: {limit}")
-    reanalyze_news(limit)
+    parser = argparse.ArgumentParser(description="重新分析新闻")
+    parser.add_argument("limit", nargs="?", type=int, default=None, help="最多处理的新闻数（同步模式默认10）")
+    parser.add_argument("--offline", action="store_true", help="使用离线批处理回填")
+    parser.add_argument("--all", action="store_true", help="离线模式下重新分析时间范围内的全部新闻")
+    parser.add_argument("--days", type=int, default=None, help="离线模式下只处理最近N天入库的新闻")
+    parser.add_argument("--provider", choices=["local", "openai"], default=None, help="批处理提供方")
+    parser.add_argument("--stale", action="store_true", help="离线模式下加上提示词模板已更新的新闻")
+    args = parser.parse_args()
+    
+    if args.offline:
+        print("开始离线回填" + ("（全部新闻）" if args.all else "（提示词模板已更新的新闻）" if args.stale else "（AI评分为0的新闻）"))
+        reanalyze_offline(
+            args.limit, only_missing=not args.all, days=args.days, provider=args.provider, stale_prompts=args.stale
+        )
+    else:
+        limit = args.limit or 10
+        print(f"开始重新分析AI评分为0的新闻，限制数量: {limit}")
+        reanalyze_news(limit)
@@ -0,0 +1,39 @@
+"""
+基准测试冒烟测试：以极小规模跑一遍全部场景，确认桩服务、LLM 调用和推送链路可用
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def test_run_all_scenarios_tiny(tmp_path):
+    output = tmp_path / "result.json"
+    # 子进程运行：run.py 需在导入 app 之前设置 DATABASE_URL 等环境变量
+    completed = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.run",
+            "--sizes", "20",
+            "--iterations", "2",
+            "--llm-sample", "2",
+            "--crawl-items", "2",
+            "--llm-latency-ms", "0",
+            "--output", str(output),
+        ],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    assert "Event loop is closed" not in completed.stderr
+
+    results = json.loads(output.read_text(encoding="utf-8"))["results"]["20"]
+    errors = {name: result["error"] for name, result in results.items() if "error" in result}
+    assert not errors
+
+    assert results["process_news"]["items"] == 2
+    assert results["process_news"]["llm_requests"] == 10
+    assert results["push_high_score_news"]["smtp_messages"] > 0
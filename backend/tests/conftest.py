@@ -0,0 +1,59 @@
+"""
+公共测试夹具
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401  注册所有表
+from app.database import Base
+from app.models import News, UserConfig
+
+
+@pytest.fixture
+def db():
+    """独立的内存 SQLite 会话"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def add_news(db):
+    """
+    新闻工厂：add_news(title, **fields) 写入并 flush
+
+    默认正文 content、来源 Reuters、入库时间为当前时间，发布时间同入库时间
+    """
+    def factory(title: str, **fields) -> News:
+        fields.setdefault('content', 'content')
+        fields.setdefault('url', f'https://example.com/{title}')
+        fields.setdefault('source', 'Reuters')
+        fields.setdefault('crawled_at', datetime.utcnow())
+        fields.setdefault('published_at', fields['crawled_at'])
+        news = News(title=title, **fields)
+        db.add(news)
+        db.flush()
+        return news
+
+    return factory
+
+
+@pytest.fixture
+def add_user(db):
+    """用户配置工厂：add_user(user_id='default', **fields) 写入并 flush"""
+    def factory(user_id: str = 'default', **fields) -> UserConfig:
+        config = UserConfig(user_id=user_id, **fields)
+        db.add(config)
+        db.flush()
+        return config
+
+    return factory
@@ -0,0 +1,82 @@
+"""
+本地批处理：分段执行、已有输出的请求不重复执行（中断后续跑）
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.llm import llm_engine
+from app.llm.batch import LocalBatchProvider, build_request, read_jsonl, response_content, response_usage, write_jsonl
+
+from tests.llm.test_engine_costs import fake_response
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    """记录 _completion 收到的请求体，回复中带上请求的 custom_id 标记"""
+    calls = []
+
+    async def completion(task, hedge=None, **body):
+        calls.append((task, hedge, body))
+        return fake_response(f"reply to {body['messages'][0]['content']}", prompt_tokens=30, completion_tokens=5)
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    return calls
+
+
+def write_input(path, count):
+    write_jsonl(str(path), [
+        build_request(f"news-{n}", 'gpt-4o-mini', [{'role': 'user', 'content': f"item {n}"}], temperature=0.3)
+        for n in range(1, count + 1)
+    ])
+
+
+def test_retrieve_runs_in_steps_and_skips_done(tmp_path, completions):
+    input_file, output_file = tmp_path / 'job.jsonl', tmp_path / 'job.output.jsonl'
+    write_input(input_file, 5)
+    provider = LocalBatchProvider(step=2, concurrency=1)
+
+    first = asyncio.run(provider.retrieve('local-job', str(input_file), str(output_file)))
+    assert first == {'status': 'in_progress', 'completed': 2, 'total': 5}
+
+    # 再次轮询只执行尚无输出的请求
+    asyncio.run(provider.retrieve('local-job', str(input_file), str(output_file)))
+    last = asyncio.run(provider.retrieve('local-job', str(input_file), str(output_file)))
+    assert last == {'status': 'completed', 'completed': 5, 'total': 5}
+
+    assert [body['messages'][0]['content'] for _, _, body in completions] == [f"item {n}" for n in range(1, 6)]
+    assert {(task, hedge) for task, hedge, _ in completions} == {('backfill', False)}
+    rows = list(read_jsonl(str(output_file)))
+    assert [row['custom_id'] for row in rows] == [f"news-{n}" for n in range(1, 6)]
+    assert response_content(rows[0]) == 'reply to item 1'
+    assert response_usage(rows[0]) == {'input_tokens': 30, 'output_tokens': 5, 'cached_tokens': 0}
+
+
+def test_retrieve_resumes_from_existing_output(tmp_path, completions):
+    input_file, output_file = tmp_path / 'job.jsonl', tmp_path / 'job.output.jsonl'
+    write_input(input_file, 3)
+    # 中断前已写入 news-2 的输出，以及一行写入中断的残行
+    existing = {'custom_id': 'news-2', 'response': {'status_code': 200, 'body': {'choices': []}}, 'error': None}
+    output_file.write_text(json.dumps(existing) + "\n" + '{"custom_id": "news-3", "resp', encoding='utf-8')
+
+    result = asyncio.run(LocalBatchProvider(step=10).retrieve('local-job', str(input_file), str(output_file)))
+
+    assert result == {'status': 'completed', 'completed': 3, 'total': 3}
+    assert sorted(body['messages'][0]['content'] for _, _, body in completions) == ['item 1', 'item 3']
+    assert sorted(row['custom_id'] for row in read_jsonl(str(output_file))) == ['news-1', 'news-2', 'news-3']
+
+
+def test_failed_request_is_recorded_as_error(tmp_path, monkeypatch):
+    input_file, output_file = tmp_path / 'job.jsonl', tmp_path / 'job.output.jsonl'
+    write_input(input_file, 1)
+
+    async def completion(task, hedge=None, **body):
+        raise RuntimeError('rate limited')
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    asyncio.run(LocalBatchProvider(step=10).retrieve('local-job', str(input_file), str(output_file)))
+
+    row = next(read_jsonl(str(output_file)))
+    assert row['error'] == {'message': 'rate limited'}
+    assert response_content(row) is None
@@ -0,0 +1,150 @@
+"""
+打包分析：正文按 token 预算挑选，打包和输入 token 分摊与实际发送的文本一致，
+缺失或无效的结果单独重试
+"""
+import asyncio
+import json
+
+from app.llm import llm_engine, tokens
+from app.monitoring import metrics
+
+from tests.llm.test_engine_costs import fake_response
+
+MODEL = 'gpt-4o-mini'
+
+BRIEF = {
+    "summary": "s", "keywords": ["AI"], "sentiment": "neutral", "categories": ["AI"], "importance": 60,
+    "position_bias": "neutral", "position_magnitude": 0, "market_impact": 50, "industry_relevance": 50,
+    "novelty_score": 50, "urgency": 50,
+}
+
+
+def long_content(sentences: int = 80) -> str:
+    return ' '.join(f"Company {n} reported {n}% revenue growth in the quarter." for n in range(sentences))
+
+
+def test_fit_packed_item_selects_sentences_within_budget():
+    item = {'id': 1, 'title': 'Earnings', 'content': long_content()}
+
+    fitted = llm_engine.fit_packed_item(item, MODEL)
+
+    budget = llm_engine.token_budget(MODEL, 'batch')
+    assert tokens.count_tokens(fitted['content'], llm_engine.model_name(MODEL)) <= budget
+    # 按句子挑选，不在句中截断
+    assert all(sentence in item['content'] for sentence in tokens.split_sentences(fitted['content']))
+    assert fitted['packed_tokens'] == tokens.count_tokens(llm_engine._packed_entry(fitted), llm_engine.model_name(MODEL))
+    assert item['content'] == long_content()
+
+
+def test_packed_request_matches_counted_tokens(monkeypatch):
+    items = [
+        {'id': 1, 'title': 'Earnings', 'content': long_content()},
+        {'id': 2, 'title': 'Short', 'content': 'Chip exports rose.'},
+    ]
+    sent = []
+
+    async def completion(task, hedge=None, **kwargs):
+        sent.append(kwargs['messages'][-1]['content'])
+        return fake_response(json.dumps({"results": [{"id": 1, **BRIEF}, {"id": 2, **BRIEF}]}), prompt_tokens=1000)
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    monkeypatch.setattr(llm_engine.result_cache, 'max_size', 0)
+
+    results = asyncio.run(llm_engine.analyze_batch(items, MODEL))
+
+    fitted = [llm_engine.fit_packed_item(item, MODEL) for item in items]
+    assert len(sent) == 1
+    for item in fitted:
+        assert llm_engine._packed_entry(item) in sent[0]
+    assert long_content() not in sent[0]
+
+    weights = {item['id']: item['packed_tokens'] for item in fitted}
+    total = sum(weights.values())
+    for item_id, weight in weights.items():
+        assert results[item_id]['input_tokens'] == round(1000 * weight / total)
+        assert results[item_id]['batch_size'] == 2
+
+
+def short_items(count):
+    return [{'id': n, 'title': f"Headline {n}", 'content': f"Short item {n}."} for n in range(1, count + 1)]
+
+
+def test_pack_batches_respects_item_limit():
+    batches = llm_engine.pack_batches(short_items(7), max_items=3, max_input_tokens=100000, model=MODEL)
+
+    assert [[item['id'] for item in batch] for batch in batches] == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_pack_batches_respects_token_budget():
+    items = short_items(6)
+    items[4] = {'id': 5, 'title': 'Earnings', 'content': long_content()}
+    per_item = llm_engine.fit_packed_item(items[0], MODEL)['packed_tokens']
+    oversized = llm_engine.fit_packed_item(items[4], MODEL)['packed_tokens']
+
+    batches = llm_engine.pack_batches(items, max_items=10, max_input_tokens=per_item * 2 + 1, model=MODEL)
+
+    assert [[item['id'] for item in batch] for batch in batches] == [[1, 2], [3, 4], [5], [6]]
+    # 单条超出预算时独占一个请求
+    assert oversized > per_item * 2 + 1
+    for batch in batches:
+        if len(batch) > 1:
+            assert sum(item['packed_tokens'] for item in batch) <= per_item * 2 + 1
+
+
+def retry_counter():
+    samples = metrics.snapshot()['counters'].get('llm_batch_retries_total', [])
+    return sum(sample['value'] for sample in samples if sample['labels'].get('model') == MODEL)
+
+
+def test_missing_and_invalid_results_retried_individually(monkeypatch):
+    items = short_items(3)
+    calls = []
+
+    async def completion(task, hedge=None, **kwargs):
+        calls.append(task)
+        if task == 'batch_analysis':
+            return fake_response(json.dumps({"results": [
+                {"id": 1, **BRIEF},
+                {"id": 2, "summary": "no categories", "sentiment": "excited"},
+                {"id": 99, **BRIEF},
+            ]}), prompt_tokens=900, completion_tokens=120)
+        return fake_response(json.dumps({**BRIEF, "summary": "retried"}), prompt_tokens=100, completion_tokens=30)
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    monkeypatch.setattr(llm_engine.result_cache, 'max_size', 0)
+    retries_before = retry_counter()
+
+    results = asyncio.run(llm_engine.analyze_batch(items, MODEL))
+
+    # 一次打包请求 + id=2（无效）和 id=3（缺失）各一次单独请求，未知的 id=99 被忽略
+    assert calls == ['batch_analysis', 'brief_analysis', 'brief_analysis']
+    assert set(results) == {1, 2, 3}
+    assert results[1]['batch_size'] == 3 and results[1]['output_tokens'] == 120
+    assert results[2]['summary'] == results[3]['summary'] == 'retried'
+    assert retry_counter() - retries_before == 2
+
+    # 打包请求中分摊给失败条目的输入 token 计入其重试结果
+    weights = {item['id']: llm_engine.fit_packed_item(item, MODEL)['packed_tokens'] for item in items}
+    total = sum(weights.values())
+    for item_id in (2, 3):
+        assert results[item_id]['input_tokens'] == 100 + round(900 * weights[item_id] / total)
+    assert results[1]['input_tokens'] == round(900 * weights[1] / total)
+
+
+def test_failed_packed_request_retries_every_item(monkeypatch):
+    calls = []
+
+    async def completion(task, hedge=None, **kwargs):
+        calls.append(task)
+        if task == 'batch_analysis':
+            raise RuntimeError('upstream timeout')
+        return fake_response(json.dumps(BRIEF), prompt_tokens=100, completion_tokens=30)
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    monkeypatch.setattr(llm_engine.result_cache, 'max_size', 0)
+
+    results = asyncio.run(llm_engine.analyze_batch(short_items(2), MODEL))
+
+    assert calls == ['batch_analysis', 'brief_analysis', 'brief_analysis']
+    # 请求失败没有返回用量，不产生分摊
+    assert [results[n]['input_tokens'] for n in (1, 2)] == [100, 100]
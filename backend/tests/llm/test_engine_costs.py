@@ -0,0 +1,57 @@
+"""
+逐项分析的模型和成本归属：各子任务使用请求的模型，成本按该模型计价
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.llm import llm_engine
+from app.llm.pricing import model_pricing
+
+REPLIES = {
+    'classify': {"categories": ["AI"]},
+    'score': {"market_impact": 80, "industry_relevance": 70, "novelty_score": 60, "urgency": 50},
+    'extract_keywords': {"keywords": ["AI", "chips"]},
+    'sentiment': {"sentiment": "positive"},
+}
+
+
+def fake_response(text: str, prompt_tokens: int = 100, completion_tokens: int = 20):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              prompt_tokens_details=None, prompt_cache_hit_tokens=None),
+    )
+
+
+def test_process_news_uses_requested_model(monkeypatch):
+    calls = []
+
+    async def completion(task, hedge=None, **kwargs):
+        calls.append((task, kwargs['model']))
+        return fake_response(json.dumps(REPLIES[task]) if task in REPLIES else "summary text")
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    monkeypatch.setattr(llm_engine.result_cache, 'max_size', 0)
+
+    result = asyncio.run(llm_engine.process_news("Title", "Short content", model='deepseek-chat'))
+
+    assert result['model_used'] == 'deepseek-chat'
+    assert len(calls) == 5
+    assert {model for _, model in calls} == {'deepseek-chat'}
+    assert result['cost']['input_tokens'] == 500
+    assert result['cost']['output_tokens'] == 100
+
+    cost = llm_engine.calculate_cost(result['model_used'], 500, 100)
+    expected = model_pricing.cost('deepseek-chat', 500, 100)
+    assert cost['cost_usd'] == expected['cost_usd']
+    assert cost['priced']
+
+
+def test_calculate_cost_prices_cached_tokens():
+    price, priced = model_pricing.price('gpt-4o')
+    assert priced
+    cost = llm_engine.calculate_cost('gpt-4o', 1000, 0, cached_tokens=400)
+    expected = 0.6 * price.input + 0.4 * price.cached_input
+    assert abs(cost['cost_usd'] - round(expected, 6)) < 1e-9
+    assert cost['cached_tokens'] == 400
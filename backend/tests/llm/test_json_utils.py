@@ -0,0 +1,43 @@
+"""
+LLM 输出的宽松 JSON 解析：代码块、说明文字、尾随逗号、截断输出和增量解析
+"""
+from app.llm.json_utils import IncrementalJSONParser, extract_json_object, parse_partial_object
+
+
+def test_extract_plain_and_fenced():
+    assert extract_json_object('{"a": 1}') == {'a': 1}
+    assert extract_json_object('结果如下：\n```json\n{"a": 1, "b": [1, 2]}\n```') == {'a': 1, 'b': [1, 2]}
+    assert extract_json_object('Sure! {"a": "x}y"} hope this helps') == {'a': 'x}y'}
+
+
+def test_extract_trailing_comma():
+    assert extract_json_object('{"a": [1, 2,], "b": 2,}') == {'a': [1, 2], 'b': 2}
+
+
+def test_extract_truncated_keeps_complete_fields():
+    text = '{"summary": "芯片发布", "keywords": ["AI", "GPU", "算'
+    assert extract_json_object(text) == {'summary': '芯片发布', 'keywords': ['AI', 'GPU']}
+    assert extract_json_object(text, allow_partial=False) is None
+
+
+def test_extract_non_object():
+    assert extract_json_object('') is None
+    assert extract_json_object('no json here') is None
+    assert extract_json_object('[1, 2]') is None
+
+
+def test_partial_object():
+    assert parse_partial_object('{"a": 1, "b": {"c": 2}, "d": "unfinished') == {'a': 1, 'b': {'c': 2}}
+
+
+def test_incremental_parser_emits_fields_and_items():
+    parser = IncrementalJSONParser()
+    events = []
+    for chunk in ('```json\n{"summary": "新', '品", "results": [{"id": 1},', ' {"id": 2}], "n": 3}'):
+        events.extend(parser.feed(chunk))
+
+    assert ('field', 'summary', '新品') in events
+    assert [value for kind, key, value in events if kind == 'item'] == [{'id': 1}, {'id': 2}]
+    assert ('field', 'n', 3) in events
+    assert parser.done
+    assert parser.fields == {'summary': '新品', 'results': [{'id': 1}, {'id': 2}], 'n': 3}
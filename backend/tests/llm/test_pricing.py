@@ -0,0 +1,42 @@
+"""
+模型价格表：精确匹配、通配符匹配、未配置价格的模型和汇率换算
+"""
+import json
+
+from app.llm.pricing import PricingTable
+
+
+def make_table(tmp_path, data):
+    path = tmp_path / 'pricing.json'
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return PricingTable(path=str(path), catalog_path='')
+
+
+def test_pattern_and_currency(tmp_path):
+    table = make_table(tmp_path, {
+        'exchange_rates': {'CNY': 8.0},
+        'models': {
+            'gpt-4o-2024-*': {'input': 0.002, 'output': 0.008},
+            'gpt-4o-*': {'input': 0.003, 'output': 0.012},
+            'qwen-plus': {'input': 0.008, 'output': 0.016, 'currency': 'CNY'},
+        },
+    })
+
+    assert table.lookup('GPT-4o-2024-08-06').input == 0.002
+    assert table.lookup('gpt-4o-audio').input == 0.003
+
+    cost = table.cost('qwen-plus', 1000, 1000)
+    assert cost['priced']
+    assert cost['cost_usd'] == 0.003
+    assert cost['cost_cny'] == 0.024
+
+
+def test_unpriced_model_uses_default(tmp_path):
+    table = make_table(tmp_path, {
+        'models': {'gpt-4o': {'input': 0.0025, 'output': 0.01}},
+        'default': {'input': 0.001, 'output': 0.002},
+    })
+
+    cost = table.cost('unknown-model', 1000, 1000)
+    assert not cost['priced']
+    assert cost['cost_usd'] == 0.003
@@ -0,0 +1,88 @@
+"""
+提示词模板：版本过期判断、结果缓存键的稳定性、结果缓存的过期和 LRU 淘汰
+"""
+from app.llm import prompts
+from app.llm.prompts import PromptRegistry, PromptTemplate, ResultCache, prompt_registry
+
+
+def make_registry():
+    registry = PromptRegistry()
+    registry.register(PromptTemplate('brief', 'v1', system="Analyze.", user="$title\n$content"))
+    registry.register(PromptTemplate('tags', 'v1', system="Tag.", user="$content"))
+    return registry
+
+
+def test_is_stale_follows_active_version():
+    registry = make_registry()
+
+    assert not registry.is_stale({'brief': 'v1'})
+    assert not registry.is_stale({'brief': 'v1', 'tags': 'v1'})
+    # 未记录版本视为过期
+    assert registry.is_stale(None)
+    assert registry.is_stale({})
+
+    # 注册但不启用的新版本不影响判断
+    registry.register(PromptTemplate('brief', 'v2', system="Analyze better.", user="$title\n$content"), active=False)
+    assert not registry.is_stale({'brief': 'v1'})
+
+    registry.register(PromptTemplate('brief', 'v2', system="Analyze better.", user="$title\n$content"))
+    assert registry.is_stale({'brief': 'v1'})
+    assert registry.is_stale({'brief': 'v2', 'tags': 'v0'})
+    assert not registry.is_stale({'brief': 'v2', 'tags': 'v1'})
+    assert registry.get('brief', 'v1').system == "Analyze."
+
+
+def test_registered_templates_are_current():
+    assert not prompt_registry.is_stale(prompt_registry.versions())
+
+
+def test_cache_key_is_stable():
+    template = PromptTemplate('brief', 'v1', system="Analyze.", user="$title\n$content")
+
+    key = template.cache_key('gpt-4o-mini', title='AI', content='chips')
+    # 与变量顺序无关，重复计算结果一致
+    assert key == template.cache_key('gpt-4o-mini', content='chips', title='AI')
+    assert key == PromptTemplate('brief', 'v1', system="Analyze.", user="$title\n$content").cache_key(
+        'gpt-4o-mini', title='AI', content='chips')
+    assert key.startswith('brief:v1:gpt-4o-mini:')
+
+    assert key != template.cache_key('gpt-4o', title='AI', content='chips')
+    assert key != template.cache_key('gpt-4o-mini', title='AI', content='chips!')
+    assert key != PromptTemplate('brief', 'v2', system="Analyze.", user="$title\n$content").cache_key(
+        'gpt-4o-mini', title='AI', content='chips')
+
+
+def test_result_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompts.time, 'monotonic', lambda: now[0])
+    cache = ResultCache(max_size=10, ttl_seconds=60)
+
+    cache.set('a', 'result')
+    now[0] += 59
+    assert cache.get('a') == 'result'
+    now[0] += 2
+    assert cache.get('a') is None
+    # 过期条目在读取时被移除
+    assert 'a' not in cache._entries
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_size=2, ttl_seconds=60)
+
+    cache.set('a', '1')
+    cache.set('b', '2')
+    assert cache.get('a') == '1'  # a 变为最近使用
+    cache.set('c', '3')
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('1', '3')
+
+    # 覆盖已有键不淘汰其他条目
+    cache.set('a', '1b')
+    assert (cache.get('a'), cache.get('c')) == ('1b', '3')
+
+
+def test_result_cache_disabled():
+    cache = ResultCache(max_size=0)
+    cache.set('a', '1')
+    assert cache.get('a') is None
@@ -0,0 +1,119 @@
+"""
+多端点路由：熔断、故障切换和对冲请求
+"""
+import asyncio
+
+from app.config import settings
+from app.llm import router as router_module
+from app.llm.router import CLOSED, HALF_OPEN, OPEN, Endpoint, LLMRouter
+
+
+def make_router(*names):
+    return LLMRouter([Endpoint(name, f"http://{name}/v1", 'sk-test', model_prefix='openai/') for name in names])
+
+
+def fake_acompletion(monkeypatch, behaviour):
+    """behaviour: api_base -> 协程函数；返回记录调用端点的列表"""
+    calls = []
+
+    async def acompletion(**kwargs):
+        calls.append(kwargs['api_base'])
+        return await behaviour[kwargs['api_base']](kwargs)
+
+    monkeypatch.setattr(router_module.litellm, 'acompletion', acompletion)
+    return calls
+
+
+def test_circuit_opens_and_half_opens(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_CIRCUIT_FAILURES', 3)
+    router = make_router('a', 'b')
+    a, b = router.endpoints
+
+    for _ in range(3):
+        router.record(a, 'gpt-4o-mini', None, error=True)
+    stats = router._get_stats(a, 'gpt-4o-mini')
+    assert stats.state == OPEN
+    assert router.candidates('gpt-4o-mini') == [b]
+
+    # 冷却结束后只放行一个试探请求
+    stats.opened_at -= settings.LLM_CIRCUIT_COOLDOWN_SECONDS
+    assert a in router.candidates('gpt-4o-mini')
+    assert stats.state == HALF_OPEN
+    assert router.candidates('gpt-4o-mini') == [b]
+
+    # 试探失败重新熔断，成功则恢复
+    router.record(a, 'gpt-4o-mini', None, error=True)
+    assert stats.state == OPEN
+    stats.opened_at -= settings.LLM_CIRCUIT_COOLDOWN_SECONDS
+    router.candidates('gpt-4o-mini')
+    router.record(a, 'gpt-4o-mini', 0.5, error=False)
+    assert stats.state == CLOSED
+    assert stats.consecutive_failures == 0
+
+
+def test_all_open_falls_back_to_earliest(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_CIRCUIT_FAILURES', 1)
+    router = make_router('a', 'b')
+    a, b = router.endpoints
+    router.record(a, 'gpt-4o-mini', None, error=True)
+    router.record(b, 'gpt-4o-mini', None, error=True)
+
+    assert router.candidates('gpt-4o-mini') == [a]
+
+
+def test_completion_fails_over(monkeypatch):
+    async def fail(kwargs):
+        raise RuntimeError('upstream 500')
+
+    async def ok(kwargs):
+        return kwargs['model']
+
+    calls = fake_acompletion(monkeypatch, {'http://a/v1': fail, 'http://b/v1': ok})
+    router = make_router('a', 'b')
+
+    assert asyncio.run(router.completion(hedge=False, model='gpt-4o-mini', messages=[])) == 'openai/gpt-4o-mini'
+    assert calls == ['http://a/v1', 'http://b/v1']
+    assert router._get_stats(router.endpoints[0], 'gpt-4o-mini').consecutive_failures == 1
+
+
+def warm_up(router, endpoint, latency=0.01):
+    for _ in range(router_module.MIN_HEDGE_SAMPLES):
+        router.record(endpoint, 'gpt-4o-mini', latency, error=False)
+
+
+def test_no_hedge_with_single_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_HEDGE_MIN_DELAY_SECONDS', 0.01)
+
+    async def slow(kwargs):
+        await asyncio.sleep(0.05)
+        return 'slow'
+
+    calls = fake_acompletion(monkeypatch, {'http://a/v1': slow})
+    router = make_router('a')
+    warm_up(router, router.endpoints[0])
+
+    assert asyncio.run(router.completion(hedge=True, model='gpt-4o-mini', messages=[])) == 'slow'
+    assert calls == ['http://a/v1']
+
+
+def test_hedge_to_distinct_endpoint(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_HEDGE_MIN_DELAY_SECONDS', 0.01)
+
+    async def slow(kwargs):
+        await asyncio.sleep(1)
+        return 'slow'
+
+    async def fast(kwargs):
+        return 'fast'
+
+    calls = fake_acompletion(monkeypatch, {'http://a/v1': slow, 'http://b/v1': fast})
+    router = make_router('a', 'b')
+    warm_up(router, router.endpoints[0], latency=0.01)
+    warm_up(router, router.endpoints[1], latency=0.02)
+
+    assert asyncio.run(router.completion(hedge=True, model='gpt-4o-mini', messages=[])) == 'fast'
+    assert calls == ['http://a/v1', 'http://b/v1']
+
+
+def test_hedging_is_off_by_default():
+    assert type(settings).model_fields['LLM_HEDGE_ENABLED'].default is False
@@ -0,0 +1,104 @@
+"""
+各任务输出的结构校验：关键字段缺失、为空或被截断时算解析失败，且不进入结果缓存
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.llm import llm_engine
+from app.llm.prompts import ResultCache
+from app.llm.schemas import (
+    BatchOutput,
+    BriefOutput,
+    ClassifyOutput,
+    KeywordsOutput,
+    ScoreOutput,
+    SearchOutput,
+    SentimentOutput,
+    parse_output,
+)
+from app.monitoring import metrics
+
+SCORES = {"market_impact": "80%", "industry_relevance": 120, "novelty_score": "60", "urgency": 40}
+
+
+def parse_count(task: str, outcome: str) -> float:
+    return sum(
+        entry['value'] for entry in metrics.snapshot()['counters'].get('llm_parse_total', [])
+        if entry['labels'].get('task') == task and entry['labels'].get('outcome') == outcome
+    )
+
+
+def test_scores_are_coerced():
+    parsed = parse_output(json.dumps(SCORES), ScoreOutput, 'score', 'gpt-4o-mini')
+    assert (parsed.market_impact, parsed.industry_relevance, parsed.novelty_score, parsed.urgency) == (80, 100, 60, 40)
+    assert parsed.importance == 50
+    assert parsed.position_bias == 'neutral'
+
+
+def test_wrong_keys_fail():
+    before = parse_count('score', 'failed')
+    assert parse_output('{"foo": 1}', ScoreOutput, 'score', 'gpt-4o-mini') is None
+    assert parse_count('score', 'failed') == before + 1
+
+    assert parse_output('{"foo": 1}', ClassifyOutput, 'classify', 'gpt-4o-mini') is None
+    assert parse_output('{"foo": 1}', KeywordsOutput, 'keywords', 'gpt-4o-mini') is None
+    assert parse_output('{"foo": 1}', SentimentOutput, 'sentiment', 'gpt-4o-mini') is None
+    assert parse_output('{"foo": 1}', SearchOutput, 'search', 'gpt-4o-mini') is None
+
+
+def test_empty_or_invalid_values_fail():
+    assert parse_output('{"categories": []}', ClassifyOutput, 'classify', 'gpt-4o-mini') is None
+    assert parse_output('{"keywords": ""}', KeywordsOutput, 'keywords', 'gpt-4o-mini') is None
+    assert parse_output('{"sentiment": "mixed"}', SentimentOutput, 'sentiment', 'gpt-4o-mini') is None
+    assert parse_output(json.dumps({**SCORES, 'urgency': 'high'}), ScoreOutput, 'score', 'gpt-4o-mini') is None
+    assert parse_output('{"results": [{"foo": 1}]}', BatchOutput, 'batch_analysis', 'gpt-4o-mini') is None
+
+
+def test_truncated_score_fails():
+    before = parse_count('score', 'repaired')
+    assert parse_output('{"market_impact": 80, "industry_relevance": 70, "nov', ScoreOutput, 'score', 'gpt-4o-mini') is None
+    assert parse_count('score', 'repaired') == before
+
+
+def test_repaired_output():
+    before = parse_count('classify', 'repaired')
+    parsed = parse_output('```json\n{"categories": "AI，Market"}\n```', ClassifyOutput, 'classify', 'gpt-4o-mini')
+    assert parsed.categories == ['AI', 'Market']
+    assert parse_count('classify', 'repaired') == before + 1
+
+
+def test_brief_requires_summary_and_categories():
+    brief = {**SCORES, 'summary': ' 芯片发布 ', 'categories': ['AI'], 'sentiment': 'Positive'}
+    parsed = BriefOutput.model_validate(brief)
+    assert parsed.summary == '芯片发布'
+    assert parsed.sentiment == 'positive'
+    assert parsed.keywords == []
+
+    for key in ('summary', 'categories', 'market_impact'):
+        assert parse_output(json.dumps({k: v for k, v in brief.items() if k != key}), BriefOutput, 'brief', 'gpt-4o-mini') is None
+
+
+def test_failed_output_is_not_cached(monkeypatch):
+    replies = iter(['{"foo": 1}', '{"categories": ["AI"]}'])
+
+    async def completion(task, hedge=None, **kwargs):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=next(replies)))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+    monkeypatch.setattr(llm_engine, '_completion', completion)
+    monkeypatch.setattr(llm_engine, 'result_cache', ResultCache(100, 3600))
+
+    async def classify():
+        return await llm_engine._classify('内容', 'gpt-4o-mini')
+
+    first = asyncio.run(classify())
+    assert first['categories'] == [] and not first['cache_hit']
+
+    second = asyncio.run(classify())
+    assert second['categories'] == ['AI'] and not second['cache_hit']
+
+    third = asyncio.run(classify())
+    assert third['categories'] == ['AI'] and third['cache_hit']
@@ -0,0 +1,131 @@
+"""
+跨进程指标汇总和性能分析开关：worker 上报的指标合并到 API 导出，开关经 Redis 由 worker 领取
+"""
+import fnmatch
+
+from app.monitoring import MetricsAggregator, MetricsRegistry, TaskProfiler
+
+
+class FakeRedis:
+    """测试用的最小 Redis 替身（只实现用到的命令）"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.lists = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def scan_iter(self, match):
+        return [key for key in list(self.values) if fnmatch.fnmatchcase(key, match)]
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    def hincrby(self, key, field, amount):
+        value = int(self.hashes.setdefault(key, {}).get(field) or 0) + amount
+        self.hashes[key][field] = str(value)
+        return value
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:end + 1]
+
+    def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:end + 1]
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+def test_dump_and_load_merge_series():
+    worker = MetricsRegistry()
+    worker.inc('news_crawled_total', 3, source='rss')
+    worker.observe(MetricsRegistry.STAGE_HISTOGRAM, 0.2, stage='fetch')
+    worker.observe(MetricsRegistry.STAGE_HISTOGRAM, 1.5, stage='fetch')
+
+    combined = MetricsRegistry()
+    combined.load(worker.dump(), process='w1')
+    combined.load(worker.dump(), process='w1')
+    snapshot = combined.snapshot()
+
+    assert snapshot['counters']['news_crawled_total'] == [{'labels': {'process': 'w1', 'source': 'rss'}, 'value': 6}]
+    histogram = snapshot['histograms'][MetricsRegistry.STAGE_HISTOGRAM][0]
+    assert histogram['count'] == 4
+    assert histogram['min'] == 0.2 and histogram['max'] == 1.5
+
+
+def test_render_includes_worker_metrics():
+    client = FakeRedis()
+    api = MetricsRegistry()
+    api.inc('http_requests_total')
+    worker = MetricsRegistry()
+    worker.inc('news_crawled_total', 2, source='rss')
+
+    worker_side = MetricsAggregator(worker, backend='redis')
+    worker_side._redis = client
+    worker_side.publish()
+
+    api_side = MetricsAggregator(api, backend='redis')
+    api_side._redis = client
+    text = api_side.render_prometheus()
+
+    assert 'llmquant_http_requests_total 1' in text
+    assert 'llmquant_news_crawled_total{process="' in text
+    assert text.count('# TYPE llmquant_news_crawled_total counter') == 1
+    assert list(api_side.snapshot()['workers'].values())[0]['counters']['news_crawled_total'][0]['value'] == 2
+
+
+def test_memory_backend_only_exports_local_metrics():
+    registry = MetricsRegistry()
+    registry.inc('http_requests_total')
+    aggregator = MetricsAggregator(registry, backend='memory')
+
+    assert aggregator.render_prometheus() == registry.render_prometheus()
+    assert aggregator.snapshot()['workers'] == {}
+
+
+def test_profiler_runs_are_shared_across_processes():
+    client = FakeRedis()
+    api = TaskProfiler(backend='redis')
+    api._redis = client
+    workers = [TaskProfiler(backend='redis'), TaskProfiler(backend='redis')]
+    for worker in workers:
+        worker._redis = client
+
+    api.enable('crawl_single_source', runs=2)
+    assert api.status()['enabled'] == {'crawl_single_source': 2}
+
+    claimed = [worker._claim('crawl_single_source') for worker in workers + workers]
+    assert claimed == [True, True, False, False]
+    assert api.status()['enabled'] == {}
+
+    with workers[0].profile('push_scored_news'):
+        pass
+    api.enable('push_scored_news', runs=None)
+    with workers[1].profile('push_scored_news'):
+        sum(range(100))
+    results = api.get_results('push_scored_news')
+    assert len(results) == 1 and results[0]['report']
+    assert api.status()['enabled'] == {'push_scored_news': None}
+
+    api.disable('push_scored_news')
+    assert not workers[0]._claim('push_scored_news')
@@ -0,0 +1,146 @@
+"""
+SSE 事件流：按 Last-Event-ID 续传、缓冲区溢出和进程重启后的重置
+"""
+import asyncio
+import json
+
+from app.realtime import EventStream, FeedFilter
+from app.routers.stream import _event_source
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def parse(message):
+    """SSE 消息 -> {字段: 值}"""
+    fields = {}
+    for line in message.strip().split("\n"):
+        key, _, value = line.partition(": ")
+        fields[key] = value
+    return fields
+
+
+def collect(stream, last_event_id, live=(), feed_filter=None):
+    """订阅事件流，补发完成后写入 live 中的事件，返回收到的 (event, id, data) 列表"""
+    async def run():
+        source = _event_source(FakeRequest(), stream, last_event_id, feed_filter)
+        received = []
+        assert await source.__anext__() == "retry: 3000\n\n"
+        for event_type, data in live:
+            stream.append(event_type, data)
+        while True:
+            try:
+                message = await asyncio.wait_for(source.__anext__(), timeout=0.05)
+            except asyncio.TimeoutError:
+                break
+            fields = parse(message)
+            received.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+        await source.aclose()
+        return received
+
+    return asyncio.run(run())
+
+
+def fill(stream, count):
+    for i in range(1, count + 1):
+        stream.append('news', {'n': i})
+
+
+def test_event_ids_carry_epoch():
+    stream = EventStream('news')
+    seq = stream.append('news', {'n': 1})
+    assert seq == 1
+    assert stream.event_id(seq) == f"{stream.epoch}-1"
+    assert EventStream('news').epoch != stream.epoch
+
+
+def test_resume_replays_missed_events():
+    stream = EventStream('news')
+    fill(stream, 5)
+
+    received = collect(stream, stream.event_id(3), live=[('news', {'n': 6})])
+
+    assert [(event, event_id) for event, event_id, _ in received] == [
+        ('news', stream.event_id(4)), ('news', stream.event_id(5)), ('news', stream.event_id(6)),
+    ]
+
+
+def test_resume_skips_live_events_already_replayed():
+    stream = EventStream('news')
+    fill(stream, 2)
+
+    async def run():
+        source = _event_source(FakeRequest(), stream, stream.event_id(1))
+        await source.__anext__()
+        # 订阅之后、补发之前到达的事件同时在缓冲区和队列中
+        stream.append('news', {'n': 3})
+        messages = []
+        while True:
+            try:
+                messages.append(parse(await asyncio.wait_for(source.__anext__(), timeout=0.05)))
+            except asyncio.TimeoutError:
+                break
+        await source.aclose()
+        return [m['id'] for m in messages]
+
+    assert asyncio.run(run()) == [stream.event_id(2), stream.event_id(3)]
+
+
+def test_no_last_event_id_only_streams_live_events():
+    stream = EventStream('news')
+    fill(stream, 3)
+
+    received = collect(stream, None, live=[('news', {'n': 4})])
+
+    assert [event_id for _, event_id, _ in received] == [stream.event_id(4)]
+
+
+def test_gap_sends_reset_then_remaining_buffer():
+    stream = EventStream('news', buffer_size=3)
+    fill(stream, 6)
+
+    received = collect(stream, stream.event_id(1))
+
+    assert received[0][0] == 'reset'
+    assert received[0][2] == {'reason': 'buffer_overflow', 'last_id': stream.event_id(6)}
+    assert [event_id for _, event_id, _ in received[1:]] == [stream.event_id(n) for n in (4, 5, 6)]
+
+
+def test_id_from_before_restart_resets_instead_of_skipping_new_events():
+    before = EventStream('news')
+    fill(before, 50)
+    stale_id = before.event_id(50)
+
+    # 重启后序号从1开始，旧ID的序号比新事件大
+    stream = EventStream('news')
+    fill(stream, 3)
+    received = collect(stream, stale_id, live=[('news', {'n': 4})])
+
+    assert received[0][0] == 'reset'
+    assert received[0][2]['reason'] == 'stream_restarted'
+    assert [(event, event_id) for event, event_id, _ in received[1:]] == [('news', stream.event_id(4))]
+
+
+def test_legacy_or_unknown_ids_reset():
+    stream = EventStream('news')
+    fill(stream, 3)
+
+    for last_event_id in ('2', 'garbage', f"{stream.epoch}-99"):
+        reason, sent, backlog = stream.resume(last_event_id)
+        assert (reason, sent, backlog) == ('stream_restarted', 0, [])
+
+
+def test_filtered_replay_advances_resume_point():
+    stream = EventStream('news')
+    stream.append('news', {'final_score': 90, 'source': 'a'})
+    stream.append('news', {'final_score': 10, 'source': 'a'})
+
+    received = collect(
+        stream, stream.event_id(0),
+        live=[('news', {'final_score': 95, 'source': 'a'})],
+        feed_filter=FeedFilter.from_dict({'min_score': 50}),
+    )
+
+    assert [event_id for _, event_id, _ in received] == [stream.event_id(1), stream.event_id(3)]
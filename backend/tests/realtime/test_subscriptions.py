@@ -0,0 +1,109 @@
+"""
+信息流订阅索引：索引匹配结果与逐条件判断一致
+"""
+import random
+
+import pytest
+
+from app.realtime import FeedFilter, Subscription, SubscriptionIndex
+from app.realtime.subscriptions import MAX_SUBSCRIPTIONS_PER_CONNECTION
+
+SOURCES = ['Reuters', 'Bloomberg', '财联社', 'WSJ']
+BIASES = ['bullish', 'bearish', 'neutral']
+CATEGORIES = ['macro', 'tech', 'energy', 'finance']
+KEYWORDS = ['ai', 'chips', '降息', 'oil', 'nvidia', 'fed']
+
+
+class Connection:
+    pass
+
+
+def sample(rng, values):
+    """空集合（不限）的概率较高，模拟真实订阅"""
+    if rng.random() < 0.5:
+        return []
+    return rng.sample(values, rng.randint(1, 2))
+
+
+def random_filter(rng) -> FeedFilter:
+    min_score = rng.choice([0, 0, 30, 60, 80])
+    return FeedFilter.from_dict({
+        'min_score': min_score,
+        'max_score': rng.choice([None, None, 90, min_score + 10]),
+        'position_bias': sample(rng, BIASES),
+        'sources': sample(rng, SOURCES),
+        'categories': sample(rng, CATEGORIES),
+        'keywords': sample(rng, KEYWORDS),
+    })
+
+
+def random_news(rng):
+    words = rng.sample(KEYWORDS + ['market', 'stocks'], 2)
+    return {
+        'final_score': rng.choice([None, rng.uniform(0, 100), 60, 80]),
+        'position_bias': rng.choice(BIASES + [None]),
+        'source': rng.choice(SOURCES + [None]),
+        'categories': sample(rng, CATEGORIES),
+        'title': f"{words[0].upper()} update",
+        'summary': f"about {words[1]}",
+        'keywords': sample(rng, KEYWORDS),
+    }
+
+
+def keys(subscriptions):
+    return sorted(subscription.key for subscription in subscriptions)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_match_agrees_with_filter(seed):
+    rng = random.Random(seed)
+    index = SubscriptionIndex()
+    subscriptions = []
+    for _ in range(40):
+        connection = Connection()
+        for n in range(rng.randint(1, 3)):
+            subscription = Subscription(connection, f"s{n}", random_filter(rng))
+            index.add(subscription)
+            subscriptions.append(subscription)
+
+    # 部分订阅被移除，索引中不应残留
+    for subscription in rng.sample(subscriptions, 15):
+        assert index.remove(subscription.connection, subscription.subscription_id)
+        subscriptions.remove(subscription)
+    assert len(index) == len(subscriptions)
+
+    for _ in range(200):
+        news = random_news(rng)
+        expected = [subscription for subscription in subscriptions if subscription.filter.matches(news)]
+        assert keys(index.match(news)) == keys(expected)
+
+
+def test_match_returns_each_subscription_once():
+    index = SubscriptionIndex()
+    connection = Connection()
+    index.add(Subscription(connection, 'multi', FeedFilter.from_dict({
+        'categories': ['tech', 'macro'], 'keywords': ['ai', 'chips'],
+    })))
+
+    news = {'final_score': 70, 'categories': ['tech', 'macro'], 'title': 'AI chips'}
+    assert [subscription.subscription_id for subscription in index.match(news)] == ['multi']
+
+
+def test_replace_and_limit():
+    index = SubscriptionIndex()
+    connection = Connection()
+    index.add(Subscription(connection, 'a', FeedFilter.from_dict({'sources': ['Reuters']})))
+    index.add(Subscription(connection, 'a', FeedFilter.from_dict({'sources': ['WSJ']})))
+
+    assert len(index) == 1
+    assert index.match({'final_score': 50, 'source': 'Reuters'}) == []
+    assert len(index.match({'final_score': 50, 'source': 'WSJ'})) == 1
+
+    for n in range(1, MAX_SUBSCRIPTIONS_PER_CONNECTION):
+        index.add(Subscription(connection, f"s{n}", FeedFilter()))
+    with pytest.raises(ValueError):
+        index.add(Subscription(connection, 'overflow', FeedFilter()))
+
+    index.remove_connection(connection)
+    assert len(index) == 0
+    assert index.match({'final_score': 50}) == []
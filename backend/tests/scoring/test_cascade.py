@@ -0,0 +1,63 @@
+"""
+级联预筛选测试
+"""
+from datetime import datetime, timedelta, timezone
+
+from app.models import News
+from app.scoring.cascade import CascadeFilter, freshness
+from app.scoring.engine import NewsScorer, to_naive_utc
+
+
+def make_news(**fields) -> News:
+    defaults = {'title': 'AI chip export news', 'content': 'content', 'source': 'Reuters', 'categories': []}
+    return News(**{**defaults, **fields})
+
+
+def test_to_naive_utc_converts_aware_values():
+    aware = datetime(2024, 5, 1, 8, 0, tzinfo=timezone(timedelta(hours=8)))
+    assert to_naive_utc(aware) == datetime(2024, 5, 1, 0, 0)
+    naive = datetime(2024, 5, 1, 0, 0)
+    assert to_naive_utc(naive) is naive
+    assert to_naive_utc(None) is None
+
+
+def test_freshness_accepts_tz_aware_published_at():
+    now = datetime(2024, 5, 1, 12, 0)
+    # 北京时间 20:00 即 UTC 12:00，刚发布
+    published = datetime(2024, 5, 1, 20, 0, tzinfo=timezone(timedelta(hours=8)))
+    assert freshness(make_news(published_at=published), now) == 1.0
+
+    half_day_ago = datetime(2024, 5, 1, 0, 0, tzinfo=timezone.utc)
+    assert freshness(make_news(published_at=half_day_ago), now) == 0.5
+
+
+def test_freshness_decays_to_zero():
+    now = datetime(2024, 5, 1, 12, 0)
+    assert freshness(make_news(published_at=now - timedelta(hours=48)), now) == 0.0
+    # 没有发布时间时使用抓取时间
+    assert freshness(make_news(published_at=None, crawled_at=now), now) == 1.0
+
+
+def test_local_score_with_tz_aware_published_at():
+    cascade = CascadeFilter([{}], min_score=0)
+    news = make_news(published_at=datetime.now(timezone.utc))
+    score = cascade.local_score(NewsScorer({}), news)
+    assert 0 < score <= 100
+    assert cascade.evaluate(news).passed
+
+
+def test_evaluate_blocked_source_and_excluded_keyword():
+    cascade = CascadeFilter([{'blocked_sources': ['Reuters']}], min_score=0)
+    assert cascade.evaluate(make_news()).reason == 'blocked_source'
+
+    cascade = CascadeFilter([{'excluded_keywords': ['export']}], min_score=0)
+    decision = cascade.evaluate(make_news())
+    assert not decision.passed
+    assert decision.reason == 'excluded_keyword'
+
+
+def test_evaluate_below_threshold():
+    cascade = CascadeFilter([{}], min_score=101)
+    decision = cascade.evaluate(make_news(published_at=datetime.utcnow()))
+    assert not decision.passed
+    assert decision.reason == 'below_threshold'
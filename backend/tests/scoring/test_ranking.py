@@ -0,0 +1,64 @@
+"""
+时间衰减排序：持久化的排序键与当前时间的衰减评分顺序一致，并随评分更新自动维护
+"""
+import math
+import random
+from datetime import datetime, timedelta
+
+from app.models import News
+from app.scoring.engine import DECAY_HALF_LIFE_HOURS, calculate_decay_rank_key, calculate_decayed_score
+from app.scoring.ranking import feed_ranking_engine
+
+
+def test_rank_key_order_matches_decayed_score():
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    items = [
+        (rng.uniform(1, 100), now - timedelta(hours=rng.uniform(0, 96)))
+        for _ in range(200)
+    ]
+
+    by_key = sorted(items, key=lambda item: calculate_decay_rank_key(*item), reverse=True)
+    by_score = sorted(items, key=lambda item: calculate_decayed_score(*item), reverse=True)
+    # 衰减评分四舍五入到两位小数，只比较分数明显不同的相邻条目
+    for a, b in zip(by_key, by_key[1:]):
+        assert calculate_decayed_score(*a) >= calculate_decayed_score(*b) - 0.01
+    assert by_key[0] == by_score[0]
+
+
+def test_rank_key_trades_score_against_age():
+    now = datetime(2024, 5, 1)
+    # 一个衰减常数之前的新闻需要 e 倍的分数才能与刚发布的新闻持平
+    older = calculate_decay_rank_key(50 * math.e, now - timedelta(hours=DECAY_HALF_LIFE_HOURS))
+    assert abs(older - calculate_decay_rank_key(50, now)) < 1e-9
+    # 零分新闻也有有限的排序键，排在同一时间的有分新闻之后
+    assert calculate_decay_rank_key(0, now) < calculate_decay_rank_key(1, now)
+
+
+def test_rank_key_maintained_on_write(db):
+    crawled_at = datetime.utcnow() - timedelta(hours=5)
+    news = News(title='t', url='https://example.com/t', final_score=40, crawled_at=crawled_at)
+    db.add(news)
+    db.commit()
+    assert news.decay_rank_key == calculate_decay_rank_key(40, crawled_at)
+
+    news.final_score = 80
+    db.commit()
+    assert news.decay_rank_key == calculate_decay_rank_key(80, crawled_at)
+
+
+def test_feed_query_orders_by_rank_key(db):
+    now = datetime.utcnow()
+    rows = [
+        News(title='old-high', url='https://example.com/1', final_score=90, crawled_at=now - timedelta(hours=72)),
+        News(title='new-mid', url='https://example.com/2', final_score=60, crawled_at=now),
+        News(title='new-low', url='https://example.com/3', final_score=20, crawled_at=now - timedelta(hours=1)),
+    ]
+    db.add_all(rows)
+    db.commit()
+
+    ordered = feed_ranking_engine.order_by_decayed_score(db.query(News)).all()
+
+    assert [news.title for news in ordered] == ['new-mid', 'new-low', 'old-high']
+    scores = [feed_ranking_engine.decayed_score(news) for news in ordered]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,81 @@
+"""
+分析队列测试：入队（含带时区的发布时间）、优先级、预算档位和领取
+"""
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.models import AnalysisJob, News
+from app.services.analysis_queue import (
+    AnalysisQueueService, TIER_BUDGET, TIER_DEFERRED, TIER_FULL, TIER_TITLE_ONLY,
+)
+
+
+def test_enqueue_tz_aware_item(db, add_news):
+    published = datetime.now(timezone(timedelta(hours=8)))
+    news = add_news('aware', published_at=published)
+
+    assert AnalysisQueueService.enqueue(db, [news], source_priority=5) == 1
+    db.commit()
+
+    job = db.query(AnalysisJob).filter(AnalysisJob.news_id == news.id).one()
+    assert job.status == 'queued'
+    # 刚发布的新闻时效性满分
+    assert job.priority == AnalysisQueueService.compute_priority(news, 5, 1, datetime.utcnow())
+
+    claimed = AnalysisQueueService.claim_next(db, budget_percentage=0, limit=10)
+    assert [c.news_id for c in claimed] == [news.id]
+    assert claimed[0].status == 'running'
+    assert claimed[0].tier == TIER_FULL
+
+
+def test_enqueue_skips_already_queued(db, add_news):
+    news = add_news('dup')
+    assert AnalysisQueueService.enqueue(db, [news]) == 1
+    db.commit()
+    assert AnalysisQueueService.enqueue(db, [news]) == 0
+
+
+def test_priority_prefers_fresh_and_clustered_news():
+    now = datetime(2024, 5, 1, 12, 0)
+    fresh = News(title='a', published_at=now, rule_score=50)
+    stale = News(title='b', published_at=now - timedelta(days=2), rule_score=50)
+    assert AnalysisQueueService.compute_priority(fresh, now=now) > AnalysisQueueService.compute_priority(stale, now=now)
+    assert AnalysisQueueService.compute_priority(stale, cluster_size=4, now=now) > \
+        AnalysisQueueService.compute_priority(stale, cluster_size=1, now=now)
+
+
+def test_admission_tier_by_budget():
+    high = settings.ANALYSIS_TITLE_ONLY_MIN_PRIORITY + 1
+    low = settings.ANALYSIS_TITLE_ONLY_MIN_PRIORITY - 1
+    assert AnalysisQueueService.admission_tier(0, low) == TIER_FULL
+    assert AnalysisQueueService.admission_tier(settings.ANALYSIS_BUDGET_DOWNGRADE_PCT, low) == TIER_BUDGET
+    assert AnalysisQueueService.admission_tier(settings.ANALYSIS_BUDGET_TITLE_ONLY_PCT, high) == TIER_TITLE_ONLY
+    assert AnalysisQueueService.admission_tier(settings.ANALYSIS_BUDGET_TITLE_ONLY_PCT, low) == TIER_DEFERRED
+    assert AnalysisQueueService.admission_tier(100, high) == TIER_DEFERRED
+
+
+def test_claim_next_uses_budget_model_and_skips_deferred(db, add_news):
+    important = add_news('important')
+    minor = add_news('minor')
+    now = datetime.utcnow()
+    db.add_all([
+        AnalysisJob(news_id=important.id, priority=80, status='queued', attempts=0, cluster_size=1, enqueued_at=now),
+        AnalysisJob(news_id=minor.id, priority=10, status='queued', attempts=0, cluster_size=1, enqueued_at=now),
+    ])
+    db.commit()
+
+    claimed = AnalysisQueueService.claim_next(db, budget_percentage=settings.ANALYSIS_BUDGET_TITLE_ONLY_PCT, limit=10)
+    assert [job.news_id for job in claimed] == [important.id]
+    assert claimed[0].tier == TIER_TITLE_ONLY
+    assert claimed[0].model == settings.ANALYSIS_BUDGET_MODEL
+
+
+def test_apply_admission_defers_and_restores(db, add_news):
+    news = add_news('low')
+    db.add(AnalysisJob(news_id=news.id, priority=1, status='queued', attempts=0, cluster_size=1, enqueued_at=datetime.utcnow()))
+    db.commit()
+
+    assert AnalysisQueueService.apply_admission(db, 100) == {'deferred': 1, 'restored': 0}
+    # 进入新的月份，预算恢复
+    assert AnalysisQueueService.apply_admission(db, 0) == {'deferred': 0, 'restored': 1}
+    assert db.query(AnalysisJob).one().status == 'queued'
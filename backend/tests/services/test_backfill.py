@@ -0,0 +1,102 @@
+"""
+回填结果写回：从断点继续、不覆盖作业创建后已重新分析的新闻
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.llm.batch import write_jsonl
+from app.models import LLMBatchJob
+from app.services.backfill import CUSTOM_ID_PREFIX, BackfillService
+from app.services.news_service import CostService
+
+BRIEF = {
+    "summary": "batch summary", "keywords": ["AI"], "sentiment": "positive", "categories": ["AI"], "importance": 77,
+    "position_bias": "bullish", "position_magnitude": 40, "market_impact": 70, "industry_relevance": 60,
+    "novelty_score": 50, "urgency": 40,
+}
+
+
+@pytest.fixture
+def costs(monkeypatch):
+    """记录写回时登记的成本（不进入全局成本账本）"""
+    recorded = []
+    monkeypatch.setattr(CostService, 'record_cost', staticmethod(lambda db, **fields: recorded.append(fields)))
+    return recorded
+
+
+def output_row(news_id, content=None, error=None):
+    if error:
+        return {'custom_id': f"{CUSTOM_ID_PREFIX}{news_id}", 'response': None, 'error': {'message': error}}
+    body = {
+        'choices': [{'message': {'role': 'assistant', 'content': json.dumps(content or BRIEF)}}],
+        'usage': {'prompt_tokens': 200, 'completion_tokens': 50},
+    }
+    return {'custom_id': f"{CUSTOM_ID_PREFIX}{news_id}", 'response': {'status_code': 200, 'body': body}, 'error': None}
+
+
+def make_job(db, tmp_path, rows, **fields):
+    output_file = tmp_path / 'job.output.jsonl'
+    write_jsonl(str(output_file), rows)
+    job = LLMBatchJob(
+        name='reanalyze', provider='local', model='gpt-4o-mini', prompt_version='v2', status='completed',
+        output_file=str(output_file), request_count=len(rows), **fields
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_apply_results_writes_back_analysis(db, tmp_path, add_news, costs):
+    news = add_news('AI chips')
+    failed = add_news('rate limited')
+    job = make_job(db, tmp_path, [output_row(news.id), output_row(failed.id, error='rate limited')])
+
+    BackfillService.apply_results(db, job, price_ratio=0.5)
+
+    db.refresh(news)
+    assert news.is_analyzed and news.analysis_type == 'backfill'
+    assert news.summary == 'batch summary' and news.ai_score == 77
+    assert news.prompt_versions == {'brief': 'v2'}
+    assert not failed.is_analyzed
+    assert (job.status, job.applied_count, job.succeeded_count, job.failed_count) == ('applied', 2, 1, 1)
+    assert [(cost['news_id'], cost['request_type'], cost['prompt_tokens']) for cost in costs] == [(news.id, 'backfill', 200)]
+
+
+def test_apply_results_resumes_from_applied_count(db, tmp_path, add_news, costs, monkeypatch):
+    monkeypatch.setattr(settings, 'BACKFILL_APPLY_BATCH', 2)
+    news = [add_news(f"news {n}") for n in range(5)]
+    # 前两行已在中断前写回
+    job = make_job(db, tmp_path, [output_row(item.id) for item in news], applied_count=2, succeeded_count=2)
+
+    BackfillService.apply_results(db, job)
+
+    assert [item.is_analyzed for item in news] == [False, False, True, True, True]
+    assert sorted(cost['news_id'] for cost in costs) == [item.id for item in news[2:]]
+    assert (job.applied_count, job.succeeded_count, job.status) == (5, 5, 'applied')
+
+    # 已写回的作业再次执行不会重复登记
+    costs.clear()
+    BackfillService.apply_results(db, job)
+    assert costs == []
+
+
+def test_apply_results_keeps_newer_live_analysis(db, tmp_path, add_news, costs):
+    job_created = datetime.utcnow() - timedelta(hours=2)
+    live = add_news('reanalyzed live', is_analyzed=True, summary='live summary', ai_score=90,
+                    analysis_type='vapi', analyzed_at=job_created + timedelta(hours=1))
+    stale = add_news('analyzed before job', is_analyzed=True, summary='old summary', ai_score=10,
+                     analysis_type='vapi', analyzed_at=job_created - timedelta(days=1))
+    job = make_job(db, tmp_path, [output_row(live.id), output_row(stale.id)], created_at=job_created)
+
+    BackfillService.apply_results(db, job)
+
+    db.refresh(live)
+    db.refresh(stale)
+    assert (live.summary, live.ai_score, live.analysis_type) == ('live summary', 90, 'vapi')
+    assert (stale.summary, stale.ai_score, stale.analysis_type) == ('batch summary', 77, 'backfill')
+    # 已发生的批处理成本照常登记
+    assert sorted(cost['news_id'] for cost in costs) == sorted([live.id, stale.id])
+    assert job.succeeded_count == 2
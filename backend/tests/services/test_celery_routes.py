@@ -0,0 +1,113 @@
+"""
+Celery 任务路由与队列配置（不需要 Redis：路由在本地计算，投递使用内存消息代理）
+"""
+import ast
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services import celery_app as celery_module
+from app.services.celery_app import (
+    ANALYZE_QUEUE,
+    CRAWL_QUEUE,
+    MAINTENANCE_QUEUE,
+    PUSH_QUEUE,
+    QUEUE_WORKER_SETTINGS,
+    TASK_ROUTES,
+    celery_app,
+    configure_queue_worker,
+)
+
+TASKS_FILE = Path(celery_module.__file__).with_name('tasks.py')
+
+EXPECTED_QUEUES = {
+    'crawl_single_source': CRAWL_QUEUE,
+    'crawl_all_sources': CRAWL_QUEUE,
+    'process_analysis_queue': ANALYZE_QUEUE,
+    'process_news_with_ai': ANALYZE_QUEUE,
+    'run_backfill_jobs': ANALYZE_QUEUE,
+    'push_scored_news': PUSH_QUEUE,
+    'push_high_score_news': PUSH_QUEUE,
+    'drain_push_outbox': PUSH_QUEUE,
+    'rescore_news_for_config': MAINTENANCE_QUEUE,
+    'refresh_user_relevance': MAINTENANCE_QUEUE,
+    'cleanup_old_news': MAINTENANCE_QUEUE,
+}
+
+
+def declared_tasks():
+    """tasks.py 中用 @celery_app.task 注册的任务名（解析源码，避免导入 LLM 等依赖）"""
+    names = []
+    for node in ast.parse(TASKS_FILE.read_text(encoding='utf-8')).body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        for decorator in node.decorator_list:
+            target = decorator.func if isinstance(decorator, ast.Call) else decorator
+            if ast.unparse(target) == 'celery_app.task':
+                names.append(f'app.services.tasks.{node.name}')
+    return names
+
+
+def route(name: str) -> str:
+    return celery_app.amqp.router.route({}, name)['queue'].name
+
+
+def test_every_task_is_routed():
+    tasks = declared_tasks()
+    assert tasks
+    assert set(tasks) == set(TASK_ROUTES)
+    for entry in celery_app.conf.beat_schedule.values():
+        assert entry['task'] in TASK_ROUTES
+
+
+def test_task_queues():
+    for task, queue in EXPECTED_QUEUES.items():
+        assert route(f'app.services.tasks.{task}') == queue
+    assert route('app.services.tasks.unknown') == MAINTENANCE_QUEUE
+    assert {queue.name for queue in celery_app.conf.task_queues} == set(QUEUE_WORKER_SETTINGS)
+
+
+def test_messages_land_in_routed_queue():
+    with celery_app.connection_for_write('memory://') as connection:
+        channel = connection.default_channel
+        for queue in celery_app.amqp.queues.values():
+            queue(channel).declare()
+            channel.queue_purge(queue.name)
+
+        celery_app.send_task('app.services.tasks.crawl_single_source', args=[1], connection=connection)
+        celery_app.send_task('app.services.tasks.push_scored_news', args=[1], connection=connection)
+
+        counts = {
+            name: channel.queue_declare(queue=name, passive=True).message_count
+            for name in QUEUE_WORKER_SETTINGS
+        }
+    assert counts == {CRAWL_QUEUE: 1, ANALYZE_QUEUE: 0, PUSH_QUEUE: 1, MAINTENANCE_QUEUE: 0}
+
+
+@pytest.mark.parametrize('queues', [CRAWL_QUEUE, [ANALYZE_QUEUE], f' {PUSH_QUEUE} '])
+def test_single_queue_worker_settings(queues):
+    conf = SimpleNamespace(worker_concurrency=None, worker_prefetch_multiplier=None)
+    configure_queue_worker(conf=conf, options={'queues': queues})
+
+    name = (queues[0] if isinstance(queues, list) else queues).strip()
+    assert (conf.worker_concurrency, conf.worker_prefetch_multiplier) == QUEUE_WORKER_SETTINGS[name]
+
+
+@pytest.mark.parametrize('options', [{}, {'queues': 'crawl,analyze'}, {'queues': ['unknown']}])
+def test_other_workers_keep_defaults(options):
+    conf = SimpleNamespace(worker_concurrency=None, worker_prefetch_multiplier=None)
+    configure_queue_worker(conf=conf, options=options)
+    assert conf.worker_concurrency is None and conf.worker_prefetch_multiplier is None
+
+
+def test_broker_urls(monkeypatch):
+    monkeypatch.setattr(settings, 'CELERY_BACKEND', 'memory')
+    assert celery_module.broker_urls() == ('memory://', 'cache+memory://')
+
+    monkeypatch.setattr(settings, 'CELERY_BACKEND', 'redis')
+    monkeypatch.setattr(settings, 'REDIS_URL', 'redis://cache:6379/0')
+    monkeypatch.setattr(settings, 'CELERY_RESULT_BACKEND_URL', 'redis://cache:6379/1')
+    monkeypatch.setattr(settings, 'CELERY_BROKER_URL', None)
+    assert celery_module.broker_urls() == ('redis://cache:6379/0', 'redis://cache:6379/1')
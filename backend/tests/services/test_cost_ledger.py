@@ -0,0 +1,167 @@
+"""
+成本账本：缓冲记录立即计入汇总，批量写入时同一事务累加 cost_rollups，多进程通过重新加载合并
+"""
+from datetime import datetime
+
+import pytest
+
+from app.models import CostRollup, LLMCost
+from app.services.cost_ledger import DAY, MONTH, CostLedger
+
+# 内存快照只加载最近 COST_LEDGER_MEMORY_DAYS 天的汇总
+CREATED_AT = datetime.utcnow()
+DAY_KEY = CREATED_AT.strftime('%Y-%m-%d')
+MONTH_KEY = CREATED_AT.strftime('%Y-%m')
+
+
+@pytest.fixture
+def ledger():
+    ledger = CostLedger()
+    # 不启动后台写入线程，由测试显式 flush 到测试数据库
+    ledger._ensure_flusher = lambda: None
+    return ledger
+
+
+def record(ledger, model='gpt-4o-mini', request_type='news_analysis', source='Reuters', cost=0.01,
+           created_at=CREATED_AT, **fields):
+    return ledger.record(
+        created_at=created_at, model=model, provider='openai', request_type=request_type, source=source,
+        prompt_tokens=1000, completion_tokens=200, cached_tokens=400, cost_usd=cost, cost_cny=cost * 7.2,
+        **fields,
+    )
+
+
+def rollup_rows(db):
+    return {
+        (row.period, row.period_key, row.model, row.request_type, row.source): row
+        for row in db.query(CostRollup)
+    }
+
+
+def test_buffered_records_count_before_flush(db, ledger):
+    record(ledger)
+    record(ledger, model='deepseek-chat', cost=0.002)
+
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.012)
+    assert db.query(LLMCost).count() == 0
+
+    assert ledger.flush(db) == 2
+    assert db.query(LLMCost).count() == 2
+    # 写入后从增量转为快照，合计不变
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.012)
+    assert ledger.flush(db) == 0
+
+
+def test_flush_accumulates_rollups(db, ledger):
+    record(ledger)
+    ledger.flush(db)
+    record(ledger, cost=0.03)
+    record(ledger, request_type='brief_analysis', source=None, cost=0.005)
+    ledger.flush(db)
+
+    rows = rollup_rows(db)
+    assert set(rows) == {
+        (DAY, DAY_KEY, 'gpt-4o-mini', 'news_analysis', 'Reuters'),
+        (MONTH, MONTH_KEY, 'gpt-4o-mini', 'news_analysis', 'Reuters'),
+        (DAY, DAY_KEY, 'gpt-4o-mini', 'brief_analysis', ''),
+        (MONTH, MONTH_KEY, 'gpt-4o-mini', 'brief_analysis', ''),
+    }
+    month = rows[(MONTH, MONTH_KEY, 'gpt-4o-mini', 'news_analysis', 'Reuters')]
+    assert month.requests == 2
+    assert month.prompt_tokens == 2000 and month.cached_tokens == 800 and month.total_tokens == 2400
+    assert month.cost_usd == pytest.approx(0.04)
+
+
+def test_other_process_sees_flushed_totals(db, ledger):
+    record(ledger, cost=0.02)
+    ledger.flush(db)
+
+    other = CostLedger()
+    other._ensure_flusher = lambda: None
+    other.refresh(db, force=True)
+    by_stage = other.totals(db, MONTH, period_keys={MONTH_KEY}, group_by=('stage',))['stage']
+    assert by_stage['news_analysis'].cost_usd == pytest.approx(0.02)
+
+    # 本进程未写入的增量叠加在快照之上
+    record(other, cost=0.01)
+    assert other.month_cost(db, MONTH_KEY) == pytest.approx(0.03)
+
+
+def test_failed_flush_keeps_records(db, ledger, monkeypatch):
+    record(ledger)
+
+    def fail():
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(db, 'commit', fail)
+    with pytest.raises(RuntimeError):
+        ledger.flush(db)
+    monkeypatch.undo()
+
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.01)
+    assert ledger.flush(db) == 1
+    assert rollup_rows(db)[(MONTH, MONTH_KEY, 'gpt-4o-mini', 'news_analysis', 'Reuters')].requests == 1
+
+
+def test_rebuild_matches_incremental_rollups(db, ledger):
+    record(ledger)
+    record(ledger, model='deepseek-chat', request_type='backfill', cost=0.003)
+    record(ledger, source='Bloomberg', cost=0.02)
+    ledger.flush(db)
+    incremental = {key: (row.requests, round(row.cost_usd, 6)) for key, row in rollup_rows(db).items()}
+
+    assert CostLedger.rebuild(db) == len(incremental)
+    rebuilt = {key: (row.requests, round(row.cost_usd, 6)) for key, row in rollup_rows(db).items()}
+    assert rebuilt == incremental
+
+
+def test_summary_attribution(db, ledger):
+    record(ledger, cost=0.03)
+    record(ledger, source=None, request_type='brief_analysis', cost=0.01)
+    ledger.flush(db)
+
+    summary = ledger.summary(db, days=1)
+    assert summary['total_requests'] == 2
+    assert summary['by_model']['gpt-4o-mini']['cache_hit_rate'] == 0.4
+    assert list(summary['by_stage']) == ['news_analysis', 'brief_analysis']
+    assert summary['by_source']['other']['cost_usd'] == 0.01
+
+
+def test_month_cost_reads_running_total_without_database(db, ledger, monkeypatch):
+    record(ledger, cost=0.02)
+    ledger.flush(db)
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.02)
+
+    # 首次加载之后，预算检查不再查询数据库
+    def no_query(*args, **kwargs):
+        raise AssertionError('month_cost queried the database')
+
+    monkeypatch.setattr(db, 'query', no_query)
+    record(ledger, cost=0.01)
+    record(ledger, created_at=datetime(2001, 1, 15), cost=0.5)
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.03)
+    assert ledger.month_cost(db, '2001-01') == pytest.approx(0.5)
+    assert ledger.month_cost(db, '1999-12') == 0.0
+
+
+def test_month_running_total_matches_rollups(db, ledger):
+    record(ledger, cost=0.02)
+    record(ledger, model='deepseek-chat', source=None, cost=0.003)
+    ledger.flush(db)
+    record(ledger, cost=0.01)
+
+    by_model = ledger.totals(db, MONTH, period_keys={MONTH_KEY})['model']
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(sum(t.cost_usd for t in by_model.values()))
+
+    # 重新加载替换已写入部分，本进程未写入的增量保留
+    other = CostLedger()
+    other._ensure_flusher = lambda: None
+    record(other, cost=0.1)
+    other.flush(db)
+    ledger.refresh(db, force=True)
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.133)
+
+    ledger.flush(db)
+    ledger.refresh(db, force=True)
+    assert ledger.month_cost(db, MONTH_KEY) == pytest.approx(0.133)
+    assert ledger._pending_month_cost == {}
@@ -0,0 +1,94 @@
+"""
+推送发件箱：幂等写入、单次领取、租约过期重领和失败退避
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import PushOutbox
+from app.push import PushResult
+from app.services.push_outbox import PushOutboxService
+
+
+@pytest.fixture(autouse=True)
+def immediate_push(monkeypatch):
+    monkeypatch.setattr(settings, 'PUSH_DIGEST_ENABLED', False)
+    monkeypatch.setattr(settings, 'SCORE_THRESHOLD', 60.0)
+
+
+def test_idempotency_key_is_stable():
+    key = PushOutboxService.idempotency_key(1, 'feishu')
+    assert key == PushOutboxService.idempotency_key(1, 'feishu')
+    assert key != PushOutboxService.idempotency_key(1, 'email')
+    assert key != PushOutboxService.idempotency_key(2, 'feishu')
+
+
+def test_enqueue_is_idempotent(db, add_news, add_user):
+    user = add_user(push_enabled=True, push_channels=['feishu', 'email'])
+    high = add_news('high', final_score=80)
+    low = add_news('low', final_score=40)
+    pushed = add_news('pushed', final_score=90, is_pushed=True)
+
+    assert PushOutboxService.enqueue(db, [high, low, pushed], user) == 2
+    db.commit()
+    # 重复评分（重新评分、任务重试）不会产生重复记录
+    assert PushOutboxService.enqueue(db, [high], user) == 0
+    assert PushOutboxService.enqueue_pending_news(db, user) == 0
+
+    entries = db.query(PushOutbox).order_by(PushOutbox.channel).all()
+    assert [(entry.news_id, entry.channel) for entry in entries] == [(high.id, 'email'), (high.id, 'feishu')]
+    for entry in entries:
+        assert entry.idempotency_key == PushOutboxService.idempotency_key(high.id, entry.channel)
+
+
+def test_enqueue_requires_push_config(db, add_news, add_user):
+    news = add_news('high', final_score=80)
+    assert PushOutboxService.enqueue(db, [news], None) == 0
+    assert PushOutboxService.enqueue(db, [news], add_user(push_enabled=True, push_channels=[])) == 0
+
+
+def test_claim_once_and_reclaim_after_lease(db, add_news, add_user):
+    user = add_user(push_enabled=True, push_channels=['feishu'])
+    news = add_news('high', final_score=80)
+    PushOutboxService.enqueue(db, [news], user)
+    db.commit()
+
+    claimed = PushOutboxService.claim_due(db)
+    assert len(claimed) == 1 and claimed[0].status == 'sending'
+    # 租约期内不会被其他 worker 再次领取
+    assert PushOutboxService.claim_due(db) == []
+
+    # worker 崩溃、租约到期后重新领取，幂等键不变
+    entry = claimed[0]
+    entry.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    reclaimed = PushOutboxService.claim_due(db)
+    assert [item.id for item in reclaimed] == [entry.id]
+    assert reclaimed[0].idempotency_key == PushOutboxService.idempotency_key(news.id, 'feishu')
+
+
+def test_record_result_backoff_and_give_up(monkeypatch):
+    monkeypatch.setattr(settings, 'PUSH_OUTBOX_MAX_ATTEMPTS', 2)
+    now = datetime(2024, 5, 1)
+    entry = PushOutbox(news_id=1, channel='feishu', status='sending', attempts=0)
+
+    PushOutboxService.record_result(entry, PushResult(success=False, channel='feishu', error_message='timeout'), now)
+    assert entry.status == 'pending'
+    delay = (entry.next_attempt_at - now).total_seconds()
+    assert settings.PUSH_OUTBOX_BASE_BACKOFF_SECONDS / 2 <= delay <= settings.PUSH_OUTBOX_BASE_BACKOFF_SECONDS
+
+    PushOutboxService.record_result(entry, PushResult(success=False, channel='feishu', error_message='timeout'), now)
+    assert entry.status == 'failed' and entry.attempts == 2
+
+    sent = PushOutbox(news_id=1, channel='email', status='sending', attempts=1, last_error='timeout')
+    PushOutboxService.record_result(sent, PushResult(success=True, channel='email'), now)
+    assert (sent.status, sent.sent_at, sent.last_error) == ('sent', now, None)
+
+
+def test_backoff_grows_and_caps():
+    for attempts in range(1, 12):
+        delay = PushOutboxService.backoff_delay(attempts)
+        expected = min(settings.PUSH_OUTBOX_MAX_BACKOFF_SECONDS,
+                       settings.PUSH_OUTBOX_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        assert expected / 2 <= delay <= expected
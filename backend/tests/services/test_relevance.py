@@ -0,0 +1,105 @@
+"""
+新闻-用户关联度表：入库时为所有用户写入、配置变更后由后台任务增量刷新、信息流按关联度筛选
+"""
+from datetime import datetime, timedelta
+
+from app.models import NewsUserRelevance
+from app.services.news_filter import NewsFilterService
+from app.services.rescoring import RescoringService
+
+
+def relevance_rows(db, user_id):
+    return {
+        row.news_id: row
+        for row in db.query(NewsUserRelevance).filter(NewsUserRelevance.user_id == user_id)
+    }
+
+
+def test_store_for_all_users(db, add_news, add_user):
+    ai_user = add_user('ai', keywords={'AI': 1.0})
+    bank_user = add_user('bank', keywords={'央行': 1.0})
+    news = [add_news('AI chips'), add_news('央行降息')]
+
+    assert NewsFilterService.store_relevance_for_all_users(db, news) == 4
+    db.commit()
+
+    for user in (ai_user, bank_user):
+        rows = relevance_rows(db, user.user_id)
+        assert set(rows) == {item.id for item in news}
+        for item in news:
+            assert rows[item.id].relevance == NewsFilterService.calculate_user_relevance(item, user)
+    assert relevance_rows(db, 'ai')[news[0].id].relevance > relevance_rows(db, 'ai')[news[1].id].relevance
+
+    # 重新计算时更新已有记录而不是重复插入
+    NewsFilterService.store_relevance_for_all_users(db, news)
+    db.commit()
+    assert db.query(NewsUserRelevance).count() == 4
+
+
+def test_refresh_only_stale_rows(db, add_news, add_user):
+    user = add_user('default', keywords={'AI': 1.0})
+    fresh = add_news('AI fresh')
+    missing = add_news('AI missing')
+    old = add_news('AI old', published_at=datetime.utcnow() - timedelta(days=30))
+    NewsFilterService.store_relevance(db, [fresh], user)
+    db.commit()
+
+    # 窗口内缺少记录的新闻被补算，窗口外的不处理
+    assert NewsFilterService.refresh_stale_relevance(db, user) == 1
+    assert set(relevance_rows(db, 'default')) == {fresh.id, missing.id}
+    assert NewsFilterService.refresh_stale_relevance(db, user) == 0
+
+    # 配置更新晚于计算时间后全部重算
+    user.keywords = {'chips': 1.0}
+    user.updated_at = datetime.utcnow() + timedelta(seconds=1)
+    db.commit()
+    assert NewsFilterService.refresh_stale_relevance(db, user) == 2
+    assert old.id not in relevance_rows(db, 'default')
+
+
+def test_feed_skips_zero_relevance(db, add_news, add_user):
+    user = add_user('default', keywords={'AI': 1.0}, blocked_sources=['Spam'])
+    visible = add_news('AI visible', final_score=70)
+    add_news('AI blocked', source='Spam', final_score=90)
+
+    feed = NewsFilterService.filter_news_by_config(db, user, mode='all')
+
+    assert [news.id for news in feed] == [visible.id]
+    assert feed[0].user_relevance_score == relevance_rows(db, 'default')[visible.id].relevance
+
+
+def test_feed_only_fills_missing_rows(db, add_news, add_user):
+    user = add_user('default', keywords={'AI': 1.0})
+    scored = add_news('AI scored', final_score=70)
+    NewsFilterService.store_relevance(db, [scored], user)
+    db.commit()
+    computed_at = relevance_rows(db, 'default')[scored.id].computed_at
+    missing = add_news('AI missing', final_score=60)
+    db.commit()
+
+    # 与关联度无关的配置变更（如推送开关）也会更新 updated_at，读取时不重算已有记录
+    user.push_enabled = not user.push_enabled
+    user.updated_at = datetime.utcnow() + timedelta(seconds=1)
+    db.commit()
+    feed = NewsFilterService.filter_news_by_config(db, user, mode='all')
+
+    assert {news.id for news in feed} == {scored.id, missing.id}
+    rows = relevance_rows(db, 'default')
+    assert rows[scored.id].computed_at == computed_at
+    assert missing.id in rows
+
+
+def test_relevance_changed_only_for_relevance_fields(db, add_user):
+    user = add_user('default', keywords={'AI': 1.0}, categories=['tech'])
+    snapshot = RescoringService.snapshot_config(user)
+
+    user.push_enabled = not user.push_enabled
+    user.min_score_threshold = 80
+    assert not NewsFilterService.relevance_changed(snapshot, user)
+
+    user.categories = ['tech', 'finance']
+    assert NewsFilterService.relevance_changed(snapshot, user)
+
+    user.categories = ['tech']
+    user.blocked_sources = ['Spam']
+    assert NewsFilterService.relevance_changed(snapshot, user)
@@ -0,0 +1,70 @@
+"""
+增量重新评分：配置差异、受影响新闻的筛选和只回写变化的记录
+"""
+from datetime import datetime, timedelta
+
+from app.services.rescoring import ConfigDiff, RescoringService
+
+BASE_CONFIG = {
+    'keywords': {'AI': 1.0, '芯片': 1.0},
+    'industries': ['Technology'],
+    'excluded_keywords': ['广告'],
+    'ai_weight': 0.6,
+    'rule_weight': 0.4,
+    'keyword_positions': {},
+    'position_sensitivity': 1.0,
+}
+
+
+def test_diff_configs():
+    new = {**BASE_CONFIG, 'keywords': {'AI': 2.0, '央行': 1.0}, 'industries': ['Technology', 'Finance']}
+    diff = RescoringService.diff_configs(BASE_CONFIG, new)
+
+    assert diff.added_keywords == ['央行']
+    assert diff.removed_keywords == ['芯片']
+    assert diff.reweighted_keywords == ['AI']
+    assert diff.changed_industries == ['Finance']
+    assert not diff.requires_full_rescore
+    assert diff.affected_terms == {'AI', '芯片', '央行'}
+    assert ConfigDiff.from_dict(diff.to_dict()) == diff
+
+    assert RescoringService.diff_configs(BASE_CONFIG, dict(BASE_CONFIG)).is_empty()
+    assert RescoringService.diff_configs(BASE_CONFIG, {**BASE_CONFIG, 'ai_weight': 0.8}).requires_full_rescore
+
+
+def test_find_affected_news(db, add_news):
+    chip = add_news('芯片出口', categories=['Market'])
+    finance = add_news('股市收盘', categories=['Finance'])
+    other = add_news('天气预报')
+    add_news('芯片旧闻', crawled_at=datetime.utcnow() - timedelta(days=60))
+
+    diff = ConfigDiff(removed_keywords=['芯片'], changed_industries=['Finance'])
+    assert RescoringService.find_affected_news_ids(db, diff) == [chip.id, finance.id]
+
+    # 权重变化影响窗口内所有新闻
+    assert RescoringService.find_affected_news_ids(db, ConfigDiff(weights_changed=True)) == [chip.id, finance.id, other.id]
+    assert RescoringService.find_affected_news_ids(db, ConfigDiff()) == []
+
+
+def test_run_only_writes_changed_news(db, add_news, add_user):
+    user = add_user(push_channels=[], **BASE_CONFIG)
+    news = add_news('AI芯片发布', content='AI 芯片')
+    untouched = add_news('天气预报')
+    db.commit()
+
+    old = RescoringService.snapshot_config(user)
+    user.keywords = {'AI': 3.0, '芯片': 1.0}
+    db.commit()
+    diff = RescoringService.diff_configs(old, RescoringService.snapshot_config(user))
+
+    progress = []
+    result = RescoringService.run(db, 'default', diff, progress_callback=lambda *args: progress.append(args))
+
+    assert result == {'total': 1, 'processed': 1, 'changed': 1}
+    assert progress == [(1, 1, 1)]
+    db.refresh(news)
+    assert news.rule_score > 0
+    assert untouched.rule_score == 0
+
+    # 配置未再变化时重新评分不产生写入
+    assert RescoringService.run(db, 'default', diff)['changed'] == 0
@@ -0,0 +1,183 @@
+"""
+SMTP 连接池：连接复用、失效连接重连、按服务器和账号区分连接池
+"""
+import asyncio
+from email.message import EmailMessage
+
+import aiosmtplib
+import pytest
+
+from app.push import smtp_pool
+from app.push.smtp_pool import SMTPConnectionPool, SMTPPoolRegistry
+
+
+class FakeSMTP:
+    """记录连接和发送的 aiosmtplib.SMTP 替身；dead 表示服务器已断开但客户端尚未察觉"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.is_connected = False
+        self.dead = False
+        self.sent = []
+        self.noops = 0
+
+    async def connect(self):
+        self.is_connected = True
+
+    def _check(self):
+        if self.dead:
+            self.is_connected = False
+            raise aiosmtplib.SMTPServerDisconnected("Connection lost")
+
+    async def send_message(self, message, recipients=None):
+        self._check()
+        self.sent.append((message['Subject'], recipients))
+        return {}, 'OK'
+
+    async def noop(self):
+        self._check()
+        self.noops += 1
+
+    async def quit(self):
+        self.is_connected = False
+
+    def close(self):
+        self.is_connected = False
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def factory(**kwargs):
+        smtp = FakeSMTP(**kwargs)
+        created.append(smtp)
+        return smtp
+
+    monkeypatch.setattr(smtp_pool.aiosmtplib, 'SMTP', factory)
+    return created
+
+
+def message(subject='news'):
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = 'bot@example.com'
+    msg['To'] = 'user@example.com'
+    msg.set_content('body')
+    return msg
+
+
+def make_pool(**kwargs):
+    return SMTPConnectionPool('smtp.example.com', 587, 'bot', 'secret', True, **kwargs)
+
+
+def test_sequential_sends_reuse_connection(connections):
+    async def run():
+        pool = make_pool()
+        for n in range(3):
+            await pool.send_message(message(f"news {n}"), recipients=['a@example.com', 'b@example.com'])
+        await pool.close()
+        return pool
+
+    pool = asyncio.run(run())
+
+    assert pool.connects == 1
+    assert len(connections) == 1
+    assert connections[0].kwargs['username'] == 'bot' and connections[0].kwargs['start_tls'] is True
+    assert [subject for subject, _ in connections[0].sent] == ['news 0', 'news 1', 'news 2']
+    assert connections[0].sent[0][1] == ['a@example.com', 'b@example.com']
+    assert not connections[0].is_connected
+
+
+def test_concurrent_sends_bounded_by_pool_size(connections):
+    async def run():
+        pool = make_pool(max_size=2)
+        await asyncio.gather(*(pool.send_message(message(f"news {n}")) for n in range(6)))
+        return pool
+
+    pool = asyncio.run(run())
+
+    assert pool.connects <= 2
+    assert sum(len(smtp.sent) for smtp in connections) == 6
+
+
+def test_send_reconnects_when_reused_connection_was_dropped(connections):
+    async def run():
+        pool = make_pool()
+        await pool.send_message(message('first'))
+        connections[0].dead = True
+        await pool.send_message(message('second'))
+        return pool
+
+    pool = asyncio.run(run())
+
+    assert pool.connects == 2
+    assert connections[1].sent == [('second', None)]
+
+
+def test_failed_health_check_discards_dead_connection(connections):
+    async def run():
+        pool = make_pool()
+        assert await pool.health_check()
+        connections[0].dead = True
+        # 服务器已断开：NOOP 失败，连接被丢弃而不是放回池中
+        healthy_after_drop = await pool.health_check()
+        recovered = await pool.health_check()
+        return pool, healthy_after_drop, recovered
+
+    pool, healthy_after_drop, recovered = asyncio.run(run())
+
+    assert not healthy_after_drop
+    assert recovered
+    assert pool.connects == 2
+    assert connections[1].noops == 1
+
+
+def test_idle_timeout_discards_stale_connection(connections):
+    async def run():
+        pool = make_pool(idle_timeout=0)
+        await pool.send_message(message('first'))
+        await pool.send_message(message('second'))
+        return pool
+
+    pool = asyncio.run(run())
+
+    assert pool.connects == 2
+    assert not connections[0].is_connected
+
+
+def test_registry_keys_pools_by_server_and_account(connections):
+    registry = SMTPPoolRegistry()
+
+    async def run():
+        pool = registry.get('smtp.example.com', 587, 'bot', 'secret', True)
+        same = registry.get('smtp.example.com', 587, 'bot', 'secret', True)
+        other_user = registry.get('smtp.example.com', 587, 'alerts', 'secret', True)
+        other_host = registry.get('smtp.other.com', 587, 'bot', 'secret', True)
+        await pool.send_message(message())
+        await same.send_message(message())
+        await other_user.send_message(message())
+        await registry.close()
+        return pool, same, other_user, other_host
+
+    pool, same, other_user, other_host = asyncio.run(run())
+
+    assert pool is same
+    assert len({id(pool), id(other_user), id(other_host)}) == 3
+    assert [smtp.kwargs['username'] for smtp in connections] == ['bot', 'alerts']
+    assert all(not smtp.is_connected for smtp in connections)
+    assert registry._pools == {}
+
+
+def test_registry_separates_event_loops(connections):
+    registry = SMTPPoolRegistry()
+
+    async def get():
+        return registry.get('smtp.example.com', 587, 'bot', 'secret', True)
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+
+    # 连接池绑定事件循环，已关闭循环的连接池被清理
+    assert first is not second
+    assert len(registry._pools) == 1
@@ -16,6 +16,7 @@ import {
   TrendingUp as TrendingIcon,
   AttachMoney as MoneyIcon,
   Settings as SettingsIcon,
+  HourglassTop as QueueIcon,
 } from '@mui/icons-material'
 import axios from 'axios'
 import { useState, useEffect } from 'react'
@@ -88,11 +89,17 @@ export default function Dashboard() {
     if (latestData && latestData.type === 'dashboard_update') {
       // 只更新当天的数据
       if (formatDate(selectedDate) === formatDate(new Date())) {
+        // 服务端只推送增量：新入库的新闻合并到最近新闻列表顶部
         setLocalStats(prevStats => ({
           ...prevStats,
           today_news: latestData.data.today_news,
           today_pushed: latestData.data.today_pushed,
-          recent_news: latestData.data.recent_news
+          recent_news: [
+            ...(latestData.data.new_news || []),
+            ...(prevStats?.recent_news || []).filter(
+              (news: any) => !(latestData.data.new_news_ids || []).includes(news.id)
+            ),
+          ].slice(0, 5)
         }))
       }
     }
@@ -139,6 +146,13 @@ export default function Dashboard() {
       icon: <SettingsIcon />,
       color: '#4facfe',
     },
+    {
+      title: '分析队列',
+      value: displayStats?.analysis_queue?.depth || 0,
+      subValue: `平均等待: ${(displayStats?.analysis_queue?.avg_wait_seconds || 0).toFixed(0)}s · 最久: ${(displayStats?.analysis_queue?.oldest_wait_seconds || 0).toFixed(0)}s · 延后: ${displayStats?.analysis_queue?.deferred || 0}`,
+      icon: <QueueIcon />,
+      color: '#43e97b',
+    },
   ]
 
   return (
@@ -31,6 +31,7 @@ import {
 } from '@mui/icons-material';
 import axios from 'axios';
 import type { NewsFeedItem, PositionBias } from '../types';
+import { useWebSocket } from '../components/Layout';
 
 const API_URL = '/api/v1';
 
@@ -190,13 +191,47 @@ export default function FeedList() {
   const availableCategories = ['科技', '财经', '体育', '娱乐', '政治', '教育', '健康', '汽车'];
   const availableSources = ['新浪财经', '腾讯新闻', '网易新闻', '凤凰网', '新华网'];
 
-  // 基础新闻Feed查询
+  // 基础新闻Feed查询（新文章通过 WebSocket 订阅实时推送，不再在窗口聚焦时重新拉取）
   const { data, isLoading, isFetching } = useQuery({
     queryKey: ['newsFeed', offset, filters],
     queryFn: () => fetchNewsFeed(offset, limit, filters),
     enabled: hasMore && !isSearchMode,
+    refetchOnWindowFocus: false,
   });
 
+  // 按当前筛选条件订阅实时信息流（连接重建或筛选变化时重新订阅）
+  const { latestData, isConnected, sendMessage } = useWebSocket();
+  useEffect(() => {
+    if (!isConnected || isSearchMode) {
+      return;
+    }
+    sendMessage({
+      action: 'subscribe',
+      id: 'feed',
+      filters: {
+        min_score: filters.minScore,
+        max_score: filters.maxScore,
+        sources: filters.sources,
+        categories: filters.categories,
+        keywords: filters.keywords,
+      },
+    });
+    return () => sendMessage({ action: 'unsubscribe', id: 'feed' });
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [isConnected, isSearchMode, filters]);
+
+  // 收到匹配订阅的新文章时插入列表顶部
+  useEffect(() => {
+    if (latestData?.type === 'feed_items' && latestData.subscription === 'feed' && !isSearchMode) {
+      setItems(prev => {
+        const incoming = (latestData.items as NewsFeedItem[]).filter(
+          item => !prev.some(existing => existing.id === item.id)
+        );
+        return [...incoming, ...prev];
+      });
+    }
+  }, [latestData, isSearchMode]);
+
   // 搜索查询
   const { data: searchData, isLoading: searchLoading, isFetching: searchFetching } = useQuery({
     queryKey: ['searchNews', searchQuery, offset],
@@ -120,7 +120,8 @@ export default function NewsList() {
 
   // 当接收到 WebSocket 消息时，处理新数据通知
   useEffect(() => {
-    if (latestData && latestData.type === 'dashboard_update') {
+    // 只有新入库新闻时才提示刷新（推送计数变化也会触发 dashboard_update）
+    if (latestData && latestData.type === 'dashboard_update' && latestData.data.new_news_ids?.length) {
       // 如果当前没有按日期过滤，或者过滤的是今天
       if (!filters.date || filters.date === formatDate(new Date())) {
         if (autoRefresh) {
@@ -128,7 +129,7 @@ export default function NewsList() {
           debouncedRefresh()
         } else {
           // 手动模式：增加新数据计数
-          setNewDataCount(prev => prev + 1)
+          setNewDataCount(prev => prev + latestData.data.new_news_ids.length)
         }
       }
     }